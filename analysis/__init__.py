@@ -1,26 +1,21 @@
 """
 analysis package for scattering problems on the lattice
+
+The submodules are imported lazily when one of their names is first
+accessed, see _lazy.py.
 """
 
-from .input_output import *
-from .corr_matrix import *
-from .bootstrap import *
-from .chiral_fits import *
-from .analyze_fcts import *
-from .fit import *
-from .interpol import *
-from .plot import *
-from .solver import *
-from .zeta_func import *
-from .phaseshift import *
-from .ratio import *
-from ._calc_energies import calc_Ecm, calc_gamma, calc_q2
-from ._quantiles import weighted_quantile
-from .ensemble import LatticeEnsemble
-from .fitresults import FitResults
-from .module_global import __m, set_cores, get_cores, multiprocess
-from .fitfunc import pion_fit
+from .module_global import __m
+from ._lazy import install
 
-__all__ = [t for t in dir() if not t.startswith('_')]
+install(__name__,
+    ["input_output", "corr_matrix", "bootstrap", "chiral_fits",
+     "analyze_fcts", "fit", "interpol", "plot", "solver", "zeta_func",
+     "phaseshift", "ratio"],
+    {"calc_Ecm": "_calc_energies", "calc_gamma": "_calc_energies",
+     "calc_q2": "_calc_energies", "weighted_quantile": "_quantiles",
+     "LatticeEnsemble": "ensemble", "FitResults": "fitresults",
+     "set_cores": "module_global", "get_cores": "module_global",
+     "multiprocess": "module_global", "pion_fit": "fitfunc"})
 
-del t
+del install
@@ -0,0 +1,137 @@
+# Lazy loading of the package contents.
+#
+# The package used to star-import all submodules on import, which loads
+# matplotlib, scipy and the zeta function even for scripts that only read
+# data. Instead the names every submodule would export are found by
+# parsing its source, and the submodule is imported when one of its
+# names is first accessed.
+
+import os
+import ast
+import sys
+import types
+import importlib
+
+def _assigned(target):
+  if isinstance(target, ast.Name):
+    return [target.id]
+  if isinstance(target, (ast.Tuple, ast.List)):
+    res = []
+    for t in target.elts:
+      res.extend(_assigned(t))
+    return res
+  return []
+
+def star_names(path, modname, seen=None):
+  """The names 'from modname import *' would import, without importing it.
+
+  Args:
+    path: The directory of the package.
+    modname: The name of the submodule.
+
+  Returns:
+    A set of names.
+  """
+  if seen is None:
+    seen = set()
+  if modname in seen:
+    return set()
+  seen.add(modname)
+  try:
+    with open(os.path.join(path, modname + ".py")) as f:
+      tree = ast.parse(f.read())
+  except (IOError, SyntaxError):
+    return set()
+  names = set()
+  for node in tree.body:
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+      names.add(node.name)
+    elif isinstance(node, ast.Assign):
+      for t in node.targets:
+        names.update(_assigned(t))
+        # an explicit __all__ defines the exported names
+        if (isinstance(t, ast.Name) and t.id == "__all__" and
+            isinstance(node.value, (ast.List, ast.Tuple))):
+          return set(e.s for e in node.value.elts if isinstance(e, ast.Str))
+    elif isinstance(node, ast.Import):
+      for a in node.names:
+        names.add(a.asname or a.name.split(".")[0])
+    elif isinstance(node, ast.ImportFrom):
+      for a in node.names:
+        if a.name == "*":
+          # only star imports of sibling modules can be resolved
+          if node.module and "." not in node.module:
+            names.update(star_names(path, node.module, seen))
+        else:
+          names.add(a.asname or a.name)
+  return set(n for n in names if not n.startswith("_"))
+
+class LazyPackage(types.ModuleType):
+  """Package module importing its submodules on first access.
+
+  The origin maps every exported name to the submodule it comes from,
+  modules are the submodules to import when a name is not found.
+  """
+  def __getattr__(self, name):
+    if name.startswith("__"):
+      raise AttributeError(name)
+    origin = self._origin
+    if name in origin:
+      mod = importlib.import_module("." + origin[name], self.__name__)
+      value = getattr(mod, name)
+    else:
+      try:
+        value = importlib.import_module("." + name, self.__name__)
+      except ImportError:
+        # the parsed names might be incomplete, import everything
+        for m in self._modules:
+          mod = importlib.import_module("." + m, self.__name__)
+          if hasattr(mod, name) and not name.startswith("_"):
+            value = getattr(mod, name)
+            break
+        else:
+          raise AttributeError("module '%s' has no attribute '%s'" %
+              (self.__name__, name))
+    setattr(self, name, value)
+    return value
+
+  def __dir__(self):
+    return sorted(set(self.__dict__) | set(self._origin))
+
+def install(name, star_modules, explicit):
+  """Replace the package module by a lazy one.
+
+  Args:
+    name: The name of the package.
+    star_modules: The submodules whose public names are exported, later
+        modules take precedence as with star imports.
+    explicit: Dictionary of single exported names and their submodule.
+
+  Returns:
+    The lazy package.
+  """
+  old = sys.modules[name]
+  path = os.path.dirname(old.__file__)
+  origin = {}
+  for m in star_modules:
+    for n in star_names(path, m):
+      origin[n] = m
+  origin.update(explicit)
+  # names that are also submodules, e.g. the function fit of fit.py, are
+  # properties, so the submodule set as attribute on import does not
+  # shadow them
+  props = {}
+  for n, m in origin.items():
+    if os.path.isfile(os.path.join(path, n + ".py")):
+      props[n] = property(lambda self, n=n, m=m: getattr(
+          importlib.import_module("." + m, name), n))
+  cls = type("LazyPackage", (LazyPackage,), props)
+  package = cls(name, old.__doc__)
+  package.__dict__.update(old.__dict__)
+  package._origin = origin
+  package._modules = list(star_modules) + sorted(set(explicit.values()))
+  package.__all__ = sorted(n for n in origin if not n.startswith("_"))
+  # python 2 clears the globals of deleted modules, keep the old one
+  package._module = old
+  sys.modules[name] = package
+  return package
@@ -46,12 +46,7 @@ def compute_derivative(data):
         deviation.
     """
     # creating derivative array from data array
-    derv = np.zeros_like(data[:,:-1], dtype=float)
-    # computing the derivative
-    for b in range(0, data.shape[0]):
-        row = data[b]
-        for t in range(0, len(row)-1):
-            derv[b, t] = row[t+1] - row[t]
+    derv = np.asarray(data[:,1:] - data[:,:-1], dtype=float)
     mean, err = calc_error(derv)
     return derv, mean, err
 
@@ -71,22 +66,14 @@ def compute_back_derivative(data):
         deviation.
     """
     # creating derivative array from data array
-    derv = np.zeros_like(data[:,:-1], dtype=float)
-    # computing the derivative
-    for b in range(0, data.shape[0]):
-        row = data[b]
-        for t in range(0, len(row)-1):
-            derv[b, t] = row[t] - row[t+1]
+    derv = np.asarray(data[:,:-1] - data[:,1:], dtype=float)
     mean, err = calc_error(derv)
     return derv, mean, err
 
 def compute_square(data):
     """Square a bootstrapped correlation function
     """
-    square = np.zeros_like(data, dtype=float)
-    #compute the elementwise square of every bootstrapsample
-    for b in range(0, data.shape[0]):
-      square[b] = np.square(data[b])
+    square = np.square(np.asarray(data, dtype=float))
     mean, err = calc_error(square)
     return square, mean, err
 
@@ -106,20 +93,11 @@ def compute_mass(data, usecosh=True):
         The energy of the correlation function and its mean and standard
         deviation.
     """
-    # creating mass array from data array
-    mass = np.zeros_like(data[:,1:-1])
-    # computing the energy
+    # computing the energy on all samples and time slices at once
     if usecosh:
-       for b in range(0, data.shape[0]):
-           row = data[b,:]
-           for t in range(1, len(row)-1):
-               mass[b, t-1] = (row[t-1] + row[t+1])/(2.0*row[t])
-       mass = np.arccosh(mass)
+       mass = np.arccosh((data[:,:-2] + data[:,2:])/(2.0*data[:,1:-1]))
     else:
-       for b in range(0, data.shape[0]):
-           row = data[b,:]
-           for t in range(1, len(row)-1):
-               mass[b, t-1] = np.log(row[t]/row[t+1])
+       mass = np.log(data[:,1:-1]/data[:,2:])
     # print energy
     mean, err = calc_error(mass)
     return mass, mean, err
@@ -70,26 +70,21 @@ def chi_pt_cont(p,mpi):
   fk = 160
   ren = fk
   #ren = 130.7
-  mk_akk = []
-  #convert mpi to phys
-  _mpi = lat_to_phys(mpi)
-  for i,x in enumerate(_mpi):
-    # Overall prefactor
-    pre_out = (2.*Bms - x**2)/(16*math.pi*fk**2)
-    # inner prefactor
-    pre_in = (2.*Bms + x**2)/(32*math.pi**2*fk**2)
-    # 3 coefficients to the logarithms
-    coeff = np.array([2, 1./(2.*Bms/x**2-1.), 20./9.*(Bms-x**2)/(2.*Bms-x**2)])
-    # 3 logarithms
-    log = np.log(np.array([(x**2+2.*Bms)/ren**2,x**2/ren**2,(x**2+4.*Bms)/(3.*ren**2)]))
-    # sum_i coeff[i]*log[i]
-    prod = np.multiply(coeff,log)
-    # decorated counterterm
-    count = 14./9. + 32.*(4*math.pi)**2*lkk
-    brac_in = prod[0] - prod[1] + prod[2] - count
-    brac_out = 1. + pre_in*brac_in
-    mk_akk.append(pre_out*brac_out)
-  return mk_akk
+  #convert mpi to phys, all values are computed at once, lkk and Bms may
+  #carry extra axes to evaluate several parameter sets together
+  x2 = np.square(lat_to_phys(np.asarray(mpi, dtype=float)))
+  # Overall prefactor
+  pre_out = (2.*Bms - x2)/(16*math.pi*fk**2)
+  # inner prefactor
+  pre_in = (2.*Bms + x2)/(32*math.pi**2*fk**2)
+  # sum_i coeff[i]*log[i] of the 3 logarithms
+  prod = (2.*np.log((x2+2.*Bms)/ren**2)
+      - 1./(2.*Bms/x2-1.)*np.log(x2/ren**2)
+      + 20./9.*(Bms-x2)/(2.*Bms-x2)*np.log((x2+4.*Bms)/(3.*ren**2)))
+  # decorated counterterm
+  count = 14./9. + 32.*(4*math.pi)**2*lkk
+  brac_out = 1. + pre_in*(prod - count)
+  return pre_out*brac_out
 
 def nlo_kk():
   """ Afunction for calculating the NLO corrected Chiral Perturbation
@@ -86,7 +86,8 @@ def create_corr_matrix(nbsamples, filepath, filestring, filesuffix=".dat",
     Reads different correlation functions and inserts them into a matrix. The
     matrix is filled row majored, the correlation functions matrix is stored
     column majored. It is assumed that the matrix is symmetric, the off
-    diagonal elements are symmetrized.
+    diagonal elements are symmetrized while reading and only the upper
+    triangle is bootstrapped.
     WARNING: Up to now a maximum matrix size of 20x20 operators is implemented.
 
     Args:
@@ -118,43 +119,65 @@ def create_corr_matrix(nbsamples, filepath, filestring, filesuffix=".dat",
     if _nbops == 0:
         print("ERROR: size of the correlation matrix could not be determined")
         os.sys.exit(-4)
-    # Treat first element differently so we can create an array of the correct
-    # size. This allows also to check whether the other files have the same
-    # number of configurations and the same time extent.
-    _name = "".join((filepath, filestring[0], filesuffix))
+    # only the upper triangle is stored, the transposed elements are averaged
+    # while reading
+    _row, _col = np.triu_indices(_nbops)
+    data = None
+    for _nb, (_i, _j) in enumerate(zip(_row, _col)):
+        _data = _read_element(filepath, filestring[_i*_nbops+_j], filesuffix,
+                              column, verbose)
+        if _i != _j:
+            _data = (_data + _read_element(filepath,
+                filestring[_j*_nbops+_i], filesuffix, column, verbose)) / 2.
+        if data is None:
+            data = np.zeros(_data.shape + (len(_row),))
+        elif _data.shape != data.shape[:2]:
+            # check if size is the same as the first operator
+            print("ERROR while reading file " + filestring[_i*_nbops+_j])
+            print("\tnumber of configurations or time extent is wrong")
+            continue
+        data[:,:,_nb] = _data
+    # symmetrize in time and bootstrap all elements with the same samples
+    _boot = _sym_and_boot_matrix(data, nbsamples)
+    corr_mat = np.zeros(_boot.shape[0:2] + (_nbops,) * 2)
+    corr_mat[:,:,_row,_col] = _boot
+    corr_mat[:,:,_col,_row] = _boot
+    return corr_mat
+
+def _read_element(filepath, filestring, filesuffix, column, verbose):
+    _name = "".join((filepath, filestring, filesuffix))
     if verbose:
         print("filename " + _name)
-    _data1 = io.read_data_ascii(_name, column, verbose)
-    _nbcfg = _data1.shape[0]
-    _T = _data1.shape[1]
-    _boot1 = bootstrap.sym_and_boot(_data1, nbsamples)
-    # create correlation function matrix
-    corr_mat = np.zeros(_boot1.shape[0:2] + (_nbops,) * 2)
-    corr_mat[:,:,0,0] = _boot1
-    # read in all other correlation functions, bootstrap them and write them to
-    # the numpy array
-    for _nb, _sub in enumerate(filestring[1:], start=1):
-        # generate filename
-        _name = "".join((filepath, _sub, filesuffix))
-        if verbose:
-            print("filename " + _name)
-        # read in data
-        _data = io.read_data_ascii(_name, column)
-        _nbcfg1 = _data.shape[0]
-        _T1 = _data.shape[1]
-        # check if size is the same as the first operator
-        if _nbcfg != _nbcfg1 or _T != _T1:
-            print("ERROR while reading file " + _name)
-            print("\tnumber of configurations or time extent is wrong")
-        else:
-            _boot = bootstrap.sym_and_boot(_data, nbsamples)
-            corr_mat[:, :, int(_nb/_nbops), int(_nb%_nbops)] = _boot 
-
-    corr_mat_symm = np.zeros_like(corr_mat)
-    for _s in range(0, nbsamples):
-        for _t in range(0, int(_T/2)+1):
-            corr_mat_symm[_s, _t] = (corr_mat[_s, _t] + corr_mat[_s, _t].T) / 2.
-    return corr_mat_symm
+    return io.read_data_ascii(_name, column, verbose)
+
+def _sym_and_boot_matrix(source, nbsamples):
+    """Symmetrizes and bootstraps all elements with one set of samples.
+
+    The random numbers are drawn as in bootstrap.bootstrap, so the result
+    is the same as calling bootstrap.sym_and_boot for every element.
+
+    Args:
+        source: A numpy array, the first axis is the configuration number,
+            the second is time, the last are the elements.
+        nbsamples: Number of bootstrap samples created.
+
+    Returns:
+        The bootstrap samples, the time extent is reduced to T/2+1.
+    """
+    _nbcfg, _T = source.shape[0:2]
+    _symm = source[:,:int(_T/2)+1].copy()
+    _t = np.arange(1, int(_T/2))
+    _symm[:,_t] = (source[:,_t] + source[:,_T-_t]) / 2.
+    # multiplicity of every configuration in every sample
+    np.random.seed(1227)
+    counts = np.zeros((nbsamples, _nbcfg))
+    counts[0] = 1.
+    for _i in range(1, nbsamples):
+        _rnd = np.random.randint(0, _nbcfg, size=_nbcfg)
+        counts[_i] = np.bincount(_rnd, minlength=_nbcfg)
+    _flat = _symm.reshape((_nbcfg, -1))
+    boot = np.dot(counts, _flat) / float(_nbcfg)
+    return boot.reshape((nbsamples,) + _symm.shape[1:])
 
 def permutation_indices(data):
     """Sorts the data according to their value.
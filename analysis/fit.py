@@ -133,7 +133,24 @@ def fit(fitfunc, X, Y, start_parm, add_parm=None, num=None, correlated=True,
     else:
         return (num, res, chisquare, pvals)
 
-def fitting(fitfunc, X, Y, start_parm, E_single=None, correlated=True, verbose=True):
+def whitening(Y, correlated=True):
+    """The inverse, cholesky decomposed covariance matrix of Y.
+
+    Args:
+        Y: The bootstrap samples of the data.
+        correlated: Use the full covariance matrix or just the errors.
+
+    Returns:
+        The matrix that whitens the residuals of a fit to Y.
+    """
+    if not correlated:
+        cov = np.diag(np.diagonal(np.cov(Y.T)))
+    else:
+        cov = np.cov(Y.T)
+    return (np.linalg.cholesky(np.linalg.inv(cov))).T
+
+def fitting(fitfunc, X, Y, start_parm, E_single=None, correlated=True, verbose=True,
+            cov=None):
     """A function that fits a correlation function.
 
     This function fits the given function fitfunc to the data given in X and Y.
@@ -148,6 +165,8 @@ def fitting(fitfunc, X, Y, start_parm, E_single=None, correlated=True, verbose=T
         E_single: single particle energies entering the ratio R
         correlated: Flag to use a correlated or uncorrelated fit.
         verbose: Controls the amount of information written to the screen.
+        cov: The inverse, cholesky decomposed covariance matrix, computed from
+            Y if not given.
 
     Returns:
         The function returns the fitting parameters, the chi^2 and the p-value
@@ -158,11 +177,8 @@ def fitting(fitfunc, X, Y, start_parm, E_single=None, correlated=True, verbose=T
     else:
         errfunc = lambda p, x, y, e, error: np.dot(error, (y-fitfunc(p,x,e)).T)
     # compute inverse, cholesky decomposed covariance matrix
-    if not correlated:
-        cov = np.diag(np.diagonal(np.cov(Y.T)))
-    else:
-        cov = np.cov(Y.T)
-    cov = (np.linalg.cholesky(np.linalg.inv(cov))).T
+    if cov is None:
+        cov = whitening(Y, correlated)
     # degrees of freedom
     dof = float(Y.shape[1]-len(start_parm)) 
     # create results arrays
@@ -522,6 +538,10 @@ def genfit_comb(_data, fitint_data, fitint_par, fitfunc, start_params,
     for l in range(ncorr):
         # setup
         mdata, ddata = af.calc_error(data[:,:,l])
+        # index of the old fit intervals
+        if olddata:
+            _index = dict(((int(v[0]), int(v[1])), ind)
+                          for ind, v in enumerate(_ranges[l]))
         # loop over the fit intervals
         for i in range(nint_data[l]):
             lo, up = fitint_data[l][i]
@@ -529,18 +549,19 @@ def genfit_comb(_data, fitint_data, fitint_par, fitfunc, start_params,
             if verbose:
                 print("Interval [%d, %d]" % (lo, up))
                 print("correlator %d" % l)
+            # the data and its covariance matrix are the same for all
+            # fit intervals of the varying parameter
+            cov = whitening(data[:,lo:up+1,l])
             # loop over the varying parameter and its fit intervals
             for k in range(ncorr_par):
                 if olddata:
-                    for ind, v in enumerate(_ranges[l]):
-                        if v[0] == lo and v[1] == up:
-                            print("found match at index %d (k %d, l %d)" % (ind, k, l))
-                            res[k][l][:,:,i] = _par[k][l][:,:,ind]
-                            chi2[k][l][:,i] = _chi2[k][l][:,ind]
-                            pval[k][l][:,i] = _pvals[k][l][:,ind]
-                            dofit=False
-                            # if a matching range was found stop searching
-                            break
+                    ind = _index.get((int(lo), int(up)))
+                    if ind is not None:
+                        print("found match at index %d (k %d, l %d)" % (ind, k, l))
+                        res[k][l][:,:,i] = _par[k][l][:,:,ind]
+                        chi2[k][l][:,i] = _chi2[k][l][:,ind]
+                        pval[k][l][:,i] = _pvals[k][l][:,ind]
+                        dofit=False
                 for j in range(nint_par[k]):
                     if dofit:
                         # fit the energy and print information
@@ -549,7 +570,7 @@ def genfit_comb(_data, fitint_data, fitint_par, fitfunc, start_params,
                         res[k][l][:,:,i,j], chi2[k][l][:,i,j], pval[k][l][:,i,j] = \
                             fitting(fitfunc, tlist[lo:up+1], data[:,lo:up+1,l],
                                     start_params, E_single = par[k][:,par_index,j], 
-                                    verbose=False)
+                                    verbose=False, cov=cov)
                     if verbose:
                         print("p-value %.7lf\nChi^2/dof %.7lf\nresults:"
                               % (pval[k][l][0,i,j], chi2[k][l][0,i,j]/(
@@ -619,6 +640,10 @@ def genfit(_data, fit_intervals, fitfunc, start_params, olddata=None, verbose=Tr
     for _l in range(ncorr):
         # setup
         mdata, ddata = af.calc_error(data[:,:,_l])
+        # index of the old fit intervals
+        if olddata:
+            _index = dict(((int(v[0]), int(v[1])), ind)
+                          for ind, v in enumerate(_ranges[_l]))
         for _i in range(ninter[_l]):
             lo, up = fit_intervals[_l][_i]
             dofit=True
@@ -628,17 +653,13 @@ def genfit(_data, fit_intervals, fitfunc, start_params, olddata=None, verbose=Tr
 
             # check if already in old data
             if olddata:
-                #print(_ranges[_l])
-                #print(fit_intervals[_l][_i])
-                for ind, v in enumerate(_ranges[_l]):
-                    if v[0] == lo and v[1] == up:
-                        print("found match at index %d" % ind)
-                        res[_l][:,:,_i] = _par[_l][:,:,ind]
-                        chi2[_l][:,_i] = _chi2[_l][:,ind]
-                        pval[_l][:,_i] = _pvals[_l][:,ind]
-                        dofit=False
-                        # stop if match was found
-                        break
+                ind = _index.get((int(lo), int(up)))
+                if ind is not None:
+                    print("found match at index %d" % ind)
+                    res[_l][:,:,_i] = _par[_l][:,:,ind]
+                    chi2[_l][:,_i] = _chi2[_l][:,ind]
+                    pval[_l][:,_i] = _pvals[_l][:,ind]
+                    dofit=False
             if dofit:
                 # fit the energy and print information
                 if verbose:
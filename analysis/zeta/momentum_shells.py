@@ -0,0 +1,230 @@
+"""
+Momentum shells for the sums in the zeta function.
+
+A shell contains all integer three-vectors n with n.n = p. The shells are
+enumerated on the symmetry reduced set 0 <= x <= y <= z, every
+representative stands for all vectors generated by permutations and sign
+flips, given by its multiplicity. The full shells are stored in one
+integer array with offsets and cached in a per-user directory, keyed by
+the number of shells. The default location is
+$XDG_CACHE_HOME/analysis-code or ~/.cache/analysis-code, it can be
+changed with the environment variable ZETA_MOMENTA_DIR. The table is
+only generated or loaded when first needed and extended when a sum needs
+more shells.
+"""
+
+import os
+import tempfile
+import itertools
+import numpy as np
+
+# number of shells created by default, p = 0, ..., CUTOFF-1
+CUTOFF = 302
+
+def cache_dir():
+    """The directory for the cached momentum tables."""
+    path = os.environ.get("ZETA_MOMENTA_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME",
+        os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "analysis-code")
+
+def _cache_file(cutoff):
+    return os.path.join(cache_dir(), "momenta_%d.npz" % cutoff)
+
+def reduced_shells(cutoff):
+    """The representatives of the shells with p < cutoff.
+
+    Parameters
+    ----------
+    cutoff : int
+        The number of shells.
+
+    Returns
+    -------
+    reps : ndarray
+        The representatives 0 <= x <= y <= z, shape (k, 3), sorted by
+        their norm.
+    norms : ndarray
+        The squared norm of the representatives.
+    mult : ndarray
+        The number of vectors each representative stands for.
+    """
+    nmax = int(np.sqrt(cutoff)) + 1
+    z = np.arange(nmax)
+    x, y, z = np.meshgrid(z, z, z, indexing="ij")
+    sel = (x <= y) & (y <= z)
+    reps = np.column_stack((x[sel], y[sel], z[sel]))
+    norms = np.sum(reps**2, axis=1)
+    sel = norms < cutoff
+    reps, norms = reps[sel], norms[sel]
+    order = np.argsort(norms, kind="mergesort")
+    reps, norms = reps[order], norms[order]
+    # 48 elements of the cubic group, reduced by zero components and
+    # equal components
+    nonzero = np.count_nonzero(reps, axis=1)
+    equal = (reps[:,0] == reps[:,1]).astype(int) + \
+        (reps[:,1] == reps[:,2]).astype(int)
+    perms = np.where(equal == 2, 1, np.where(equal == 1, 3, 6))
+    mult = perms * 2**nonzero
+    return reps, norms, mult
+
+def expand(reps):
+    """All vectors generated from the representatives.
+
+    Parameters
+    ----------
+    reps : ndarray
+        The representatives, shape (k, 3).
+
+    Returns
+    -------
+    ndarray
+        The distinct vectors, sorted by norm and lexicographically within
+        a shell.
+    """
+    reps = np.asarray(reps, dtype=np.int64)
+    if reps.shape[0] == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    perms = np.asarray(list(itertools.permutations(range(3))))
+    signs = np.asarray(list(itertools.product((-1, 1), repeat=3)))
+    vecs = reps[:,perms]
+    vecs = (vecs[:,:,None,:] * signs[None,None,:,:]).reshape(-1, 3)
+    vecs = np.unique(vecs, axis=0)
+    norms = np.sum(vecs**2, axis=1)
+    return vecs[np.argsort(norms, kind="mergesort")]
+
+def generate(cutoff):
+    """The momentum table for p < cutoff.
+
+    Parameters
+    ----------
+    cutoff : int
+        The number of shells.
+
+    Returns
+    -------
+    vectors : ndarray
+        All vectors with n.n < cutoff, sorted by shell.
+    offsets : ndarray
+        Shell p consists of vectors[offsets[p]:offsets[p+1]].
+    """
+    reps, norms, mult = reduced_shells(cutoff)
+    vectors = expand(reps)
+    counts = np.bincount(norms, weights=mult, minlength=cutoff)
+    offsets = np.zeros((cutoff+1,), dtype=np.int64)
+    offsets[1:] = np.cumsum(counts.astype(np.int64))
+    return vectors.astype(np.int16), offsets
+
+def _load(cutoff):
+    """Load the smallest cached table with at least cutoff shells."""
+    try:
+        names = os.listdir(cache_dir())
+    except OSError:
+        return None
+    avail = []
+    for name in names:
+        if name.startswith("momenta_") and name.endswith(".npz"):
+            try:
+                avail.append(int(name[8:-4]))
+            except ValueError:
+                pass
+    for c in sorted(avail):
+        if c < cutoff:
+            continue
+        try:
+            with np.load(_cache_file(c)) as f:
+                vectors, offsets = f["vectors"], f["offsets"]
+        except (IOError, KeyError, ValueError):
+            continue
+        return vectors[:offsets[cutoff]], offsets[:cutoff+1]
+    return None
+
+def _save(cutoff, vectors, offsets):
+    """Write the table to the cache, ignoring unwritable locations."""
+    path = cache_dir()
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=path)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, vectors=vectors, offsets=offsets)
+        # the rename is atomic, concurrent processes see a complete file
+        os.rename(tmp, _cache_file(cutoff))
+    except (IOError, OSError):
+        pass
+
+class MomentumShells(object):
+    """The momentum shells, extended on demand.
+
+    For compatibility with the old object arrays, shells[p, 0] is the
+    shell p and shells[p, 1] is p.
+    """
+    def __init__(self, cutoff=CUTOFF, cache=True):
+        """Load or create the momentum table.
+
+        Parameters
+        ----------
+        cutoff : int, optional
+            The number of shells to load initially.
+        cache : bool, optional
+            Use the cache directory.
+        """
+        self.cache = cache
+        self.cutoff = 0
+        self._shells = []
+        self.extend(cutoff)
+
+    def extend(self, cutoff):
+        """Make at least cutoff shells available.
+
+        Parameters
+        ----------
+        cutoff : int
+            The number of shells.
+        """
+        if cutoff <= self.cutoff:
+            return
+        table = _load(cutoff) if self.cache else None
+        if table is None:
+            table = generate(cutoff)
+            if self.cache:
+                _save(cutoff, *table)
+        self.vectors, self.offsets = table
+        self.cutoff = cutoff
+        self._shells = [None] * cutoff
+
+    def shell(self, p):
+        """The vectors n with n.n = p as floats, shape (k, 3)."""
+        if p >= self.cutoff:
+            self.extend(max(2*self.cutoff, p+1))
+        res = self._shells[p]
+        if res is None:
+            res = self.vectors[self.offsets[p]:self.offsets[p+1]].astype(float)
+            self._shells[p] = res
+        return res
+
+    def multiplicity(self, p):
+        """The number of vectors in shell p."""
+        if p >= self.cutoff:
+            self.extend(max(2*self.cutoff, p+1))
+        return int(self.offsets[p+1] - self.offsets[p])
+
+    def __len__(self):
+        return self.cutoff
+
+    def __getitem__(self, index):
+        p, i = index
+        if i == 0:
+            return self.shell(p)
+        return p
+
+_shells = None
+
+def get_shells():
+    """The momentum shells of this process, loaded on first use."""
+    global _shells
+    if _shells is None:
+        _shells = MomentumShells()
+    return _shells
@@ -40,7 +40,6 @@
 
 __all__ = ["Z"]
 
-import os
 import math
 import cmath
 import numpy as np
@@ -48,27 +47,16 @@ import scipy.special
 import scipy.integrate
 
 from _zeta_memoize import memoize
+from momentum_shells import get_shells
 
 def zeta_n(function):
-    path = "./momenta.npy"
-    if not os.path.isfile(path):
-        import create_momentum_array as cma
-        cma.main()
-    try:
-        _mem = np.load(path)
-        #print("reading n in wrapper")
-    except (IOError, UnicodeDecodeError):
-        import create_momentum_array as cma
-        cma.main()
-        _mem = np.load(path)
-        #print("error and reading n in wrapper")
-
+    # the momentum shells are loaded from the cache or created on the first
+    # call, see momentum_shells
     def zeta_wrapper(*args, **kwargs):
         if 'n' in kwargs:
             kwargs.pop('n')
-        return function(*args, n=_mem, **kwargs)
+        return function(*args, n=get_shells(), **kwargs)
 
-    zeta_wrapper._zeta_n_mem = _mem
     zeta_wrapper._zeta_n_origfunc = function
     zeta_wrapper._zeta_n_func_name = function.func_name
     return zeta_wrapper
@@ -108,10 +96,8 @@ def Z(q2, gamma = 1.0, l = 0, m = 0, d = np.array([0., 0., 0.]), \
   if gamma < 1.0:
     print( 'Gamma must be larger or equal to 1.0')
     exit(0)
-  if n==None:
-      # reading the three momenta for summation from file
-      print("loading n zeta")
-      _n = np.load("./momenta.npy")
+  if n is None:
+      _n = get_shells()
   else:
       _n = n
   # the computation
@@ -195,7 +181,7 @@ def sph_harm(m = 0, l = 0, phi = 0, theta = 0):
 # returns the part of the momentum array for a given momentum squared
 ################################################################################
 def return_momentum_array(p, n):
-  if len(n[p,0]) is 0:
+  if len(n[p,0]) == 0:
     p += 1
   out = n[p, 0]
   p += 1
@@ -26,11 +26,33 @@
 #
 ################################################################################
 
-__all__ = ["Z"]
+__all__ = ["Z", "Z_exact", "set_tables"]
 
 from .zeta import Z as _Z
 import numpy as np
 
+# interpolation tables used instead of the exact calculation
+_tables = []
+
+def set_tables(tables):
+    """Set interpolation tables used by Z.
+
+    Z is read from the first table whose matches(l, m, d, m_split,
+    precision) is true, e.g. analysis2.zeta_table.ZetaTable built with
+    exact=Z_exact. This speeds up the determinant equations, which
+    evaluate Z at many nearby points.
+
+    Args:
+        tables: A sequence of tables or None to switch the tables off.
+
+    Returns:
+        The tables used before.
+    """
+    global _tables
+    old = _tables
+    _tables = [] if tables is None else list(tables)
+    return old
+
 ################################################################################
 #
 #                            Luescher's Zeta Function
@@ -58,10 +80,18 @@ import numpy as np
 ################################################################################
 def Z(q2, gamma = None, l = 0, m = 0, d = np.array([0., 0., 0.]), \
       m_split = 1, precision = 10e-6, verbose = 0):
+    for table in _tables:
+        if table.matches(l, m, d, m_split, precision):
+            return table(q2, gamma)
+    return Z_exact(q2, gamma, l, m, d, m_split, precision, verbose)
+
+def Z_exact(q2, gamma = None, l = 0, m = 0, d = np.array([0., 0., 0.]), \
+      m_split = 1, precision = 10e-6, verbose = 0):
+    """Z without interpolation tables."""
     # check if more than one value for q2 was given by checking the type of q2
     if isinstance(q2, (tuple, list, np.ndarray)):
         _q2 = np.asarray(q2)
-        if gamma == None:
+        if gamma is None:
             _gamma = np.ones(_q2.shape)
         else:
             _gamma = np.asarray(gamma)
@@ -73,7 +103,7 @@ def Z(q2, gamma = None, l = 0, m = 0, d = np.array([0., 0., 0.]), \
             res.flat[_i] = _Z(_q2.flat[_i], _gamma.flat[_i], l, m, d, m_split,
                               precision, verbose)
     else:
-        if gamma == None:
+        if gamma is None:
             gamma = 1.
         res = _Z(q2, gamma, l, m, d, m_split, precision, verbose)
     return res
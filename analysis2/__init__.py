@@ -1,13 +1,58 @@
 """
 analysis package for scattering problems on the lattice
+
+The public names are imported lazily on first access, so scripts only
+pay for the modules they use. Plotting (matplotlib) and the zeta function
+are only loaded when they are needed.
 """
+import sys
+import types
+import importlib
+
 # .in_out imports only preliminary, think about more encapsulated solution
-from .in_out import inputnames, read_confs, write_data_ascii, confs_subtr, conf_abs, confs_mult
-from .correlator import Correlators
-from .ensemble import LatticeEnsemble
-from .fit import LatticeFit, FitResult
-from .plot import LatticePlot
-from .functions import func_const, func_ratio, func_single_corr
-from .statistics import draw_weighted, compute_error, sys_error, draw_gauss_distributed 
-from .interpol import interp_fk
-from .utils import mean_std
+_exports = {
+    "in_out": ["inputnames", "read_confs", "write_data_ascii", "confs_subtr",
+        "conf_abs", "confs_mult"],
+    "correlator": ["Correlators"],
+    "ensemble": ["LatticeEnsemble"],
+    "catalog": ["EnsembleCatalog", "open_catalogs"],
+    "fit": ["LatticeFit", "FitResult"],
+    "plot": ["LatticePlot"],
+    "functions": ["func_const", "func_ratio", "func_single_corr"],
+    "statistics": ["draw_weighted", "compute_error", "sys_error",
+        "draw_gauss_distributed"],
+    "interpol": ["interp_fk"],
+    "utils": ["mean_std"],
+}
+
+_origin = dict((name, mod) for mod, names in _exports.items() for name in names)
+
+class _LazyPackage(types.ModuleType):
+    """Package module importing its public names on first access."""
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in _origin:
+            value = getattr(importlib.import_module("." + _origin[name],
+                __name__), name)
+        else:
+            # submodules not imported yet
+            try:
+                value = importlib.import_module("." + name, __name__)
+            except ImportError:
+                raise AttributeError("module '%s' has no attribute '%s'" %
+                    (__name__, name))
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_origin))
+
+__all__ = sorted(_origin)
+
+# replace this module by the lazy one, the old module is kept alive since
+# python 2 clears the globals of deleted modules
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
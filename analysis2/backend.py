@@ -0,0 +1,134 @@
+"""
+Exchangeable implementations of the innermost loops.
+
+The hot kernels are the summands of the zeta function, see zeta.kernels,
+and the residuals of the predefined fit functions in the fits. The numpy
+backend is always available. The numba backend compiles loop versions of
+the same kernels if numba is installed; the first call of every kernel
+includes the compilation. The results agree up to rounding, the public
+functions are the same for all backends.
+"""
+
+import math
+import numpy as np
+
+from functions import func_single_corr, func_ratio
+
+BACKENDS = ("numpy", "numba")
+
+_backend = "numpy"
+_residuals = {}
+
+def _numpy_residuals():
+    return {
+        func_single_corr: lambda p, t, T2, y: y - func_single_corr(p, t, T2),
+        func_ratio: lambda p, t, o, y: y - func_ratio(p, t, o),
+    }
+
+def make_residual_loops(jit):
+    """The loop kernels of the residuals, compiled with jit.
+
+    Parameters
+    ----------
+    jit : callable
+        The compiler, e.g. numba.njit. With the identity the kernels run
+        as plain python.
+
+    Returns
+    -------
+    dict
+        The kernels for func_single_corr and func_ratio, called with the
+        parameters, the time, the constants and the data.
+    """
+    @jit
+    def single_corr(p0, p1, t, T2, y):
+        out = np.empty(t.shape[0])
+        a = 0.5 * p0 * p0
+        for i in range(t.shape[0]):
+            out[i] = y[i] - a * (math.exp(-p1*t[i]) + math.exp(-p1*(T2-t[i])))
+        return out
+
+    @jit
+    def ratio(p0, p1, t, o0, o1, y):
+        out = np.empty(t.shape[0])
+        for i in range(t.shape[0]):
+            x = t[i] - o1 / 2.
+            out[i] = y[i] - p0 * (math.cosh(p1*x) + math.sinh(p1*x) /
+                math.tanh(2.*o0*x))
+        return out
+
+    def residual_single_corr(p, t, T2, y):
+        if np.ndim(T2) != 0:
+            return y - func_single_corr(p, t, T2)
+        return single_corr(float(p[0]), float(p[1]), np.asarray(t,
+            dtype=float), float(T2), np.asarray(y, dtype=float))
+
+    def residual_ratio(p, t, o, y):
+        return ratio(float(p[0]), float(p[1]), np.asarray(t, dtype=float),
+            float(o[0]), float(o[1]), np.asarray(y, dtype=float))
+
+    return {func_single_corr: residual_single_corr, func_ratio: residual_ratio}
+
+def available():
+    """The backends that can be used.
+
+    Returns
+    -------
+    list of str
+        The names of the backends.
+    """
+    res = ["numpy"]
+    try:
+        import numba
+    except ImportError:
+        return res
+    return res + ["numba"]
+
+def get_backend():
+    """The name of the backend in use."""
+    return _backend
+
+def set_backend(name):
+    """Choose the backend of the kernels.
+
+    Parameters
+    ----------
+    name : str
+        The backend, see BACKENDS.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    ImportError
+        If the backend needs a package that is not installed.
+    """
+    global _backend, _residuals
+    if name not in BACKENDS:
+        raise ValueError("unknown backend %s" % name)
+    from zeta import kernels
+    kernels.set_backend(name)
+    if name == "numba":
+        import numba
+        _residuals = make_residual_loops(numba.njit)
+    else:
+        _residuals = _numpy_residuals()
+    _backend = name
+
+def residual(fitfunc):
+    """The residual kernel of a fit function.
+
+    Parameters
+    ----------
+    fitfunc : callable
+        The fit function.
+
+    Returns
+    -------
+    callable or None
+        The kernel, called as kernel(p, x, add, y), for the predefined
+        functions with additional parameters, otherwise None.
+    """
+    return _residuals.get(fitfunc)
+
+_residuals = _numpy_residuals()
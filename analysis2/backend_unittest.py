@@ -0,0 +1,95 @@
+"""
+Unit tests for the kernel backends.
+"""
+
+import unittest
+import numpy as np
+import scipy.integrate
+
+import backend
+from functions import func_single_corr, func_ratio
+from zeta import kernels
+from zeta import zeta as zeta_module
+from zeta.momentum_shells import get_shells
+from zeta_wrapper import Z
+
+identity = lambda f: f
+
+class Backend_Test(unittest.TestCase):
+    def tearDown(self):
+        backend.set_backend("numpy")
+
+    def test_set_backend(self):
+        self.assertIn("numpy", backend.available())
+        self.assertRaises(ValueError, backend.set_backend, "fortran")
+        if "numba" not in backend.available():
+            self.assertRaises(ImportError, backend.set_backend, "numba")
+            self.assertEqual(backend.get_backend(), "numpy")
+
+    def test_numba(self):
+        if "numba" not in backend.available():
+            self.skipTest("numba not installed")
+        q2 = np.linspace(0.1, 0.9, 5)
+        ref = Z(q2, 1.1, l=2, d=np.array([0., 0., 1.]))
+        backend.set_backend("numba")
+        self.assertEqual(backend.get_backend(), "numba")
+        res = Z(q2, 1.1, l=2, d=np.array([0., 0., 1.]))
+        self.assertTrue(np.allclose(res, ref, rtol=1e-12, atol=1e-14))
+
+    def test_residuals(self):
+        loops = backend.make_residual_loops(identity)
+        t = np.arange(5., 12.)
+        y = np.linspace(1., 2., 7)
+        p = np.array([0.8, 0.3])
+        ref = y - func_single_corr(p, t, 24.)
+        self.assertTrue(np.allclose(loops[func_single_corr](p, t, 24., y), ref))
+        self.assertTrue(np.array_equal(backend.residual(func_single_corr)(p, t,
+            24., y), ref))
+        o = np.array([0.14, 48.])
+        ref = y - func_ratio(p, t, o)
+        self.assertTrue(np.allclose(loops[func_ratio](p, t, o, y), ref))
+        self.assertIsNone(backend.residual(lambda p, t: p[0]))
+
+class ZetaKernels_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loops = kernels.LoopKernels(identity)
+        shells = get_shells()
+        cls.shell = np.asarray(shells[5,0], dtype=float)
+
+    def shells(self, d, gamma):
+        a = zeta_module.compute_r_in_spherical_coordinates(self.shell, d,
+            gamma, 1.)
+        w = zeta_module.compute_gamma_w_in_spherical_coordinates(self.shell,
+            d, gamma)
+        return a, w
+
+    def test_sph_harm(self):
+        a, _ = self.shells(np.array([0., 0., 1.]), 1.1)
+        for l, m in [(0, 0), (1, 1), (2, -2), (2, 0), (4, 2), (4, -4)]:
+            self.assertTrue(np.allclose(self.loops.sph_harm(m, l, a[:,2],
+                a[:,1]), kernels.sph_harm_numpy(m, l, a[:,2], a[:,1])))
+
+    def test_summands(self):
+        for d in (np.zeros(3), np.array([0., 0., 1.]), np.array([1., 1., 0.])):
+            a, w = self.shells(d, 1.1)
+            for l, m in [(0, 0), (2, 0), (2, 2), (4, -2), (2, 1)]:
+                self.assertAlmostEqual(self.loops.summands_A(a, 0.3, l, m),
+                    kernels.summands_A_numpy(a, 0.3, l, m), delta=1e-12)
+                ref = kernels.summands_C_numpy(w, self.shell, 0.3, 1.1, l, m,
+                    d, 1., 1e-5)
+                res = self.loops.summands_C(w, self.shell, 0.3, 1.1, l, m, d,
+                    1., 1e-5)
+                self.assertAlmostEqual(res, ref, delta=1e-12)
+
+    def test_integrals(self):
+        w2 = np.array([1., 5., 5., 20.])
+        integrand = lambda t, q, l, w: (np.pi/t)**(1.5+l) * np.exp(q*t-w/t)
+        res = kernels.integrals_C(0.3, 2, w2, 1e-6)
+        for x, r in zip(w2, res):
+            ref = scipy.integrate.quadrature(integrand, 0., 1., args=(0.3, 2,
+                x), tol=1e-6, maxiter=1000)[0]
+            self.assertEqual(r, ref)
+
+if __name__ == "__main__":
+    unittest.main()
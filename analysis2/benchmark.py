@@ -0,0 +1,370 @@
+"""
+Benchmarks of the analysis steps on synthetic data.
+
+Every benchmark is run in a fresh python process, so the reported peak
+memory is the one of that benchmark alone. The results can be stored as
+a baseline and later runs compared against it.
+
+Usage: python benchmark.py [--quick] [--save FILE] [--compare FILE]
+           [--tolerance TOL] [benchmark ...]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import numpy as np
+
+import synthetic
+
+# problem sizes of the benchmarks
+SIZES = {
+    "quick": {"nconf": 100, "T": 48, "L": 24, "nsamples": 100},
+    "default": {"nconf": 500, "T": 64, "L": 32, "nsamples": 500},
+}
+
+def _prepare_single(p):
+    """Bootstrapped single particle correlator and its fit."""
+    from fit import LatticeFit
+    corr = synthetic.to_correlators(synthetic.single_correlator(p["nconf"],
+        p["T"], [0.14, 0.6], [1., 0.5], noise=0.005, growth=0.02))
+    corr.sym_and_boot(p["nsamples"])
+    add = np.ones((p["nsamples"],)) * p["T"]
+    fitter = LatticeFit(0, dt_i=2, dt_f=2, dt=6)
+    return corr, fitter, add
+
+def _prepare_ratio(p):
+    """Ratio of the two and single particle correlators and the fits
+    needed for a combined fit."""
+    from fit import LatticeFit
+    corr, fitter, add = _prepare_single(p)
+    twocorr = synthetic.to_correlators(synthetic.two_particle_correlator(
+        p["nconf"], p["T"], [0.29, 0.9], 0.14, noise=0.005, growth=0.03))
+    twocorr.sym_and_boot(p["nsamples"])
+    ratio = twocorr.ratio(corr, ratio=2)
+    T2 = p["T"] // 2
+    mfit = fitter.fit(None, corr, [T2-14, T2], corrid="m", add=add)
+    ratiofitter = LatticeFit(1, dt_i=2, dt_f=2, dt=6, xshift=0.5)
+    return ratio, ratiofitter, mfit.singularize(), mfit, add
+
+def bench_bootstrap(p):
+    from bootstrap import sym_and_boot
+    data = synthetic.single_correlator(p["nconf"], p["T"], 0.14)
+    return lambda: sym_and_boot(data, p["nsamples"])
+
+def bench_gevp(p):
+    from bootstrap import sym_and_boot
+    from gevp import calculate_gevp
+    data = synthetic.correlator_matrix(p["nconf"], p["T"], [0.3, 0.5, 0.8])
+    data = sym_and_boot(data, p["nsamples"])
+    return lambda: calculate_gevp(data, 1)
+
+def bench_fit_single(p):
+    corr, fitter, add = _prepare_single(p)
+    T2 = p["T"] // 2
+    return lambda: fitter.fit(None, corr, [T2-14, T2], corrid="m", add=add)
+
+def bench_fit_comb(p):
+    ratio, fitter, oldfit, _, add = _prepare_ratio(p)
+    T2 = p["T"] // 2
+    return lambda: fitter.fit([1., 0.005], ratio, [T2-14, T2], corrid="R",
+        add=add, oldfit=oldfit, oldfitpar=1)
+
+def bench_fit_comb_batched(p):
+    ratio, fitter, oldfit, _, add = _prepare_ratio(p)
+    T2 = p["T"] // 2
+    return lambda: fitter.fit([1., 0.005], ratio, [T2-14, T2], corrid="R",
+        add=add, oldfit=oldfit, oldfitpar=1, batched=True)
+
+def bench_sys_error(p):
+    from statistics import sys_error
+    rng = np.random.RandomState(1227)
+    nranges = 200
+    data = [0.14 + 0.001 * rng.standard_normal((p["nsamples"], 2, nranges))]
+    pvals = [np.tile(rng.uniform(size=nranges), (p["nsamples"], 1))]
+    return lambda: sys_error(data, pvals, par=1)
+
+def bench_res_reduced(p):
+    from fit import FitResult
+    rng = np.random.RandomState(1227)
+    nranges = 2000
+    res = FitResult("obs", derived=True)
+    res.create_empty((p["nsamples"], 2, nranges), (p["nsamples"], 2, nranges),
+        1)
+    res.data[0][...] = rng.standard_normal(res.data[0].shape)
+    res.pval[0][...] = rng.uniform(size=nranges)
+    return lambda: res.res_reduced(samples=nranges, m_a0=True)
+
+def bench_fit_table(p):
+    from fit import FitResult
+    rng = np.random.RandomState(1227)
+    res = FitResult("obs")
+    res.create_empty((p["nsamples"], 2, 40, 60), (p["nsamples"], 40, 60),
+        [1, 1])
+    res.set_ranges([np.array([[t, t+10] for t in range(60)])], [[60]])
+    res.data[0][...] = 1. + 0.01*rng.standard_normal(res.data[0].shape)
+    res.pval[0][...] = rng.uniform(size=(40, 60))
+    return lambda: res.table(new=True).where(lo=(10, 30), pval=(0.1, None))
+
+def bench_zeta(p):
+    from zeta_wrapper import Z
+    rng = np.random.RandomState(1227)
+    q2 = rng.uniform(0.05, 0.3, size=p["nsamples"])
+    gamma = rng.uniform(1.0, 1.2, size=p["nsamples"])
+    d = np.array([0., 0., 1.])
+    return lambda: Z(q2, gamma, d=d)
+
+def bench_zeta_table(p):
+    from zeta_table import ZetaTable
+    rng = np.random.RandomState(1227)
+    q2 = rng.uniform(0.05, 0.3, size=p["nsamples"])
+    gamma = rng.uniform(1.0, 1.2, size=p["nsamples"])
+    table = ZetaTable((0.05, 0.3), (1.0, 1.2), d=np.array([0., 0., 1.]))
+    return lambda: table(q2, gamma)
+
+def bench_scattering_length(p):
+    ratio, fitter, oldfit, mfit, add = _prepare_ratio(p)
+    T2 = p["T"] // 2
+    # the scattering length needs the ratio fitted for every mass fit
+    rfit = fitter.fit([1., 0.005], ratio, [T2-10, T2], corrid="R", add=add,
+        oldfit=mfit, oldfitpar=1)
+    return lambda: rfit.calc_scattering_length(mfit, 1, 1, L=p["L"],
+        isratio=True)
+
+def bench_eff_mass(p):
+    import kernels
+    from bootstrap import sym_and_boot
+    data = synthetic.correlator_matrix(p["nconf"], p["T"], [0.3, 0.5, 0.8])
+    data = sym_and_boot(data.reshape(data.shape[:2] + (-1,)), p["nsamples"])
+    out = np.empty((data.shape[0], data.shape[1]-1, data.shape[2]))
+    return lambda: kernels.eff_mass_implicit(data, p["T"], out=out)
+
+def bench_ratio(p):
+    import ratio
+    rng = np.random.RandomState(1227)
+    shape = (p["nsamples"], p["T"]//2+1, 4)
+    d1 = 1. + 0.01*rng.standard_normal((shape[0], shape[1]-1, 4))
+    d2 = 1. + 0.01*rng.standard_normal(shape)
+    dE = 0.01 + 0.001*rng.standard_normal(p["nsamples"])
+    out = np.empty_like(d1)
+    return lambda: ratio.ratio_shift(d1, d2, d2, 1, dE, True, 1, p["L"],
+        out=out)
+
+def bench_kinematics(p):
+    from fit import FitResult
+    rng = np.random.RandomState(1227)
+    mass = FitResult("mass")
+    mass.create_empty((p["nsamples"], 2, 20), (p["nsamples"], 20), 1)
+    mass.data[0][...] = 0.14 + 0.001*rng.standard_normal(mass.data[0].shape)
+    mass.pval[0][...] = rng.uniform(size=20)
+    mass.calc_error()
+    energy = FitResult("energy")
+    energy.create_empty((p["nsamples"], 2, 20, 40), (p["nsamples"], 20, 40),
+        [1, 1])
+    energy.data[0][...] = 0.4 + 0.01*rng.standard_normal(energy.data[0].shape)
+    energy.pval[0][...] = rng.uniform(size=(20, 40))
+    d = np.array([0., 0., 1.])
+    return lambda: energy.to_CM(1, p["L"], d).calc_momentum(mass, 1, p["L"],
+        isdependend=True)
+
+def bench_chiral_fit(p):
+    from fit import LatticeFit
+    rng = np.random.RandomState(1227)
+    X = np.linspace(0.1, 0.5, 8)[:,None] + 0.01*rng.randn(8, p["nsamples"])
+    Y = 1. + 3.*X + 0.01*rng.randn(8, p["nsamples"])
+    fitter = LatticeFit(lambda p, x: p[0] + p[1]*x)
+    return lambda: fitter.chiral_fit(X, Y, start=[1., 1.], paired=True)
+
+def _startup(statement):
+    """Time a fresh interpreter importing the packages."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cmd = [sys.executable, "-c", statement]
+    return lambda: subprocess.check_call(cmd, cwd=root)
+
+def bench_startup(p):
+    # a script only reading data
+    return _startup("import analysis2; analysis2.read_confs")
+
+def bench_startup_fit(p):
+    # a script fitting and plotting
+    return _startup("import analysis2; analysis2.LatticeFit; "
+        "analysis2.LatticePlot")
+
+BENCHMARKS = {
+    "bootstrap": bench_bootstrap,
+    "gevp": bench_gevp,
+    "eff_mass": bench_eff_mass,
+    "ratio": bench_ratio,
+    "fit_single": bench_fit_single,
+    "fit_comb": bench_fit_comb,
+    "fit_comb_batched": bench_fit_comb_batched,
+    "sys_error": bench_sys_error,
+    "res_reduced": bench_res_reduced,
+    "fit_table": bench_fit_table,
+    "kinematics": bench_kinematics,
+    "chiral_fit": bench_chiral_fit,
+    "zeta": bench_zeta,
+    "zeta_table": bench_zeta_table,
+    "scattering_length": bench_scattering_length,
+    "startup": bench_startup,
+    "startup_fit": bench_startup_fit,
+}
+
+def _peak_memory():
+    """The peak resident memory of this process in MB."""
+    # ru_maxrss is given in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+def run_single(name, params, repeat=3):
+    """Run one benchmark in this process.
+
+    Parameters
+    ----------
+    name : str
+        The name of the benchmark.
+    params : dict
+        The problem size.
+    repeat : int, optional
+        How often the benchmark is run, the fastest run is reported.
+
+    Returns
+    -------
+    dict
+        The time in seconds, the peak memory of the process and the
+        memory added by the benchmark itself in MB.
+    """
+    func = BENCHMARKS[name](params)
+    mem_setup = _peak_memory()
+    times = []
+    devnull = open(os.devnull, "w")
+    for i in range(repeat):
+        # the analysis code is chatty, do not time the printing
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            start = time.time()
+            func()
+            times.append(time.time() - start)
+        finally:
+            sys.stdout = stdout
+    devnull.close()
+    mem = _peak_memory()
+    return {"time": min(times), "memory": mem, "memory_run": mem - mem_setup}
+
+def run(names, params, repeat=3, verbose=True):
+    """Run benchmarks, each in a separate process.
+
+    Parameters
+    ----------
+    names : sequence of str
+        The benchmarks to run.
+    params : dict
+        The problem size.
+    repeat : int, optional
+        How often each benchmark is run.
+    verbose : bool, optional
+        Print the results while running.
+
+    Returns
+    -------
+    dict
+        The results of run_single for every benchmark.
+    """
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            raise KeyError("unknown benchmark %s" % name)
+        cmd = [sys.executable, os.path.abspath(__file__), "--single", name,
+            "--params", json.dumps(params), "--repeat", str(repeat)]
+        out = subprocess.check_output(cmd,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        results[name] = json.loads(out.strip().split("\n")[-1])
+        if verbose:
+            print("%-20s %10.4f s %10.1f MB" % (name, results[name]["time"],
+                results[name]["memory"]))
+    return results
+
+def compare(results, baseline, tolerance=0.2):
+    """Compare results to a baseline.
+
+    Parameters
+    ----------
+    results, baseline : dict
+        The results of run.
+    tolerance : float, optional
+        The allowed relative increase of time and memory.
+
+    Returns
+    -------
+    list of str
+        Description of every regression found.
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        for key in ("time", "memory"):
+            old = baseline[name][key]
+            new = results[name][key]
+            if old > 0. and (new - old) / old > tolerance:
+                regressions.append("%s: %s %.4g -> %.4g (+%.0f%%)" % (name,
+                    key, old, new, 100. * (new - old) / old))
+    return regressions
+
+def print_comparison(results, baseline):
+    print("%-20s %21s %21s" % ("benchmark", "time [s]", "memory [MB]"))
+    for name in sorted(results):
+        new = results[name]
+        old = baseline.get(name)
+        if old is None:
+            print("%-20s %10.4f %10s %10.1f %10s" % (name, new["time"], "-",
+                new["memory"], "-"))
+        else:
+            print("%-20s %10.4f %10.4f %10.1f %10.1f" % (name, new["time"],
+                old["time"], new["memory"], old["memory"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the analysis")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, "
+        "default all of %s" % ", ".join(sorted(BENCHMARKS)))
+    parser.add_argument("--quick", action="store_true",
+        help="use small problem sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="store the results as baseline")
+    parser.add_argument("--compare", help="compare to a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+        help="allowed relative regression")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single is not None:
+        # worker mode, the result is the last line of the output
+        res = run_single(args.single, json.loads(args.params), args.repeat)
+        print(json.dumps(res))
+        return 0
+
+    params = SIZES["quick" if args.quick else "default"]
+    names = args.names or sorted(BENCHMARKS)
+    results = run(names, params, args.repeat, verbose=args.compare is None)
+    status = 0
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            print("warning: baseline was created with %s" % baseline.get("params"))
+        print_comparison(results, baseline["results"])
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for r in regressions:
+            print("regression %s" % r)
+        status = 1 if regressions else 0
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2,
+                sort_keys=True)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Unit tests for the benchmark helpers.
+"""
+
+import os
+import sys
+import unittest
+import subprocess
+
+from benchmark import compare, run_single, SIZES
+
+class Benchmark_Test(unittest.TestCase):
+    def test_compare(self):
+        base = {"a": {"time": 1., "memory": 10.}, "b": {"time": 1., "memory": 10.}}
+        res = {"a": {"time": 1.1, "memory": 10.}, "b": {"time": 1.5, "memory": 13.},
+            "c": {"time": 5., "memory": 50.}}
+        reg = compare(res, base, tolerance=0.2)
+        self.assertEqual(len(reg), 2)
+        self.assertTrue(all(r.startswith("b:") for r in reg))
+
+    def test_run_single(self):
+        res = run_single("sys_error", SIZES["quick"], repeat=1)
+        self.assertGreater(res["time"], 0.)
+        self.assertGreater(res["memory"], 0.)
+
+class Startup_Test(unittest.TestCase):
+    def run_python(self, statement):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output([sys.executable, "-c", statement],
+            cwd=root).split()
+
+    def test_lazy_import(self):
+        out = self.run_python("import sys, analysis2; "
+            "print('matplotlib' in sys.modules); analysis2.read_confs; "
+            "print('matplotlib' in sys.modules); analysis2.LatticePlot; "
+            "print('matplotlib' in sys.modules)")
+        self.assertEqual(out, [b"False", b"False", b"True"])
+
+    def test_star_import(self):
+        out = self.run_python("from analysis2 import *; "
+            "print(FitResult.__name__); print(mean_std.__name__)")
+        self.assertEqual(out, [b"FitResult", b"mean_std"])
+
+    def test_legacy_package(self):
+        out = self.run_python("import sys, analysis; "
+            "print('matplotlib' in sys.modules); "
+            "print(analysis.fit.__module__); print(analysis.calc_Ecm.__name__)")
+        self.assertEqual(out, [b"False", b"analysis.fit", b"calc_Ecm"])
+
+if __name__ == "__main__":
+    unittest.main()
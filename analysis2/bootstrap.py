@@ -6,7 +6,7 @@ import os
 import math
 import numpy as np
 
-def bootstrap(source, nbsamples):
+def bootstrap(source, nbsamples, stream=None):
     """Bootstraping of data.
 
     Creates nbsamples bootstrap samples of source.
@@ -17,41 +17,37 @@ def bootstrap(source, nbsamples):
         Data on which the bootstrap samples are created.
     nbsamples : int
         Number of bootstrap samples created.
+    stream : rng.Stream, optional
+        The random numbers of the resampling, see bootstrap_counts.
 
     Returns
     -------
     boot : ndarray
         The bootstrap samples.
     """
-    # seed the random number generator
-    # the seed is hardcoded to be able to recreate the samples
-    # original seed
-    #np.random.seed(125013)
-    # Bastians seed
-    np.random.seed(1227)
     # initialize the bootstrapsamples to 0.
     _rshape = list(source.shape)
     _rshape[0] = nbsamples
     boot = np.zeros(_rshape, dtype=float)
     # the first entry is the average over the original data
     boot[0] = np.mean(source, dtype=np.float64, axis=0)
-    # create the rest of the bootstrap samples
+    # create the rest of the bootstrap samples, all elements of source
+    # are resampled with the same configurations
     number = len(source)
-    for _i in range(1, nbsamples):
-        _rnd = np.random.randint(0, number, size=number)
-        _sum = 0.
-        for _r in range(0, number):
-            _sum += source[_rnd[_r]]
-        boot[_i] = _sum / float(number)
+    counts = bootstrap_counts(number, nbsamples, stream=stream)
+    _flat = np.reshape(source, (number, -1))
+    boot[1:] = np.dot(counts.astype(float), _flat).reshape(boot[1:].shape)
+    boot[1:] /= float(number)
     return boot
 
-def sym_and_boot(source, nbsamples = 1000):
+def sym_and_boot(source, nbsamples = 1000, stream=None):
     """Symmetrizes and boostraps correlation functions.
 
     Symmetrizes the correlation functions given in source and creates
     bootstrap samples. The data is assumed to be a numpy array with
-    two dimensions. The first axis is the sample number and the second
-    axis is time.
+    at least two dimensions. The first axis is the sample number and
+    the second axis is time, further axes, e.g. of a correlation
+    function matrix, are resampled with the same configurations.
 
     Parameters
     ----------
@@ -59,29 +55,116 @@ def sym_and_boot(source, nbsamples = 1000):
         A numpy array with correlation functions
     nbsamples : int
         Number of bootstrap samples created.
+    stream : rng.Stream, optional
+        The random numbers of the resampling, see bootstrap_counts.
 
     Returns:
     boot : ndarray
         The bootstrapsamples, the sample number is the first axis,
         the symmetrization is around the second axis.
     """
-    _rshape = list(source.shape)
-    _nbcorr = _rshape[0]
-    _T = _rshape[1]
-    _rshape[0] = nbsamples
-    _rshape[1] = int(_T/2)+1
+    # one set of resampling indices for all timeslices and elements
+    return bootstrap(sym(source), nbsamples, stream)
 
-    # initialize the bootstrap samples to 0.
-    boot = np.zeros(_rshape, dtype=float)
-    # the first timeslice is not symmetrized
-    boot[:,0] = bootstrap(source[:,0], nbsamples)
-    for _t in range(1, int(_T/2)):
-        # symmetrize the correlation function
-        _symm = (source[:,_t] + source[:,(_T - _t)]) / 2.
-        # bootstrap the timeslice
-        boot[:,_t] = bootstrap(_symm, nbsamples)
-    # the timeslice at t = T/2 is not symmetrized
-    boot[:,-1] = bootstrap(source[:,int(_T/2)], nbsamples)
+def bootstrap_counts(nconf, nbsamples, seed=1227, stream=None, samples=None):
+    """Multiplicity of every configuration in the bootstrap samples.
+
+    The random numbers are drawn in the same order as in bootstrap, so
+    the samples created from the counts are the same.
+
+    Without a stream the configurations are drawn with a generator
+    seeded with seed, sample after sample. With a stream configuration j
+    of sample i+1 is the number i*nconf+j of the stream, so every range
+    of samples can be calculated on its own, e.g. by different workers,
+    and the counts do not depend on the ranges.
+
+    Parameters
+    ----------
+    nconf : int
+        The number of configurations.
+    nbsamples : int
+        Number of bootstrap samples, including the mean.
+    seed : int, optional
+        The seed of the random number generator, unused with a stream.
+    stream : rng.Stream, optional
+        The stream of the random numbers.
+    samples : tuple of int, optional
+        Only calculate the rows start to stop-1 of the counts.
+
+    Returns
+    -------
+    counts : ndarray
+        How often configuration j is drawn for sample i+1, the shape is
+        (nbsamples-1, nconf) or (stop-start, nconf).
+    """
+    start, stop = (0, nbsamples-1) if samples is None else samples
+    dtype = np.uint16 if nconf < 2**16 else np.uint32
+    if stream is not None:
+        _n = stop - start
+        _rnd = stream.integers(nconf, (_n, nconf), offset=start*nconf)
+        _rnd += np.arange(_n)[:,None] * nconf
+        return np.bincount(_rnd.ravel(), minlength=_n*nconf).reshape(
+            (_n, nconf)).astype(dtype)
+    rng = np.random.RandomState(seed)
+    counts = np.zeros((stop-start, nconf), dtype=dtype)
+    for _i in range(stop):
+        _rnd = rng.randint(0, nconf, size=nconf)
+        if _i >= start:
+            counts[_i-start] = np.bincount(_rnd, minlength=nconf)
+    return counts
+
+def sym_and_boot_stream(chunks, nconf, nbsamples=1000, symmetrize=True,
+        stream=None):
+    """Symmetrizes and bootstraps correlation functions read in chunks.
+
+    The bootstrap samples are accumulated chunk by chunk using the
+    multiplicities of the configurations, so only one chunk of the data
+    and the bootstrap samples are kept in memory. The result agrees
+    with sym_and_boot and bootstrap up to rounding.
+
+    Parameters
+    ----------
+    chunks : iterable of ndarrays
+        The data in chunks of configurations, the first axis is the
+        configuration number and the second axis is time.
+    nconf : int
+        The total number of configurations in all chunks.
+    nbsamples : int
+        Number of bootstrap samples created.
+    symmetrize : bool, optional
+        Symmetrize the data around the second axis.
+    stream : rng.Stream, optional
+        The random numbers of the resampling, see bootstrap_counts.
+
+    Returns
+    -------
+    boot : ndarray
+        The bootstrap samples, the sample number is the first axis.
+
+    Raises
+    ------
+    ValueError
+        If the chunks do not contain nconf configurations.
+    """
+    counts = bootstrap_counts(nconf, nbsamples, stream=stream)
+    boot = None
+    start = 0
+    for chunk in chunks:
+        if symmetrize:
+            chunk = sym(chunk)
+        _n = chunk.shape[0]
+        if start + _n > nconf:
+            raise ValueError("more than %d configurations given" % nconf)
+        if boot is None:
+            boot = np.zeros((nbsamples,) + chunk.shape[1:], dtype=float)
+        _flat = chunk.reshape((_n, -1))
+        boot[0] += _flat.sum(axis=0).reshape(chunk.shape[1:])
+        _c = counts[:,start:start+_n].astype(float)
+        boot[1:] += np.dot(_c, _flat).reshape((nbsamples-1,) + chunk.shape[1:])
+        start += _n
+    if start != nconf:
+        raise ValueError("expected %d configurations, got %d" % (nconf, start))
+    boot /= float(nconf)
     return boot
 
 def sym(source):
@@ -6,6 +6,7 @@ import unittest
 import numpy as np
 
 import bootstrap as bs
+import rng
 
 class Bootstrap_Test(unittest.TestCase):
     def test_bootstrap(self):
@@ -17,6 +18,57 @@ class Bootstrap_Test(unittest.TestCase):
     def test_sym(self):
         self.assertTrue(True)
 
+class Stream_Test(unittest.TestCase):
+    def setUp(self):
+        self.data = np.random.rand(40, 16, 2, 2)
+
+    def test_counts(self):
+        data = np.random.rand(40)
+        counts = bs.bootstrap_counts(40, 20)
+        self.assertEqual(counts.shape, (19, 40))
+        self.assertTrue(np.all(counts.sum(axis=1) == 40))
+        res = np.dot(counts, data) / 40.
+        self.assertTrue(np.allclose(res, bs.bootstrap(data, 20)[1:]))
+
+    def test_stream(self):
+        ref = bs.sym_and_boot(self.data, 20)
+        for size in (1, 7, 40):
+            chunks = (self.data[i:i+size] for i in range(0, 40, size))
+            res = bs.sym_and_boot_stream(chunks, 40, 20)
+            self.assertEqual(res.shape, ref.shape)
+            self.assertTrue(np.allclose(res, ref))
+
+    def test_stream_nosym(self):
+        ref = bs.bootstrap(self.data, 20)
+        chunks = (self.data[i:i+8] for i in range(0, 40, 8))
+        res = bs.sym_and_boot_stream(chunks, 40, 20, symmetrize=False)
+        self.assertTrue(np.allclose(res, ref))
+
+    def test_counts_chunks(self):
+        ref = bs.bootstrap_counts(40, 20)
+        res = np.concatenate([bs.bootstrap_counts(40, 20, samples=(i,
+            min(i+6, 19))) for i in range(0, 19, 6)])
+        self.assertTrue(np.array_equal(res, ref))
+
+    def test_rng_stream(self):
+        s = rng.stream("A40.24", "pi", "bootstrap")
+        ref = bs.bootstrap_counts(40, 20, stream=s)
+        self.assertEqual(ref.shape, (19, 40))
+        self.assertTrue(np.all(ref.sum(axis=1) == 40))
+        self.assertFalse(np.array_equal(ref, bs.bootstrap_counts(40, 20)))
+        # the counts do not depend on how the samples are split
+        for size in (1, 5, 19):
+            res = np.concatenate([bs.bootstrap_counts(40, 20, stream=s,
+                samples=(i, min(i+size, 19))) for i in range(0, 19, size)])
+            self.assertTrue(np.array_equal(res, ref))
+        res = bs.bootstrap(self.data, 20, s)
+        self.assertTrue(np.allclose(res, bs.sym_and_boot_stream(iter([
+            self.data]), 40, 20, symmetrize=False, stream=s)))
+
+    def test_stream_nconf(self):
+        chunks = (self.data[i:i+8] for i in range(0, 32, 8))
+        self.assertRaises(ValueError, bs.sym_and_boot_stream, chunks, 40, 20)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,388 @@
+"""
+Content-addressed cache for the results of the analysis stages.
+"""
+
+import os
+import sys
+import types
+import hashlib
+import numpy as np
+
+# the directory of the package, only its modules are part of the code hash
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+_code_hashes = {}
+
+def _source_file(module):
+    """The source file of a module of the package or None."""
+    fname = getattr(module, "__file__", None)
+    if fname is None:
+        return None
+    fname = os.path.abspath(fname)
+    if fname.endswith((".pyc", ".pyo")):
+        fname = fname[:-1]
+    if not fname.startswith(_PACKAGE + os.sep) or not os.path.isfile(fname):
+        return None
+    return fname
+
+def _dependencies(module):
+    """The source files of the package modules a module uses.
+
+    The modules are found through the global names of the module,
+    i.e. imported modules and the modules of imported functions and
+    classes, recursively.
+    """
+    found = set()
+    seen = set()
+    todo = [module]
+    while todo:
+        m = todo.pop()
+        fname = _source_file(m)
+        if id(m) in seen or (m is not module and fname is None):
+            continue
+        seen.add(id(m))
+        if fname is not None:
+            found.add(fname)
+        for v in vars(m).values():
+            if isinstance(v, types.ModuleType):
+                todo.append(v)
+            elif isinstance(v, (types.FunctionType, type, types.ClassType)):
+                if v.__module__ in sys.modules:
+                    todo.append(sys.modules[v.__module__])
+    return sorted(found)
+
+def code_hash(func):
+    """Hash of the source of the package modules a function depends on.
+
+    The hash covers the module of the function and all modules of the
+    package it uses, see _dependencies. It is computed once per module
+    and process.
+
+    Parameters
+    ----------
+    func : function
+        The function.
+
+    Returns
+    -------
+    str or None
+        The hexadecimal SHA1 digest, None if the module is unknown.
+    """
+    module = sys.modules.get(func.__module__)
+    if module is None:
+        return None
+    if func.__module__ not in _code_hashes:
+        h = hashlib.sha1()
+        for fname in _dependencies(module):
+            h.update(os.path.relpath(fname, _PACKAGE))
+            with open(fname, "rb") as f:
+                h.update(f.read())
+        _code_hashes[func.__module__] = h.hexdigest()
+    return _code_hashes[func.__module__]
+
+def _update_hash(h, obj):
+    """Feed an object into a hash.
+
+    Numpy arrays are hashed by dtype, shape and content, containers are
+    hashed recursively, functions by their byte code, constants,
+    closures and the source of the package modules they depend on, see
+    code_hash, and all other objects by their attributes. The attributes
+    'debug', 'error', 'weight' and 'tables' are skipped, the latter three
+    are recalculated from the data when needed.
+
+    Parameters
+    ----------
+    h : hashlib hash object
+        The hash to update.
+    obj : anything
+        The object to hash.
+    """
+    if obj is None or isinstance(obj, (bool, int, long, float, complex, str,
+            unicode)):
+        h.update("%s:%r;" % (type(obj).__name__, obj))
+    elif isinstance(obj, np.ndarray):
+        h.update("ndarray:%s:%s;" % (obj.dtype.str, str(obj.shape)))
+        if obj.dtype.hasobject:
+            for x in obj.flat:
+                _update_hash(h, x)
+        else:
+            h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, np.generic):
+        _update_hash(h, np.asarray(obj))
+    elif isinstance(obj, (tuple, list)):
+        h.update("%s:%d;" % (type(obj).__name__, len(obj)))
+        for x in obj:
+            _update_hash(h, x)
+    elif isinstance(obj, dict):
+        h.update("dict:%d;" % len(obj))
+        for k in sorted(obj.keys()):
+            _update_hash(h, k)
+            _update_hash(h, obj[k])
+    elif isinstance(obj, types.CodeType):
+        h.update("code:%s;" % obj.co_name)
+        h.update(obj.co_code)
+        _update_hash(h, obj.co_consts)
+        _update_hash(h, obj.co_names)
+    elif isinstance(obj, types.FunctionType):
+        h.update("function:%s.%s;" % (obj.__module__, obj.__name__))
+        _update_hash(h, code_hash(obj))
+        _update_hash(h, obj.func_code)
+        _update_hash(h, obj.func_defaults)
+        if obj.func_closure is not None:
+            _update_hash(h, [c.cell_contents for c in obj.func_closure])
+    elif isinstance(obj, types.MethodType):
+        _update_hash(h, obj.im_func)
+        _update_hash(h, obj.im_self)
+    elif isinstance(obj, types.BuiltinFunctionType):
+        h.update("builtin:%s;" % obj.__name__)
+    elif hasattr(obj, "__dict__"):
+        h.update("object:%s;" % type(obj).__name__)
+        attr = dict((k, v) for k, v in vars(obj).items()
+                if k not in ("debug", "error", "weight", "tables")
+                and v is not obj)
+        _update_hash(h, attr)
+    else:
+        h.update("%s:%r;" % (type(obj).__name__, obj))
+
+def hash_args(*args, **kwargs):
+    """Calculates a hash of the given arguments.
+
+    Parameters
+    ----------
+    args, kwargs : anything
+        The data and parameters to hash.
+
+    Returns
+    -------
+    str
+        The hexadecimal SHA1 digest.
+    """
+    h = hashlib.sha1()
+    _update_hash(h, args)
+    _update_hash(h, kwargs)
+    return h.hexdigest()
+
+class ArtifactCache(object):
+    """Cache for intermediate results of an analysis chain.
+
+    Every result is stored under a key built from the name of the stage
+    and a hash of all input data and parameters. If a stage is called
+    again with the same input, the stored result is read instead of
+    recalculated. Changing any input of a stage changes the key, so
+    that stage and everything depending on it is recalculated, while
+    all unchanged stages are read from disk.
+
+    The code of a stage is part of the key as well: the function and
+    the source of all modules of this package it uses, directly or
+    through other modules, see code_hash. Changes that are not seen
+    this way are not detected, call clear() after changing them. These
+    are changes to other packages like numpy and scipy, to modules that
+    are only imported inside of functions, and to files read by the
+    code, e.g. tables.
+
+    Supported results are Correlators, FitResult, ndarrays and tuples
+    of those.
+    """
+    def __init__(self, path, verbose=False):
+        """Create a cache in the given directory.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the cache, created if needed.
+        verbose : bool, optional
+            Print info about cache hits and misses.
+        """
+        self.path = path
+        self.verbose = verbose
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def key(self, stage, *args, **kwargs):
+        """Build the key of a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        args, kwargs : anything
+            The input data and parameters of the stage.
+
+        Returns
+        -------
+        str
+            The key of the stage.
+        """
+        return "%s_%s" % (stage, hash_args(*args, **kwargs))
+
+    def _fname(self, key, suffix=""):
+        return os.path.join(self.path, key + suffix)
+
+    def has(self, key):
+        """Check if a result is stored under key."""
+        return os.path.isfile(self._fname(key, ".meta"))
+
+    def save(self, key, obj):
+        """Store a result.
+
+        The meta file listing the stored parts is written last, so an
+        interrupted write does not leave a valid entry behind.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+        obj : Correlators, FitResult, ndarray or tuple of those
+            The result to store.
+        """
+        if isinstance(obj, tuple):
+            parts = obj
+        else:
+            parts = (obj,)
+        kinds = []
+        for i, part in enumerate(parts):
+            fname = self._fname(key, "_%02d" % i)
+            kind = type(part).__name__
+            if kind == "FitResult":
+                part.save(fname + ".npz")
+            elif kind == "Correlators":
+                np.save(fname + ".npy", part.data)
+            elif kind == "ndarray":
+                np.save(fname + ".npy", part)
+            else:
+                raise TypeError("cannot cache objects of type %s" % kind)
+            kinds.append(kind)
+        with open(self._fname(key, ".meta"), "w") as f:
+            f.write("%s\n" % ("tuple" if isinstance(obj, tuple) else "single"))
+            f.write("\n".join(kinds))
+
+    def load(self, key):
+        """Read a stored result.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+
+        Returns
+        -------
+        Correlators, FitResult, ndarray or tuple of those
+            The stored result.
+
+        Raises
+        ------
+        KeyError
+            If nothing is stored under the key.
+        """
+        if not self.has(key):
+            raise KeyError("no result stored for key %s" % key)
+        with open(self._fname(key, ".meta"), "r") as f:
+            lines = f.read().split("\n")
+        parts = []
+        for i, kind in enumerate(lines[1:]):
+            fname = self._fname(key, "_%02d" % i)
+            if kind == "FitResult":
+                from fit import FitResult
+                parts.append(FitResult.read(fname + ".npz"))
+            elif kind == "Correlators":
+                from correlator import Correlators
+                parts.append(Correlators.read(fname + ".npy"))
+            else:
+                parts.append(np.load(fname + ".npy"))
+        if lines[0] == "tuple":
+            return tuple(parts)
+        return parts[0]
+
+    def reuse(self, stage, func, *args, **kwargs):
+        """Return the stored result of func or calculate and store it.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        func : callable
+            The function calculating the result. It is part of the key.
+        args, kwargs : anything
+            The arguments passed to func, they are part of the key.
+
+        Returns
+        -------
+        anything
+            The result of func(*args, **kwargs).
+        """
+        key = self.key(stage, func, *args, **kwargs)
+        return self.reuse_key(key, func, *args, **kwargs)
+
+    def reuse_key(self, key, func, *args, **kwargs):
+        """Return the result stored under key or calculate and store it.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result, see key.
+        func : callable
+            The function calculating the result.
+        args, kwargs : anything
+            The arguments passed to func.
+
+        Returns
+        -------
+        anything
+            The result of func(*args, **kwargs).
+        """
+        if self.has(key):
+            if self.verbose:
+                print("reusing %s" % key)
+            return self.load(key)
+        if self.verbose:
+            print("calculating %s" % key)
+        res = func(*args, **kwargs)
+        if res is not None:
+            self.save(key, res)
+        return res
+
+    def clear(self, stage=None):
+        """Delete stored results.
+
+        Parameters
+        ----------
+        stage : str, optional
+            Only delete results of this stage.
+        """
+        for fname in os.listdir(self.path):
+            if stage is None or fname.startswith(stage + "_"):
+                os.remove(os.path.join(self.path, fname))
+
+# arguments that do not change the result of a method
+_SCHEDULING = ("queue", "chunksize")
+
+def cached(stage):
+    """Decorator adding a 'cache' keyword to a method.
+
+    If an ArtifactCache is passed as 'cache', the result of the method
+    is looked up in the cache, with the object itself and all arguments
+    as part of the key. The arguments 'queue' and 'chunksize' only
+    distribute the work and are not part of the key. Without cache the
+    method is called directly.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage.
+    """
+    def decorator(method):
+        def cached_wrapper(self, *args, **kwargs):
+            cache = kwargs.pop("cache", None)
+            if cache is None:
+                return method(self, *args, **kwargs)
+            options = dict((k, kwargs.pop(k)) for k in _SCHEDULING
+                if k in kwargs)
+            key = cache.key(stage, method, self, *args, **kwargs)
+            kwargs.update(options)
+            return cache.reuse_key(key, method, self, *args, **kwargs)
+        cached_wrapper.__name__ = method.__name__
+        cached_wrapper.__doc__ = method.__doc__
+        return cached_wrapper
+    return decorator
+
+if __name__ == "__main__":
+    pass
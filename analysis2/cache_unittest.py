@@ -0,0 +1,152 @@
+"""
+Unit tests for the artifact cache.
+"""
+
+from __future__ import with_statement
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from cache import ArtifactCache, hash_args, cached, code_hash, _dependencies
+from fit import FitResult
+
+_calls = []
+
+def _scale(x, factor=2.):
+    _calls.append(factor)
+    return x * factor
+
+class HashArgs_Test(unittest.TestCase):
+
+    def test_stable(self):
+        a = np.arange(10.)
+        self.assertEqual(hash_args(a, 2, t0=1), hash_args(a.copy(), 2, t0=1))
+
+    def test_code(self):
+        # the helpers of a stage are part of the key
+        import fit
+        files = [os.path.basename(f) for f in _dependencies(fit)]
+        for name in ("fit.py", "fit_routines.py", "functions.py",
+                "backend.py", "statistics.py", "kinematics.py"):
+            self.assertIn(name, files)
+        self.assertEqual(code_hash(fit.LatticeFit.fit.im_func), code_hash(
+            fit.FitResult.to_CM.im_func))
+        self.assertNotEqual(code_hash(_scale), code_hash(
+            fit.LatticeFit.fit.im_func))
+
+    def test_data_changes(self):
+        a = np.arange(10.)
+        b = a.copy()
+        b[3] = 0.
+        self.assertNotEqual(hash_args(a), hash_args(b))
+
+    def test_parameter_changes(self):
+        a = np.arange(10.)
+        self.assertNotEqual(hash_args(a, t0=1), hash_args(a, t0=2))
+        self.assertNotEqual(hash_args(a, 1), hash_args(a, 1.))
+
+    def test_shape_changes(self):
+        a = np.arange(10.)
+        self.assertNotEqual(hash_args(a), hash_args(a.reshape((2, 5))))
+
+class ArtifactCache_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ArtifactCache(self.path)
+        del _calls[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_ndarray(self):
+        data = np.random.rand(4, 5)
+        key = self.cache.key("test", data)
+        self.assertFalse(self.cache.has(key))
+        self.cache.save(key, data)
+        self.assertTrue(self.cache.has(key))
+        self.assertTrue(np.array_equal(self.cache.load(key), data))
+
+    def test_missing(self):
+        self.assertRaises(KeyError, self.cache.load, "test_0")
+
+    def test_tuple(self):
+        data = (np.ones(3), np.zeros(2))
+        key = self.cache.key("test", 1)
+        self.cache.save(key, data)
+        res = self.cache.load(key)
+        self.assertIsInstance(res, tuple)
+        self.assertEqual(len(res), 2)
+        self.assertTrue(np.array_equal(res[0], data[0]))
+        self.assertTrue(np.array_equal(res[1], data[1]))
+
+    def test_fitresult(self):
+        fr = FitResult("test")
+        fr.create_empty((10, 2, 4), (10, 4), 1)
+        res = np.random.rand(10, 2)
+        fr.add_data((0, 1), res, np.ones(10), np.ones(10))
+        key = self.cache.key("test", fr)
+        self.cache.save(key, fr)
+        fr1 = self.cache.load(key)
+        self.assertTrue(np.array_equal(fr1.data[0], fr.data[0]))
+        self.assertTrue(np.array_equal(fr1.pval[0], fr.pval[0]))
+
+    def test_reuse(self):
+        data = np.arange(5.)
+        res = self.cache.reuse("test", _scale, data)
+        self.assertEqual(len(_calls), 1)
+        res1 = self.cache.reuse("test", _scale, data)
+        self.assertEqual(len(_calls), 1)
+        self.assertTrue(np.array_equal(res, res1))
+        self.cache.reuse("test", _scale, data, factor=3.)
+        self.assertEqual(len(_calls), 2)
+
+    def test_clear(self):
+        data = np.arange(5.)
+        self.cache.reuse("test", _scale, data)
+        self.cache.reuse("other", _scale, data)
+        self.cache.clear("test")
+        self.cache.reuse("test", _scale, data)
+        self.cache.reuse("other", _scale, data)
+        self.assertEqual(len(_calls), 3)
+
+class _Dummy(object):
+    def __init__(self, data):
+        self.data = data
+
+    @cached("dummy")
+    def scale(self, factor):
+        _calls.append(factor)
+        return self.data * factor
+
+class Cached_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ArtifactCache(self.path)
+        del _calls[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_without_cache(self):
+        d = _Dummy(np.ones(3))
+        d.scale(2.)
+        d.scale(2.)
+        self.assertEqual(len(_calls), 2)
+
+    def test_with_cache(self):
+        d = _Dummy(np.ones(3))
+        res = d.scale(2., cache=self.cache)
+        res1 = d.scale(2., cache=self.cache)
+        self.assertEqual(len(_calls), 1)
+        self.assertTrue(np.array_equal(res, res1))
+        d.data[0] = 3.
+        d.scale(2., cache=self.cache)
+        self.assertEqual(len(_calls), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,497 @@
+"""
+Catalog of the result files of an ensemble.
+
+The catalog is a LatticeEnsemble that additionally indexes the files
+written for the ensemble, e.g. correlators, bootstrap samples, fit
+results and derived observables. For every file the index holds the
+kind, the parameters, a hash of the input, and the shape, type and byte
+offset of every array in the file. The index and the ensemble data are
+stored in one small JSON file, so scripts find the results of many
+ensembles by reading the index files only, and arrays stored uncompressed
+are opened as memory maps without reading the file.
+"""
+
+from __future__ import with_statement
+
+import os
+import json
+import struct
+import zipfile
+import tempfile
+import numpy as np
+
+from ensemble import LatticeEnsemble
+from in_out import check_read, check_write
+from cache import hash_args
+
+KINDS = ("correlator", "bootstrap", "fit", "derived", "array")
+
+def _npy_header(f):
+    """Read the header of a npy file, returns shape, fortran order and
+    dtype, f is positioned at the data."""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+def _layout(shape, fortran, dtype, offset):
+    if dtype.hasobject:
+        offset = None
+    return {"shape": list(shape), "dtype": dtype.str, "fortran": fortran,
+        "offset": offset}
+
+def array_layout(filename):
+    """The layout of the arrays in a npy or npz file.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the file.
+
+    Returns
+    -------
+    dict
+        For every array, the name in a npz file or None for a npy file,
+        the shape, dtype, order and the offset of the data in the file.
+        The offset is None if the array is compressed or contains python
+        objects.
+    """
+    if not zipfile.is_zipfile(filename):
+        with open(filename, "rb") as f:
+            shape, fortran, dtype = _npy_header(f)
+            return {None: _layout(shape, fortran, dtype, f.tell())}
+    res = {}
+    with open(filename, "rb") as raw:
+        zf = zipfile.ZipFile(raw)
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") \
+                else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as f:
+                    shape, fortran, dtype = _npy_header(f)
+                res[name] = _layout(shape, fortran, dtype, None)
+                continue
+            # the data starts after the local file header
+            raw.seek(info.header_offset)
+            head = raw.read(30)
+            nname, nextra = struct.unpack("<HH", head[26:30])
+            raw.seek(info.header_offset + 30 + nname + nextra)
+            shape, fortran, dtype = _npy_header(raw)
+            res[name] = _layout(shape, fortran, dtype, raw.tell())
+        zf.close()
+    return res
+
+def _encode(obj):
+    """Make the ensemble data serializable as JSON."""
+    if isinstance(obj, np.ndarray):
+        return {"__ndarray__": obj.tolist(), "dtype": obj.dtype.str}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("%r is not JSON serializable" % (obj,))
+
+def _decode(dic):
+    if "__ndarray__" in dic:
+        return np.asarray(dic["__ndarray__"], dtype=dic["dtype"])
+    return dic
+
+def _str(obj):
+    """Convert the unicode strings of the JSON decoder to str."""
+    if isinstance(obj, unicode):
+        return str(obj)
+    if isinstance(obj, list):
+        return [_str(x) for x in obj]
+    if isinstance(obj, dict):
+        return dict((_str(k), _str(v)) for k, v in obj.items())
+    return obj
+
+class EnsembleCatalog(LatticeEnsemble):
+    """A LatticeEnsemble with an index of its result files.
+
+    The files are registered under a key, e.g. "fit_k", with their kind,
+    see KINDS, parameters and the hash of their input. If the index file
+    is set, the names of the files below its directory are stored
+    relative to it, so the data can be moved together with the index.
+    """
+    def __init__(self, name, L, T, path=None):
+        """Create an empty catalog.
+
+        Parameters
+        ----------
+        name : str
+            Identifier of the ensemble.
+        L : int
+            The spatial extent of the lattice.
+        T : int
+            The temporal extent of the lattice.
+        path : str, optional
+            The name of the index file.
+        """
+        LatticeEnsemble.__init__(self, name, L, T)
+        self.path = path
+        self.entries = {}
+
+    @classmethod
+    def from_ensemble(cls, ens, path=None):
+        """Create a catalog with the data of a LatticeEnsemble.
+
+        Parameters
+        ----------
+        ens : LatticeEnsemble
+            The ensemble.
+        path : str, optional
+            The name of the index file.
+
+        Returns
+        -------
+        EnsembleCatalog
+            The catalog without entries.
+        """
+        obj = cls(ens.name(), ens.L(), ens.T(), path)
+        obj.data = dict(ens.data)
+        return obj
+
+    @classmethod
+    def open(cls, path):
+        """Read a catalog from its index file.
+
+        Only the index is read, the files are opened when their data is
+        requested.
+
+        Parameters
+        ----------
+        path : str
+            The name of the index file.
+
+        Returns
+        -------
+        EnsembleCatalog
+            The catalog.
+
+        Raises
+        ------
+        IOError
+            If the file is not found.
+        """
+        check_read(path)
+        with open(path, "r") as f:
+            index = _str(json.load(f, object_hook=_decode))
+        data = index["ensemble"]
+        obj = cls(data["name"], data["L"], data["T"], path)
+        obj.data = data
+        obj.entries = index["entries"]
+        return obj
+
+    def write(self, path=None):
+        """Write the index file.
+
+        The file is replaced atomically, readers never see a partial
+        index.
+
+        Parameters
+        ----------
+        path : str, optional
+            The name of the index file, by default the one the catalog
+            was opened from.
+        """
+        if path is not None:
+            self.path = path
+        if self.path is None:
+            raise RuntimeError("no index file given")
+        check_write(os.path.abspath(self.path))
+        index = {"ensemble": self.data, "entries": self.entries}
+        fd, tmp = tempfile.mkstemp(prefix=".tmp", dir=os.path.dirname(
+            os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f, default=_encode, indent=1, sort_keys=True)
+            os.rename(tmp, self.path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _root(self):
+        if self.path is None:
+            return os.getcwd()
+        return os.path.dirname(os.path.abspath(self.path))
+
+    def register(self, key, filename, kind="array", params=None, inputs=None):
+        """Add an existing file to the index.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file in the catalog, an existing entry is
+            replaced.
+        filename : str
+            The name of the npy or npz file.
+        kind : str, optional
+            The kind of data, see KINDS.
+        params : dict, optional
+            The parameters the data was calculated with, used to find
+            the entry. The values have to be serializable as JSON.
+        inputs : str or tuple, optional
+            The hash of the input data, or the input data, which is
+            hashed with cache.hash_args.
+
+        Returns
+        -------
+        dict
+            The entry.
+
+        Raises
+        ------
+        ValueError
+            If the kind is unknown.
+        IOError
+            If the file is not found.
+        """
+        if kind not in KINDS:
+            raise ValueError("unknown kind %s" % kind)
+        check_read(filename)
+        if inputs is not None and not isinstance(inputs, str):
+            inputs = hash_args(*inputs)
+        name = os.path.abspath(filename)
+        root = self._root()
+        if self.path is not None and name.startswith(root + os.sep):
+            name = os.path.relpath(name, root)
+        stat = os.stat(filename)
+        layout = array_layout(filename)
+        entry = {"file": name, "kind": kind, "params": params or {},
+            "inputs": inputs, "size": stat.st_size, "mtime": stat.st_mtime,
+            "arrays": dict(("" if k is None else k, v) for k, v in
+                layout.items())}
+        self.entries[key] = entry
+        return entry
+
+    def store(self, key, obj, filename, kind=None, params=None, inputs=None,
+            compact=False):
+        """Save data and add the file to the index.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file in the catalog.
+        obj : Correlators, FitResult or ndarray
+            The data to save.
+        filename : str
+            The name of the file, numpy adds the extension if missing.
+            Correlators and arrays in the compact format are stored with
+            the extension .npz, see in_out.write_data.
+        kind : str, optional
+            The kind of data, by default "correlator", "fit", "derived"
+            or "array" depending on obj, see KINDS.
+        params, inputs
+            See register.
+        compact : bool, optional
+            Use the compact format of the data, see in_out.write_data.
+
+        Returns
+        -------
+        dict
+            The entry.
+        """
+        from correlator import Correlators
+        from fit import FitResult
+        from in_out import write_data, compact_name
+        if isinstance(obj, Correlators):
+            obj.save(filename, compact=compact)
+            default, ext = "correlator", ".npy"
+            # the layout cannot be seen from the data
+            params = dict(params or {}, matrix=bool(obj.matrix),
+                packed=bool(obj.packed))
+        elif isinstance(obj, FitResult):
+            obj.save(filename, compact=compact)
+            default = "derived" if obj.derived else "fit"
+            ext = ".npz"
+        else:
+            write_data(np.asarray(obj), filename, compact=compact)
+            default, ext = "array", ".npy"
+        if compact and ext == ".npy":
+            # the compact format is a npz file
+            filename = compact_name(filename)
+        if not os.path.isfile(filename):
+            filename += ext
+        return self.register(key, filename, kind or default, params, inputs)
+
+    def keys(self, kind=None, **params):
+        """The keys of the entries with the given kind and parameters.
+
+        Parameters
+        ----------
+        kind : str, optional
+            The kind of the entries.
+        params : anything
+            Parameters the entries have to have.
+
+        Returns
+        -------
+        list of str
+            The sorted keys.
+        """
+        res = []
+        for key, entry in self.entries.items():
+            if kind is not None and entry["kind"] != kind:
+                continue
+            if any(entry["params"].get(k) != v for k, v in params.items()):
+                continue
+            res.append(key)
+        return sorted(res)
+
+    def info(self, key):
+        """The entry of a key.
+
+        Raises
+        ------
+        KeyError
+            If the key is not in the catalog.
+        """
+        if key not in self.entries:
+            raise KeyError("Catalog %s has no entry '%s'" % (self.name(), key))
+        return self.entries[key]
+
+    def filename(self, key):
+        """The name of the file of a key."""
+        return os.path.join(self._root(), self.info(key)["file"])
+
+    def changed(self, key):
+        """Check if the file was changed since it was registered."""
+        entry = self.info(key)
+        try:
+            stat = os.stat(self.filename(key))
+        except OSError:
+            return True
+        return (stat.st_size != entry["size"] or
+            stat.st_mtime != entry["mtime"])
+
+    def array(self, key, name=None):
+        """An array of a file.
+
+        Uncompressed arrays are opened as read-only memory maps, only the
+        parts used are read from disk. Other arrays are read.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        name : str, optional
+            The name of the array in a npz file.
+
+        Returns
+        -------
+        ndarray
+            The array.
+
+        Raises
+        ------
+        KeyError
+            If the key or the array is not in the catalog.
+        """
+        arrays = self.info(key)["arrays"]
+        if name is None:
+            name = ""
+        if name not in arrays:
+            raise KeyError("%s has no array '%s'" % (key, name))
+        layout = arrays[name]
+        filename = self.filename(key)
+        if layout["offset"] is None:
+            if not name:
+                return np.load(filename)
+            with np.load(filename) as f:
+                return f[name]
+        shape = tuple(layout["shape"])
+        if not shape or 0 in shape:
+            with open(filename, "rb") as f:
+                f.seek(layout["offset"])
+                return np.fromfile(f, dtype=layout["dtype"],
+                    count=int(np.prod(shape))).reshape(shape,
+                    order="F" if layout["fortran"] else "C")
+        return np.memmap(filename, dtype=layout["dtype"], mode="r",
+            offset=layout["offset"], shape=shape,
+            order="F" if layout["fortran"] else "C")
+
+    def load(self, key, lazy=True):
+        """Open the data of a key.
+
+        Correlators and fit results are returned as objects, other data
+        as array. With lazy the bootstrap samples stay on disk as memory
+        maps if they are stored uncompressed, the memory maps are read
+        only.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        lazy : bool, optional
+            Use memory maps instead of reading the data.
+
+        Returns
+        -------
+        Correlators, FitResult or ndarray
+            The data.
+        """
+        from correlator import Correlators
+        from fit import FitResult
+        from in_out import read_data
+        kind = self.info(key)["kind"]
+        filename = self.filename(key)
+        if kind in ("fit", "derived"):
+            if not lazy or "ps00" in self.info(key)["arrays"]:
+                return FitResult.read(filename)
+            return self._fitresult(key)
+        if lazy and "" in self.info(key)["arrays"]:
+            data = self.array(key)
+        else:
+            data = read_data(filename)
+        if kind in ("correlator", "bootstrap"):
+            tmp = Correlators()
+            tmp.data = data
+            tmp.shape = data.shape
+            params = self.info(key)["params"]
+            if "matrix" in params:
+                tmp.matrix = params["matrix"]
+                tmp.packed = params.get("packed", False)
+            else:
+                tmp.matrix = data.shape[-2] == data.shape[-1]
+            return tmp
+        return data
+
+    def _fitresult(self, key):
+        """A FitResult with memory mapped data."""
+        from fit import FitResult
+        arrays = self.info(key)["arrays"]
+        with np.load(self.filename(key)) as f:
+            head, ranges = f["data"], f["fi"]
+        obj = FitResult(head[0], head[3])
+        obj.corr_num = head[1]
+        obj.fit_ranges_shape = head[2]
+        obj.fit_ranges = ranges
+        obj.old_fit_ranges = head[4] if len(head) > 4 else None
+        n = len([x for x in arrays if x.startswith("la")])
+        obj.data = [self.array(key, "pi%02d" % i) for i in range(n)]
+        obj.chi2 = [self.array(key, "ch%02d" % i) for i in range(n)]
+        obj.pval = [self.array(key, "pv%02d" % i) for i in range(n)]
+        obj.label = [self.array(key, "la%02d" % i) for i in range(n)]
+        return obj
+
+def open_catalogs(paths):
+    """Open the catalogs of many ensembles.
+
+    Parameters
+    ----------
+    paths : sequence of str
+        The index files.
+
+    Returns
+    -------
+    dict
+        The catalogs by the name of their ensemble.
+    """
+    res = {}
+    for p in paths:
+        cat = EnsembleCatalog.open(p)
+        res[cat.name()] = cat
+    return res
+
+if __name__ == "__main__":
+    pass
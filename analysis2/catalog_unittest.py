@@ -0,0 +1,146 @@
+"""
+Unit tests for the ensemble catalog.
+"""
+
+import os
+import shutil
+import unittest
+import tempfile
+import numpy as np
+
+from catalog import EnsembleCatalog, array_layout, open_catalogs
+from correlator import Correlators
+from ensemble import LatticeEnsemble
+from fit import FitResult
+
+class Catalog_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = os.path.join(self.path, "A40.24.json")
+        self.cat = EnsembleCatalog("A40.24", 24, 48, self.index)
+        self.cat.add_data("d2", 1)
+        self.cat.add_data("mass", np.array([0.1, 0.2]))
+        rng = np.random.RandomState(3)
+        self.corr = Correlators()
+        self.corr.data = rng.rand(10, 25, 1)
+        self.corr.shape = self.corr.data.shape
+        self.fit = FitResult("m")
+        self.fit.create_empty((10, 2, 4), (10, 4), 1)
+        self.fit.set_ranges([np.array([[5, 9], [5, 12], [6, 12], [7, 12]])],
+            [[4]])
+        self.fit.data[0][...] = rng.rand(10, 2, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fname(self, name):
+        return os.path.join(self.path, "data", name)
+
+    def test_layout(self):
+        data = np.arange(12.).reshape(3, 4)
+        fname = self.fname("x.npy")
+        os.mkdir(os.path.dirname(fname))
+        np.save(fname, data)
+        layout = array_layout(fname)[None]
+        self.assertEqual(layout["shape"], [3, 4])
+        with open(fname, "rb") as f:
+            f.seek(layout["offset"])
+            self.assertTrue(np.array_equal(np.fromfile(f).reshape(3, 4), data))
+        np.savez_compressed(fname + ".npz", a=data)
+        self.assertIsNone(array_layout(fname + ".npz")["a"]["offset"])
+
+    def test_store(self):
+        self.cat.store("corr_pi", self.corr, self.fname("corr_pi"),
+            kind="bootstrap", params={"nsamples": 10}, inputs=(self.corr.data,))
+        self.cat.store("fit_pi", self.fit, self.fname("fit_pi"),
+            params={"range": [5, 12]})
+        self.cat.store("mpi", np.ones(10), self.fname("mpi.npy"))
+        self.assertEqual(self.cat.info("corr_pi")["file"], "data/corr_pi.npy")
+        self.assertEqual(self.cat.keys(), ["corr_pi", "fit_pi", "mpi"])
+        self.assertEqual(self.cat.keys(kind="fit"), ["fit_pi"])
+        self.assertEqual(self.cat.keys(nsamples=10), ["corr_pi"])
+        self.assertEqual(len(self.cat.info("corr_pi")["inputs"]), 40)
+        self.assertRaises(KeyError, self.cat.info, "fit_k")
+        self.assertRaises(ValueError, self.cat.register, "x",
+            self.fname("mpi.npy"), "plot")
+
+    def test_open(self):
+        self.cat.store("corr_pi", self.corr, self.fname("corr_pi"))
+        self.cat.store("fit_pi", self.fit, self.fname("fit_pi"))
+        self.cat.write()
+        cat = EnsembleCatalog.open(self.index)
+        self.assertEqual(cat.name(), "A40.24")
+        self.assertEqual(cat.get_data("d2"), 1)
+        self.assertTrue(np.array_equal(cat.get_data("mass"), [0.1, 0.2]))
+        self.assertEqual(cat.entries, self.cat.entries)
+        self.assertFalse(cat.changed("fit_pi"))
+        # the data stays on disk
+        corr = cat.load("corr_pi")
+        self.assertIsInstance(corr.data, np.memmap)
+        self.assertTrue(np.array_equal(corr.data, self.corr.data))
+        self.assertFalse(corr.matrix)
+        fit = cat.load("fit_pi")
+        self.assertIsInstance(fit.data[0], np.memmap)
+        self.assertTrue(np.array_equal(fit.data[0], self.fit.data[0]))
+        self.assertTrue(np.array_equal(fit.get_ranges()[0][0],
+            self.fit.fit_ranges[0]))
+        self.assertTrue(np.allclose(fit.table()["value"],
+            self.fit.table()["value"]))
+        fit = cat.load("fit_pi", lazy=False)
+        self.assertNotIsInstance(fit.data[0], np.memmap)
+
+    def test_restore(self):
+        # a matrix in packed form, the upper triangle of 2x2
+        corr = Correlators()
+        corr.data = np.random.RandomState(4).rand(10, 25, 3)
+        corr.shape = corr.data.shape
+        corr.matrix, corr.packed = True, True
+        self.cat.store("gevp", corr, self.fname("gevp.npy"))
+        res = self.cat.load("gevp")
+        self.assertTrue(res.matrix)
+        self.assertTrue(res.packed)
+        self.cat.store("corr_pi", self.corr, self.fname("corr_pi.npy"))
+        self.assertFalse(self.cat.load("corr_pi").matrix)
+        # the old fits of a combined fit
+        comb = FitResult("e")
+        comb.create_empty((10, 2, 4, 2), (10, 4, 2), [1, 1])
+        comb.set_ranges([np.array([[8, 12], [9, 12]])], [[4], [2]])
+        comb.old_fit_ranges = [self.fit.fit_ranges]
+        self.cat.store("comb", comb, self.fname("comb"))
+        for lazy in (True, False):
+            res = self.cat.load("comb", lazy=lazy)
+            self.assertEqual(len(res.old_fit_ranges), 1)
+            self.assertTrue(np.array_equal(res.old_fit_ranges[0][0],
+                self.fit.fit_ranges[0]))
+
+    def test_compact(self):
+        self.cat.store("fit_pi", self.fit, self.fname("fit_pi"), compact=True)
+        self.cat.store("corr_pi", self.corr, self.fname("corr_pi.npy"),
+            compact=True)
+        self.assertTrue(self.cat.filename("corr_pi").endswith("corr_pi.npz"))
+        fit = self.cat.load("fit_pi")
+        self.assertTrue(np.allclose(fit.data[0], self.fit.data[0]))
+        self.assertTrue(np.allclose(self.cat.load("corr_pi").data,
+            self.corr.data))
+        self.assertTrue(np.array_equal(self.cat.array("fit_pi", "pi00"),
+            self.fit.data[0][:1]))
+
+    def test_moved(self):
+        self.cat.store("mpi", np.arange(10.), self.fname("mpi.npy"))
+        self.cat.write()
+        new = os.path.join(self.path, "moved")
+        shutil.move(os.path.join(self.path, "data"), os.path.join(new, "data"))
+        shutil.move(self.index, os.path.join(new, "A40.24.json"))
+        cats = open_catalogs([os.path.join(new, "A40.24.json")])
+        self.assertTrue(np.array_equal(cats["A40.24"].load("mpi"),
+            np.arange(10.)))
+
+    def test_from_ensemble(self):
+        ens = LatticeEnsemble("B55.32", 32, 64)
+        ens.add_data("nboot", 1500)
+        cat = EnsembleCatalog.from_ensemble(ens)
+        self.assertEqual(cat.data, ens.data)
+        self.assertRaises(RuntimeError, cat.write)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,12 +13,20 @@ import gevp
 import functions as func
 from ratio import simple_ratio, ratio_shift, simple_ratio_subtract, twopoint_ratio
 from energies import WfromMass_lat, WfromMass
+import instrument
+from instrument import timed
+
+def _stream_kwargs(stream):
+    """The stream as keyword argument, empty without a stream so that the
+    cache keys of the default resampling do not change."""
+    return {} if stream is None else {"stream": stream}
 
 class Correlators(object):
     """Correlation function class.
     """
 
-    def __init__(self, filename=None, column=(1,), matrix=True, skip=1, debug=0):
+    def __init__(self, filename=None, column=(1,), matrix=True, skip=1, debug=0,
+            upper=False, packed=False):
         """Reads in data from an ascii file.
 
         The file is assumed to have in the first line the number of
@@ -42,6 +50,12 @@ class Correlators(object):
             The number of header lines that are skipped.
         debug : int, optional
             The amount of debug information printed.
+        upper : bool, optional
+            The files of a matrix only contain the upper triangle, see
+            in_out.read_matrix.
+        packed : bool, optional
+            Keep a matrix in packed symmetric form until it is needed,
+            see expand.
 
         Raises
         ------
@@ -57,12 +71,15 @@ class Correlators(object):
         self.debug = debug
         self.data = None
         self.matrix = None
+        self.packed = False
 
         if filename is not None:
             if isinstance(filename, (list, tuple)):
                 if matrix:
-                    self.data = in_out.read_matrix(filename, column, skip, debug)
+                    self.data = in_out.read_matrix(filename, column, skip,
+                        debug, upper, packed)
                     self.matrix = True
+                    self.packed = packed
                 else:
                     self.data = in_out.read_vector(filename, column, skip, debug)
                     self.matrix = False
@@ -108,7 +125,54 @@ class Correlators(object):
             tmp.matrix = True
         return tmp
 
-    def save(self, filename, asascii=False):
+    @classmethod
+    def read_sym_and_boot(cls, filename, nsamples, column=(1,), matrix=True,
+            skip=1, chunksize=100, debug=0, upper=False, packed=False,
+            stream=None):
+        """Reads ascii data in chunks, symmetrizes and bootstraps it.
+
+        Gives the same result as reading the data with the constructor
+        and calling sym_and_boot, but only chunksize configurations are
+        kept in memory at a time.
+
+        Parameters
+        ----------
+        filename : str or sequence of str
+            The filename of the file.
+        nsamples : int
+            The number of bootstrap samples to be calculated.
+        column : sequence, optional
+            The columns that are read.
+        matrix : bool, optional
+            Read data as matrix or not
+        skip : int, optional
+            The number of header lines that are skipped.
+        chunksize : int, optional
+            The number of configurations read at once.
+        debug : int, optional
+            The amount of debug information printed.
+        upper : bool, optional
+            The files of a matrix only contain the upper triangle.
+        packed : bool, optional
+            Bootstrap and keep a matrix in packed symmetric form.
+        stream : rng.Stream, optional
+            The random numbers of the resampling, see
+            bootstrap.bootstrap_counts.
+        """
+        if skip < 1:
+            raise ValueError("File is assumed to have info in first line")
+        nconf, chunks = in_out.read_chunks(filename, column, skip, chunksize,
+            matrix, debug, upper, packed)
+        tmp = cls(skip=skip, debug=debug)
+        with instrument.span("correlators.sym_and_boot"):
+            tmp.data = boot.sym_and_boot_stream(chunks, nconf, nsamples,
+                stream=stream)
+        tmp.shape = tmp.data.shape
+        tmp.matrix = isinstance(filename, (list, tuple)) and matrix
+        tmp.packed = tmp.matrix and packed
+        return tmp
+
+    def save(self, filename, asascii=False, compact=False):
         """Saves the data to disk.
         
         The data can be saved in numpy format or plain ascii.
@@ -119,31 +183,58 @@ class Correlators(object):
             The name of the file to write to.
         asascii : bool, optional
             Toggle numpy format or ascii.
+        compact : bool, optional
+            Store the bootstrap samples in single precision, see
+            in_out.write_data.
         """
         verbose = (self.debug > 0) and True or False
         if asascii:
             in_out.write_data_ascii(self.data, filename, verbose)
         else:
-            in_out.write_data(self.data, filename, verbose)
+            in_out.write_data(self.data, filename, verbose, compact)
+
+    def expand(self):
+        """Expand a matrix stored in packed symmetric form.
+
+        The symmetric matrix is stored as its upper triangle along the
+        last axis, which halves the memory and the work for reading and
+        bootstrapping. Functions needing the full matrix expand it.
+        """
+        if self.packed:
+            self.data = in_out.unpack_sym(self.data)
+            self.shape = self.data.shape
+            self.packed = False
 
+    @timed("correlators.symmetrize")
     def symmetrize(self):
         """Symmetrizes the data around the second axis.
         """
         self.data = boot.sym(self.data)
         self.shape = self.data.shape
 
-    def bootstrap(self, nsamples):
+    @timed("correlators.bootstrap")
+    def bootstrap(self, nsamples, cache=None, stream=None):
         """Creates bootstrap samples of the data.
 
         Parameters
         ----------
         nsamples : int
             The number of bootstrap samples to be calculated.
+        cache : ArtifactCache, optional
+            Reuse the samples stored for the same data and parameters.
+        stream : rng.Stream, optional
+            The random numbers of the resampling, see
+            bootstrap.bootstrap_counts.
         """
-        self.data = boot.bootstrap(self.data, nsamples)
+        if cache is None:
+            self.data = boot.bootstrap(self.data, nsamples, stream)
+        else:
+            self.data = cache.reuse("bootstrap", boot.bootstrap, self.data,
+                    nsamples, **_stream_kwargs(stream))
         self.shape = self.data.shape
 
-    def sym_and_boot(self, nsamples):
+    @timed("correlators.sym_and_boot")
+    def sym_and_boot(self, nsamples, cache=None, stream=None):
         """Symmetrizes the data around the second axis and then
         create bootstrap samples of the data
 
@@ -151,10 +242,20 @@ class Correlators(object):
         ----------
         nsamples : int
             The number of bootstrap samples to be calculated.
+        cache : ArtifactCache, optional
+            Reuse the samples stored for the same data and parameters.
+        stream : rng.Stream, optional
+            The random numbers of the resampling, see
+            bootstrap.bootstrap_counts.
         """
-        self.data = boot.sym_and_boot(self.data, nsamples)
+        if cache is None:
+            self.data = boot.sym_and_boot(self.data, nsamples, stream)
+        else:
+            self.data = cache.reuse("sym_and_boot", boot.sym_and_boot,
+                    self.data, nsamples, **_stream_kwargs(stream))
         self.shape = self.data.shape
 
+    @timed("correlators.shift")
     def shift(self, dt, mass=None, shift=1, d2=0, L=24, irrep="A1",
             uselattice=True):
         """Shift and weight the data.
@@ -187,6 +288,7 @@ class Correlators(object):
         # if the data is not a matrix, do nothing
         if not self.matrix:
             return
+        self.expand()
 
         # calculate the dE for weighting if needed
         if mass is None:
@@ -219,7 +321,8 @@ class Correlators(object):
             self.data = gevp.gevp_shift_2(self.data, dt, dE, self.debug)
         self.shape = self.data.shape
 
-    def gevp(self, t0):
+    @timed("correlators.gevp")
+    def gevp(self, t0, cache=None):
         """Calculate the GEVP of the matrix.
 
         This function only works with matrices.
@@ -228,26 +331,38 @@ class Correlators(object):
         ----------
         t0 : int
             The index of the inverted matrix.
+        cache : ArtifactCache, optional
+            Reuse the eigenvalues stored for the same data and t0.
         """
         if not self.matrix:
             return
+        self.expand()
 
-        self.data = gevp.calculate_gevp(self.data, t0)
+        if cache is None:
+            self.data = gevp.calculate_gevp(self.data, t0)
+        else:
+            self.data = cache.reuse("gevp", gevp.calculate_gevp, self.data, t0)
         self.shape = self.data.shape
         self.matrix = False
 
-    def mass(self, usecosh=True):
+    @timed("correlators.mass")
+    def mass(self, usecosh=True, T=None, usesinh=False):
         """Computes the effective mass.
 
         Two formulas are implemented. The standard formula is based on the
-        cosh function, the alternative is based on the log function.
+        cosh function, the alternative is based on the log function. If T
+        is given, the implicit cosh (or sinh) equation is solved instead.
 
         Parameters
         ----------
         usecosh : bool
             Toggle between the two implemented methods.
+        T : int, optional
+            The time extent of the lattice for the implicit formula.
+        usesinh : bool, optional
+            Use sinh in the implicit formula.
         """
-        self.data = func.compute_eff_mass(self.data, usecosh)
+        self.data = func.compute_eff_mass(self.data, usecosh, T, usesinh)
         self.shape = self.data.shape
 
     def get_data(self):
@@ -260,6 +375,7 @@ class Correlators(object):
         """
         return np.copy(self.data)
 
+    @timed("correlators.ratio")
     def ratio(self, single_corr, ratio=0, shift=1, single_corr1=None,
             useall=False, mass=None, d2=0, L=24, irrep="A1"):
         """Calculates the ratio and returns a new Correlator object.
@@ -268,6 +384,7 @@ class Correlators(object):
         * corr/(single_corr^2)
         * corr(t)/(single_corr(t)^2 - single_corr(t+shift)^2)
         * (corr(t)-corr(t+1))/(single_corr(t)^2 - single_corr(t+1)^2)
+        * corr/single_corr - 1
         where shift is an additional parameter.
 
         If single_corr1 is given, single_corr^2 becomes
@@ -320,28 +437,13 @@ class Correlators(object):
         #        2: ratio.simple_ratio_subtract, 3: ratio.ratio}
         ratiofunc = functions.get(ratio)
 
+        # dE is broadcast by the ratio functions, further axes of dE are
+        # aligned with the axes after the time axis
         if single_corr1 is None:
-            if dE is not None and dE.ndim > 1:
-                tmp = np.zeros_like(self.data)
-                # iterate over the axis > 1 of dE
-                item = [[n for n in range(x)] for x in dE.shape[1:]]
-                for it in itertools.product(*item):
-                    # select the correct entries for tmp and dE
-                    s = (Ellipsis,) + it +(slice(None), slice(None))
-                    s1 = (slice(None),) + it
-                    tmp[s] = ratiofunc(self.data, single_corr.data, single_corr.data,
-                        shift, dE[s1], useall, d2, L, irrep)
-                obj = Correlators(debug=self.debug)
-                obj.data = tmp
-
-            else:
-                obj = Correlators(debug=self.debug)
-                obj.data = ratiofunc(self.data, single_corr.data, single_corr.data,
-                    shift, dE, useall, d2, L, irrep)
-        else:
-            obj = Correlators(debug=self.debug)
-            obj.data = ratiofunc(self.data, single_corr.data, single_corr1.data,
-                shift, dE, useall, d2, L, irrep)
+            single_corr1 = single_corr
+        obj = Correlators(debug=self.debug)
+        obj.data = ratiofunc(self.data, single_corr.data, single_corr1.data,
+            shift, dE, useall, d2, L, irrep)
         obj.shape = obj.data.shape
         return obj
 
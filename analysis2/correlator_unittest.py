@@ -72,6 +72,42 @@ class CorBase_Test(unittest.TestCase):
         self.assertEqual(self.mat[:,:,:2].shape, corr.shape)
         self.assertTrue(np.allclose(self.mat[:,:,:2], corr.data))
 
+    def test_read_sym_and_boot(self):
+        fname = "./test_data/corr_test_real.txt"
+        corr = Correlators(fname)
+        corr.sym_and_boot(10)
+        for size in (1, 3, 1000):
+            corr1 = Correlators.read_sym_and_boot(fname, 10, chunksize=size)
+            self.assertEqual(corr.shape, corr1.shape)
+            self.assertFalse(corr1.matrix)
+            self.assertTrue(np.allclose(corr.data, corr1.data))
+
+    def test_read_sym_and_boot_matrix(self):
+        fnames = ["./test_data/corr_test_mat_short_%d%d.txt" % (s,t) \
+            for s in range(3) for t in range(3)]
+        corr = Correlators(fnames)
+        corr.sym_and_boot(10)
+        corr1 = Correlators.read_sym_and_boot(fnames, 10, chunksize=2)
+        self.assertEqual(corr.shape, corr1.shape)
+        self.assertTrue(corr1.matrix)
+        self.assertTrue(np.allclose(corr.data, corr1.data))
+
+    def test_packed_matrix(self):
+        fnames = ["./test_data/corr_test_mat_short_%d%d.txt" % (s,t) \
+            for s in range(3) for t in range(3)]
+        corr = Correlators(fnames)
+        corr.sym_and_boot(10)
+        corr1 = Correlators(fnames, packed=True)
+        self.assertTrue(corr1.packed)
+        corr1.sym_and_boot(10)
+        self.assertEqual(corr1.shape, corr.shape[:-2] + (6,))
+        corr2 = Correlators.read_sym_and_boot(fnames, 10, chunksize=2,
+            packed=True)
+        self.assertTrue(np.allclose(corr1.data, corr2.data))
+        corr1.expand()
+        self.assertFalse(corr1.packed)
+        self.assertTrue(np.allclose(corr.data, corr1.data))
+
 # Testing the data handling with one correlation function
 class CorrFunc_Test(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,192 @@
+"""
+Driver running the analysis of several ensembles in parallel.
+
+Every ensemble is described by an input file for LatticeEnsemble.parse.
+The analysis of one ensemble is a function taking the LatticeEnsemble
+and returning a dictionary of results for the summary table. The
+ensembles are distributed over a pool of processes, the output of each
+ensemble goes to its own log file. The zeta function values are shared
+between the processes and the momentum tables are loaded once before
+the processes are started.
+
+Usage: python driver.py [-j N] [--logdir DIR] module:function ini [ini ...]
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import traceback
+import multiprocessing as mp
+
+from ensemble import LatticeEnsemble
+import zeta_wrapper
+from zeta.momentum_shells import get_shells
+
+def _init_worker(cache):
+    """Initializer of the pool processes."""
+    zeta_wrapper.set_shared_cache(cache)
+
+def _run_one(args):
+    """Run the pipeline on one ensemble, with the output in a log file.
+
+    Returns
+    -------
+    tuple
+        The input file, the name of the ensemble, the status, the run
+        time and either the summary or the error message.
+    """
+    pipeline, inifile, logdir = args
+    start = time.time()
+    logname = os.path.join(logdir, "%s.log" %
+        os.path.splitext(os.path.basename(inifile))[0])
+    name = inifile
+    stdout, stderr = sys.stdout, sys.stderr
+    with open(logname, "w") as log:
+        sys.stdout, sys.stderr = log, log
+        try:
+            ens = LatticeEnsemble.parse(inifile)
+            name = ens.name()
+            res = pipeline(ens)
+            if res is None:
+                res = {}
+            status = "ok"
+        except Exception:
+            res = traceback.format_exc()
+            log.write(res)
+            status = "failed"
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+    return inifile, name, status, time.time() - start, res
+
+def load_pipeline(spec):
+    """Import the pipeline given as 'module:function'.
+
+    Parameters
+    ----------
+    spec : str
+        The module and the function name separated by a colon.
+
+    Returns
+    -------
+    callable
+        The pipeline function.
+    """
+    try:
+        modname, funcname = spec.split(":")
+    except ValueError:
+        raise ValueError("pipeline must be given as module:function")
+    return getattr(importlib.import_module(modname), funcname)
+
+def run_ensembles(inifiles, pipeline, processes=None, logdir="./logs",
+        share_zeta=True):
+    """Run the pipeline for every ensemble in a process pool.
+
+    Parameters
+    ----------
+    inifiles : sequence of str
+        The input files of the ensembles.
+    pipeline : callable
+        Function taking a LatticeEnsemble and returning a dict of
+        results or None. It must be importable by the pool processes.
+    processes : int, optional
+        The number of processes, defaults to the number of cores.
+    logdir : str, optional
+        The directory for the log files.
+    share_zeta : bool, optional
+        Share the zeta function values between the processes.
+
+    Returns
+    -------
+    list of tuples
+        For every ensemble the input file, the name, the status, the run
+        time and the summary dict or the error message, in the order of
+        inifiles.
+    """
+    if not os.path.isdir(logdir):
+        os.makedirs(logdir)
+    if processes is None:
+        processes = mp.cpu_count()
+    processes = max(1, min(processes, len(inifiles)))
+    # load the momentum table before forking, so the processes share it
+    get_shells()
+    manager = None
+    cache = None
+    if share_zeta and processes > 1:
+        manager = mp.Manager()
+        cache = manager.dict()
+    elif share_zeta:
+        cache = {}
+    jobs = [(pipeline, f, logdir) for f in inifiles]
+    try:
+        if processes == 1:
+            _init_worker(cache)
+            results = [_run_one(j) for j in jobs]
+        else:
+            pool = mp.Pool(processes, _init_worker, (cache,))
+            try:
+                results = pool.map(_run_one, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        zeta_wrapper.set_shared_cache(None)
+        if manager is not None:
+            manager.shutdown()
+    return results
+
+def summary_table(results):
+    """Format the results of run_ensembles as a table.
+
+    Parameters
+    ----------
+    results : list of tuples
+        The return value of run_ensembles.
+
+    Returns
+    -------
+    str
+        The table.
+    """
+    keys = []
+    for r in results:
+        if r[2] == "ok":
+            for k in sorted(r[4]):
+                if k not in keys:
+                    keys.append(k)
+    head = "%-20s %-8s %10s" % ("ensemble", "status", "time [s]")
+    head += "".join(" %15s" % k for k in keys)
+    lines = [head]
+    for inifile, name, status, runtime, res in results:
+        line = "%-20s %-8s %10.1f" % (name, status, runtime)
+        for k in keys:
+            val = res.get(k, "") if status == "ok" else ""
+            if isinstance(val, float):
+                line += " %15.6g" % val
+            else:
+                line += " %15s" % str(val)
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="analyse ensembles in parallel")
+    parser.add_argument("pipeline", help="analysis function as module:function")
+    parser.add_argument("inifiles", nargs="+", help="ensemble input files")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+        help="number of processes, default all cores")
+    parser.add_argument("--logdir", default="./logs")
+    parser.add_argument("--no-shared-zeta", action="store_true",
+        help="do not share zeta function values between processes")
+    args = parser.parse_args(argv)
+
+    pipeline = load_pipeline(args.pipeline)
+    results = run_ensembles(args.inifiles, pipeline, args.processes,
+        args.logdir, not args.no_shared_zeta)
+    print(summary_table(results))
+    return 0 if all(r[2] == "ok" for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Unit tests for the multi-ensemble driver.
+"""
+
+from __future__ import with_statement
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import driver
+import zeta_wrapper
+
+def _pipeline(ens):
+    print("analysing %s" % ens.name())
+    if ens.get_data("fail"):
+        raise RuntimeError("failing on purpose")
+    z = zeta_wrapper.Z(0.1, 1.).real
+    return {"L": ens.L(), "zeta": float(z)}
+
+class Driver_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.logdir = os.path.join(self.path, "logs")
+        self.files = []
+        for name, L, fail in (("A40.24", 24, False), ("A40.32", 32, False),
+                ("B55.32", 32, True)):
+            fname = os.path.join(self.path, "%s.ini" % name)
+            with open(fname, "w") as f:
+                f.write("[main]\nname = %s\nT = %d\nL = %d\nreadold = no\n"
+                    "[bools]\nfail = %s\n" % (name, 2*L, L, fail))
+            self.files.append(fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def check(self, results):
+        self.assertEqual([r[1] for r in results], ["A40.24", "A40.32",
+            "B55.32"])
+        self.assertEqual([r[2] for r in results], ["ok", "ok", "failed"])
+        self.assertEqual(results[0][4]["L"], 24)
+        self.assertTrue(np.isclose(results[0][4]["zeta"], results[1][4]["zeta"]))
+        self.assertIn("failing on purpose", results[2][4])
+        with open(os.path.join(self.logdir, "A40.24.log")) as f:
+            self.assertIn("analysing A40.24", f.read())
+        table = driver.summary_table(results)
+        self.assertEqual(len(table.split("\n")), 4)
+
+    def test_serial(self):
+        self.check(driver.run_ensembles(self.files, _pipeline, 1, self.logdir))
+
+    def test_parallel(self):
+        self.check(driver.run_ensembles(self.files, _pipeline, 2, self.logdir))
+        self.assertIsNone(zeta_wrapper._shared_cache)
+
+    def test_load_pipeline(self):
+        # run as a script this module is __main__, compare by name
+        func = driver.load_pipeline("driver_unittest:_pipeline")
+        self.assertEqual((func.__module__, func.__name__),
+            ("driver_unittest", "_pipeline"))
+        self.assertRaises(ValueError, driver.load_pipeline, "driver_unittest")
+
+class SharedCache_Test(unittest.TestCase):
+    def tearDown(self):
+        zeta_wrapper.set_shared_cache(None)
+
+    def test_shared_cache(self):
+        cache = {}
+        zeta_wrapper.set_shared_cache(cache)
+        z1 = zeta_wrapper.Z(0.1, 1.)
+        self.assertEqual(len(cache), 1)
+        z2 = zeta_wrapper.Z(np.asarray([0.1, 0.2]), np.ones(2))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(z1, z2[0])
+
+if __name__ == "__main__":
+    unittest.main()
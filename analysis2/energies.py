@@ -5,6 +5,7 @@ Funtions for energy and momentum calculations.
 import numpy as np
 
 from memoize import memoize
+import kinematics
 
 @memoize(50)
 def WfromE(E, d=np.array([0., 0., 0.]), L=24):
@@ -150,8 +151,7 @@ def calc_gamma(q2, m, d=np.array([0., 0., 1.]), L=24):
     float or ndarray
         The Lorentz boost factor.
     """
-    E = EfromMpi(m, np.sqrt(q2), L)
-    return WfromE(E, d, L) / E
+    return kinematics.gamma(q2, m, d, L)
 
 def calc_Ecm(E, d=np.array([0., 0., 1.]), L=24, lattice=False):
     """Calculates the center of mass energy and the boost factor.
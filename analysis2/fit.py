@@ -2,22 +2,24 @@
 The class for fitting.
 """
 
-import time
 import itertools
 import numpy as np
 
 from fit_routines import (fit_comb, fit_single, calculate_ranges, compute_dE,
-    get_start_values, get_start_values_comb, fitting)
+    get_start_values, get_start_values_comb, fitting, fitting_paired)
 from in_out import read_fitresults, write_fitresults
-from interpol import match_lin, evaluate_lin
+from cache import cached
+import instrument
+from interpol import match_poly, evaluate_poly
 from functions import (func_single_corr, func_ratio, func_const, func_two_corr,
     func_single_corr2, func_sinh, compute_eff_mass)
-from statistics import (compute_error, sys_error, sys_error_der, draw_weighted,
-    freq_count, draw_gauss_distributed)
-from energies import calc_q2, calc_Ecm
+from statistics import (compute_error, sys_error, sys_error_der,
+    draw_weighted_indices, draw_gauss_distributed)
+import kinematics
 from zeta_wrapper import Z
 from scattering_length import calculate_scat_len
-from phaseshift_functions import compute_phaseshift
+from phaseshift_functions import compute_phaseshift, phaseshift_tables
+from fit_table import FitTable
 
 class LatticeFit(object):
     def __init__(self, fitfunc, dt_i=2, dt_f=2, dt=4, xshift=0.,
@@ -62,8 +64,10 @@ class LatticeFit(object):
         self.dt_f = dt_f
         self.correlated = correlated
 
+    @cached("fit")
     def fit(self, start, corr, ranges, corrid="", add=None, oldfit=None,
-            oldfitpar=None, useall=False, lint=False):
+            oldfitpar=None, useall=False, lint=False, batched=False,
+            previous=None, queue=None, chunksize=10):
         """Fits fitfunc to a Correlators object.
 
         The predefined functions describe a single particle correlation
@@ -95,6 +99,22 @@ class LatticeFit(object):
             use just the lowest.
         median : bool
             Adjusts fit ranges of fitresult if median is used
+        batched : bool, optional
+            For combined fits, fit all fit ranges of oldfit together, see
+            fit_routines.fitting_batched.
+        previous : FitResult, optional
+            A fit of the same data with the same fit function, e.g. with
+            other ranges or step sizes. The results of all fit ranges
+            contained in previous are copied, only the other fit ranges
+            are fitted, see FitResult.reuse. For combined fits previous
+            has to use the same oldfit.
+        queue : WorkQueue, optional
+            Distribute the fit ranges over the workers of the queue, see
+            workqueue.WorkQueue. The fit function has to be picklable.
+        chunksize : int, optional
+            The number of fit ranges per job of the queue.
+        cache : ArtifactCache, optional
+            Reuse a stored fit with the same data and parameters.
 
         Returns
         -------
@@ -130,13 +150,14 @@ class LatticeFit(object):
             if start is None:
                 # set starting values
                 start = get_start_values(ncorr, franges, corr.data, self.npar)
-            print self.correlated
+            todo = None if previous is None else fitres.reuse(previous)
 
             # do the fitting
-            for res in fit_single(self.fitfunc, start, corr, franges,
-                    add=add, debug=self.debug, correlated=self.correlated,
-                    xshift=self.xshift, npar=self.npar):
-                fitres.add_data(*res)
+            task = (fit_single, (self.fitfunc, start, corr, franges),
+                dict(add=add, debug=self.debug, correlated=self.correlated,
+                    xshift=self.xshift, npar=self.npar))
+            with instrument.span("fit.single"):
+                _run_fits(fitres, task, todo, queue, chunksize)
         else:
             # handle the fitranges
             dshape = corr.shape
@@ -164,6 +185,7 @@ class LatticeFit(object):
             # prepare storage
             fitres = FitResult(corrid)
             fitres.set_ranges(franges, fshape)
+            fitres.old_fit_ranges = (oldfit.old_fit_ranges or []) + [oldranges]
             fitres.create_empty(shapes_data, shapes_other, ncorr)
             del shapes_data, shapes_other
 
@@ -171,16 +193,25 @@ class LatticeFit(object):
                 #print("ncorr")
                 #print(ncorr)
                 start = get_start_values_comb(ncorr, franges, corr.data, self.npar)
+            todo = None if previous is None else fitres.reuse(previous)
             # do the fitting
-            for res in fit_comb(self.fitfunc, start, corr, franges, fshape,
-                    oldfit, add, oldfitpar, useall, self.debug, self.xshift,
-                    self.correlated):
-                fitres.add_data(*res)
+            task = (fit_comb, (self.fitfunc, start, corr, franges, fshape,
+                oldfit, add, oldfitpar, useall, self.debug, self.xshift,
+                self.correlated), dict(batched=batched))
+            with instrument.span("fit.comb"):
+                _run_fits(fitres, task, todo, queue, chunksize)
 
         return fitres
 
-    def chiral_fit(self, X, Y, corrid="", start=None, xcut=None, debug=0):
+    def chiral_fit(self, X, Y, corrid="", start=None, xcut=None, paired=False,
+            debug=0):
         """Fit function to data.
+
+        By default every bootstrap sample of X is fitted against all
+        samples of Y, which is quadratic in the number of samples and
+        therefore limited to the first 100 samples of X. With paired
+        the samples of X and Y are fitted one-to-one, see
+        fitting_paired, and all samples are used.
         
         Parameters
         ----------
@@ -194,6 +225,8 @@ class LatticeFit(object):
         xcut : float
             A maximal value for the X values. Everything above will not
             be used in the fit.
+        paired : bool
+            Fit the samples of X and Y one-to-one.
         debug : int
             The amount of information printed to screen.
         """
@@ -202,7 +235,7 @@ class LatticeFit(object):
             _start = [3.0]
         # make sure start is a tuple, list, or ndarray for leastsq to work
         elif not isinstance(start, (np.ndarray, tuple, list)):
-            _start = list(start)
+            _start = [start]
         else:
             _start = start
         # implement a cut on the data if given
@@ -214,6 +247,18 @@ class LatticeFit(object):
             _X = X.T
             _Y = Y.T
 
+        if paired:
+            fitres = FitResult("chiral_fit")
+            shape1 = (_X.shape[0], len(_start), 1)
+            shape2 = (_X.shape[0], 1)
+            fitres.create_empty(shape1, shape2, 1)
+            with instrument.span("fit.chiral"):
+                res, chi2, pval = fitting_paired(self.fitfunc, _X, _Y, _start,
+                    self.correlated, debug=debug)
+                instrument.count("fit.chiral.samples", _X.shape[0])
+            fitres.add_data((0,0), res, chi2, pval)
+            return fitres
+
         # create FitResults
         fitres = FitResult("chiral_fit")
         shape1 = (_X.shape[0], 1, _X.shape[0])
@@ -222,19 +267,84 @@ class LatticeFit(object):
         # fit the data
         dof = _X.shape[1] - len(_start)
         # fit every bootstrap sample
-        timing = []
-        for i, x in enumerate(_X[:100]):
-            timing.append(time.clock())
-            tmpres, tmpchi2, tmppval = fitting(self.fitfunc, x, _Y, _start, debug=debug)
-            fitres.add_data((0,i), tmpres, tmpchi2, tmppval)
-            #if i % 100:
-            #    print("%d of %d finished" % (i+1, _X.shape[0]))
-        t1 = np.asarray(timing)
-        print("total fit time %fs" % (t1[-1] - t1[0]))
-        t2 = t1[1:] - t1[:-1]
-        print("time per fit %f +- %fs" % (np.mean(t2), np.std(t2)))
+        with instrument.span("fit.chiral"):
+            for i, x in enumerate(_X[:100]):
+                tmpres, tmpchi2, tmppval = fitting(self.fitfunc, x, _Y, _start, debug=debug)
+                fitres.add_data((0,i), tmpres, tmpchi2, tmppval)
+                instrument.count("fit.chiral.samples")
+                #if i % 100:
+                #    print("%d of %d finished" % (i+1, _X.shape[0]))
         return fitres
 
+def _fits(task, todo):
+    """Runs the fit routine of a task for the fit ranges in todo."""
+    func, args, kwargs = task
+    return func(*args, todo=todo, **kwargs)
+
+def _fit_job(task, todo):
+    """Job of a WorkQueue, the results of _fits as list."""
+    return list(_fits(task, todo))
+
+def _split_todo(fitres, todo, chunksize):
+    """Splits the fit ranges to do into chunks of at most chunksize.
+
+    Every chunk contains fit ranges of one correlator (combination) and
+    is a complete todo dictionary, see FitResult.reuse.
+    """
+    items = [tuple(np.atleast_1d(lab)) for lab in fitres.label]
+    chunks = []
+    for item in items:
+        if todo is None:
+            indices = range(len(fitres.fit_ranges[item[-1]]))
+        else:
+            indices = list(todo.get(item, []))
+        for lo in range(0, len(indices), chunksize):
+            chunk = dict((i, []) for i in items)
+            chunk[item] = indices[lo:lo+chunksize]
+            chunks.append(chunk)
+    return chunks
+
+def _run_fits(fitres, task, todo=None, queue=None, chunksize=10):
+    """Runs the fits of a task and stores the results in fitres.
+
+    Parameters
+    ----------
+    fitres : FitResult
+        The storage for the results.
+    task : tuple
+        The fit routine, its positional and its keyword arguments.
+    todo : dict, optional
+        The fit ranges to fit, see FitResult.reuse, all if None.
+    queue : WorkQueue, optional
+        Distribute the fit ranges in chunks of chunksize over the workers
+        of the queue.
+    chunksize : int, optional
+        The number of fit ranges per job.
+    """
+    if queue is None:
+        results = _fits(task, todo)
+    else:
+        shared = queue.share(task)
+        chunks = _split_todo(fitres, todo, chunksize)
+        results = itertools.chain.from_iterable(queue.map(_fit_job,
+            [(shared, c) for c in chunks], shared=[shared]))
+    for res in results:
+        fitres.add_data(*res)
+        instrument.count("fit.ranges")
+
+def _same_ranges(a, b):
+    """Compare nested fit ranges, lists and arrays are equivalent."""
+    if a is None or b is None:
+        return a is None and b is None
+    try:
+        a, b = np.asarray(a, dtype=int), np.asarray(b, dtype=int)
+        return a.shape == b.shape and np.array_equal(a, b)
+    except (ValueError, TypeError):
+        pass
+    if len(a) != len(b):
+        return False
+    return all(_same_ranges(x, y) for x, y in zip(a, b))
+
 class FitResult(object):
     """Class to hold the results of a fit.
 
@@ -268,9 +378,12 @@ class FitResult(object):
         self.corr_num = None
         self.fit_ranges = None
         self.fit_ranges_shape = None
+        # the fit ranges of the old fits of a combined fit, outermost first
+        self.old_fit_ranges = None
         self.derived = derived
         self.error = None
         self.weight = None
+        self.tables = {}
 
     @classmethod
     def read(cls, filename):
@@ -285,23 +398,29 @@ class FitResult(object):
         obj.label = tmp[5]
         obj.corr_num = tmp[0][1]
         obj.fit_ranges_shape = tmp[0][2]
+        if len(tmp[0]) > 4:
+            obj.old_fit_ranges = tmp[0][4]
         return obj
 
-    def save(self, filename):
+    def save(self, filename, compact=False):
         """Save data to disk.
 
         Parameters
         ----------
         filename : str
             The name of the file.
+        compact : bool, optional
+            Store the bootstrap samples in single precision and compress
+            chi^2 and p-values, see in_out.write_fitresults.
         """
-        tmp = np.empty((4,), dtype=object)
+        tmp = np.empty((5,), dtype=object)
         tmp[0] = self.corr_id
         tmp[1] = self.corr_num
         tmp[2] = self.fit_ranges_shape
         tmp[3] = self.derived
+        tmp[4] = self.old_fit_ranges
         write_fitresults(filename, tmp, self.fit_ranges, self.data, self.chi2,
-            self.pval, self.label, False)
+            self.pval, self.label, False, compact)
 
     def get_data(self, index):
         """Returns the data at the index.
@@ -348,16 +467,11 @@ class FitResult(object):
         """
         # Create an empty correlator object for easier plotting
         fitres_cut = FitResult('delta E', derived = False)
-        # get fitranges from ratiofit
-        range_r, r_r_shape = self.get_ranges()
         # get indices for fitranges of interval
-        ranges=[]
-        for s,i in enumerate(range_r[0]):
-          if i[0] >= t_min and i[1] <= t_max:
-            if i[1]-i[0] >= min_dat:
-              ranges.append(s)
-            else:
-              continue
+        table = self.table(par)
+        rows = table.where(corr=0, lo=(t_min, None), up=(None, t_max),
+            length=(min_dat+1, None))
+        ranges = np.unique(table["range"][rows])
 
         # shape for 1 Correlator, data and pvalues
         shape_dE = (self.data[0].shape[0], self.data[0].shape[1], len(ranges))
@@ -407,10 +521,12 @@ class FitResult(object):
         if self.data is None:
             raise RuntimeError("No place to store data, call create_empty first")
         print(data.shape)
+        self.tables = {}
         if isinstance(self.corr_num, int):
             if len(index) != 2:
                 raise ValueError("Index has wrong length")
             lindex = self._get_index(index[0])
+            self._writable(lindex)
             if self.derived:
                 self.data[lindex][:, index[1]] = data
             else:
@@ -421,6 +537,7 @@ class FitResult(object):
             if len(index) != 2*len(self.corr_num):
                 raise ValueError("Index has wrong length")
             lindex = self._get_index(index[:len(self.corr_num)])
+            self._writable(lindex)
             if self.derived:
                 rindex = [slice(None)] + [x for x in index[len(self.corr_num):]]
             else:
@@ -430,6 +547,86 @@ class FitResult(object):
             self.chi2[lindex][rindex] = chi2
             self.pval[lindex][rindex] = pval
 
+    def _writable(self, lindex):
+        """Copy read-only chi^2 and p-values of a correlator before writing.
+
+        Derived results may share one weight per fit range over all
+        samples, see apply.
+        """
+        for arrays in (self.data, self.chi2, self.pval):
+            if not arrays[lindex].flags.writeable:
+                arrays[lindex] = np.array(arrays[lindex], copy=True)
+
+    def reuse(self, previous):
+        """Copy the results of a previous fit for matching fit ranges.
+
+        For every correlator (combination) the fit ranges of previous are
+        indexed by their first and last time slice, the results of all
+        fit ranges found in the index are copied at once. The other axes
+        of the data, the samples, parameters and fit ranges of an old fit
+        in a combined fit, have to agree, otherwise nothing is copied for
+        this correlator. The fit ranges of the old fits are matched by
+        position, so previous has to have the same identifier and, for
+        combined fits, the same fit ranges of all old fits.
+
+        Parameters
+        ----------
+        previous : FitResult
+            The previous fit of the same data.
+
+        Returns
+        -------
+        dict
+            The indices of the fit ranges not found in previous for every
+            correlator (combination), as tuple.
+
+        Raises
+        ------
+        RuntimeError
+            If the fit ranges are not set.
+        ValueError
+            If previous has a different identifier or different old fits.
+        """
+        if self.fit_ranges is None or previous.fit_ranges is None:
+            raise RuntimeError("fit ranges not set")
+        if previous.corr_id != self.corr_id:
+            raise ValueError("previous fit of %s, not of %s" % (
+                previous.corr_id, self.corr_id))
+        if not _same_ranges(self.old_fit_ranges, previous.old_fit_ranges):
+            raise ValueError("previous fit uses different old fits")
+        todo = {}
+        for lindex, lab in enumerate(self.label):
+            item = tuple(np.atleast_1d(lab))
+            n = item[-1]
+            franges = self.fit_ranges[n]
+            todo[item] = range(len(franges))
+            try:
+                plindex = previous._get_index(item)
+            except (ValueError, RuntimeError):
+                continue
+            data, pdata = self.data[lindex], previous.data[plindex]
+            if data.shape[:-1] != pdata.shape[:-1]:
+                continue
+            index = dict(((int(r[0]), int(r[1])), m) for m, r in
+                enumerate(previous.fit_ranges[n]))
+            new, old = [], []
+            for m, r in enumerate(franges):
+                k = index.get((int(r[0]), int(r[1])))
+                if k is not None:
+                    new.append(m)
+                    old.append(k)
+            if not new:
+                continue
+            self._writable(lindex)
+            self.tables = {}
+            data[...,new] = pdata[...,old]
+            self.chi2[lindex][...,new] = previous.chi2[plindex][...,old]
+            self.pval[lindex][...,new] = previous.pval[plindex][...,old]
+            found = set(new)
+            todo[item] = [m for m in range(len(franges)) if m not in found]
+            instrument.count("fit.reused", len(new))
+        return todo
+
     def _get_index(self, index):
         """Linearize index.
 
@@ -643,75 +840,65 @@ class FitResult(object):
                     rsys[i][1]))
         print("------------------------------\n\n")
 
+    def table(self, par=0, rel=False, new=False):
+        """The summary table of all fits.
+
+        The table is calculated once and kept until the data is changed
+        with add_data, reuse or the finite size corrections, see
+        fit_table.FitTable. After writing to the data directly use new.
+
+        Parameters
+        ----------
+        par : int, optional
+            The parameter used for the weights.
+        rel : bool, optional
+            Use the relative error for the weights.
+        new : bool, optional
+            Recalculate the table, e.g. after changing the data.
+
+        Returns
+        -------
+        FitTable
+            The table.
+        """
+        key = (par, rel)
+        if new or key not in self.tables:
+            self.tables[key] = FitTable.from_fitresult(self, par, rel)
+        return self.tables[key]
+
     def print_details(self):
         """Prints details for every fit."""
+        table = self.table()
         print("------------------------------")
         print("details for %s" % self.corr_id)
-        if self.derived:
-            # iterate over the correlators
-            for i, lab in enumerate(self.label):
-                print("correlator %s" % (str(lab)))
-                if self.data[i].ndim < 3:
-                    for j in range(self.data[i].shape[-1]):
-                        # create a string containing the fit parameters
-                        tmpstring = " ".join(("%2d:" % (j),
-                                              "weight %e" % (self.pval[i][0,j]),
-                                              "par: %e" % (self.data[i][0,j])))
-                        print(tmpstring)
+        # iterate over the correlators
+        for i, lab in enumerate(self.label):
+            print("correlator %s" % (str(lab)))
+            for row in table.sort("range", table.where(corr=i)):
+                j = table["range"][row]
+                old = table.index(row)[:-1]
+                if self.derived:
+                    items = ["%2d:" % (j)]
                 else:
-                    for j in range(self.data[i].shape[-1]):
-                        # iterate over additional fit intervals
-                        nintervals = self.data[i].shape[1:-1]
-                        ninteriter = [[x for x in range(n)] for n in nintervals]
-                        for item in itertools.product(*ninteriter):
-                            # create a string containing the fit parameters
-                            select = (slice(None),) + item + (j,)
-                            tmpstring = " ".join(("%2d:" % (j),
-                                                  "add ranges %s" % str(item),
-                                                  "weight %e" % (self.pval[i][select][0]),
-                                                  "par: %e +- %e" % (self.data[i][select][0], np.std(self.data[i][select]))))
-                            print(tmpstring)
-        else:
-            # iterate over the correlators
-            for i, lab in enumerate(self.label):
-                print("correlator %s" % (str(lab)))
-                if self.data[i].ndim < 4:
-                    for j, r in enumerate(self.fit_ranges[i]):
-                        # create a string containing the fit parameters
-                        tmppar = ["par:"]
-                        for p in range(self.data[i].shape[1]):
-                          tmppar.append("%e +- %e" % (self.data[i][0,p,j], np.std(self.data[i][:,p,j])))
-                        tmppar = " ".join(tmppar)
-                        tmpstring = " ".join(("%d: range %2d:%2d" % (j, r[0],r[1]),
-                                              "chi^2 %e" % (self.chi2[i][0,j]),
-                                              "pval %5f" % (self.pval[i][0,j]),
-                                              tmppar))
-                        print(tmpstring)
+                    items = ["%d: range %2d:%2d" % (j, table["lo"][row],
+                        table["up"][row])]
+                if old:
+                    items.append("add ranges %s" % str(old))
+                if self.derived:
+                    items.append("weight %e" % (table["weight"][row]))
                 else:
-                    for j, r in enumerate(self.fit_ranges[i]):
-                        # iterate over additional fit intervals
-                        nintervals = self.data[i].shape[2:-1]
-                        ninteriter = [[x for x in range(n)] for n in nintervals]
-                        for item in itertools.product(*ninteriter):
-                            # create a string containing the fit parameters
-                            tmppar = ["par:"]
-                            for p in range(self.data[i].shape[1]):
-                                select = (slice(None), p) + item + (j,)
-                                tmppar.append("%e" % (self.data[i][select])[0])
-                            select = (slice(None),) + item + (j,)
-                            tmppar = " ".join(tmppar)
-                            select = (0,) + item + (j,)
-                            tmpstring = " ".join(("%d: range %2d:%2d" % (j, r[0],r[1]),
-                                                  "add ranges %s" % str(item),
-                                                  "chi^2 %e" % (self.chi2[i][select]),
-                                                  "pval %5f" % (self.pval[i][select]),
-                                                  tmppar))
-                            print(tmpstring)
+                    items.append("chi^2 %e" % (table["chi2"][row]))
+                    items.append("pval %5f" % (table["pval"][row]))
+                items.append("par:")
+                for v, e in zip(table["value"][row], table["error"][row]):
+                    items.append("%e +- %e" % (v, e))
+                print(" ".join(items))
 
     def data_for_plot(self, par=0, new=False):
         """Prints the errors etc of the data."""
         if new is True:
           self.error=None
+          self.tables = {}
         self.calc_error()
 
         if self.derived:
@@ -723,8 +910,9 @@ class FitResult(object):
                 rsys[i][1]))
         return res
 
+    @cached("cot_delta")
     def calc_cot_delta(self, Ecm, L=24, isdependend=True,
-            d2=0, irrep="A1"):
+            d2=0, irrep="A1", queue=None, chunksize=10, tables=False):
         """Calculate the cotangent of the scattering phase.
 
         Parameters
@@ -735,6 +923,14 @@ class FitResult(object):
             The parameter of the mass fit to tuse.
         L : int, optional
             The spatial extend of the lattice.
+        queue : WorkQueue, optional
+            Distribute the zeta function evaluations over the workers of
+            the queue, see workqueue.WorkQueue.
+        chunksize : int, optional
+            The number of fit ranges per job of the queue.
+        tables : bool, optional
+            Interpolate the zeta functions in tables covering the data,
+            see phaseshift_functions.phaseshift_tables.
         """
         # we need the weight
         self.calc_error()
@@ -747,12 +943,18 @@ class FitResult(object):
         cotdelta = FitResult("cotdelta", True)
         cotdelta.create_empty(newshape, newshape, self.corr_num)
         # the Lorentz boost is saved in Ecm.chi2
+        if tables:
+            tables = phaseshift_tables(self.data, Ecm.chi2, d2)
+        else:
+            tables = None
         for res, res1 in compute_phaseshift(self.data, self.weight[0], Ecm.chi2,
-                Ecm.weight[0], L, isdependend, d2, irrep):
+                Ecm.weight[0], L, isdependend, d2, irrep, queue, chunksize,
+                tables):
             cotdelta.add_data(*res)
             delta.add_data(*res1)
         return delta, cotdelta
 
+    @cached("dE")
     def calc_dE(self, mass, parself=0, parmass=0, isdependend=True):
         """Calculate dE from own data and the mass of the particles.
 
@@ -782,6 +984,7 @@ class FitResult(object):
             dE.add_data(*res)
         return dE
 
+    @cached("scattering_length")
     def calc_scattering_length(self, mass, parself=0, parmass=0, L=24,
             isratio=False, isdependend=True):
         """Calculate the scattering length.
@@ -834,6 +1037,7 @@ class FitResult(object):
             scat.add_data(*res)
         return scat
 
+    @cached("to_CM")
     def to_CM(self, par, L=24, d=np.array([0., 0., 1.]), uselattice=True):
         """Transform data to center of mass frame.
 
@@ -854,27 +1058,16 @@ class FitResult(object):
         newshapes = [p.shape for p in self.pval]
         Ecm = FitResult("Ecm", True)
         Ecm.create_empty(newshapes, newshapes, self.corr_num)
-        nsamples = self.data[0].shape[0]
         for i, data in enumerate(self.data):
-            ranges = [[x for x in range(n)] for n in data.shape[2:]]
-            for item in itertools.product(*ranges):
-                select = (slice(None), par) + item
-                gamma, res = calc_Ecm(data[select], d=d, L=L, lattice=uselattice)
-                weight = np.ones(nsamples) * self.weight[par][i][item]
-                if isinstance(self.label[i], np.ndarray):
-                    if self.label[i].ndim == 0:
-                        tmp = (self.label[i].item(),)
-                    else:
-                        tmp = tuple(self.label[i])
-                elif not isinstance(self.label[i]):
-                    tmp = tuple(self.label[i])
-                else:
-                    tmp = self.label[i]
-                #if np.any(res > 4*0.14463):
-                #    print("%s: Ecm over 4*mpi" % str(tmp+item))
-                Ecm.add_data(tmp + item, res, gamma, weight)
+            # all samples and fit ranges at once
+            gamma, res = kinematics.to_cm(data[:,par], d, L, uselattice)
+            lindex = Ecm._get_index(tuple(np.atleast_1d(self.label[i])))
+            Ecm.data[lindex][...] = res
+            Ecm.chi2[lindex][...] = gamma
+            Ecm.pval[lindex][...] = self.weight[par][i]
         return Ecm
 
+    @cached("momentum")
     def calc_momentum(self, mass, parmass, L=24, uselattice=True, isdependend=False):
         """Calculate the lattice momentum of the system.
 
@@ -896,217 +1089,291 @@ class FitResult(object):
         else:
             newshapes = [(d.shape[0],_ma.shape[-1])+tuple(d.shape[1:]) for d in self.data]
             q2.create_empty(newshapes, newshapes, [1, self.corr_num])
-        nsamples = self.data[0].shape[0]
-        needed = np.zeros((nsamples,))
-        if isdependend:
-            for i, data in enumerate(self.data):
-                weight = (_ma_w * self.weight[0][i].T).T
-                for n in range(data.shape[-1]):
-                    res = calc_q2(data[...,n], _ma, L=L, lattice=uselattice)
-                    #print(res.shape)
-                    for m in range(data.shape[-2]):
-                        tmp = weight[m,n] * np.ones((nsamples,))
-                        q2.add_data((0, i, m, n), res[:,m], needed, tmp)
-        else:
-            for i, data in enumerate(self.data):
-                for n in range(data.shape[-1]):
-                    for m in range(_ma.shape[-1]):
-                        res = calc_q2(data[...,n], _ma[...,m], L=L, lattice=uselattice)
-                        weight = np.ones((nsamples,))*_ma_w[...,m]*self.weight[0][i][n]
-                        q2.add_data((0, i, m, n), res, needed, weight)
+        for i, data in enumerate(self.data):
+            weight = self.weight[0][i]
+            if isdependend:
+                # the mass fit ranges are the first fit range axis
+                extra = (1,) * (data.ndim - 2)
+                res = kinematics.q2(data, _ma.reshape(_ma.shape + extra), L,
+                    uselattice)
+                weight = _ma_w.reshape(_ma_w.shape + extra) * weight
+            else:
+                # a new axis for the mass fit ranges
+                extra = (1,) * (data.ndim - 1)
+                res = kinematics.q2(data[:,None], _ma.reshape(_ma.shape + extra),
+                    L, uselattice)
+                weight = _ma_w.reshape(_ma_w.shape + extra) * weight
+            lindex = q2._get_index((0, i))
+            q2.data[lindex][...] = res
+            q2.pval[lindex][...] = weight
         return q2
 
+    def _matching_input(self, amu_s, obs1, obs2, obs3, meth, parobs):
+        """Collect the observables for the quark mass matching."""
+        if isinstance(obs1, (list, tuple)):
+            observables = list(obs1)
+        else:
+            observables = [o for o in (obs1, obs2, obs3) if o is not None]
+        if len(observables) < 2:
+            raise ValueError("Matching not possible, check input of 2nd (and 3rd) observable!")
+        if len(observables) != len(amu_s):
+            raise ValueError("number of quark masses and observables differ")
+        deg = 2 if meth == 2 else 1
+        data, weights = zip(*[self._matching_data(o, parobs)
+            for o in observables])
+        return data, weights, deg
+
+    @staticmethod
+    def _matching_data(obs, parobs):
+        """The data and the weights of the fit ranges of an observable."""
+        data = obs.data[0]
+        # derived results may or may not keep the parameter axis
+        if data.ndim == obs.pval[0].ndim + 1:
+            data = data[:,parobs]
+        return data, obs.pval[0][0]
+
+    def _store_matching(self, res, weight):
+        # the result is a derived quantity with the layout of res
+        self.derived = True
+        self.create_empty(res.shape, res.shape, 1)
+        self.data[0][...] = res
+        self.pval[0][...] = weight
+
     def evaluate_quark_mass(self, amu_s, obs_eval, obs1, obs2=None, obs3=None,
         meth=0, parobs=1):
-      """ evaluate the strange quark mass at obs_match
+      """ evaluate the observables at the strange quark mass obs_eval
+
+      The dependence of the observables on the strange quark mass is
+      interpolated or fitted for all samples and fit ranges at once.
 
       Parameters
       ----------
-      obs1, obs2, obs3: Up to 3 different Observables are supported at the
-          moment (should be easy to extend). Every Observable is a FitResult
-          object
+      amu_s : sequence of floats
+          The strange quark masses of the observables.
+      obs_eval : float, ndarray or FitResult
+          The strange quark mass to evaluate at. A FitResult adds its
+          fit ranges as extra axes to the result.
+      obs1, obs2, obs3: Every Observable is a FitResult object, obs1 can
+          also be a list of arbitrary many FitResults.
 
       meth: How to match: 0: linear interpolation (only two values)
                           1: linear fit
-                          2: quadratic interpolation
+                          2: quadratic interpolation or fit
       parobs : int
                Which parameter of the results should be taken
       """
-      if obs2==None and obs3==None:
-        raise ValueError("Matching not possible, check input of 2nd (and 3rd) observable!")
-      #if obs3==None:
-      # Get the we
-      # Result has the same layout as one of the observables!
-      # TODO: If observables have different layouts break
-      shape1 = obs1.data[0].shape
-      shape2 = obs1.pval[0].shape
-      # prepare shapes
-      layout1 = (shape1[0],shape1[-1])
-      layout2 = [shape2[0],]
-
-      _obs1 = obs1.data[0][:,parobs]
-      _obsweight1 = obs1.pval[0][0]
-      if obs2 is not None:
-        _obs2 = obs2.data[0][:,parobs]
-        _obsweight2 = obs2.pval[0][0]
-      if obs3 is not None:
-        _obs3 = obs3.data[0][:,parobs]
-        _obsweight3 = obs3.pval[0][0]
-      _obs_eval = obs_eval
-      print("observable to evaluate at")
-      print(_obs_eval)
-
-      self.create_empty(layout1, layout1, 1)
-      # Decide method beforehand, cheaper in the end
-
-      if meth == 0:
-        for res in evaluate_lin(_obs1, _obs2, amu_s, _obsweight1,
-            _obsweight2, _obs_eval):
-            self.add_data(*res)
-
-      if meth == 1:
-        for res in evaluate_quad(_obs1, _obs2, _obs3, _obsweight1,
-            _obsweight2, _obsweight3, amu_s, obs_match):
-            self.add_data(*res)
-
-      if meth == 2:
-        for res in evaluate_fit(_obs1, _obs2, _obs3, _obsweight1,
-            _obsweight2, _obsweight3, amu_s, obs_match):
-            self.add_data(*res)
+      data, weights, deg = self._matching_input(amu_s, obs1, obs2, obs3,
+          meth, parobs)
+      if isinstance(obs_eval, FitResult):
+          _obs_eval, _eval_weight = self._matching_data(obs_eval, parobs)
+      else:
+          _obs_eval, _eval_weight = obs_eval, None
+      res, weight = evaluate_poly(amu_s, data, weights, _obs_eval,
+          _eval_weight, deg)
+      self._store_matching(res, weight)
 
     def match_quark_mass(self, amu_s, obs_match, obs1, obs2=None, obs3=None,
-        meth=0, evaluate=False):
+        meth=0, evaluate=False, parobs=1):
       """ Match the strange quark mass to an observable in lattice units.
 
+      The dependence of the observables on the strange quark mass is
+      interpolated or fitted for all samples and fit ranges at once and
+      solved for the quark mass where it equals obs_match.
+
       Parameters
       ----------
-      obs1, obs2, obs3: Up to 3 different Observables are supported at the
-          moment (should be easy to extend). Every Observable is a FitResult
-          object
+      amu_s : sequence of floats
+          The strange quark masses of the observables.
+      obs_match : float, ndarray or FitResult
+          The value to match. A FitResult adds its fit ranges as extra
+          axes to the result.
+      obs1, obs2, obs3: Every Observable is a FitResult object, obs1 can
+          also be a list of arbitrary many FitResults.
 
       meth: How to match: 0: linear interpolation (only two values)
                           1: linear fit
-                          2: quadratic interpolation
-
+                          2: quadratic interpolation or fit
+      evaluate : bool
+          Kept for compatibility, a FitResult as obs_match is detected.
+      parobs : int
+          Which parameter of non-derived results should be taken
       """
-      if obs2==None and obs3==None:
-        raise ValueError("Matching not possible, check input of 2nd (and 3rd) observable!")
-      #if obs3==None:
-      # Get the we
-      # Result has the same layout as one of the observables!
-      # TODO: If observables have different layouts break
-      layout = obs1.data[0].shape
-      print(layout)
-      _obs1 = obs1.data[0]
-      _obsweight1 = obs1.pval[0][0]
-      if obs2 is not None:
-        _obs2 = obs2.data[0]
-        _obsweight2 = obs2.pval[0][0]
-      if obs3 is not None:
-        _obs3 = obs3.data[0]
-        _obsweight3 = obs3.pval[0][0]
-      if evaluate is True:
-        _obs_match = obs_match.data[0]
-        _obs_match_weight = obs_match.pval[0][0]
-      else:
-        _obs_match = obs_match
-        _obs_match_weight = None
-      print("observable to match")
-      print(_obs_match)
-
-      boots = layout[0] 
-      ranges1 = layout[1]
-      if obs1.data[0].ndim == 3:
-        ranges2 = layout[2]
+      data, weights, deg = self._matching_input(amu_s, obs1, obs2, obs3,
+          meth, parobs)
+      if isinstance(obs_match, FitResult):
+          _obs_match, _match_weight = self._matching_data(obs_match, parobs)
       else:
-        ranges2 = 0
-      self.create_empty(layout, layout, 1)
-      # Decide method beforehand, cheaper in the end
+          _obs_match, _match_weight = obs_match, None
+      res, weight = match_poly(amu_s, data, weights, _obs_match,
+          _match_weight, deg)
+      self._store_matching(res, weight)
+
+    def _algebra_data(self, par):
+        """The data (samples, ranges...) and the weights (ranges...) of
+        one parameter."""
+        self.calc_error()
+        data = self.data[0]
+        # derived results may or may not keep the parameter axis
+        if data.ndim == self.pval[0].ndim + 1:
+            data = data[:,par]
+        if self.derived:
+            return data, self.weight[0][0]
+        return data, self.weight[par][0]
+
+    def apply(self, func, other=None, par=0, parother=0, isdependend=False,
+            corr_id=None):
+        """Apply a function to the data and return the derived observable.
+
+        The function is applied to all samples and fit ranges at once,
+        so it must work elementwise on arrays, e.g. a numpy ufunc. If
+        other is a FitResult, the fit ranges of both observables are
+        combined: for dependend observables the fit ranges of the
+        observable with fewer range axes are the leading range axes of
+        the other one, as for combined fits; otherwise every fit range
+        is combined with every fit range of the other observable. An
+        observable combined with itself is always dependend. The
+        weights of the combination are the products of the weights.
+
+        The weights are stored once per fit range and only broadcast to
+        the sample axis, no copy per sample is made. These arrays are
+        read-only, add_data and reuse copy them before writing, other
+        code writing to pval or chi2 has to do the same.
+
+        Parameters
+        ----------
+        func : callable
+            Function of one argument, or of two if other is given.
+        other : FitResult, float or ndarray, optional
+            The second argument of func. An array is interpreted as one
+            value per sample.
+        par, parother : int, optional
+            The parameters of self and other to use.
+        isdependend : bool
+            If self and other are dependend on each other.
+        corr_id : str, optional
+            Identifier of the result.
+
+        Returns
+        -------
+        FitResult
+            The derived observable.
+        """
+        a, wa = self._algebra_data(par)
+        if isinstance(other, FitResult):
+            b, wb = other._algebra_data(parother)
+            ra, rb = a.ndim - 1, b.ndim - 1
+            # an observable always depends on itself
+            if isdependend or other is self:
+                # align the range axes from the left
+                nr = max(ra, rb)
+                a = a.reshape(a.shape + (1,)*(nr-ra))
+                wa = wa.reshape(wa.shape + (1,)*(nr-ra))
+                b = b.reshape(b.shape + (1,)*(nr-rb))
+                wb = wb.reshape(wb.shape + (1,)*(nr-rb))
+            else:
+                # outer product of the range axes
+                a = a.reshape(a.shape + (1,)*rb)
+                wa = wa.reshape(wa.shape + (1,)*rb)
+                b = b.reshape(b.shape[:1] + (1,)*ra + b.shape[1:])
+                wb = wb.reshape((1,)*ra + wb.shape)
+            res = func(a, b)
+            weight = wa * wb
+        elif other is not None:
+            b = np.asarray(other)
+            if b.ndim > 0:
+                b = b.reshape(b.shape[:1] + (1,)*(a.ndim-1))
+            res = func(a, b)
+            weight = wa
+        else:
+            res = func(a)
+            weight = wa
+        if corr_id is None:
+            corr_id = self.corr_id
+        obs = FitResult(corr_id, True)
+        obs.corr_num = [1, 1]
+        obs.label = [np.asarray((0, 0))]
+        obs.data = [res]
+        obs.pval = [np.broadcast_to(weight, res.shape)]
+        obs.chi2 = [np.broadcast_to(0., res.shape)]
+        return obs
+
+    def add(self, other, par=0, parother=0, isdependend=False, corr_id="Sum"):
+        """Add an observable, see apply."""
+        return self.apply(np.add, other, par, parother, isdependend, corr_id)
+
+    def subtract(self, other, par=0, parother=0, isdependend=False,
+            corr_id="Difference"):
+        """Subtract an observable, see apply."""
+        return self.apply(np.subtract, other, par, parother, isdependend,
+            corr_id)
+
+    def multiply(self, other, par=0, parother=0, isdependend=False,
+            corr_id="Product"):
+        """Multiply with an observable, see apply."""
+        return self.apply(np.multiply, other, par, parother, isdependend,
+            corr_id)
+
+    def divide(self, other, par=0, parother=0, isdependend=False,
+            corr_id="Quotient"):
+        """Divide by an observable, see apply."""
+        return self.apply(np.divide, other, par, parother, isdependend,
+            corr_id)
+
+    def __add__(self, other):
+        return self.add(other)
+
+    def __radd__(self, other):
+        return self.add(other)
+
+    def __sub__(self, other):
+        return self.subtract(other)
+
+    def __rsub__(self, other):
+        return self.apply(lambda a, b: b - a, other, corr_id="Difference")
+
+    def __mul__(self, other):
+        return self.multiply(other)
+
+    def __rmul__(self, other):
+        return self.multiply(other)
+
+    def __div__(self, other):
+        return self.divide(other)
 
-      if meth == 0:
-        for res in match_lin(_obs1, _obs2, amu_s, _obsweight1,
-            _obsweight2, _obs_match, _obs_match_weight, evaluate):
-            self.add_data(*res)
+    __truediv__ = __div__
 
-      if meth == 1:
-        for res in match_quad(_obs1, _obs2, _obs3, _obsweight1,
-            _obsweight2, _obsweight3, amu_s, obs_match):
-            self.add_data(*res)
+    def __rdiv__(self, other):
+        return self.apply(lambda a, b: b / a, other, corr_id="Quotient")
 
-      if meth == 2:
-        for res in match_fit(_obs1, _obs2, _obs3, _obsweight1,
-            _obsweight2, _obsweight3, amu_s, obs_match):
-            self.add_data(*res)
+    __rtruediv__ = __rdiv__
+
+    def __neg__(self):
+        return self.apply(np.negative)
 
     def mult_obs(self, other, corr_id="Product", isdependend=False):
       """Multiply two observables in order to treat them as a new observable.
 
-        Warning
-        -------
-        This overwrites the data, so be careful to save the data before.
-      
+      The second parameter of other is used, see apply.
+
       Parameters
       ----------
       other: FitResult object that gets multiplied with self in a
           weightpreserving way.
       corr_id: Id of derived observable
-
+      isdependend : bool
+          If self and other are dependend on each other.
       """
-      # Self determines the resulting layout
-      layout = self.data[0].shape
-      boots = layout[0] 
-      ranges1 = layout[1]
-      if self.data[0].ndim == 3:
-        ranges2 = layout[2]
-      else:
-        ranges2 = 0
-      
-      # Check ranges and samples for compliance
-      if layout[0] != other.data[0].shape[0]:
+      if self.data[0].shape[0] != other.data[0].shape[0]:
         raise ValueError("Number of Bootstrapsamples not compatible!")
-      if isdependend:
-          if layout[1] != other.data[0][0].shape[1]:
-            raise ValueError("Number of same parameter fit ranges not compatible!\n"
-                + "%d vs. %d" % (layout[1], other.data[0][0].shape[1]))
-      # Deal with observable
-      product = np.zeros_like(self.data[0])
-      for b, arr0 in enumerate(other.data[0]):
-        for r_self, arr1 in enumerate(arr0[1]):
-          product[b][r_self] = np.multiply(arr1, self.data[0][b][r_self])
-
-      # Deal with observable weights
-      # Get weights for all fit ranges (1 sample is sufficient)
-      weights_0 = self.pval[0][0]
-      # prepare new weight array
-      weights_prod = np.zeros_like(weights_0)
-      # multiply weights of first observable with observable of second
-      print self.weight
-      print other.weight
-      if isdependend:
-        for idx, weights_1 in enumerate(other.weight[1][0]):
-           weights_prod[idx] = np.multiply(weights_1, weights_0[idx])
-      else:
-        for idx, weights_1 in enumerate(other.weight):
-           weights_prod[idx] = np.multiply(weights_1, weights_0[idx])
-      
-      # Get array into right shape for calculation
-      weights = np.tile( weights_prod.flatten(), boots ).reshape(boots, ranges1,
-          ranges2)
-
-      # prepare storage
-      mult_obs = FitResult(corr_id, True)
-      mult_obs.create_empty(layout, layout, [1,1])
-      mult_obs.data[0] = product
-      mult_obs.pval[0] = weights
-      return mult_obs
+      return self.multiply(other, 0, 1, isdependend, corr_id)
 
     def mult_obs_single(self, other, corr_id="Product"):
-        """Multiply two observables in order to treat them as a new observable.
+        """Multiply two observables with the same layout.
+
+        All parameters are multiplied elementwise, the weights are the
+        weights of the second parameter of other times the p-values of
+        self.
 
-          Warning
-          -------
-          This overwrites the data, so be careful to save the data before.
-        
         Parameters
         ----------
         other: FitResult object that gets multiplied with self in a
@@ -1114,63 +1381,52 @@ class FitResult(object):
         corr_id: Id of derived observable
 
         """
-        # Self determines the resulting layout
         layout = self.data[0].shape
-        boots = layout[0] 
-        ranges1 = layout[2]
-        if self.data[0].ndim == 3:
-            ranges2 = layout[2]
-        else:
-            ranges2 = 0
-        
         # Check ranges and samples for compliance
         if layout[0] != other.data[0].shape[0]:
             raise ValueError("Number of Bootstrapsamples not compatible!")
         if layout[1] != other.data[0].shape[1]:
             raise ValueError("Number of same parameter fit ranges not compatible!\n"
               + "%d vs. %d" % (layout[1], other.data[0].shape[1]))
+        other.calc_error()
+        weights = self.pval[0][0] * other.weight[1][0]
 
-        # Deal with observables
-        product = np.zeros_like(self.data[0])
-        for b, arr0 in enumerate(other.data[0]):
-            for r_self, arr1 in enumerate(arr0):
-                product[b][r_self] = np.multiply(arr1, self.data[0][b][r_self])
-
-        # Deal with observable weights
-        # Get weights for all fit ranges (1 sample is sufficient)
-        weights_0 = self.pval[0][0]
-        # prepare new weight array
-        weights_prod = np.zeros_like(weights_0)
-        # multiply weights of first observable with observable of second
-        for idx, weights_1 in enumerate(other.weight[1][0]):
-            weights_prod[idx] = np.multiply(weights_1, weights_0[idx])
-
-        # Get array into right shape for calculation
-        weights = np.tile( weights_prod.flatten(), boots ).reshape(boots, ranges1)
-
-        # prepare storage
         mult_obs = FitResult(corr_id, True)
-        mult_obs.create_empty(layout, layout, [1,1])
-        mult_obs.data[0] = product
-        mult_obs.pval[0] = weights
+        mult_obs.corr_num = [1, 1]
+        mult_obs.label = [np.asarray((0, 0))]
+        mult_obs.data = [self.data[0] * other.data[0]]
+        mult_obs.pval = [np.broadcast_to(weights, self.pval[0].shape)]
+        mult_obs.chi2 = [np.broadcast_to(0., self.pval[0].shape)]
         return mult_obs
 
-    def res_reduced(self, samples=20, corr_id='reduced', m_a0 = False):
-        """Take boolean 1d intersection of two arrays to choose certain fitranges and
-        corresponding data.
+    def res_reduced(self, samples=20, corr_id='reduced', m_a0 = False,
+            stream=None):
+        """Resample the fit ranges according to their weights.
+
+        The fit ranges are drawn with probabilities proportional to their
+        weights, see statistics.draw_weighted_indices, and the data of
+        the drawn ranges is collected in a new FitResult, ordered by
+        increasing weight. A range drawn several times appears several
+        times.
   
         This function flattens the data wrt the fit ranges. Thus the structure of
         different observables will get lost.
         
         Parameters
         ----------
-        vals : 
-            The chosen weights as result of draw_weighted
+        samples : int, optional
+            The number of drawn fit ranges.
+        corr_id : str, optional
+            The identifier of the result.
+        m_a0 : bool, optional
+            Take all parameters of derived data instead of the second.
+        stream : rng.Stream, optional
+            The random numbers of the draws.
 
         Returns
         -------
         res_sorted :
-            The intersected data and weights as a new FitResult object.
+            The drawn data and weights as a new FitResult object.
         
         """
         # Self determines the resulting layout
@@ -1185,110 +1441,53 @@ class FitResult(object):
                 flat_weights = self.pval[0][0].reshape(ndim)
             else:
                 ndim = self.data[0].shape[2]
-                print ndim
-                print self.data[0][:,1].shape
                 flat_data = self.data[0][:,1].reshape((boots,ndim))
                 flat_weights = self.pval[0][0].reshape(ndim)
         else:
-          ndim = self.data[0].shape[2]
-          print ndim
-          print self.data[0][:,1].shape
-          flat_data = self.data[0][:,1].reshape((boots,ndim))
-          flat_weights = self.pval[0][0].reshape(ndim)
-      else:
-        ndim = self.data[0].shape[2]
-        flat_data = self.data[0][:,1].reshape((boots,ndim))
-        self.calc_error()
-        flat_weights = self.weight[1]
-
-      vals = draw_weighted(flat_weights, samples=samples)
-      ranges = vals.shape[0]
-      # Get frequency count of sorted vals 
-      freq_vals = freq_count(vals, verb=False)
-      # Create empty fitresult to add data
-      res_sorted = FitResult(corr_id, derived=True)
-      store1 = (boots, ranges)
-      store2 = (boots,ranges)
-      res_sorted.create_empty(store1, store2 ,1)
-      # get frequencies and indices in original data
-      intersect = np.zeros_like(freq_vals)
-      # replace first column
-      wght_draw_unq = freq_vals[:,0]
-      intersect[:,0] = np.asarray(np.nonzero(np.in1d(flat_weights, wght_draw_unq)))
-      intersect[:,1] = freq_vals[:,1]
-      print intersect
-      # TODO: solve this by an iterator
-      ind=0
-      for i,v in enumerate(intersect):
-        for cnt in range(int(v[1])):
-          targ_ind = (0,ind)
-          weight = np.tile(freq_vals[i,0],boots)
-          data = flat_data[:,v[0]]
-          chi2_dummy = np.zeros_like(weight)
-          res_sorted.add_data(targ_ind,data,chi2_dummy,weight)
-          ind += 1
-
-      return res_sorted
-
-    def fse_multiply(self, mean, std):
-        """Do finite size corrections to the data."""
-        # loop over principal correlators
-        for d in self.data:
-            # get the needed shape of samples
-            shape = (d.shape[0],)
-            # get bootstrap samples of corrections
-            fse = draw_gauss_distributed(mean, std, shape)
-            for x in np.nditer(d, op_flags=["readwrite"], 
-                    flags=["external_loop"], order="F"):
-                x[...]=x*fse
-        if self.error is not None:
-            self.error = None
+            ndim = self.data[0].shape[2]
+            flat_data = self.data[0][:,1].reshape((boots,ndim))
             self.calc_error()
+            flat_weights = self.weight[1][0].reshape(ndim)
 
-    def fse_divide(self, mean, std):
-        """Do finite size corrections to the data."""
+        indices = draw_weighted_indices(flat_weights, samples=samples,
+            stream=stream)
+        res_sorted = FitResult(corr_id, derived=True)
+        res_sorted.create_empty((boots, samples), (boots, samples), 1)
+        res_sorted.data[0][...] = flat_data[:,indices]
+        res_sorted.pval[0][...] = flat_weights[indices]
+        return res_sorted
+
+    def _fse(self, mean, std, func, stream=None):
+        """Apply finite size corrections to the data.
+
+        The corrections of all principal correlators are drawn from the
+        same numbers, from stream if given.
+        """
         # loop over principal correlators
-        for d in self.data:
-            # get the needed shape of samples
-            shape = (d.shape[0],)
+        for i, d in enumerate(self.data):
             # get bootstrap samples of corrections
-            fse = draw_gauss_distributed(mean, std, shape)
-            for x in np.nditer(d, op_flags=["readwrite"], 
-                    flags=["external_loop"], order="F"):
-                x[...]=x/fse
+            fse = draw_gauss_distributed(mean, std, (d.shape[0],), stream)
+            self.data[i] = func(d, fse.reshape((-1,) + (1,)*(d.ndim-1)))
+        self.tables = {}
         if self.error is not None:
             self.error = None
             self.calc_error()
 
-    def fse_add(self, mean, std):
+    def fse_multiply(self, mean, std, stream=None):
         """Do finite size corrections to the data."""
-        # loop over principal correlators
-        for d in self.data:
-            # get the needed shape of samples
-            shape = (d.shape[0],)
-            # get bootstrap samples of corrections
-            fse = draw_gauss_distributed(mean, std, shape)
-            for x in np.nditer(d, op_flags=["readwrite"], 
-                    flags=["external_loop"], order="F"):
-                x[...]=x + fse
-        if self.error is not None:
-            self.error = None
-            self.calc_error()
+        self._fse(mean, std, np.multiply, stream)
 
-    def fse_subtract(self, mean, std):
+    def fse_divide(self, mean, std, stream=None):
         """Do finite size corrections to the data."""
-        # loop over principal correlators
-        for d in self.data:
-            # get the needed shape of samples
-            shape = (d.shape[0],)
-            # get bootstrap samples of corrections
-            fse = draw_gauss_distributed(mean, std, shape)
-            for x in np.nditer(d, op_flags=["readwrite"], 
-                    flags=["external_loop"], order="F"):
-                x[...]=x - fse
-        if self.error is not None:
-            self.error = None
-            self.calc_error()
+        self._fse(mean, std, np.divide, stream)
+
+    def fse_add(self, mean, std, stream=None):
+        """Do finite size corrections to the data."""
+        self._fse(mean, std, np.add, stream)
+
+    def fse_subtract(self, mean, std, stream=None):
+        """Do finite size corrections to the data."""
+        self._fse(mean, std, np.subtract, stream)
 
 if __name__ == "__main__":
     pass
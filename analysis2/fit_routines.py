@@ -11,9 +11,10 @@ import numpy as np
 from statistics import compute_error
 from functions import compute_eff_mass
 from utils import loop_iterator
+import backend
 
 def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
-        correlated=True, xshift=0., npar=2):
+        correlated=True, xshift=0., npar=2, todo=None):
     """Fits fitfunc to a Correlators object.
 
     The predefined functions describe a single particle correlation
@@ -37,6 +38,9 @@ def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
         The amount of info printed.
     correlated : bool
         Use the full covariance matrix or just the errors.
+    todo : dict, optional
+        The indices of the fit ranges to fit for every correlator, see
+        FitResult.reuse. All fit ranges are fitted by default.
     """
     dshape = corr.shape
     ncorr = dshape[-1]
@@ -52,7 +56,7 @@ def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
         if debug > 1:
             print("fitting correlator %d" % (n))
         if isinstance(start[0], (tuple, list)) and len(start[0]) == 1:
-            for i, r in enumerate(franges[n]):
+            for i, r in _todo(todo, (n,), franges[n]):
                 if debug > 1:
                     print("fitting interval %d" % (i))
                 res, chi, pva = fitting(fitfunc, X[r[0]:r[1]+1],
@@ -60,7 +64,7 @@ def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
                         correlated=correlated, debug=debug)
                 yield (n, i), res, chi, pva
         elif isinstance(start[0], (tuple, list)):
-            for i, r in enumerate(franges[n]):
+            for i, r in _todo(todo, (n,), franges[n]):
                 if debug > 1:
                     print("fitting interval %d" % (i))
                 res, chi, pva = fitting(fitfunc, X[r[0]:r[1]+1],
@@ -68,7 +72,7 @@ def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
                         correlated=correlated, debug=debug)
                 yield (n, i), res, chi, pva
         else:
-            for i, r in enumerate(franges[n]):
+            for i, r in _todo(todo, (n,), franges[n]):
                 if debug > 1:
                     print("fitting interval %d" % (i))
                 res, chi, pva = fitting(fitfunc, X[r[0]:r[1]+1],
@@ -77,13 +81,19 @@ def fit_single(fitfunc, start, corr, franges, add=None, debug=0,
                 yield (n, i), res, chi, pva
 
 def fit_comb(fitfunc, start, corr, franges, fshape, oldfit, add=None,
-        oldfitpar=None, useall=False, debug=0, xshift=0., correlated=True, npar=1):
+        oldfitpar=None, useall=False, debug=0, xshift=0., correlated=True, npar=1,
+        batched=False, todo=None):
     """Fits fitfunc to a Correlators object.
 
     The predefined functions describe a single particle correlation
     function, a ratio of single and two-particle correlation
     functions and a constant function.
 
+    The data and its covariance matrix only depend on the fit range of
+    the data, so they are prepared once for all fit ranges of the old
+    fit. The results are yielded for all old fit ranges of one data fit
+    range at a time.
+
     Parameters
     ----------
     fitfunc : callable
@@ -112,6 +122,12 @@ def fit_comb(fitfunc, start, corr, franges, fshape, oldfit, add=None,
         The amount of info printed.
     correlated : bool
         Use the full covariance matrix or just the errors.
+    batched : bool
+        Fit all fit ranges of the old fit together, see fitting_batched.
+        Otherwise every combination is fitted with scipy's leastsq.
+    todo : dict, optional
+        The indices of the data fit ranges to fit for every correlator
+        combination, see FitResult.reuse. All are fitted by default.
     """
     dshape = corr.shape
     ncorrs = [len(s) for s in fshape]
@@ -135,39 +151,54 @@ def fit_comb(fitfunc, start, corr, franges, fshape, oldfit, add=None,
         if debug > 1:
             print("fitting correlators %s" % str(item))
         n = item[-1]
-        # iterate over the fit ranges
         tmp = [fshape[i][x] for i,x in enumerate(item)]
-        for ritem in loop_iterator(tmp):
-            m = ritem[-1]
+        ranges = list(_todo(todo, item, franges[n]))
+        if not ranges:
+            continue
+        # the additional parameters for all fit ranges of the old fit
+        olditems = list(loop_iterator(tmp[:-1]))
+        add_data = np.stack([_comb_add(oldfit.get_data(item[:-1] + o),
+            oldfitpar, add) for o in olditems])
+        if isinstance(start[0], (tuple, list)):
+            _start = start[n]
+            data = corr.data[...,item[-2],n]
+        else:
+            _start = start
+            data = corr.data[...,n]
+        # iterate over the fit ranges of the data
+        for m, r in ranges:
             if debug > 1:
-                print("fitting fit ranges %s" % str(ritem))
-            # get fit interval
-            r = franges[n][m]
-            # get old data
-            add_data = oldfit.get_data(item[:-1] + ritem[:-1]) 
-            # get only the wanted parameter if oldfitpar is given
-            if oldfitpar is not None:
-                add_data = add_data[:,oldfitpar]
-            # if there is additional stuff needed for the fit
-            # function add it to the old data
-            if add is not None:
-                # get the shape right, atleast_2d adds the dimension
-                # in front, we need it in the end
-                if add.ndim == 1:
-                    add.shape = (-1, 1)
-                if add_data.ndim == 1:
-                    add_data.shape = (-1, 1)
-                add_data = np.hstack((add_data, add))
-            # do the fitting
-            if isinstance(start[0], (tuple, list)):
-                res, chi, pva = fitting(fitfunc, X[r[0]:r[1]+1],
-                    corr.data[:,r[0]:r[1]+1,item[-2],n], start[n],
-                    add=add_data, correlated=correlated, debug=debug)
+                print("fitting fit range %d" % m)
+            _X, _Y = X[r[0]:r[1]+1], data[:,r[0]:r[1]+1]
+            if batched:
+                res, chi, pva = fitting_batched(fitfunc, _X, _Y, _start,
+                    add_data, correlated=correlated, debug=debug)
             else:
-                res, chi, pva = fitting(fitfunc, X[r[0]:r[1]+1],
-                    corr.data[:,r[0]:r[1]+1,n], start,
-                    add=add_data, correlated=correlated, debug=debug)
-            yield item + ritem, res, chi, pva
+                cov = whitening(_Y, correlated)
+                res, chi, pva = zip(*[fitting(fitfunc, _X, _Y, _start, add=a,
+                    correlated=correlated, debug=debug, cov=cov)
+                    for a in add_data])
+            for k, o in enumerate(olditems):
+                yield item + o + (m,), res[k], chi[k], pva[k]
+
+def _todo(todo, item, franges):
+    """The indices and fit ranges that are not fitted yet."""
+    if todo is None or tuple(item) not in todo:
+        return enumerate(franges)
+    return [(m, franges[m]) for m in todo[tuple(item)]]
+
+def _comb_add(add_data, oldfitpar, add):
+    """The additional parameters of a combined fit, the samples on the
+    first axis."""
+    # get only the wanted parameter if oldfitpar is given
+    if oldfitpar is not None:
+        add_data = add_data[:,oldfitpar]
+    # if there is additional stuff needed for the fit function add it
+    # to the old data
+    if add is not None:
+        add_data = np.hstack((add_data.reshape((add_data.shape[0], -1)),
+            np.reshape(add, (add.shape[0], -1))))
+    return add_data
 
 def calculate_ranges(ranges, shape, oldshape=None, dt_i=2, dt_f=2, dt=4, debug=0,
         lintervals=False):
@@ -327,7 +358,29 @@ def get_ranges2(lower, upper, dt_i=2, dt_f=2, dt=4):
                     ran.append((lo, up))
     return np.asarray(ran)
 
-def fitting(fitfunc, X, Y, start, add=None, correlated=True, debug=0):
+def whitening(Y, correlated=True):
+    """The inverse, Cholesky decomposed covariance matrix of Y.
+
+    Parameters
+    ----------
+    Y : ndarray
+        The data, samples on the first axis.
+    correlated : bool
+        Use the full covariance matrix or just the errors.
+
+    Returns
+    -------
+    ndarray
+        The matrix that whitens the residuals of a fit to Y.
+    """
+    if not correlated:
+        cov = np.diag(np.diagonal(np.cov(Y.T)))
+    else:
+        cov = np.cov(Y.T)
+    return (np.linalg.cholesky(np.linalg.inv(cov))).T
+
+def fitting(fitfunc, X, Y, start, add=None, correlated=True, debug=0,
+        cov=None):
     """A function that fits a correlation function.
 
     This function fits the given function fitfunc to the data given in
@@ -348,6 +401,9 @@ def fitting(fitfunc, X, Y, start, add=None, correlated=True, debug=0):
         Flag to use a correlated or uncorrelated fit.
     debug : int
         The amount of info printed.
+    cov : ndarray, optional
+        The inverse, Cholesky decomposed covariance matrix, see
+        whitening. Computed from Y if not given.
 
     Returns
     -------
@@ -361,19 +417,18 @@ def fitting(fitfunc, X, Y, start, add=None, correlated=True, debug=0):
     # define error function
     if debug > 1:
         print("defining errfunc and computing covariance matrix")
+    # the residuals of the predefined functions are kernels of the backend
+    kernel = backend.residual(fitfunc)
     if add is None:
         errfunc = lambda p, x, y, error: np.dot(error, (y-fitfunc(p,x)).T)
+    elif kernel is not None:
+        errfunc = lambda p, x, y, e, error: np.dot(error, kernel(p, x, e, y).T)
     else:
         errfunc = lambda p, x, y, e, error: np.dot(error, (y-fitfunc(p,x,e)).T)
 
     # compute inverse, cholesky decomposed covariance matrix
-    print correlated
-    if not correlated:
-        cov = np.diag(np.diagonal(np.cov(Y.T)))
-        print cov
-    else:
-        cov = np.cov(Y.T)
-    cov = (np.linalg.cholesky(np.linalg.inv(cov))).T
+    if cov is None:
+        cov = whitening(Y, correlated)
 
     # degrees of freedom
     dof = float(Y.shape[1]-len(start)) 
@@ -419,6 +474,261 @@ def fitting(fitfunc, X, Y, start, add=None, correlated=True, debug=0):
 
     return res, chisquare, pvals
 
+class _NoBroadcast(Exception):
+    """The fit function does not broadcast over a batch of fits."""
+    pass
+
+def _eval_batched(fitfunc, p, X):
+    """Evaluate fitfunc for all samples at once.
+
+    The parameters are passed with the parameter index first and the
+    samples on the second axis, so that fitfunc can unpack them as
+    usual. Raises _NoBroadcast if fitfunc does not broadcast over the
+    samples.
+    """
+    try:
+        with np.errstate(all="ignore"):
+            y = np.asarray(fitfunc(p.T[:,:,None], X), dtype=float)
+    except (TypeError, ValueError, IndexError):
+        raise _NoBroadcast()
+    # a transposed result has the right size but not the right layout
+    if y.shape != X.shape:
+        raise _NoBroadcast()
+    return y
+
+def fitting_paired(fitfunc, X, Y, start, correlated=True, maxiter=100,
+        tol=1e-10, debug=0):
+    """Fit every sample of Y against the same sample of X.
+
+    In contrast to fitting, X has samples as well and sample b of Y is
+    only fitted with sample b of X, so the cost is linear in the number
+    of samples. The covariance matrix is estimated from the samples of Y.
+    All samples are fitted together by a Levenberg-Marquardt iteration
+    if fitfunc broadcasts over an extra axis of the parameters, e.g.
+    fitfunc(p, x) with p[i] of shape (nsamples, 1) and x of shape
+    (nsamples, npoints). Otherwise every sample is fitted on its own.
+
+    Parameters
+    ----------
+    fitfunc : callable
+        The function to fit to the data, called as fitfunc(p, x).
+    X, Y : ndarrays
+        The X and Y data, samples on the first axis.
+    start : sequence
+        The starting parameters for the fit.
+    correlated : bool
+        Flag to use a correlated or uncorrelated fit.
+    maxiter : int
+        The maximal number of iterations.
+    tol : float
+        The relative change of the chi^2 at which the iteration stops.
+    debug : int
+        The amount of info printed.
+
+    Returns
+    -------
+    ndarray
+        The fit parameters after the fit.
+    ndarray
+        The chi^2 values of the fit.
+    ndarray
+        The p-values of the fit
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    if X.shape != Y.shape:
+        raise ValueError("X and Y need the same shape")
+    start = np.atleast_1d(np.asarray(start, dtype=float))
+    samples, npoints = Y.shape
+    npar = start.size
+    dof = float(npoints - npar)
+    cov = whitening(Y, correlated)
+
+    # residuals of all samples, weighted with the covariance
+    resid = lambda y: np.dot(Y - y, cov.T)
+    evaluate = lambda p: _eval_batched(fitfunc, p, X)
+    p = np.tile(start, (samples, 1))
+    try:
+        # the fit function may fail for any step of the iteration
+        p, chisquare = _levenberg_marquardt(evaluate, resid, p, evaluate(p),
+            maxiter, tol, debug)
+    except _NoBroadcast:
+        if debug > 1:
+            print("fit function does not broadcast, fitting samples one by one")
+        errfunc = lambda p, x, y, error: np.dot(error, (y-fitfunc(p,x)).T)
+        res = np.zeros((samples, npar))
+        chisquare = np.zeros(samples)
+        for b in range(samples):
+            _p, cov1, infodict, mesg, ier = leastsq(errfunc, start,
+                args=(X[b], Y[b], cov), full_output=1, factor=.1)
+            chisquare[b] = float(sum(infodict['fvec']**2.))
+            res[b] = np.atleast_1d(_p)
+        pvals = 1. - scipy.stats.chi2.cdf(chisquare, dof)
+        return res, chisquare, pvals
+    pvals = 1. - scipy.stats.chi2.cdf(chisquare, dof)
+    return p, chisquare, pvals
+
+def _levenberg_marquardt(evaluate, resid, p, y, maxiter=100, tol=1e-10,
+        debug=0):
+    """Levenberg-Marquardt iteration for a batch of independent fits.
+
+    Parameters
+    ----------
+    evaluate : callable
+        Maps the parameters of all fits, shape (nfits, npar), to the
+        function values, shape (nfits, npoints).
+    resid : callable
+        Maps the function values to the weighted residuals.
+    p : ndarray
+        The start parameters, changed in place.
+    y : ndarray
+        The function values at the start parameters.
+    maxiter : int
+        The maximal number of iterations.
+    tol : float
+        The relative change of the chi^2 at which the iteration stops.
+    debug : int
+        The amount of info printed.
+
+    Returns
+    -------
+    ndarray
+        The parameters.
+    ndarray
+        The chi^2 values.
+    """
+    nfits, npar = p.shape
+    r = resid(y)
+    npoints = r.shape[1]
+    chisquare = np.sum(r**2, axis=1)
+    lam = np.ones(nfits) * 1e-3
+    done = np.zeros(nfits, dtype=bool)
+    eye = np.eye(npar)
+    for i in range(maxiter):
+        # jacobian of the weighted residuals by forward differences
+        jac = np.empty((nfits, npoints, npar))
+        for k in range(npar):
+            h = 1e-7 * np.maximum(np.abs(p[:,k]), 1.)
+            dp = p.copy()
+            dp[:,k] += h
+            jac[:,:,k] = (resid(evaluate(dp)) - r) / h[:,None]
+        jtj = np.einsum("bij,bik->bjk", jac, jac)
+        jtr = np.einsum("bij,bi->bj", jac, r)
+        diag = jtj[:,eye.astype(bool)]
+        A = jtj + lam[:,None,None] * diag[:,:,None] * eye
+        try:
+            step = np.linalg.solve(A, -jtr[:,:,None])[:,:,0]
+        except np.linalg.LinAlgError:
+            step = np.einsum("bjk,bk->bj", np.linalg.pinv(A), -jtr)
+        pnew = p + step
+        # steps leading to overflows are rejected
+        with np.errstate(over="ignore", invalid="ignore"):
+            rnew = resid(evaluate(pnew))
+            chinew = np.sum(rnew**2, axis=1)
+            better = chinew <= chisquare
+            change = np.where(better, (chisquare - chinew) /
+                np.maximum(chinew, 1e-300), 0.)
+        p[better] = pnew[better]
+        r[better] = rnew[better]
+        chisquare[better] = chinew[better]
+        lam = np.where(better, lam * 0.1, lam * 10.)
+        if debug > 2:
+            print("iteration %d: mean chi^2 %e" % (i, np.mean(chisquare)))
+        done |= (better & (change < tol)) | (lam > 1e10)
+        if np.all(done):
+            break
+    return p, chisquare
+
+def fitting_batched(fitfunc, X, Y, start, add, correlated=True, maxiter=100,
+        tol=1e-10, debug=0):
+    """Fit the same data with several sets of additional parameters.
+
+    This is the combined fit for all fit ranges of an old fit at once.
+    X, Y and therefore the covariance matrix are the same for all sets,
+    only the additional parameters add[k] change. The covariance matrix
+    is inverted once and all sets and samples are fitted together by a
+    Levenberg-Marquardt iteration if fitfunc broadcasts over an extra
+    axis of the parameters, see fitting_paired. Otherwise every set is
+    fitted with fitting.
+
+    Parameters
+    ----------
+    fitfunc : callable
+        The function to fit to the data, called as fitfunc(p, x, add).
+    X, Y : ndarrays
+        The X and Y data, Y has the samples on the first axis.
+    start : sequence
+        The starting parameters for the fit.
+    add : ndarray
+        The additional parameters, the sets on the first, the samples on
+        the second axis.
+    correlated : bool
+        Flag to use a correlated or uncorrelated fit.
+    maxiter : int
+        The maximal number of iterations.
+    tol : float
+        The relative change of the chi^2 at which the iteration stops.
+    debug : int
+        The amount of info printed.
+
+    Returns
+    -------
+    ndarray
+        The fit parameters after the fit, shape (nsets, samples, npar).
+    ndarray
+        The chi^2 values of the fit, shape (nsets, samples).
+    ndarray
+        The p-values of the fit, shape (nsets, samples).
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    start = np.atleast_1d(np.asarray(start, dtype=float))
+    add = np.asarray(add, dtype=float)
+    nsets, samples = add.shape[:2]
+    npoints = Y.shape[1]
+    dof = float(npoints - start.size)
+    cov = whitening(Y, correlated)
+
+    # all sets and samples are one batch, the parameters and additional
+    # parameters have the batch index on the second axis
+    if add.ndim == 2:
+        e = add.reshape((-1, 1))
+    else:
+        e = add.reshape((nsets*samples, -1)).T[:,:,None]
+    def evaluate(p):
+        try:
+            with np.errstate(all="ignore"):
+                y = np.asarray(fitfunc(p.T[:,:,None], X, e), dtype=float)
+        except (TypeError, ValueError, IndexError):
+            raise _NoBroadcast()
+        if y.shape != (p.shape[0], npoints):
+            raise _NoBroadcast()
+        return y
+
+    # the weighted data is the same for all sets
+    Yw = np.dot(Y, cov.T)
+    def resid(y):
+        r = Yw - np.dot(y, cov.T).reshape((nsets, samples, npoints))
+        return r.reshape((nsets*samples, npoints))
+    p = np.tile(start, (nsets*samples, 1))
+    try:
+        # the fit function may fail for any step of the iteration
+        p, chisquare = _levenberg_marquardt(evaluate, resid, p, evaluate(p),
+            maxiter, tol, debug)
+    except _NoBroadcast:
+        if debug > 1:
+            print("fit function does not broadcast, fitting sets one by one")
+        res = np.zeros((nsets, samples, start.size))
+        chisquare = np.zeros((nsets, samples))
+        pvals = np.zeros((nsets, samples))
+        for k in range(nsets):
+            res[k], chisquare[k], pvals[k] = fitting(fitfunc, X, Y, start,
+                add=add[k], correlated=correlated, debug=debug, cov=cov)
+        return res, chisquare, pvals
+    pvals = 1. - scipy.stats.chi2.cdf(chisquare, dof)
+    return (p.reshape((nsets, samples, -1)), chisquare.reshape((nsets, samples)),
+        pvals.reshape((nsets, samples)))
+
 def compute_dE(mass, mass_w, energy, energy_w, isdependend=False):
     needed = np.zeros(mass.shape[0])
     if isdependend:
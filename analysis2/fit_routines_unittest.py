@@ -137,6 +137,97 @@ class FitRoutinesBase_Test(unittest.TestCase):
 #        fitres = next(fitter)
 #        self.assertIsNotNone(fitres)
 
+class FitPaired_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        self.nsamples = 200
+        x = np.linspace(0.1, 1., 6)
+        self.X = x + 0.01 * rng.randn(self.nsamples, 6)
+        self.Y = 0.5 - 2.*self.X**2 + 0.01 * rng.randn(self.nsamples, 6)
+        self.func = lambda p, x: p[0] + p[1]*x**2
+
+    def test_shapes(self):
+        res, chi2, pval = fr.fitting_paired(self.func, self.X, self.Y,
+            [1., 1.])
+        self.assertEqual(res.shape, (self.nsamples, 2))
+        self.assertEqual(chi2.shape, (self.nsamples,))
+        self.assertEqual(pval.shape, (self.nsamples,))
+        self.assertTrue(np.allclose(np.mean(res, axis=0), [0.5, -2.],
+            atol=0.05))
+
+    def test_batched_vs_loop(self):
+        # the same function, but not broadcasting over the samples
+        loopfunc = lambda p, x: np.asarray([p[0] + p[1]*_x**2 for _x in x])
+        res2, chi22, pval2 = fr.fitting_paired(loopfunc, self.X[:20],
+            self.Y[:20], [1., 1.])
+        res1, chi21, pval1 = fr.fitting_paired(self.func, self.X[:20],
+            self.Y[:20], [1., 1.])
+        self.assertTrue(np.allclose(res1, res2, rtol=1e-5))
+        self.assertTrue(np.allclose(chi21, chi22, rtol=1e-4))
+
+    def test_shape_mismatch(self):
+        self.assertRaises(ValueError, fr.fitting_paired, self.func, self.X,
+            self.Y[:,:-1], [1., 1.])
+
+    def test_transposed(self):
+        # broadcasts to (npoints, nsamples) instead of (nsamples, npoints)
+        tfunc = lambda p, x: self.func(p, x).T
+        res1, chi21, pval1 = fr.fitting_paired(tfunc, self.X[:20], self.Y[:20],
+            [1., 1.])
+        loopfunc = lambda p, x: np.asarray([self.func(p, _x) for _x in x])
+        res2, chi22, pval2 = fr.fitting_paired(loopfunc, self.X[:20],
+            self.Y[:20], [1., 1.])
+        self.assertTrue(np.allclose(res1, res2))
+        self.assertTrue(np.allclose(chi21, chi22))
+
+class FitBatched_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        self.X = np.linspace(0., 9., 10)
+        self.Y = 1. + 0.5*np.exp(-0.3*self.X) + 0.01*rng.randn(50, 10)
+        # the offset is given by the additional parameters
+        self.add = 1. + 0.001*rng.randn(3, 50, 2)
+        self.func = lambda p, t, o: o[0] + p[0]*np.exp(-p[1]*t)
+
+    def test_batched_vs_leastsq(self):
+        res, chi2, pval = fr.fitting_batched(self.func, self.X, self.Y,
+            [1., 0.1], self.add)
+        self.assertEqual(res.shape, (3, 50, 2))
+        self.assertEqual(chi2.shape, (3, 50))
+        for k in range(3):
+            ref = fr.fitting(self.func, self.X, self.Y, [1., 0.1],
+                add=self.add[k])
+            self.assertTrue(np.allclose(res[k], ref[0], rtol=1e-4))
+            self.assertTrue(np.allclose(chi2[k], ref[1], rtol=1e-3))
+            self.assertTrue(np.allclose(pval[k], ref[2], atol=1e-5))
+
+    def test_fallback(self):
+        # does not broadcast over the samples
+        func = lambda p, t, o: np.asarray([self.func(p, _t, o) for _t in t])
+        res, chi2, pval = fr.fitting_batched(func, self.X[:5], self.Y[:20,:5],
+            [1., 0.1], self.add[:,:20])
+        ref = fr.fitting(func, self.X[:5], self.Y[:20,:5], [1., 0.1],
+            add=self.add[1,:20])
+        self.assertTrue(np.array_equal(res[1], ref[0]))
+        self.assertTrue(np.array_equal(chi2[1], ref[1]))
+
+    def test_fallback_later(self):
+        # broadcasts for the first evaluation only
+        calls = []
+        def func(p, t, o):
+            if np.ndim(p[0]) > 1:
+                calls.append(1)
+                if len(calls) > 1:
+                    raise ValueError("no batches")
+            return self.func(p, t, o)
+        res, chi2, pval = fr.fitting_batched(func, self.X, self.Y[:20],
+            [1., 0.1], self.add[:,:20])
+        self.assertEqual(len(calls), 2)
+        ref = fr.fitting(self.func, self.X, self.Y[:20], [1., 0.1],
+            add=self.add[2,:20])
+        self.assertTrue(np.array_equal(res[2], ref[0]))
+        self.assertTrue(np.array_equal(chi2[2], ref[1]))
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,206 @@
+"""
+Columnar summary of the fits in a FitResult.
+"""
+
+import numpy as np
+
+from statistics import compute_weight
+
+class FitTable(object):
+    """Summary of all fits of a FitResult, one row per fit.
+
+    The columns are numpy arrays with one entry per row:
+
+    corr : the index of the correlator (combination) in the FitResult
+    label : the label of the correlator (combination), 2d
+    range : the index of the fit range, the last axis of the data
+    old : the indices of the fit ranges of the old fits in a combined
+          fit, the axes between parameter and fit range, 2d
+    lo, up : first and last time slice of the fit range, -1 if unknown
+    length : the number of time slices in the fit range
+    value : the value on the original data, for all parameters, 2d
+    error : the standard deviation over the bootstrap samples, 2d
+    chi2, dof, chi2dof : chi^2, degrees of freedom and their ratio
+    pval : the p-value, for derived results the weight
+    weight : the weight of the fit
+
+    Rows are selected with where and sorted with sort, both return row
+    indices. The data of a row is FitResult.data[corr][(slice(None),
+    slice(None)) + index(row)].
+    """
+    def __init__(self, columns):
+        """Create the table.
+
+        Parameters
+        ----------
+        columns : dict of ndarrays
+            The columns, all of the same length.
+        """
+        self.columns = columns
+
+    @classmethod
+    def from_fitresult(cls, fitres, par=0, rel=False):
+        """Calculate the table of a FitResult.
+
+        Parameters
+        ----------
+        fitres : FitResult
+            The fit results.
+        par : int, optional
+            The parameter used for the weights.
+        rel : bool, optional
+            Use the relative error for the weights, see
+            statistics.compute_weight.
+
+        Returns
+        -------
+        FitTable
+            The table.
+        """
+        parts = []
+        for i, lab in enumerate(fitres.label):
+            parts.append(_columns(fitres, i, np.atleast_1d(lab), par, rel))
+        columns = {}
+        for name in parts[0]:
+            columns[name] = np.concatenate([p[name] for p in parts])
+        return cls(columns)
+
+    def __len__(self):
+        return len(self.columns["corr"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def where(self, rows=None, **conditions):
+        """Select rows.
+
+        Parameters
+        ----------
+        rows : ndarray of int, optional
+            Only select from these rows.
+        conditions : scalar or tuple
+            A column name and either a value the column has to equal or
+            a tuple (min, max) of inclusive bounds, None for no bound.
+            For 2d columns all entries of a row have to fulfil the
+            condition, a list is compared entry by entry.
+
+        Returns
+        -------
+        ndarray of int
+            The indices of the selected rows, in the order of rows.
+
+        Raises
+        ------
+        KeyError
+            If a column does not exist.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, cond in conditions.items():
+            col = self.columns[name]
+            if isinstance(cond, tuple):
+                low, high = cond
+                sel = np.ones(col.shape, dtype=bool)
+                if low is not None:
+                    sel &= col >= low
+                if high is not None:
+                    sel &= col <= high
+            else:
+                sel = col == np.asarray(cond)
+            if sel.ndim > 1:
+                sel = sel.all(axis=1)
+            mask &= sel
+        if rows is None:
+            return np.flatnonzero(mask)
+        rows = np.asarray(rows, dtype=int)
+        return rows[mask[rows]]
+
+    def sort(self, by, rows=None, descending=False):
+        """Sort rows by a column.
+
+        Parameters
+        ----------
+        by : str
+            The column, for 2d columns the first parameter is used.
+        rows : ndarray of int, optional
+            Only sort these rows.
+        descending : bool, optional
+            Sort from the largest value.
+
+        Returns
+        -------
+        ndarray of int
+            The indices of the rows, rows with equal values keep their
+            order.
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        rows = np.asarray(rows, dtype=int)
+        col = self.columns[by][rows]
+        if col.ndim > 1:
+            col = col[:,0]
+        if descending:
+            col = -col
+        return rows[np.argsort(col, kind="mergesort")]
+
+    def index(self, row):
+        """The index of the fit in the data of its correlator, without
+        the axes of the samples and parameters."""
+        return tuple(int(x) for x in self.columns["old"][row]) + (
+            int(self.columns["range"][row]),)
+
+    def take(self, rows):
+        """A table of the given rows.
+
+        Parameters
+        ----------
+        rows : ndarray of int
+            The rows.
+
+        Returns
+        -------
+        FitTable
+            The new table.
+        """
+        return FitTable(dict((k, v[rows]) for k, v in self.columns.items()))
+
+def _columns(fitres, i, lab, par, rel):
+    """The columns of correlator (combination) i."""
+    data = fitres.data[i]
+    if fitres.derived:
+        # one value per fit, treat it as one parameter
+        data = data[:,None]
+    shape = data.shape[2:]
+    nfits = int(np.prod(shape))
+    npar = data.shape[1]
+    index = np.indices(shape).reshape((len(shape), nfits))
+    flat = data.reshape(data.shape[:2] + (nfits,))
+    cols = {
+        "corr": np.full(nfits, i, dtype=int),
+        "label": np.tile(lab.astype(int), (nfits, 1)),
+        "range": index[-1],
+        "old": index[:-1].T.copy(),
+        "value": flat[0].T.copy(),
+        "error": np.std(flat, axis=0).T,
+        "chi2": np.asarray(fitres.chi2[i][0], dtype=float).reshape(nfits),
+        "pval": np.asarray(fitres.pval[i][0], dtype=float).reshape(nfits),
+    }
+    if fitres.fit_ranges is None:
+        cols["lo"] = np.full(nfits, -1, dtype=int)
+        cols["up"] = np.full(nfits, -1, dtype=int)
+    else:
+        ranges = np.asarray(fitres.fit_ranges[int(lab[-1])], dtype=int)
+        cols["lo"] = ranges[cols["range"],0]
+        cols["up"] = ranges[cols["range"],1]
+    cols["length"] = np.where(cols["lo"] < 0, 0, cols["up"] - cols["lo"] + 1)
+    if fitres.derived:
+        cols["dof"] = np.full(nfits, np.nan)
+        cols["weight"] = cols["pval"].copy()
+    else:
+        cols["dof"] = np.where(cols["lo"] < 0, np.nan,
+            cols["length"] - npar).astype(float)
+        pval = np.asarray(fitres.pval[i]).reshape((data.shape[0], nfits))
+        cols["weight"] = compute_weight(flat[:,par], pval, rel=rel)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cols["chi2dof"] = cols["chi2"] / cols["dof"]
+    return cols
+
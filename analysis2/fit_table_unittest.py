@@ -0,0 +1,93 @@
+"""
+Unit tests for the fit summary table.
+"""
+
+import unittest
+import numpy as np
+
+from fit import FitResult
+from statistics import compute_weight
+
+class FitTable_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        # 2 correlators with 2 parameters and 5 fit ranges each
+        self.fr = FitResult("mass")
+        self.fr.create_empty((20, 2, 5), (20, 5), 2)
+        ranges = np.array([[8, 12], [8, 16], [10, 16], [10, 20], [12, 20]])
+        self.fr.set_ranges([ranges, ranges + 1], [[5, 5]])
+        for i in range(2):
+            self.fr.data[i][...] = rng.rand(20, 2, 5)
+            self.fr.chi2[i][...] = rng.rand(5) * 10.
+            self.fr.pval[i][...] = rng.rand(5)
+        # a combined fit with 5 old fit ranges
+        self.comb = FitResult("energy")
+        self.comb.create_empty((20, 2, 5, 5), (20, 5, 5), [1, 1])
+        self.comb.set_ranges([ranges], [[5]])
+        self.comb.data[0][...] = rng.rand(20, 2, 5, 5)
+        self.comb.pval[0][...] = rng.rand(5, 5)
+
+    def test_columns(self):
+        t = self.fr.table()
+        self.assertEqual(len(t), 10)
+        self.assertTrue(np.array_equal(t["corr"], np.repeat([0, 1], 5)))
+        self.assertTrue(np.array_equal(t["lo"][5:], [9, 9, 11, 11, 13]))
+        self.assertTrue(np.array_equal(t["length"][:5], [5, 9, 7, 11, 9]))
+        self.assertTrue(np.array_equal(t["value"][:5], self.fr.data[0][0].T))
+        self.assertTrue(np.allclose(t["error"][7], np.std(self.fr.data[1][:,:,2],
+            axis=0)))
+        self.assertTrue(np.allclose(t["chi2dof"][:5], self.fr.chi2[0][0] /
+            (t["length"][:5] - 2.)))
+        ref = compute_weight(self.fr.data[1][:,0], self.fr.pval[1], rel=False)
+        self.assertTrue(np.allclose(t["weight"][5:], ref))
+        # the table is kept
+        self.assertIs(self.fr.table(), t)
+        self.assertIsNot(self.fr.table(new=True), t)
+
+    def test_reset(self):
+        t = self.fr.table()
+        self.assertIs(self.fr.table(), t)
+        self.fr.add_data((1, 2), np.full((20, 2), 5.), np.zeros(20),
+            np.ones(20))
+        t = self.fr.table()
+        self.assertTrue(np.all(t["value"][7] == 5.))
+        self.assertEqual(t["pval"][7], 1.)
+
+    def test_query(self):
+        t = self.fr.table()
+        rows = t.where(corr=1, lo=(10, None), length=(None, 9))
+        self.assertTrue(np.array_equal(rows, [7, 9]))
+        self.assertTrue(np.array_equal(t.where(rows, up=17), [7]))
+        rows = t.sort("pval", t.where(corr=0), descending=True)
+        self.assertTrue(np.all(np.diff(t["pval"][rows]) <= 0.))
+        sub = t.take(rows[:2])
+        self.assertEqual(len(sub), 2)
+        self.assertRaises(KeyError, t.where, tmin=3)
+
+    def test_combined(self):
+        t = self.comb.table(par=1)
+        self.assertEqual(len(t), 25)
+        self.assertEqual(t["label"].shape, (25, 2))
+        self.assertTrue(np.array_equal(t.where(label=[0, 0]), np.arange(25)))
+        row = t.where(range=3, old=2)[0]
+        self.assertEqual(t.index(row), (2, 3))
+        self.assertTrue(np.array_equal(t["value"][row],
+            self.comb.data[0][0,:,2,3]))
+        self.assertEqual(t["pval"][row], self.comb.pval[0][0,2,3])
+
+    def test_derived(self):
+        der = self.comb.subtract(self.fr, 1, 1, isdependend=True)
+        t = der.table()
+        self.assertEqual(t["value"].shape, (25, 1))
+        # derived results have no fit ranges
+        self.assertTrue(np.all(t["lo"] == -1))
+        self.assertTrue(np.all(np.isnan(t["dof"])))
+        self.assertTrue(np.array_equal(t["weight"], der.pval[0][0].ravel()))
+
+    def test_cut_data(self):
+        res = self.comb.cut_data(10, 20, min_dat=6)
+        self.assertTrue(np.array_equal(res.data[0], self.comb.data[0][...,
+            [2, 3, 4]]))
+
+if __name__ == "__main__":
+    unittest.main()
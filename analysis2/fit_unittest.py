@@ -10,6 +10,7 @@ import numpy as np
 
 from fit import LatticeFit, FitResult
 from functions import func_const as f1
+from energies import calc_Ecm, calc_q2
 
 class Fit_Test(unittest.TestCase):
 
@@ -17,6 +18,72 @@ class Fit_Test(unittest.TestCase):
         fitter = LatticeFit(f1)
         self.assertIsNotNone(fitter)
 
+    def test_chiral_fit_paired(self):
+        rng = np.random.RandomState(7)
+        nens, nboot = 5, 300
+        X = np.linspace(0.1, 0.5, nens)[:,None] + 0.01*rng.randn(nens, nboot)
+        Y = 1. + 3.*X + 0.01*rng.randn(nens, nboot)
+        fitter = LatticeFit(lambda p, x: p[0] + p[1]*x)
+        res = fitter.chiral_fit(X, Y, start=[1., 1.], paired=True)
+        self.assertEqual(res.data[0].shape, (nboot, 2, 1))
+        self.assertEqual(res.pval[0].shape, (nboot, 1))
+        self.assertTrue(np.allclose(np.mean(res.data[0][:,:,0], axis=0),
+            [1., 3.], rtol=0.05))
+
+class Refit_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import synthetic
+        corr = synthetic.to_correlators(synthetic.single_correlator(100, 32,
+            [0.2, 0.6], [1., 0.5], noise=0.005))
+        corr.sym_and_boot(20)
+        cls.corr = corr
+        cls.fitter = LatticeFit(0, dt_i=1, dt_f=1, dt=4)
+        cls.add = np.ones((20,)) * 32
+        cls.fit1 = cls.fitter.fit([1., 0.2], corr, [8, 14], add=cls.add)
+
+    def test_reuse_single(self):
+        ref = self.fitter.fit([1., 0.2], self.corr, [6, 16], add=self.add)
+        res = self.fitter.fit([1., 0.2], self.corr, [6, 16], add=self.add,
+            previous=self.fit1)
+        self.assertTrue(np.array_equal(ref.data[0], res.data[0]))
+        self.assertTrue(np.array_equal(ref.pval[0], res.pval[0]))
+
+    def test_todo(self):
+        res = self.fitter.fit([1., 0.2], self.corr, [6, 16], add=self.add)
+        todo = res.reuse(self.fit1)
+        # ranges inside [8, 14] are reused
+        done = [m for m, r in enumerate(res.fit_ranges[0])
+            if r[0] >= 8 and r[1] <= 14]
+        self.assertEqual(len(done), self.fit1.data[0].shape[-1])
+        self.assertEqual(sorted(todo[(0,)] + done),
+            range(len(res.fit_ranges[0])))
+
+    def test_reuse_comb(self):
+        fitter = LatticeFit(1, dt_i=1, dt_f=1, dt=4)
+        kw = dict(oldfit=self.fit1, oldfitpar=1, add=self.add, batched=True)
+        fit1 = fitter.fit([1., 0.005], self.corr, [8, 14], **kw)
+        ref = fitter.fit([1., 0.005], self.corr, [6, 14], **kw)
+        res = fitter.fit([1., 0.005], self.corr, [6, 14], previous=fit1, **kw)
+        self.assertEqual(ref.data[0].shape, res.data[0].shape)
+        self.assertTrue(np.allclose(ref.data[0], res.data[0]))
+        self.assertTrue(np.allclose(ref.chi2[0], res.chi2[0]))
+        # a previous fit on top of another old fit of the same shape
+        other = self.fitter.fit([1., 0.2], self.corr, [9, 15], add=self.add)
+        self.assertEqual(other.data[0].shape, self.fit1.data[0].shape)
+        kw["oldfit"] = other
+        self.assertRaises(ValueError, fitter.fit, [1., 0.005], self.corr,
+            [6, 14], previous=fit1, **kw)
+
+    def test_reuse_checks(self):
+        res = self.fitter.fit([1., 0.2], self.corr, [6, 16], add=self.add,
+            corrid="other")
+        self.assertRaises(ValueError, res.reuse, self.fit1)
+        comb = FitResult("")
+        comb.set_ranges(self.fit1.fit_ranges, self.fit1.fit_ranges_shape)
+        comb.old_fit_ranges = [self.fit1.fit_ranges]
+        self.assertRaises(ValueError, comb.reuse, self.fit1)
+
 class FitResult_Test(unittest.TestCase):
 
     def test_add_data_single(self):
@@ -151,7 +218,26 @@ class FitResult_Test(unittest.TestCase):
             self.assertTrue(np.array_equal(fr1.chi2[0][:,3], chi2))
             self.assertTrue(np.array_equal(fr1.pval[0][:,3], pval))
             self.assertEqual(fr1.corr_id, "test")
-    
+
+    def test_read_compact(self):
+        fr = FitResult("test")
+        res = np.random.rand(10, 25)
+        chi2 = np.random.rand(10)
+        pval = np.random.rand(10)
+        fr.create_empty((10, 25, 4), (10, 4), 3)
+        fr.add_data((0,0), res, chi2, pval)
+        fr.add_data((2,3), res, chi2, pval)
+        fname = "./test_data/tmp_fitresult.npz"
+        fr.save(fname, compact=True)
+        fr1 = FitResult.read(fname)
+        self.assertEqual(fr1.data[0].dtype, np.float64)
+        self.assertTrue(np.array_equal(fr1.data[0][0,:,0], res[0]))
+        self.assertTrue(np.allclose(fr1.data[0][:,:,0], res, rtol=1e-6))
+        self.assertTrue(np.allclose(fr1.data[2][:,:,3], res, rtol=1e-6))
+        self.assertTrue(np.array_equal(fr1.chi2[2][:,3], chi2))
+        self.assertTrue(np.array_equal(fr1.pval[0][:,0], pval))
+        self.assertEqual(fr1.corr_id, "test")
+
     def test_get_data(self):
         fr = FitResult("")
         res = np.ones((10, 25))
@@ -169,6 +255,165 @@ class FitResult_Test(unittest.TestCase):
         self.assertTrue(np.array_equal(fr.data[0][:,:,3], np.ones((10, 25))))
         self.assertTrue(np.array_equal(fr.chi2[0][:,3], np.ones((10,))))
 
+class Matching_Test(unittest.TestCase):
+    def setUp(self):
+        self.amu_s = [0.0185, 0.0225]
+        self.obs = []
+        for a in self.amu_s:
+            fr = FitResult("obs", derived=True)
+            fr.create_empty((10, 3), (10, 3), 1)
+            fr.data[0][...] = 2. * a + 0.1 * np.arange(3)
+            fr.pval[0][...] = 0.5
+            self.obs.append(fr)
+
+    def test_match(self):
+        res = FitResult("match", derived=True)
+        res.match_quark_mass(self.amu_s, 0.042, self.obs[0], self.obs[1])
+        self.assertEqual(res.data[0].shape, (10, 3))
+        self.assertTrue(np.allclose(res.data[0][:,0], 0.021))
+        self.assertTrue(np.allclose(res.pval[0], 0.25))
+
+    def test_evaluate(self):
+        res = FitResult("eval", derived=True)
+        res.evaluate_quark_mass(self.amu_s, 0.021, self.obs)
+        self.assertTrue(np.allclose(res.data[0], 0.042 + 0.1*np.arange(3)))
+
+    def test_errors(self):
+        res = FitResult("match", derived=True)
+        self.assertRaises(ValueError, res.match_quark_mass, self.amu_s, 0.042,
+            self.obs[0])
+        self.assertRaises(ValueError, res.match_quark_mass, self.amu_s, 0.042,
+            self.obs, meth=2)
+
+class Algebra_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(13)
+        # a fit with 2 parameters and 3 fit ranges
+        self.fr1 = FitResult("mass")
+        self.fr1.create_empty((10, 2, 3), (10, 3), 1)
+        self.fr1.data[0][...] = rng.rand(10, 2, 3) + 1.
+        self.fr1.pval[0][...] = rng.rand(3)
+        # a combined fit depending on fr1 with 4 fit ranges each
+        self.fr2 = FitResult("energy")
+        self.fr2.create_empty((10, 2, 3, 4), (10, 3, 4), [1, 1])
+        self.fr2.data[0][...] = rng.rand(10, 2, 3, 4) + 1.
+        self.fr2.pval[0][...] = rng.rand(3, 4)
+
+    def test_dependend(self):
+        res = self.fr2.subtract(self.fr1, 1, 1, isdependend=True)
+        self.assertTrue(res.derived)
+        self.assertEqual(res.data[0].shape, (10, 3, 4))
+        ref = self.fr2.data[0][:,1] - self.fr1.data[0][:,1,:,None]
+        self.assertTrue(np.allclose(res.data[0], ref))
+        wref = self.fr1.weight[1][0][:,None] * self.fr2.weight[1][0]
+        self.assertTrue(np.allclose(res.pval[0][3], wref))
+        # the weights are not copied for every sample
+        self.assertEqual(res.pval[0].strides[0], 0)
+        # until the result is changed
+        res.add_data((0, 0, 1, 2), np.zeros(10), np.ones(10), np.ones(10))
+        self.assertTrue(np.all(res.pval[0][:,1,2] == 1.))
+        self.assertTrue(np.allclose(res.pval[0][:,0], wref[0]))
+        self.assertTrue(np.all(res.chi2[0][:,1,2] == 1.))
+
+    def test_independend(self):
+        res = self.fr1.multiply(self.fr2, 1, 1)
+        self.assertEqual(res.data[0].shape, (10, 3, 3, 4))
+        ref = self.fr1.data[0][:,1,:,None,None] * self.fr2.data[0][:,None,1]
+        self.assertTrue(np.allclose(res.data[0], ref))
+
+    def test_operators(self):
+        res = 2. * self.fr1 + 1.
+        self.assertTrue(np.allclose(res.data[0], 2.*self.fr1.data[0][:,0]+1.))
+        res = (-self.fr1).divide(self.fr1, isdependend=True)
+        self.assertTrue(np.allclose(res.data[0], -1.))
+        # operators combine the fit ranges independently
+        res = (-self.fr1) / self.fr1
+        self.assertEqual(res.data[0].shape, (10, 3, 3))
+        # the derived result can be used again
+        res = (self.fr1 * self.fr1).apply(np.sqrt)
+        self.assertTrue(np.allclose(res.data[0], self.fr1.data[0][:,0]))
+        res.calc_error()
+
+    def test_per_sample(self):
+        fse = np.arange(10.)
+        res = self.fr1.apply(np.multiply, fse, par=1)
+        self.assertTrue(np.allclose(res.data[0],
+            fse[:,None] * self.fr1.data[0][:,1]))
+
+    def test_mult_obs(self):
+        derived = self.fr2.subtract(self.fr1, 1, 1, isdependend=True)
+        res = derived.mult_obs(self.fr1, isdependend=True)
+        ref = derived.data[0] * self.fr1.data[0][:,1,:,None]
+        self.assertTrue(np.allclose(res.data[0], ref))
+
+    def test_res_reduced(self):
+        res = self.fr1.res_reduced(samples=50)
+        self.assertTrue(res.derived)
+        self.assertEqual(res.data[0].shape, (10, 50))
+        weights = self.fr1.weight[1][0]
+        w = res.pval[0][0]
+        self.assertTrue(np.all(np.diff(w) >= 0.))
+        self.assertTrue(np.all(res.pval[0] == w))
+        # every drawn range keeps its data and weight
+        for i in range(50):
+            j = np.flatnonzero(weights == w[i])[0]
+            self.assertTrue(np.array_equal(res.data[0][:,i],
+                self.fr1.data[0][:,1,j]))
+        self.assertTrue(np.all(res.chi2[0] == 0.))
+
+    def test_to_CM(self):
+        d = np.array([0., 0., 1.])
+        for lattice in (True, False):
+            res = self.fr2.to_CM(1, L=24, d=d, uselattice=lattice)
+            self.assertEqual(res.data[0].shape, (10, 3, 4))
+            gamma, ref = calc_Ecm(self.fr2.data[0][:,1], d, 24, lattice)
+            self.assertTrue(np.allclose(res.data[0], ref))
+            self.assertTrue(np.allclose(res.chi2[0], gamma))
+            self.assertTrue(np.all(res.pval[0] == self.fr2.weight[1][0]))
+        res = self.fr1.to_CM(0, d=np.zeros(3))
+        self.assertTrue(np.array_equal(res.data[0], self.fr1.data[0][:,0]))
+        self.assertTrue(np.all(res.chi2[0] == 1.))
+
+    def test_calc_momentum(self):
+        self.fr1.calc_error()
+        mass = self.fr1.data[0][:,1]
+        ecm = self.fr2.to_CM(1, uselattice=False)
+        res = ecm.calc_momentum(self.fr1, 1, uselattice=False,
+            isdependend=True)
+        self.assertEqual(res.data[0].shape, (10, 3, 4))
+        ref = calc_q2(ecm.data[0], mass[:,:,None], 24, False)
+        self.assertTrue(np.allclose(res.data[0], ref))
+        wref = self.fr1.weight[1][0][:,None] * ecm.weight[0][0]
+        self.assertTrue(np.allclose(res.pval[0][5], wref))
+        # a new axis for the fit ranges of the mass
+        ecm = self.fr1.to_CM(0)
+        res = ecm.calc_momentum(self.fr1, 1, uselattice=False)
+        self.assertEqual(res.data[0].shape, (10, 3, 3))
+        for m in range(3):
+            ref = calc_q2(ecm.data[0], mass[:,m,None], 24, False)
+            self.assertTrue(np.allclose(res.data[0][:,m], ref))
+        wref = self.fr1.weight[1][0][:,None] * ecm.weight[0][0]
+        self.assertTrue(np.allclose(res.pval[0][0], wref))
+        self.assertTrue(np.all(res.chi2[0] == 0.))
+
+    def test_fse(self):
+        data = self.fr1.data[0].copy()
+        self.fr1.fse_multiply(2., 0.)
+        self.assertTrue(np.allclose(self.fr1.data[0], 2.*data))
+        self.fr1.fse_subtract(1., 0.)
+        self.assertTrue(np.allclose(self.fr1.data[0], 2.*data-1.))
+        # all corrections take the stream
+        import rng
+        for op in ("multiply", "divide", "add", "subtract"):
+            a, b = FitResult("a"), FitResult("b")
+            for fr in (a, b):
+                fr.create_empty((10, 2, 3), (10, 3), 1)
+                fr.data[0][...] = data
+                getattr(fr, "fse_" + op)(1., 0.1, stream=rng.stream(
+                    purpose="fse"))
+            self.assertTrue(np.array_equal(a.data[0], b.data[0]))
+            self.assertFalse(np.array_equal(a.data[0], data))
+
 if __name__ == "__main__":
     unittest.main()
 
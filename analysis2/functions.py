@@ -5,6 +5,8 @@ Different functions with no other place to go.
 import os
 import numpy as np
 
+import kernels
+
 def compute_derivative(data):
     """Computes the derivative of a correlation function.
 
@@ -26,23 +28,17 @@ def compute_derivative(data):
     IndexError
         If array has only 1 axis.
     """
-    # creating derivative array from data array
-    dshape = list(data.shape)
-    dshape[1] = data.shape[1] - 1
-    derv = np.zeros(dshape, dtype=float)
-    # computing the derivative
-    for b, row in enumerate(data):
-        for t in range(len(row)-1):
-            derv[b,t] = row[t+1] - row[t]
-    return derv
-
-def compute_eff_mass(data, usecosh=True):
+    return kernels.derivative(data)
+
+def compute_eff_mass(data, usecosh=True, T=None, usesinh=False):
     """Computes the effective mass of a correlation function.
 
     The effective mass is calculated along the second axis. The extend
     along the axis is reduced, depending on the effective mass formula
     used. The standard formula is based on the cosh function, the
-    alternative is based on the log function.
+    alternative is based on the log function. If the time extent T is
+    given, the mass is the solution of the implicit cosh (or sinh)
+    equation of a periodic correlator.
 
     Parameters
     ----------
@@ -50,26 +46,19 @@ def compute_eff_mass(data, usecosh=True):
         The data.
     usecosh : bool
         Toggle between the two implemented methods.
+    T : int, optional
+        The time extent of the lattice for the implicit formula.
+    usesinh : bool, optional
+        Use sinh in the implicit formula.
 
     Returns
     -------
     ndarray
         The effective mass of the data.
     """
-    if usecosh:
-        # creating mass array from data array
-        mass = np.zeros_like(data[:,:-2])
-        for b, row in enumerate(data):
-            for t in range(1, len(row)-1):
-                mass[b,t-1] = (row[t-1] + row[t+1])/(2.*row[t])
-        mass = np.arccosh(mass)
-    else:
-        # creating mass array from data array
-        mass = np.zeros_like(data[:,:-1])
-        for b, row in enumerate(data):
-            for t in range(len(row)-1):
-               mass[b, t] = np.log(row[t]/row[t+1])
-    return mass
+    if T is not None:
+        return kernels.eff_mass_implicit(data, T, usesinh)
+    return kernels.eff_mass(data, usecosh)
 
 def func_single_corr(p, t, T2):
     """A function that describes two point correlation functions.
@@ -298,16 +287,7 @@ def compute_derivative_back(data):
     IndexError
         If array has only 1 axis.
     """
-    # creating derivative array from data array
-    dshape = list(data.shape)
-    print dshape
-    dshape[0] = data.shape[1] - 1
-    derv = np.zeros(dshape, dtype=float)
-    # computing the derivative
-    for b, row in enumerate(data):
-        for t in range(len(row)-1):
-            derv[b,t] = row[t] - row[t+1]
-    return derv
+    return kernels.derivative_back(data)
 
 def compute_square(data):
     """ Compute the squared correlator
@@ -322,4 +302,4 @@ def compute_square(data):
     ndarray
         The square of the data.
     """
-    return np.square(data)
+    return kernels.square(data)
@@ -17,7 +17,19 @@ class Func_Test(unittest.TestCase):
         self.assertTrue(np.array_equiv(data1, np.array([1.])))
 
     def test_eff_mass(self):
-        pass
+        t = np.arange(20, dtype=float)
+        data = np.exp(-0.3*t)[None,:]
+        self.assertTrue(np.allclose(func.compute_eff_mass(data), 0.3))
+        self.assertTrue(np.allclose(func.compute_eff_mass(data, False), 0.3))
+        data = np.cosh(0.3*(t-10.))[None,:]
+        mass = func.compute_eff_mass(data, T=20)
+        self.assertTrue(np.allclose(mass[0,:8], 0.3))
+
+    def test_derivative_back(self):
+        data = np.arange(20).reshape((2,10))
+        data1 = func.compute_derivative_back(data)
+        self.assertEqual(data1.shape, (2,9))
+        self.assertTrue(np.array_equiv(data1, np.array([-1.])))
 
     def test_error(self):
         pass
@@ -6,6 +6,8 @@ import numpy as np
 import scipy.linalg as spla
 import itertools
 
+from instrument import timed
+
 def gevp_shift_1(data, dt, dE=None, debug=0):
     """Weight-shift the correlation function matrix.
 
@@ -262,6 +264,7 @@ def solve_gevp_gen(data, t0):
         except (spla.LinAlgError, TypeError) as e:
             return
 
+@timed("gevp")
 def calculate_gevp(data, t0=1):
     """Solves the generalized eigenvalue problem of a correlation
     function matrix.
@@ -5,9 +5,14 @@ Functions for in and output
 from __future__ import with_statement
 
 import os
+import zipfile
+import itertools
+import tempfile
 import numpy as np
 import ConfigParser as cp
 
+import instrument
+
 def read_single(fname, column, skip, debug):
     """Read a single correlation function from file.
 
@@ -123,9 +128,96 @@ def inputnames(conf_file, corr_string):
     return inputnames
   
 
-def read_matrix(fname, column, skip, debug):
+def sym_indices(n):
+    """Indices of the upper triangle of a n x n matrix.
+
+    The packed symmetric storage keeps the elements (i, j) with i <= j in
+    row-major order along the last axis.
+
+    Parameters
+    ----------
+    n : int
+        The size of the matrix.
+
+    Returns
+    -------
+    tuple of ndarray
+        The row and column indices.
+    """
+    return np.triu_indices(n)
+
+def sym_size(npacked):
+    """Size of the matrix stored in npacked elements.
+
+    Raises
+    ------
+    RuntimeError
+        If npacked is not a triangular number.
+    """
+    _n = int(np.floor(np.sqrt(2*npacked)))
+    if _n*(_n+1)//2 != npacked:
+        raise RuntimeError("Wrong number of elements for packed matrix")
+    return _n
+
+def pack_sym(matrix):
+    """Pack symmetric matrices stored in the last two axes.
+
+    Parameters
+    ----------
+    matrix : ndarray
+        The data, the last two axes have the same extent.
+
+    Returns
+    -------
+    ndarray
+        The upper triangle, the last two axes are replaced by one axis of
+        extent n(n+1)/2.
+    """
+    _i, _j = sym_indices(matrix.shape[-1])
+    return matrix[..., _i, _j]
+
+def unpack_sym(packed):
+    """Expand packed symmetric matrices, see pack_sym.
+
+    Parameters
+    ----------
+    packed : ndarray
+        The upper triangles along the last axis.
+
+    Returns
+    -------
+    ndarray
+        The full symmetric matrices in the last two axes.
+    """
+    _n = sym_size(packed.shape[-1])
+    _i, _j = sym_indices(_n)
+    matrix = np.zeros(packed.shape[:-1] + (_n, _n), dtype=packed.dtype)
+    matrix[..., _i, _j] = packed
+    matrix[..., _j, _i] = packed
+    return matrix
+
+def _matrix_files(fname, upper):
+    """Files of the packed elements of a correlation function matrix.
+
+    Returns a list with the file of element (i, j), i <= j, and the file
+    of the transposed element (j, i) or None for every packed element.
+    """
+    if upper:
+        _n = sym_size(len(fname))
+        return [(f, None) for f in fname]
+    _n = int(np.floor(np.sqrt(len(fname))))
+    if _n*_n != len(fname):
+        raise RuntimeError("Wrong number of files for matrix")
+    return [(fname[_i*_n+_j], fname[_j*_n+_i] if _i != _j else None)
+        for _i, _j in zip(*sym_indices(_n))]
+
+def read_matrix(fname, column, skip, debug, upper=False, packed=False):
     """Read a correlation function matrix from files.
 
+    The matrix is symmetrized while reading, the off-diagonal elements
+    are averaged pairwise, so at most two files are kept in memory in
+    addition to the result.
+
     Parameters
     ----------
     filename : sequence of str
@@ -136,6 +228,11 @@ def read_matrix(fname, column, skip, debug):
         The number of header lines that are skipped.
     debug : int, optional
         The amount of debug information printed.
+    upper : bool, optional
+        The files only contain the upper triangle, element (i, j) with
+        i <= j in row-major order, instead of all n x n elements.
+    packed : bool, optional
+        Return the packed upper triangle, see pack_sym.
 
     Returns
     -------
@@ -143,40 +240,177 @@ def read_matrix(fname, column, skip, debug):
         The correlation function
     """
     verbose = (debug > 0) and True or False
-    # check length of the sequence gives a nxn matrix
-    _n = int(np.floor(np.sqrt(len(fname))))
-    if _n*_n != len(fname):
-        raise RuntimeError("Wrong number of files for matrix")
-
-    # read in all data
-    data = []
-    for f in fname:
-        data.append(read_data_ascii(f, column, False, skip, verbose))
-    
-    # check if shape of all arrays is the same
-    _rshape = data[0].shape
-    for d in data:
-        if d.shape != _rshape:
+    files = _matrix_files(fname, upper)
+
+    data = None
+    for _k, (f, ft) in enumerate(files):
+        d = read_data_ascii(f, column, False, skip, verbose)
+        if ft is not None:
+            dt = read_data_ascii(ft, column, False, skip, verbose)
+            if dt.shape != d.shape:
+                raise ValueError("Some correlation functions are not compatible")
+            d = (d + dt) / 2.
+        if data is None:
+            data = np.zeros(d.shape + (len(files),), dtype=float)
+        elif d.shape != data.shape[:-1]:
             raise ValueError("Some correlation functions are not compatible")
-    # allocate numpy array for matrix
-    _rshape = data[0].shape + (_n,) * 2
-    matrix = np.zeros(_rshape, dtype=float)
-    # sort the data into a matrix
-    for _i, d in enumerate(data):
-        matrix[..., _i//_n, _i%_n] = d
-    
-    # symmetrize matrix
-    # create list of all indices needed to iterate over
-    sym_matrix = np.zeros_like(matrix)
-    for _a in range(matrix.shape[-2]):
-        for _b in range(matrix.shape[-1]):
-            sym_matrix[...,_a,_b] = (matrix[...,_a,_b]+matrix[...,_b,_a])/2.
+        data[..., _k] = d
+    if packed:
+        return data
+    return unpack_sym(data)
+
+def read_ascii_chunks(filename, column=(1,), skip=1, chunksize=100,
+        verbose=False):
+    """Read a file in L. Liu's data format in chunks of configurations.
 
-    return sym_matrix
+    Only one chunk is kept in memory at a time.
 
-def write_data(data, filename, verbose=False):
+    Parameters
+    ----------
+    filename : str
+        The name of the file to read from.
+    column : sequence, optional
+        The columns to read.
+    skip : int, optional
+        The number of header lines that are skipped.
+    chunksize : int, optional
+        The number of configurations in each chunk.
+    verbose : bool
+        Toggle info output
+
+    Yields
+    ------
+    ndarray
+        The data of the next configurations, shape (chunksize, T) for
+        one column and (chunksize, T, ncol) otherwise. The last chunk
+        may be smaller.
+    """
+    check_read(filename)
+    if verbose:
+        print("reading from file " + str(filename))
+    nconf, T = read_header(filename)[:2]
+    nbcol = len(column)
+    instrument.add_bytes("io.read_ascii", _file_size(filename))
+    with open(filename, "r") as _f:
+        for _i in range(max(skip, 1)):
+            _f.readline()
+        for start in range(0, nconf, chunksize):
+            n = min(chunksize, nconf - start)
+            lines = list(itertools.islice(_f, n*T))
+            with instrument.span("io.read_ascii"):
+                data = np.loadtxt(lines, usecols=column, ndmin=2)
+            if nbcol == 1:
+                yield data.reshape((n, T))
+            else:
+                yield data.reshape((n, T, nbcol))
+
+def read_chunks(fname, column=(1,), skip=1, chunksize=100, matrix=True,
+        debug=0, upper=False, packed=False):
+    """Read correlation functions in chunks of configurations.
+
+    The chunks have the same layout as the data read by the Correlators
+    class, see read_single, read_vector and read_matrix.
+
+    Parameters
+    ----------
+    fname : str or sequence of str
+        The name of the file or the names of the files.
+    column : sequence, optional
+        The columns that are read.
+    skip : int, optional
+        The number of header lines that are skipped.
+    chunksize : int, optional
+        The number of configurations in each chunk.
+    matrix : bool, optional
+        Treat a sequence of files as matrix or vector.
+    debug : int, optional
+        The amount of debug information printed.
+    upper : bool, optional
+        The files of a matrix only contain the upper triangle.
+    packed : bool, optional
+        Yield matrices in packed symmetric form, see pack_sym.
+
+    Returns
+    -------
+    int
+        The number of configurations.
+    generator
+        The generator of the chunks.
+    """
+    verbose = (debug > 0) and True or False
+    if not isinstance(fname, (list, tuple)):
+        nconf = read_header(fname)[0]
+        gen = (np.atleast_3d(c) for c in read_ascii_chunks(fname, column,
+            skip, chunksize, verbose))
+        return nconf, gen
+    if matrix:
+        files = _matrix_files(fname, upper)
+        # the transposed elements are averaged on the fly
+        pairs = [_k for _k, (f, ft) in enumerate(files) if ft is not None]
+        fname = [f for f, ft in files] + [files[_k][1] for _k in pairs]
+    nconf = [read_header(f)[0] for f in fname]
+    if any(n != nconf[0] for n in nconf):
+        raise ValueError("Some correlation functions are not compatible")
+    def _gen():
+        readers = [read_ascii_chunks(f, column, skip, chunksize, verbose)
+            for f in fname]
+        for chunks in itertools.izip(*readers):
+            if not matrix:
+                yield np.stack(chunks, axis=-1)
+                continue
+            data = np.stack(chunks[:len(files)], axis=-1)
+            for _k, c in zip(pairs, chunks[len(files):]):
+                data[..., _k] = (data[..., _k] + c) / 2.
+            yield data if packed else unpack_sym(data)
+    return nconf[0], _gen()
+
+def read_confs_chunks(path, corrname, confs, _T=48, chunksize=100,
+        verb=False):
+    """Read correlation functions of several configurations in chunks.
+
+    See read_confs, only chunksize configurations are kept in memory.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data to read.
+    corrname : str
+        The name of the correlation function.
+    confs : sequence of str
+        The configuration folder names.
+    _T : int, optional
+        The temporal extent of the functions.
+    chunksize : int, optional
+        The number of configurations in each chunk.
+    verb : bool, optional
+        Toggle info output.
+
+    Yields
+    ------
+    ndarray
+        The data of the next configurations, shape (chunksize, T, 2).
+    """
+    for start in range(0, len(confs), chunksize):
+        yield read_confs(path, corrname, confs[start:start+chunksize], _T,
+            verb)
+
+def compact_name(filename):
+    """The name of the file in the compact format, the extension .npy
+    is replaced by .npz, which is added if there is no extension."""
+    base, ext = os.path.splitext(filename)
+    if ext in ("", ".npy"):
+        return base + ".npz"
+    return filename
+
+def write_data(data, filename, verbose=False, compact=False):
     """Write numpy array to binary numpy format.
 
+    In the compact format the bootstrap samples are stored in single
+    precision, only the original data (sample 0) is kept in double
+    precision. The compact format is a npz file, it is written with the
+    extension .npz instead of .npy, see compact_name. read_data
+    converts the data back to double precision.
+
     Parameters
     ----------
     filename : str
@@ -185,15 +419,38 @@ def write_data(data, filename, verbose=False):
         The data to write.
     verbose : bool
         Toggle info output
+    compact : bool, optional
+        Use the compact format.
+
+    Returns
+    -------
+    str
+        The name of the written file.
     """
     check_write(filename)
+    if compact:
+        filename = compact_name(filename)
+    elif not filename.endswith(".npy"):
+        # np.save appends the extension as well
+        filename += ".npy"
     if verbose:
         print("saving to file" + str(filename))
-    np.save(filename, data)
+    if compact:
+        first, rest = _split_samples(data)
+        with instrument.span("io.write"):
+            _savez_mixed(filename, {"s0": first, "sa": rest})
+    else:
+        with instrument.span("io.write"):
+            np.save(filename, data)
+    instrument.add_bytes("io.write", _file_size(filename))
+    return filename
 
 def read_data(filename, verbose=False):
     """Reads numpy data from binary numpy format.
 
+    If filename does not exist, the file of the compact format is read,
+    see write_data.
+
     Parameters
     ----------
     filename : str 
@@ -206,6 +463,8 @@ def read_data(filename, verbose=False):
     data : ndarray
         The read data
     """
+    if not os.path.isfile(filename) and os.path.isfile(compact_name(filename)):
+        filename = compact_name(filename)
     try:
         check_read(filename)
     except IOError as e:
@@ -213,7 +472,14 @@ def read_data(filename, verbose=False):
 
     if verbose:
         print("reading from file " + str(filename))
-    data = np.load(filename)
+    with instrument.span("io.read"):
+        data = np.load(filename)
+        # the compact format is an npz file
+        if isinstance(data, np.lib.npyio.NpzFile):
+            tmp = data
+            data = _join_samples(tmp["s0"], tmp["sa"])
+            tmp.close()
+    instrument.add_bytes("io.read", _file_size(filename))
     return data
 
 def write_data_ascii(data, filename, verbose=False):
@@ -309,7 +575,9 @@ def read_data_ascii(filename, column=(1,), noheader=False, skip=0,
         if skip == 0:
             skip = 1
     # read in data from file, skipping the header if needed
-    data = np.genfromtxt(filename, skip_header=skip, usecols=column)
+    with instrument.span("io.read_ascii"):
+        data = np.genfromtxt(filename, skip_header=skip, usecols=column)
+    instrument.add_bytes("io.read_ascii", _file_size(filename))
     # casting the array into the right shape, sample number as first index,
     # time index as second index
     # if more than one column is read, the third axis reflects this
@@ -393,12 +661,17 @@ def read_data_w_err_ascii(filename, datacol=(1,), errcol=(2,), verbose=False):
     return _data[:,:,:len(datacol)], _data[:,:,len(datacol):]
 
 def write_fitresults(filename, data, fitint, par, chi2, pvals, label,
-    verbose=False):
+    verbose=False, compact=False):
     """Writes the fitresults to a numpy file.
 
     The function takes lists of numpy arrays and writes them in the
     npz format.
 
+    In the compact format the bootstrap samples of the fit results are
+    stored in single precision, the original data (sample 0) in double
+    precision, and the chi^2 and p-values are compressed. Everything is
+    converted back to double precision by read_fitresults.
+
     Parameters
     ----------
     filename : str
@@ -417,6 +690,8 @@ def write_fitresults(filename, data, fitint, par, chi2, pvals, label,
         The labels of the fit.
     verbose : bool
         Toggle info output
+    compact : bool, optional
+        Use the compact format.
     """
     # check file
     check_write(filename)
@@ -428,13 +703,26 @@ def write_fitresults(filename, data, fitint, par, chi2, pvals, label,
     # except for the fit intervals are 2 characters plus their two digit index 
     # for each level of recursion. The name of the fit intervals is chosen to
     # be always shorter than the other names.
+    # In the compact format 'pi' holds sample 0 and 'ps' the other samples.
     dic = {"data": data}
     dic.update({'fi': fitint})
-    dic.update({'pi%02d' % i: p for (i, p) in enumerate(par)})
-    dic.update({'ch%02d' % i: p for (i, p) in enumerate(chi2)})
-    dic.update({'pv%02d' % i: p for (i, p) in enumerate(pvals)})
     dic.update({'la%02d' % i: p for (i, p) in enumerate(label)})
-    np.savez(filename, **dic)
+    if compact:
+        if not filename.endswith(".npz"):
+            filename += ".npz"
+        for i, p in enumerate(par):
+            dic['pi%02d' % i], dic['ps%02d' % i] = _split_samples(p)
+        comp = {'ch%02d' % i: p for (i, p) in enumerate(chi2)}
+        comp.update({'pv%02d' % i: p for (i, p) in enumerate(pvals)})
+        with instrument.span("io.write"):
+            _savez_mixed(filename, dic, comp)
+    else:
+        dic.update({'pi%02d' % i: p for (i, p) in enumerate(par)})
+        dic.update({'ch%02d' % i: p for (i, p) in enumerate(chi2)})
+        dic.update({'pv%02d' % i: p for (i, p) in enumerate(pvals)})
+        with instrument.span("io.write"):
+            np.savez(filename, **dic)
+    instrument.add_bytes("io.write", _file_size(filename, ".npz"))
 
 def read_fitresults(filename, verbose=False):
     """Reads the fit results from file.
@@ -469,29 +757,93 @@ def read_fitresults(filename, verbose=False):
 
     if verbose:
         print("reading from file " + str(filename))
-    f = np.load(filename)
-    #with np.load(filename) as f:
-    # check the number of levels to build
-    # The array names are  2 characters plus the two digit index of the
-    # for each level. The name of the fit intervals is only 2 characters
-    # to be able to treat it different to the rest
-    if verbose:
-        print("reading %d items" % len(f.files))
-    L = f.files
-    n = (len(L) - 2) // 4
-    par, chi2, pvals = [], [], []
-    fitint, label = [], []
-    label = []
-    data = f['data']
-    fitint = f['fi']
-    for i in range(n):
-        par.append(f['pi%02d' % i])
-        chi2.append(f['ch%02d' % i])
-        pvals.append(f['pv%02d' % i])
-        label.append(f['la%02d' % i])
-    f.close()
+    instrument.add_bytes("io.read", _file_size(filename))
+    with instrument.span("io.read"):
+        f = np.load(filename)
+        #with np.load(filename) as f:
+        # check the number of levels to build
+        # The array names are  2 characters plus the two digit index of the
+        # for each level. The name of the fit intervals is only 2 characters
+        # to be able to treat it different to the rest
+        if verbose:
+            print("reading %d items" % len(f.files))
+        L = f.files
+        n = len([x for x in L if x.startswith("la")])
+        par, chi2, pvals = [], [], []
+        fitint, label = [], []
+        label = []
+        data = f['data']
+        fitint = f['fi']
+        for i in range(n):
+            if 'ps%02d' % i in L:
+                par.append(_join_samples(f['pi%02d' % i], f['ps%02d' % i]))
+            else:
+                par.append(f['pi%02d' % i])
+            chi2.append(f['ch%02d' % i])
+            pvals.append(f['pv%02d' % i])
+            label.append(f['la%02d' % i])
+        f.close()
     return data, fitint, par, chi2, pvals, label
 
+def _split_samples(data):
+    """Split bootstrap samples into sample 0 and the other samples, the
+    latter in single precision."""
+    data = np.asarray(data)
+    if data.dtype == np.float64:
+        return data[:1], data[1:].astype(np.float32)
+    elif data.dtype == np.complex128:
+        return data[:1], data[1:].astype(np.complex64)
+    # everything else is stored as is
+    return data[:1], data[1:]
+
+def _join_samples(first, rest):
+    """Inverse of _split_samples, returns the data in the precision of
+    sample 0."""
+    res = np.empty((first.shape[0] + rest.shape[0],) + first.shape[1:],
+        dtype=first.dtype)
+    res[:first.shape[0]] = first
+    res[first.shape[0]:] = rest
+    return res
+
+def _savez_mixed(filename, stored, compressed=None):
+    """Write arrays to a npz file, only the arrays in compressed are
+    compressed.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the file, it is used unchanged.
+    stored, compressed : dict of ndarrays
+        The arrays to write uncompressed and compressed.
+    """
+    if compressed is None:
+        compressed = {}
+    zipf = zipfile.ZipFile(filename, mode="w", compression=zipfile.ZIP_STORED,
+        allowZip64=True)
+    # every array is written to a temporary file first, like numpy does
+    fd, tmpfile = tempfile.mkstemp(suffix="-numpy.npy")
+    os.close(fd)
+    try:
+        for arrays, ctype in ((stored, zipfile.ZIP_STORED),
+                (compressed, zipfile.ZIP_DEFLATED)):
+            for key, val in arrays.items():
+                with open(tmpfile, "wb") as f:
+                    np.lib.format.write_array(f, np.asanyarray(val),
+                        allow_pickle=True)
+                zipf.write(tmpfile, arcname=key + ".npy", compress_type=ctype)
+    finally:
+        os.remove(tmpfile)
+        zipf.close()
+
+def _file_size(filename, ext=""):
+    """The size of a file in bytes, numpy may have added the extension."""
+    if not os.path.isfile(filename):
+        filename += ext
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
 def read_header(filename, verbose=False):
     """Parses the first line of the data format of L. Liu.
 
@@ -2,10 +2,14 @@
 Unit tests for I/O functions
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
 import io
+import in_out
 
 class IO_Test(unittest.TestCase):
     def test_write_data(self):
@@ -44,6 +48,96 @@ class IO_Test(unittest.TestCase):
     def test_check_write(self):
         self.assertTrue(True)
 
+class Compact_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.data = np.random.rand(50, 10, 2, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_data(self):
+        fname = os.path.join(self.path, "data.npy")
+        self.assertEqual(in_out.write_data(self.data, fname, compact=True),
+            os.path.join(self.path, "data.npz"))
+        self.assertEqual(os.listdir(self.path), ["data.npz"])
+        # the compact file is found under the requested name as well
+        res = in_out.read_data(fname)
+        self.assertTrue(np.array_equal(res, in_out.read_data(
+            os.path.join(self.path, "data.npz"))))
+        self.assertEqual(res.dtype, np.float64)
+        self.assertEqual(res.shape, self.data.shape)
+        # sample 0 is exact, the rest single precision
+        self.assertTrue(np.array_equal(res[0], self.data[0]))
+        self.assertTrue(np.allclose(res[1:], self.data[1:], rtol=1e-6))
+
+    def test_data_extension(self):
+        fname = os.path.join(self.path, "data.dat")
+        self.assertEqual(in_out.write_data(self.data, fname), fname + ".npy")
+        self.assertEqual(os.listdir(self.path), ["data.dat.npy"])
+        self.assertTrue(np.array_equal(in_out.read_data(fname + ".npy"),
+            self.data))
+
+    def test_data_smaller(self):
+        fname = os.path.join(self.path, "data.npy")
+        in_out.write_data(self.data, fname)
+        fname_c = in_out.write_data(self.data, os.path.join(self.path,
+            "data_c"), compact=True)
+        self.assertLess(os.path.getsize(fname_c), 0.6*os.path.getsize(fname))
+
+    def test_fitresults(self):
+        fname = os.path.join(self.path, "fit.npz")
+        par = [np.random.rand(50, 2, 4), np.random.rand(50, 2, 3)]
+        chi2 = [np.random.rand(50, 4), np.random.rand(50, 3)]
+        pvals = [np.random.rand(50, 4), np.random.rand(50, 3)]
+        label = [np.asarray([0]), np.asarray([1])]
+        fitint = np.asarray([[8, 12], [9, 12]])
+        in_out.write_fitresults(fname, np.ones(4), fitint, par, chi2, pvals,
+            label, compact=True)
+        res = in_out.read_fitresults(fname)
+        self.assertEqual(len(res[2]), 2)
+        for p, r in zip(par, res[2]):
+            self.assertEqual(r.dtype, np.float64)
+            self.assertTrue(np.array_equal(r[0], p[0]))
+            self.assertTrue(np.allclose(r, p, rtol=1e-6))
+        for c, r in zip(chi2, res[3]):
+            self.assertTrue(np.array_equal(c, r))
+        for c, r in zip(pvals, res[4]):
+            self.assertTrue(np.array_equal(c, r))
+        self.assertTrue(np.array_equal(res[1], fitint))
+
+class PackedMatrix_Test(unittest.TestCase):
+    def setUp(self):
+        self.fnames = ["./test_data/corr_test_mat_short_%d%d.txt" % (s,t) \
+            for s in range(3) for t in range(3)]
+
+    def test_pack_unpack(self):
+        mat = np.random.rand(4, 5, 3, 3)
+        mat = mat + np.swapaxes(mat, -1, -2)
+        packed = in_out.pack_sym(mat)
+        self.assertEqual(packed.shape, (4, 5, 6))
+        self.assertTrue(np.array_equal(in_out.unpack_sym(packed), mat))
+        self.assertRaises(RuntimeError, in_out.unpack_sym, np.zeros((2, 5)))
+
+    def test_read_packed(self):
+        full = in_out.read_matrix(self.fnames, (1,), 1, 0)
+        packed = in_out.read_matrix(self.fnames, (1,), 1, 0, packed=True)
+        self.assertEqual(packed.shape, full.shape[:-2] + (6,))
+        self.assertTrue(np.allclose(in_out.unpack_sym(packed), full))
+
+    def test_read_upper(self):
+        upper = [self.fnames[3*i+j] for i in range(3) for j in range(i, 3)]
+        mat = in_out.read_matrix(upper, (1,), 1, 0, upper=True)
+        ref = in_out.read_matrix(self.fnames, (1,), 1, 0)
+        self.assertEqual(mat.shape, ref.shape)
+        for i in range(3):
+            for j in range(i, 3):
+                single = in_out.read_single(self.fnames[3*i+j], (1,), 1, 0)
+                self.assertTrue(np.allclose(mat[...,i,j], single))
+                self.assertTrue(np.allclose(mat[...,j,i], single))
+        self.assertRaises(RuntimeError, in_out.read_matrix, upper[:5], (1,),
+            1, 0, upper=True)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,191 @@
+"""
+Timing and memory instrumentation of the analysis stages.
+
+The stages of the analysis are wrapped in spans, which record the wall
+time, the number of calls, the number of bytes read or written and the
+resident memory. The memory is only known as the peak of the whole
+process: process_peak_rss is that peak when the stage last finished,
+it includes all earlier stages. rss_growth is the largest increase of
+the peak during one call of the stage, i.e. how far the stage pushed
+the memory of the process beyond everything before. Counters record
+everything else, e.g. cache hits and misses. The collected data can be
+printed with print_report or exported as JSON.
+
+Nested spans are recorded separately, the time of the outer span
+includes the time of the inner spans.
+"""
+
+from __future__ import with_statement
+
+import json
+import time
+import resource
+import contextlib
+
+class _Stage(object):
+    """Collected data of one stage."""
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.
+        self.bytes = 0
+        self.process_peak_rss = 0.
+        self.rss_growth = 0.
+
+    def as_dict(self):
+        return {"calls": self.calls, "time": self.time, "bytes": self.bytes,
+            "process_peak_rss": self.process_peak_rss,
+            "rss_growth": self.rss_growth}
+
+class TrivialClass:
+    pass
+
+__m = TrivialClass()
+__m.enabled = True
+__m.stages = {}
+__m.counters = {}
+
+def enable(flag=True):
+    """Switch the instrumentation on or off.
+
+    Parameters
+    ----------
+    flag : bool, optional
+        The new state.
+    """
+    __m.enabled = bool(flag)
+
+def is_enabled():
+    return __m.enabled
+
+def reset():
+    """Delete all collected data."""
+    __m.stages = {}
+    __m.counters = {}
+
+def peak_memory():
+    """The peak resident memory of the process in MB."""
+    # ru_maxrss is given in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+def _stage(name):
+    try:
+        return __m.stages[name]
+    except KeyError:
+        st = _Stage()
+        __m.stages[name] = st
+        return st
+
+@contextlib.contextmanager
+def span(name):
+    """Context manager measuring the wall time of a stage.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    """
+    if not __m.enabled:
+        yield
+        return
+    start = time.time()
+    rss = peak_memory()
+    try:
+        yield
+    finally:
+        st = _stage(name)
+        st.time += time.time() - start
+        st.calls += 1
+        st.process_peak_rss = peak_memory()
+        st.rss_growth = max(st.rss_growth, st.process_peak_rss - rss)
+
+def timed(name):
+    """Decorator wrapping a function into a span.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    """
+    def decorator(function):
+        def timed_wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        timed_wrapper.__name__ = function.__name__
+        timed_wrapper.__doc__ = function.__doc__
+        return timed_wrapper
+    return decorator
+
+def count(name, n=1):
+    """Increase a counter.
+
+    Parameters
+    ----------
+    name : str
+        The name of the counter.
+    n : int, optional
+        The increment.
+    """
+    if __m.enabled:
+        __m.counters[name] = __m.counters.get(name, 0) + n
+
+def add_bytes(name, nbytes):
+    """Add the number of bytes read or written to a stage.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    nbytes : int
+        The number of bytes.
+    """
+    if __m.enabled:
+        _stage(name).bytes += int(nbytes)
+
+def report():
+    """The collected data.
+
+    Returns
+    -------
+    dict
+        The data of all stages and counters and the peak memory of the
+        process in MB.
+    """
+    stages = dict((k, v.as_dict()) for k, v in __m.stages.items())
+    return {"stages": stages, "counters": dict(__m.counters),
+        "peak_rss": peak_memory()}
+
+def to_json(filename=None):
+    """Export the collected data as JSON.
+
+    Parameters
+    ----------
+    filename : str, optional
+        If given, the data is written to this file.
+
+    Returns
+    -------
+    str
+        The JSON string.
+    """
+    res = json.dumps(report(), indent=2, sort_keys=True)
+    if filename is not None:
+        with open(filename, "w") as f:
+            f.write(res)
+    return res
+
+def print_report():
+    """Print the collected data, slowest stages first."""
+    rep = report()
+    print("%-30s %8s %12s %12s %10s %10s" % ("stage", "calls", "time [s]",
+        "bytes", "+rss [MB]", "rss [MB]"))
+    for name, st in sorted(rep["stages"].items(), key=lambda x: -x[1]["time"]):
+        print("%-30s %8d %12.4f %12d %10.1f %10.1f" % (name, st["calls"],
+            st["time"], st["bytes"], st["rss_growth"], st["process_peak_rss"]))
+    if rep["counters"]:
+        print("%-30s %8s" % ("counter", "value"))
+        for name in sorted(rep["counters"]):
+            print("%-30s %8d" % (name, rep["counters"][name]))
+    print("peak memory %.1f MB" % rep["peak_rss"])
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,84 @@
+"""
+Unit tests for the instrumentation.
+"""
+
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+
+import instrument
+from in_out import write_data, read_data
+
+class Instrument_Test(unittest.TestCase):
+    def setUp(self):
+        instrument.reset()
+        instrument.enable()
+
+    def tearDown(self):
+        instrument.reset()
+        instrument.enable()
+
+    def test_span(self):
+        with instrument.span("test"):
+            pass
+        with instrument.span("test"):
+            pass
+        rep = instrument.report()
+        self.assertEqual(rep["stages"]["test"]["calls"], 2)
+        self.assertGreaterEqual(rep["stages"]["test"]["time"], 0.)
+        self.assertGreater(rep["stages"]["test"]["process_peak_rss"], 0.)
+        self.assertGreaterEqual(rep["stages"]["test"]["rss_growth"], 0.)
+        self.assertLessEqual(rep["stages"]["test"]["rss_growth"],
+            rep["stages"]["test"]["process_peak_rss"])
+
+    def test_span_exception(self):
+        def f():
+            with instrument.span("test"):
+                raise ValueError
+        self.assertRaises(ValueError, f)
+        self.assertEqual(instrument.report()["stages"]["test"]["calls"], 1)
+
+    def test_timed(self):
+        @instrument.timed("func")
+        def f(x):
+            return 2*x
+        self.assertEqual(f(2), 4)
+        self.assertEqual(instrument.report()["stages"]["func"]["calls"], 1)
+
+    def test_count(self):
+        instrument.count("c")
+        instrument.count("c", 3)
+        self.assertEqual(instrument.report()["counters"]["c"], 4)
+
+    def test_disabled(self):
+        instrument.enable(False)
+        with instrument.span("test"):
+            pass
+        instrument.count("c")
+        rep = instrument.report()
+        self.assertEqual(rep["stages"], {})
+        self.assertEqual(rep["counters"], {})
+
+    def test_io_bytes(self):
+        fname = os.path.join(tempfile.mkdtemp(), "tmp.npy")
+        data = np.ones((10, 10))
+        write_data(data, fname)
+        read_data(fname)
+        stages = instrument.report()["stages"]
+        size = os.path.getsize(fname)
+        os.remove(fname)
+        os.rmdir(os.path.dirname(fname))
+        self.assertEqual(stages["io.write"]["bytes"], size)
+        self.assertEqual(stages["io.read"]["bytes"], size)
+
+    def test_json(self):
+        with instrument.span("test"):
+            pass
+        rep = json.loads(instrument.to_json())
+        self.assertIn("test", rep["stages"])
+        self.assertIn("peak_rss", rep)
+
+if __name__ == "__main__":
+    unittest.main()
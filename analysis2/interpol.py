@@ -5,7 +5,6 @@ from scipy.optimize import leastsq
 import scipy.stats
 import math
 import numpy as np
-import fit
 #import analyze_fcts as af
 #import chiral_fits as chf
 
@@ -68,6 +67,189 @@ def evaluate_lin(y1, y2, x, w1, w2, obs_eval):
       
       yield (0,i), result, needed, weight
   
+def _outer(a, ndim, pos):
+    """Reshape a (samples, ranges...) array for an outer product.
+
+    The sample axis stays first, the other axes of a are moved to the
+    positions pos, pos+1, ... of an array with ndim axes.
+    """
+    a = np.asarray(a, dtype=float)
+    if a.ndim == 0:
+        return a.reshape((1,)*ndim)
+    shape = [1] * ndim
+    shape[0] = a.shape[0]
+    shape[pos:pos+a.ndim-1] = a.shape[1:]
+    return a.reshape(shape)
+
+def ipol_poly(x, y, deg=1):
+    """Fit a polynomial in x to all samples and ranges at once.
+
+    With deg+1 points this is an interpolation, with more points a least
+    squares fit. All samples and fit ranges are solved by a single least
+    squares solve with the same Vandermonde matrix.
+
+    Parameters
+    ----------
+    x : sequence of floats
+        The N x values, e.g. the strange quark masses.
+    y : sequence of ndarrays
+        The N observables, each of the same shape (samples, ranges...).
+    deg : int
+        The degree of the polynomial.
+
+    Returns
+    -------
+    ndarray
+        The coefficients, highest power first, with shape
+        (deg+1, samples, ranges...).
+
+    Raises
+    ------
+    ValueError
+        If there are not enough points for the degree.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.shape[0] != y.shape[0]:
+        raise ValueError("number of x values and observables differ")
+    if x.shape[0] < deg + 1:
+        raise ValueError("%d points are not enough for degree %d" % (
+            x.shape[0], deg))
+    vander = np.vander(x, deg+1)
+    coeff = np.linalg.lstsq(vander, y.reshape(y.shape[0], -1), rcond=None)[0]
+    return coeff.reshape((deg+1,) + y.shape[1:])
+
+def eval_poly(coeff, x):
+    """Evaluate the polynomial given by coeff at x.
+
+    Parameters
+    ----------
+    coeff : ndarray
+        The coefficients, highest power first.
+    x : float or ndarray
+        The x values, broadcastable to coeff[0].
+
+    Returns
+    -------
+    ndarray
+        The values of the polynomial.
+    """
+    res = np.zeros(np.broadcast(coeff[0], x).shape)
+    for c in coeff:
+        res *= x
+        res += c
+    return res
+
+def solve_poly(coeff, y, xref):
+    """Solve poly(x) = y for x, for linear and quadratic polynomials.
+
+    For quadratic polynomials the root closer to xref is taken, where
+    no real root exists the result is nan.
+
+    Parameters
+    ----------
+    coeff : ndarray
+        The coefficients, highest power first.
+    y : float or ndarray
+        The value to match, broadcastable to coeff[0].
+    xref : float
+        Reference x value to choose between two roots.
+
+    Returns
+    -------
+    ndarray
+        The solutions.
+    """
+    if coeff.shape[0] == 2:
+        return np.divide(y - coeff[1], coeff[0])
+    elif coeff.shape[0] == 3:
+        a, b, c = coeff[0], coeff[1], coeff[2] - y
+        with np.errstate(invalid="ignore", divide="ignore"):
+            disc = np.sqrt(b*b - 4.*a*c)
+            r1 = (-b + disc) / (2.*a)
+            r2 = (-b - disc) / (2.*a)
+        return np.where(np.abs(r1-xref) <= np.abs(r2-xref), r1, r2)
+    raise ValueError("only degree 1 and 2 can be solved")
+
+def _combine(obs, weights, other, oweight):
+    """Bring observables and a matched quantity to a common shape."""
+    obs = np.asarray(obs, dtype=float)
+    # number of range axes of the observables and of the other quantity
+    nr = obs.ndim - 2
+    other = np.asarray(other, dtype=float)
+    nm = max(other.ndim - 1, 0)
+    ndim = 1 + nr + nm
+    y = np.asarray([_outer(o, ndim, 1) for o in obs])
+    other = _outer(other, ndim, 1 + nr)
+    weight = np.ones((1,) * ndim)
+    for w in weights:
+        weight = weight * _outer(np.asarray(w)[None], ndim, 1)
+    if oweight is not None:
+        weight = weight * _outer(np.asarray(oweight)[None], ndim, 1 + nr)
+    return y, other, weight
+
+def match_poly(x, obs, weights, match, match_weight=None, deg=1):
+    """Find the x value where the observable matches a given value.
+
+    Parameters
+    ----------
+    x : sequence of floats
+        The N x values, e.g. the strange quark masses.
+    obs : sequence of ndarrays
+        The N observables, shape (samples, ranges...).
+    weights : sequence of ndarrays
+        The weights of the fit ranges of every observable.
+    match : float or ndarray
+        The value to match, either a number, one value per sample or an
+        array (samples, ranges...) with its own fit ranges.
+    match_weight : ndarray, optional
+        The weights of the fit ranges of match.
+    deg : int
+        The degree of the polynomial.
+
+    Returns
+    -------
+    ndarray
+        The matched x values, shape (samples, ranges..., match ranges...).
+    ndarray
+        The weights of the result.
+    """
+    y, match, weight = _combine(obs, weights, match, match_weight)
+    coeff = ipol_poly(x, y, deg)
+    res = solve_poly(coeff, match, np.mean(x))
+    return res, np.broadcast_to(weight, res.shape)
+
+def evaluate_poly(x, obs, weights, xeval, xeval_weight=None, deg=1):
+    """Evaluate the observable at given x values.
+
+    Parameters
+    ----------
+    x : sequence of floats
+        The N x values, e.g. the strange quark masses.
+    obs : sequence of ndarrays
+        The N observables, shape (samples, ranges...).
+    weights : sequence of ndarrays
+        The weights of the fit ranges of every observable.
+    xeval : float or ndarray
+        The x value, either a number, one value per sample or an array
+        (samples, ranges...) with its own fit ranges.
+    xeval_weight : ndarray, optional
+        The weights of the fit ranges of xeval.
+    deg : int
+        The degree of the polynomial.
+
+    Returns
+    -------
+    ndarray
+        The values, shape (samples, ranges..., xeval ranges...).
+    ndarray
+        The weights of the result.
+    """
+    y, xeval, weight = _combine(obs, weights, xeval, xeval_weight)
+    coeff = ipol_poly(x, y, deg)
+    res = eval_poly(coeff, xeval)
+    return res, np.broadcast_to(weight, res.shape)
+
 def ipol_lin(y1, y2, x):
     """ Interpolate bootstrapsamples of data linearly
 
@@ -0,0 +1,51 @@
+"""
+Unit tests for the interpolation functions.
+"""
+
+import unittest
+import numpy as np
+
+import interpol as ip
+
+class Poly_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(11)
+        self.x = np.asarray([0.0185, 0.0225, 0.0246])
+        # samples and two fit range axes
+        self.c = rng.rand(3, 20, 4, 2) + 1.
+        self.y = [ip.eval_poly(self.c, x) for x in self.x]
+
+    def test_ipol_lin_agrees(self):
+        coeff = ip.ipol_poly(self.x[:2], [self.y[0][:,0,0], self.y[1][:,0,0]])
+        ref = ip.ipol_lin(self.y[0][:,0,0], self.y[1][:,0,0], self.x[:2])
+        self.assertTrue(np.allclose(coeff.T, ref))
+
+    def test_quadratic(self):
+        coeff = ip.ipol_poly(self.x, self.y, deg=2)
+        self.assertEqual(coeff.shape, (3, 20, 4, 2))
+        self.assertTrue(np.allclose(coeff, self.c))
+
+    def test_not_enough_points(self):
+        self.assertRaises(ValueError, ip.ipol_poly, self.x[:2], self.y[:2], 2)
+
+    def test_match(self):
+        xtrue = 0.021
+        match = ip.eval_poly(self.c, xtrue)[:,0,0]
+        res, weight = ip.match_poly(self.x, self.y, [np.ones((4, 2))]*3,
+            match, deg=2)
+        self.assertEqual(res.shape, (20, 4, 2))
+        self.assertTrue(np.allclose(res[:,0,0], xtrue))
+        self.assertEqual(weight.shape, res.shape)
+
+    def test_evaluate_ranges(self):
+        # the evaluation point has its own fit ranges
+        xeval = np.ones((20, 3)) * np.asarray([0.02, 0.021, 0.022])
+        w = [np.ones((4, 2)) * 0.5] * 3
+        res, weight = ip.evaluate_poly(self.x, self.y, w, xeval,
+            np.ones(3) * 0.5, deg=2)
+        self.assertEqual(res.shape, (20, 4, 2, 3))
+        self.assertTrue(np.allclose(res[...,1], ip.eval_poly(self.c, 0.021)))
+        self.assertTrue(np.allclose(weight, 0.5**4))
+
+if __name__ == "__main__":
+    unittest.main()
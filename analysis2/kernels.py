@@ -0,0 +1,233 @@
+"""
+Vectorized kernels for effective masses and derivatives.
+
+All kernels work on arrays with the samples on the first and the time on
+the second axis, any further axes, e.g. several correlators, are
+processed in the same pass. The results can be written into preallocated
+arrays given by the out argument, which avoids temporary arrays when the
+kernels are called repeatedly.
+"""
+
+import numpy as np
+
+def _out(out, shape):
+    """Check or create the output array."""
+    if out is None:
+        return np.empty(shape, dtype=float)
+    if out.shape != tuple(shape):
+        raise ValueError("output has shape %s, expected %s" % (
+            str(out.shape), str(tuple(shape))))
+    return out
+
+def _time_shape(data, reduce):
+    if data.ndim < 2:
+        raise IndexError("data needs at least 2 axes")
+    shape = list(data.shape)
+    shape[1] -= reduce
+    return shape
+
+def derivative(data, out=None):
+    """Forward derivative C(t+1) - C(t) along the second axis.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    out : ndarray, optional
+        Array for the result, the time extent is reduced by one.
+
+    Returns
+    -------
+    ndarray
+        The derivative.
+
+    Raises
+    ------
+    IndexError
+        If the data has less than two axes.
+    """
+    out = _out(out, _time_shape(data, 1))
+    np.subtract(data[:,1:], data[:,:-1], out=out)
+    return out
+
+def derivative_back(data, out=None):
+    """Backward derivative C(t) - C(t+1) along the second axis.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    out : ndarray, optional
+        Array for the result, the time extent is reduced by one.
+
+    Returns
+    -------
+    ndarray
+        The derivative.
+
+    Raises
+    ------
+    IndexError
+        If the data has less than two axes.
+    """
+    out = _out(out, _time_shape(data, 1))
+    np.subtract(data[:,:-1], data[:,1:], out=out)
+    return out
+
+def square(data, out=None):
+    """Elementwise square of the data.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    out : ndarray, optional
+        Array for the result.
+
+    Returns
+    -------
+    ndarray
+        The squared data.
+    """
+    out = _out(out, data.shape)
+    np.square(data, out=out)
+    return out
+
+def eff_mass_log(data, out=None):
+    """Effective mass log(C(t)/C(t+1)).
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    out : ndarray, optional
+        Array for the result, the time extent is reduced by one.
+
+    Returns
+    -------
+    ndarray
+        The effective mass, nan where the ratio is not positive.
+    """
+    out = _out(out, _time_shape(data, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(data[:,:-1], data[:,1:], out=out)
+        np.log(out, out=out)
+    return out
+
+def eff_mass_acosh(data, out=None):
+    """Effective mass acosh((C(t-1)+C(t+1))/(2C(t))).
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    out : ndarray, optional
+        Array for the result, the time extent is reduced by two.
+
+    Returns
+    -------
+    ndarray
+        The effective mass, nan where the argument is smaller than 1.
+    """
+    out = _out(out, _time_shape(data, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.add(data[:,:-2], data[:,2:], out=out)
+        out /= data[:,1:-1]
+        out *= 0.5
+        np.arccosh(out, out=out)
+    return out
+
+def _log_cosh(x):
+    """log(cosh(x)) without overflow."""
+    ax = np.abs(x)
+    return ax + np.log1p(np.exp(-2.*ax)) - np.log(2.)
+
+def _log_sinh(x):
+    """log(|sinh(x)|) without overflow."""
+    ax = np.abs(x)
+    return ax + np.log1p(-np.exp(-2.*ax)) - np.log(2.)
+
+def eff_mass_implicit(data, T, usesinh=False, out=None, tol=1e-10,
+        maxiter=50):
+    """Effective mass of a periodic correlator by an implicit equation.
+
+    The mass m(t) solves
+    C(t)/C(t+1) = cosh(m(T/2-t))/cosh(m(T/2-t-1)),
+    or the same with sinh for antiperiodic correlators. The equations of
+    all samples, time slices and correlators are solved together with a
+    Newton iteration on the logarithm of the equation, starting from the
+    log effective mass.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data, the time axis starts at t=0.
+    T : int
+        The time extent of the lattice.
+    usesinh : bool, optional
+        Use sinh instead of cosh.
+    out : ndarray, optional
+        Array for the result, the time extent is reduced by one.
+    tol : float, optional
+        The tolerance of the Newton iteration.
+    maxiter : int, optional
+        The maximal number of iterations.
+
+    Returns
+    -------
+    ndarray
+        The effective mass, nan where no solution was found.
+    """
+    shape = _time_shape(data, 1)
+    out = _out(out, shape)
+    # a = T/2 - t, broadcast over all axes except the time
+    bshape = [1] * data.ndim
+    bshape[1] = shape[1]
+    a = (0.5 * T - np.arange(shape[1], dtype=float)).reshape(bshape)
+    b = a - 1.
+    if usesinh:
+        lfunc = _log_sinh
+        dfunc = lambda x: 1. / np.tanh(x)
+    else:
+        lfunc = _log_cosh
+        dfunc = np.tanh
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        lr = np.log(data[:,:-1] / data[:,1:])
+        m = np.abs(lr)
+        for i in range(maxiter):
+            g = lfunc(m*a) - lfunc(m*b) - lr
+            dg = a * dfunc(m*a) - b * dfunc(m*b)
+            step = g / dg
+            m = np.abs(m - step)
+            step = np.abs(step)
+            if not np.any(step[np.isfinite(step)] > tol):
+                break
+        # mark the solutions not converged or not fulfilling the equation
+        g = lfunc(m*a) - lfunc(m*b) - lr
+        m[~(np.abs(g) < np.sqrt(tol))] = np.nan
+    out[...] = m
+    return out
+
+def eff_mass(data, usecosh=True, out=None):
+    """Effective mass with the acosh or the log formula.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    usecosh : bool, optional
+        Toggle between the acosh and the log formula.
+    out : ndarray, optional
+        Array for the result.
+
+    Returns
+    -------
+    ndarray
+        The effective mass.
+    """
+    if usecosh:
+        return eff_mass_acosh(data, out)
+    return eff_mass_log(data, out)
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,69 @@
+"""
+Unit tests for the vectorized kernels.
+"""
+
+import unittest
+import numpy as np
+
+import kernels
+import synthetic
+
+class Kernels_Test(unittest.TestCase):
+    def setUp(self):
+        self.T = 32
+        self.t = np.arange(self.T, dtype=float)
+        self.data = np.random.RandomState(3).rand(5, 10, 2) + 1.
+
+    def test_derivative(self):
+        res = kernels.derivative(self.data)
+        self.assertEqual(res.shape, (5, 9, 2))
+        self.assertTrue(np.allclose(res, np.diff(self.data, axis=1)))
+        back = kernels.derivative_back(self.data)
+        self.assertTrue(np.allclose(back, -res))
+        self.assertRaises(IndexError, kernels.derivative, np.ones(4))
+
+    def test_out(self):
+        out = np.empty((5, 9, 2))
+        res = kernels.eff_mass_log(self.data, out=out)
+        self.assertIs(res, out)
+        self.assertRaises(ValueError, kernels.eff_mass_log, self.data,
+            np.empty((5, 10, 2)))
+
+    def test_eff_mass(self):
+        res = kernels.eff_mass_log(self.data)
+        self.assertTrue(np.allclose(res, np.log(self.data[:,:-1] /
+            self.data[:,1:])))
+        res = kernels.eff_mass_acosh(self.data)
+        self.assertEqual(res.shape, (5, 8, 2))
+        arg = (self.data[:,:-2] + self.data[:,2:]) / (2.*self.data[:,1:-1])
+        with np.errstate(invalid="ignore"):
+            ref = np.arccosh(arg)
+        self.assertTrue(np.allclose(res, ref, equal_nan=True))
+
+    def test_acosh_exact(self):
+        data = synthetic.single_correlator(3, self.T, 0.25, noise=0.)
+        res = kernels.eff_mass_acosh(data)
+        self.assertTrue(np.allclose(res, 0.25))
+
+    def test_implicit_cosh(self):
+        mass = np.asarray([0.2, 0.5])
+        data = np.cosh(mass[None,None,:] * (self.t[None,:,None] - self.T/2.))
+        data = np.repeat(data, 3, axis=0)
+        res = kernels.eff_mass_implicit(data, self.T)
+        self.assertEqual(res.shape, (3, self.T-1, 2))
+        # the time slices around T/2 have no unique solution
+        valid = np.abs(self.t[:-1] + 0.5 - self.T/2.) > 1
+        self.assertTrue(np.allclose(res[:,valid], mass[None,None,:]))
+        # the log mass is off close to T/2
+        lmass = kernels.eff_mass_log(data)
+        self.assertFalse(np.allclose(lmass[:,valid], mass[None,None,:]))
+
+    def test_implicit_sinh(self):
+        data = np.sinh(0.3 * (self.T/2. - self.t))[None,:]
+        res = kernels.eff_mass_implicit(data, self.T, usesinh=True)
+        valid = np.isfinite(res[0])
+        self.assertGreater(np.sum(valid), self.T//2)
+        self.assertTrue(np.allclose(res[0,valid], 0.3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+Relativistic kinematics of two-particle systems on whole arrays.
+
+All functions broadcast over their arguments, so complete blocks of
+bootstrap samples, fit ranges and mass fit ranges are converted at once.
+The total momenta d are given in units of 2*pi/L as arrays with the
+components on the last axis, or as d2 for the standard moving frames,
+see MOMENTA. Every function has a continuum and a lattice variant, for
+the lattice dispersion relation see arXiv:1011.5288.
+"""
+
+import numpy as np
+
+# the total momentum vectors of the moving frames by d^2
+MOMENTA = {
+    0: (0., 0., 0.),
+    1: (0., 0., 1.),
+    2: (1., 1., 0.),
+    3: (1., 1., 1.),
+    4: (0., 0., 2.),
+}
+
+def momenta(d2):
+    """The total momentum vectors of moving frames.
+
+    Parameters
+    ----------
+    d2 : int or sequence of int
+        The squared total momenta, see MOMENTA.
+
+    Returns
+    -------
+    ndarray
+        The momentum vectors, the components on the last axis.
+
+    Raises
+    ------
+    ValueError
+        If a frame is not in MOMENTA.
+    """
+    try:
+        return np.array([MOMENTA[x] for x in np.ravel(d2)]).reshape(
+            np.shape(d2) + (3,))
+    except KeyError as e:
+        raise ValueError("moving frame for d2 = %s not implemented" % e)
+
+def shift(d, L=24, lattice=False):
+    """The difference of the energies in the lab and the CM frame.
+
+    This is E^2 - Ecm^2 in the continuum and cosh(E) - cosh(Ecm) on the
+    lattice.
+
+    Parameters
+    ----------
+    d : ndarray
+        The total momenta, the components on the last axis.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    ndarray
+        The shift for every momentum.
+    """
+    d = np.asarray(d, dtype=float)
+    if lattice:
+        return 2. * np.sum(np.sin(d*np.pi/float(L))**2, axis=-1)
+    return np.sum(d*d, axis=-1) * 4. * np.pi*np.pi / (float(L)*float(L))
+
+def to_cm(E, d, L=24, lattice=False):
+    """Transform energies from the lab frame to the CM frame.
+
+    Parameters
+    ----------
+    E : float or ndarray
+        The energies in the lab frame.
+    d : ndarray
+        The total momenta, the components on the last axis. The other
+        axes are broadcast against E.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    gamma : ndarray
+        The boost factors.
+    Ecm : ndarray
+        The energies in the CM frame.
+    """
+    E = np.asarray(E, dtype=float)
+    s = shift(d, L, lattice)
+    if lattice:
+        Ecm = np.arccosh(np.cosh(E) - s)
+    else:
+        Ecm = np.sqrt(E*E - s)
+    # in the CM frame the energy is unchanged
+    Ecm = np.where(s == 0., E, Ecm)
+    return E / Ecm, Ecm
+
+def to_lab(Ecm, d, L=24, lattice=False):
+    """Transform energies from the CM frame to the lab frame.
+
+    Parameters
+    ----------
+    Ecm : float or ndarray
+        The energies in the CM frame.
+    d : ndarray
+        The total momenta, the components on the last axis.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    ndarray
+        The energies in the lab frame.
+    """
+    Ecm = np.asarray(Ecm, dtype=float)
+    s = shift(d, L, lattice)
+    if lattice:
+        E = np.arccosh(np.cosh(Ecm) + s)
+    else:
+        E = np.sqrt(Ecm*Ecm + s)
+    return np.where(s == 0., Ecm, E)
+
+def q2(Ecm, m, L=24, lattice=False):
+    """The squared CM momentum of two particles, in units of (2*pi/L)^2.
+
+    Parameters
+    ----------
+    Ecm : float or ndarray
+        The energies in the CM frame.
+    m : float or ndarray
+        The particle masses.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    ndarray
+        The squared momenta.
+    """
+    Ecm = np.asarray(Ecm, dtype=float)
+    if lattice:
+        return (np.arcsin(np.sqrt((np.cosh(Ecm*0.5)-np.cosh(m))*0.5)) *
+            float(L) / np.pi)**2
+    return (0.25*Ecm*Ecm - m*m) * (float(L) / (2. * np.pi))**2
+
+def energy_cm(q2, m, L=24, lattice=False):
+    """The CM energy of two particles with CM momentum squared q2, the
+    inverse of q2.
+
+    Parameters
+    ----------
+    q2 : float or ndarray
+        The squared momenta in units of (2*pi/L)^2.
+    m : float or ndarray
+        The particle masses.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    ndarray
+        The energies in the CM frame.
+    """
+    q = np.sqrt(np.asarray(q2, dtype=float))
+    if lattice:
+        return 2. * np.arccosh(np.cosh(m) + 2. * np.sin(q*np.pi/float(L))**2)
+    return 2. * np.sqrt(m*m + 4.*q*q*np.pi*np.pi/(float(L)*float(L)))
+
+def gamma(q2, m, d, L=24, lattice=False):
+    """The boost factor of two particles with CM momentum squared q2.
+
+    Parameters
+    ----------
+    q2 : float or ndarray
+        The squared momenta in units of (2*pi/L)^2.
+    m : float or ndarray
+        The particle masses.
+    d : ndarray
+        The total momenta, the components on the last axis.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    ndarray
+        The boost factors.
+    """
+    Ecm = energy_cm(q2, m, L, lattice)
+    return to_lab(Ecm, d, L, lattice) / Ecm
+
+def frames(E, m, d2=(0, 1, 2, 3), L=24, lattice=False):
+    """Boost factors, CM energies and q2 in several moving frames.
+
+    Parameters
+    ----------
+    E : float or ndarray
+        The energies in the lab frame, the same for all frames.
+    m : float or ndarray
+        The particle masses, broadcast against E.
+    d2 : sequence of int, optional
+        The moving frames, see MOMENTA.
+    L : int, optional
+        The lattice size.
+    lattice : bool, optional
+        Use the lattice dispersion relation.
+
+    Returns
+    -------
+    gamma, Ecm, q2 : ndarray
+        The results, the first axis are the frames.
+    """
+    E = np.asarray(E, dtype=float)
+    d = momenta(d2)
+    d = d.reshape((d.shape[0],) + (1,)*E.ndim + (3,))
+    g, Ecm = to_cm(E, d, L, lattice)
+    return g, Ecm, q2(Ecm, m, L, lattice)
@@ -0,0 +1,82 @@
+"""
+Unit tests for the vectorized kinematics.
+"""
+
+import unittest
+import numpy as np
+
+import kinematics
+from energies import (calc_Ecm, calc_q2, calc_gamma, WfromE, WfromE_lat,
+    WfromMass, WfromMass_lat)
+
+class Kinematics_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        # samples, fit ranges and mass fit ranges
+        self.E = 0.6 + 0.1*rng.rand(20, 5, 3)
+        self.m = 0.14 + 0.01*rng.rand(20, 1, 3)
+
+    def test_momenta(self):
+        self.assertTrue(np.array_equal(kinematics.momenta(2), [1., 1., 0.]))
+        d = kinematics.momenta([0, 1, 2, 3])
+        self.assertEqual(d.shape, (4, 3))
+        self.assertTrue(np.array_equal(np.sum(d*d, axis=1), [0, 1, 2, 3]))
+        self.assertRaises(ValueError, kinematics.momenta, 5)
+
+    def test_to_cm(self):
+        for d2 in range(4):
+            d = kinematics.momenta(d2)
+            for lattice in (True, False):
+                ref = calc_Ecm(self.E, d, 32, lattice)
+                res = kinematics.to_cm(self.E, d, 32, lattice)
+                self.assertTrue(np.allclose(res[0], ref[0]))
+                self.assertTrue(np.allclose(res[1], ref[1]))
+        # no rounding in the CM frame
+        res = kinematics.to_cm(self.E, np.zeros(3), 32, True)
+        self.assertTrue(np.array_equal(res[1], self.E))
+
+    def test_to_lab(self):
+        d = kinematics.momenta(3)
+        self.assertTrue(np.allclose(kinematics.to_lab(self.E, d, 32),
+            WfromE(self.E, d, 32)))
+        self.assertTrue(np.allclose(kinematics.to_lab(self.E, d, 32, True),
+            WfromE_lat(self.E, d, 32)))
+        for lattice in (True, False):
+            _, Ecm = kinematics.to_cm(self.E, d, 32, lattice)
+            self.assertTrue(np.allclose(kinematics.to_lab(Ecm, d, 32,
+                lattice), self.E))
+
+    def test_q2(self):
+        for lattice in (True, False):
+            ref = calc_q2(self.E, self.m, 32, lattice)
+            res = kinematics.q2(self.E, self.m, 32, lattice)
+            self.assertEqual(res.shape, (20, 5, 3))
+            self.assertTrue(np.allclose(res, ref))
+            self.assertTrue(np.allclose(kinematics.energy_cm(res, self.m, 32,
+                lattice), self.E))
+        q = np.sqrt(kinematics.q2(self.E, self.m, 32))
+        self.assertTrue(np.allclose(kinematics.energy_cm(q*q, self.m, 32),
+            2.*WfromMass(self.m, q, 32)))
+        q = np.sqrt(kinematics.q2(self.E, self.m, 32, True))
+        self.assertTrue(np.allclose(kinematics.energy_cm(q*q, self.m, 32,
+            True), 2.*WfromMass_lat(self.m, q, 32)))
+
+    def test_gamma(self):
+        d = kinematics.momenta(1)
+        g, Ecm = kinematics.to_cm(self.E, d, 32)
+        q2 = kinematics.q2(Ecm, self.m, 32)
+        self.assertTrue(np.allclose(kinematics.gamma(q2, self.m, d, 32), g))
+        self.assertTrue(np.allclose(calc_gamma(q2, self.m, d, 32), g))
+
+    def test_frames(self):
+        g, Ecm, q2 = kinematics.frames(self.E, self.m, L=32, lattice=True)
+        self.assertEqual(Ecm.shape, (4, 20, 5, 3))
+        for d2 in range(4):
+            ref = calc_Ecm(self.E, kinematics.momenta(d2), 32, True)
+            self.assertTrue(np.allclose(g[d2], ref[0]))
+            self.assertTrue(np.allclose(Ecm[d2], ref[1]))
+            self.assertTrue(np.allclose(q2[d2], calc_q2(ref[1], self.m, 32,
+                True)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,8 @@ memoize wrapper for functions.
 
 import cPickle
 
+import instrument
+
 def memoize(function, limit=None):
     """Function decorator for caching results.
     
@@ -41,8 +43,10 @@ def memoize(function, limit=None):
         try:
             # see if key is in list and if so append it to the end
             list.append(list.pop(list.index(key)))
+            instrument.count("memoize.%s.hit" % function.func_name)
         except ValueError:
             # if key is not in list, create it
+            instrument.count("memoize.%s.miss" % function.func_name)
             dict[key] = function(*args, **kwargs)
             list.append(key)
             # if size is limited and the limit is reached, delete first element
@@ -3,16 +3,52 @@ Functions to calculate the phaseshift.
 """
 
 import numpy as np
+import zeta_wrapper
 from zeta_wrapper import omega
 from utils import loop_iterator
 
+# the zeta functions (l, m) needed by get_solution for the total momentum d2
+_ZETA_LM = {0: [(0, 0)], 1: [(0, 0), (2, 0)],
+    2: [(0, 0), (2, 0), (2, 2), (4, 2)]}
+
+def phaseshift_tables(q2, gamma, d2=0, **kwargs):
+    """Interpolation tables of the zeta functions needed by get_solution.
+
+    The tables cover the range of all finite q2 and gamma, see
+    zeta_table.ZetaTable.
+
+    Parameters
+    ----------
+    q2, gamma : ndarray or sequence of ndarrays
+        The data.
+    d2 : int, optional
+        The total momentum squared.
+    kwargs
+        Passed to ZetaTable.
+
+    Returns
+    -------
+    list of ZetaTable
+        The tables.
+    """
+    from zeta_table import ZetaTable
+    q2 = np.concatenate([np.ravel(q) for q in q2])
+    gamma = np.concatenate([np.ravel(g) for g in gamma])
+    q2, gamma = q2[np.isfinite(q2)], gamma[np.isfinite(gamma)]
+    q2range = (q2.min(), q2.max())
+    grange = (max(gamma.min(), 1.), max(gamma.max(), 1.))
+    return [ZetaTable(q2range, grange, l, m, **kwargs) for l, m in
+        _ZETA_LM[d2]]
+
 def compute_phaseshift(q2, q2_w, gamma, gamma_w, L=24, isdependend=True,
-        d2=0, irrep="A1"):
+        d2=0, irrep="A1", queue=None, chunksize=10, tables=None):
     # setup variables
     if np.any(gamma < 1.):
         print(gamma)
     nsamples = gamma[0].shape[0]
     needed = np.zeros((nsamples,))
+    solutions = _solutions(q2, gamma, isdependend, d2, irrep, queue, chunksize,
+        tables)
     for i, q in enumerate(q2):
         res = np.zeros_like(needed)
         tmpweight = q2_w[i]*gamma_w[i]
@@ -21,7 +57,7 @@ def compute_phaseshift(q2, q2_w, gamma, gamma_w, L=24, isdependend=True,
             print(gamma[i])
             continue
         if isdependend:
-            tmp, tmp1 = get_solution(q, gamma[i], d2, irrep)
+            tmp, tmp1 = solutions[i]
             # iterate over fit ranges
             for item in loop_iterator(q.shape[1:]):
                 res = tmp[(slice(None),)+tuple(item)]
@@ -32,7 +68,7 @@ def compute_phaseshift(q2, q2_w, gamma, gamma_w, L=24, isdependend=True,
         else:
             # iterate over fit ranges
             for item in loop_iterator(q.shape[1:]):
-                tmp, tmp1 = get_solution(q[:,item[0]], gamma[i], d2, irrep)
+                tmp, tmp1 = solutions[i][item[0]]
                 res = tmp[(slice(None),)+tuple(item[1:])]
                 res1 = tmp1[(slice(None),)+tuple(item[1:])]
                 weight = np.ones_like(needed) * tmpweight[item]
@@ -41,7 +77,58 @@ def compute_phaseshift(q2, q2_w, gamma, gamma_w, L=24, isdependend=True,
         if i == 1:
             raise StopIteration
 
-def get_solution(q2, gamma, d2, irrep="A1"):
+def _solutions(q2, gamma, isdependend, d2, irrep, queue=None, chunksize=10,
+        tables=None):
+    """Calls get_solution for the correlators used by compute_phaseshift.
+
+    With a WorkQueue the calls are distributed over its workers, for
+    dependend data in chunks of chunksize entries of the first fit range
+    axis, otherwise one job per entry of the first fit range axis.
+
+    Returns
+    -------
+    dict
+        For every correlator the solutions, for independend data a list
+        of the solutions for every entry of the first fit range axis.
+    """
+    calls = []
+    for i, q in enumerate(q2[:2]):
+        if np.any(gamma[i] < 1.):
+            continue
+        if not isdependend:
+            calls.extend((i, (q[:,j], gamma[i])) for j in range(q.shape[1]))
+        elif queue is None:
+            calls.append((i, (q, gamma[i])))
+        else:
+            for lo in range(0, q.shape[1], chunksize):
+                sl = slice(lo, lo + chunksize)
+                calls.append((i, (q[:,sl], gamma[i][:,sl])))
+    if queue is None:
+        results = [get_solution(q, g, d2, irrep, tables) for _, (q, g) in
+            calls]
+    else:
+        results = queue.map(get_solution, [(q, g, d2, irrep, tables) for _,
+            (q, g) in calls])
+    solutions = {}
+    for (i, _), res in zip(calls, results):
+        solutions.setdefault(i, []).append(res)
+    if isdependend:
+        for i, res in solutions.items():
+            if len(res) == 1:
+                solutions[i] = res[0]
+                continue
+            solutions[i] = (np.concatenate([r[0] for r in res], axis=1),
+                np.concatenate([r[1] for r in res], axis=1))
+    return solutions
+
+def get_solution(q2, gamma, d2, irrep="A1", tables=None):
+    if tables is not None:
+        # the tables are passed along, so they are used by queue workers
+        old = zeta_wrapper.set_tables(tables)
+        try:
+            return get_solution(q2, gamma, d2, irrep)
+        finally:
+            zeta_wrapper.set_tables(old)
     if np.any(gamma < 1.):
         print("error: gamma < 1.")
         raise ValueError("blub")
@@ -118,7 +205,7 @@ def phaseshift_A1(q2, gamma=None, d2=0, prec=1e-5, debug=0):
     Returns:
         An array of the phase shift and tan(delta).
     """
-    if gamma == None:
+    if gamma is None:
         _gamma = np.ones_like(q2)
     else:
         _gamma = gamma
@@ -162,7 +249,7 @@ def phaseshift_A1(q2, gamma=None, d2=0, prec=1e-5, debug=0):
     return delta, tandelta, sindelta
 
 def phaseshift_T1(q2, gamma=None, d2=0, prec=1e-5, debug=0):
-    if gamma == None:
+    if gamma is None:
         _gamma = np.ones_like(q2)
     else:
         _gamma = gamma
@@ -2,8 +2,11 @@
 The class for fitting.
 """
 
+import os
+import pickle
 import numpy as np
 import itertools
+import multiprocessing as mp
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -15,6 +18,104 @@ from statistics import compute_error
 from plot_functions import plot_data, plot_function, plot_histogram
 from in_out import check_write
 
+def _set_env(env):
+    """Apply the plot environment of a LatticePlot to the current plot."""
+    plt.grid(env["grid"])
+    # set the axis to log scale
+    if env["xlog"]:
+        plt.xscale("log")
+    if env["ylog"]:
+        plt.yscale("log")
+    # set the axis ranges
+    if env["xlim"]:
+        plt.xlim(env["xlim"])
+    if env["ylim"]:
+        plt.ylim(env["ylim"])
+
+def _draw_fit_page(page, env):
+    """Draw data and fit function of one fit range into the current plot.
+
+    Parameters
+    ----------
+    page : dict
+        Everything needed for the plot, see LatticePlot._genplot_single.
+    env : dict
+        The plot environment.
+    """
+    plt.title(page["title"])
+    plt.xlabel(page["axis"][0])
+    plt.ylabel(page["axis"][1])
+    _set_env(env)
+    plot_data(page["X"], page["Y"], page["dY"], page["label"],
+            plotrange=page["plotrange"], col=page["col"])
+    plot_function(page["func"], page["X"], page["par"], page["fitlabel"],
+            page["add"], page["fi"], page["ploterror"], col=page["fitcol"])
+    plt.legend()
+
+def _init_worker():
+    """Drop the fonts inherited from the parent process.
+
+    The freetype objects cached by matplotlib are not safe to share
+    between forked processes, using them randomly fails to load glyphs.
+    """
+    try:
+        from matplotlib import font_manager
+        font_manager._get_font.cache_clear()
+    except AttributeError:
+        pass
+
+def _render_part(args):
+    """Render pages into a pdf file, runs in the worker processes.
+
+    Parameters
+    ----------
+    args : tuple
+        The name of the file, the plot environment and the pages.
+
+    Returns
+    -------
+    str
+        The name of the file.
+    """
+    filename, env, pages = args
+    pdf = PdfPages(filename)
+    for page in pages:
+        _draw_fit_page(page, env)
+        pdf.savefig(plt.gcf())
+        plt.clf()
+    pdf.close()
+    return filename
+
+def _can_merge():
+    """Check if pdf files can be merged, this needs PyPDF2."""
+    try:
+        import PyPDF2
+    except ImportError:
+        return False
+    return True
+
+def _merge_pdfs(parts, filename):
+    """Merge pdf files.
+
+    Parameters
+    ----------
+    parts : list of str
+        The files to merge, in order.
+    filename : str
+        The name of the merged file.
+
+    Raises
+    ------
+    ImportError
+        If PyPDF2 is not available.
+    """
+    from PyPDF2 import PdfFileMerger
+    merger = PdfFileMerger()
+    for p in parts:
+        merger.append(p)
+    merger.write(filename)
+    merger.close()
+
 class LatticePlot(object):
     def __init__(self, filename, join=False):
         """Initialize a plot.
@@ -25,7 +126,13 @@ class LatticePlot(object):
             The filename of the plot.
         """
         check_write(filename)
+        self.filename = filename
         self.plotfile = PdfPages(filename)
+        # pages rendered in parallel are collected in extra files, which
+        # are merged into filename at the end
+        self._current = filename
+        self._segments = []
+        self._nparts = 0
         # plot environment variables
         self.xlog=False
         self.ylog=False
@@ -40,16 +147,98 @@ class LatticePlot(object):
             self.cycol = itertools.cycle('b').next
 
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the plot file.
+
+        If pages were rendered in parallel, all parts are merged into
+        the plot file.
+
+        Raises
+        ------
+        RuntimeError
+            If the parts cannot be merged, they are kept as separate
+            files.
+        """
+        if self.plotfile is None:
+            return
+        npages = self.plotfile.get_pagecount()
         self.plotfile.close()
+        self.plotfile = None
+        if not self._segments:
+            return
+        if npages > 0:
+            self._segments.append(self._current)
+        else:
+            os.remove(self._current)
+        segments, self._segments = self._segments, []
+        try:
+            _merge_pdfs(segments, self.filename)
+        except ImportError:
+            raise RuntimeError("PyPDF2 not found, %s is incomplete, the "
+                "plots are kept in %s" % (self.filename, ", ".join(segments)))
+        for s in segments:
+            os.remove(s)
 
     def new_file(self, filename):
         """Open a new plot file.
         """
-        self.plotfile.close()
+        self.close()
         plt.clf()
         check_write(filename)
+        self.filename = filename
+        self._current = filename
+        self._nparts = 0
         self.plotfile = PdfPages(filename)
 
+    def _env(self):
+        return {"xlog": self.xlog, "ylog": self.ylog, "xlim": self.xlim,
+                "ylim": self.ylim, "grid": self.grid}
+
+    def _render_parallel(self, pages, processes):
+        """Render pages in worker processes.
+
+        The pages are split into one part per process. The pages plotted
+        so far and the parts are kept in separate files until the plot
+        file is closed.
+
+        Parameters
+        ----------
+        pages : list of dicts
+            The pages to render.
+        processes : int
+            The number of processes.
+        """
+        if not pages:
+            return
+        nparts = min(processes, len(pages))
+        bounds = np.linspace(0, len(pages), nparts+1).astype(int)
+        base = os.path.splitext(self.filename)[0]
+        env = self._env()
+        jobs = [("%s.part%03d.pdf" % (base, self._nparts + i), env,
+            pages[bounds[i]:bounds[i+1]]) for i in range(nparts)]
+        self._nparts += nparts
+        pool = mp.Pool(nparts, _init_worker)
+        try:
+            parts = pool.map(_render_part, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        # finish the current file, so the order of the pages is kept
+        npages = self.plotfile.get_pagecount()
+        self.plotfile.close()
+        if npages > 0:
+            seg = "%s.seg%03d.pdf" % (base, self._nparts)
+            os.rename(self._current, seg)
+            self._segments.append(seg)
+        else:
+            os.remove(self._current)
+        self._segments.extend(parts)
+        self._current = "%s.seg%03d.pdf" % (base, self._nparts + 1)
+        self._nparts += 2
+        self.plotfile = PdfPages(self._current)
+
     def save(self):
         if plt.get_fignums():
             for i in plt.get_fignums():
@@ -57,17 +246,7 @@ class LatticePlot(object):
         plt.clf()
 
     def _set_env_normal(self):
-        plt.grid(self.grid)
-        # set the axis to log scale
-        if self.xlog:
-            plt.xscale("log")
-        if self.ylog:
-            plt.yscale("log")
-        # set the axis ranges
-        if self.xlim:
-            plt.xlim(self.xlim)
-        if self.ylim:
-            plt.ylim(self.ylim)
+        _set_env(self._env())
 
     def _est_env_hist(self):
         plt.grid(self.grid)
@@ -128,7 +307,8 @@ class LatticePlot(object):
 
 
     def _genplot_single(self, corr, label, fitresult=None, fitfunc=None,
-            add=None, xshift=0., ploterror=False, rel=False, debug=0, join=False):
+            add=None, xshift=0., ploterror=False, rel=False, debug=0, join=False,
+            pages=None):
         """Plot the data of a Correlators object and a FitResult object
         together.
 
@@ -148,6 +328,9 @@ class LatticePlot(object):
         xshift : Optional scalar shift in xrange
         debug : int, optional
             The amount of info printed.
+        pages : list, optional
+            If given, the fit pages are appended to it instead of being
+            plotted.
         """
         if len(label) < 4:
             raise RuntimeError("not enough labels")
@@ -200,19 +383,25 @@ class LatticePlot(object):
                     self.set_title(label[0], label[1:3])
                     label[4] = "fit [%d, %d]" % (fi[0], fi[1])
 
+                    page = {"title": label[0], "axis": label[1:3], "X": X,
+                            "Y": corr.data[0,:,n], "dY": ddata,
+                            "label": label[3], "plotrange": [1,T],
+                            "col": self.cycol(), "func": fitfunc.fitfunc,
+                            "par": mpar, "fitlabel": label[4], "add": add,
+                            "fi": fi, "ploterror": ploterror,
+                            "fitcol": self.cycol()}
+                    if pages is not None:
+                        pages.append(page)
+                        continue
                     # plot
-                    self._set_env_normal()
-                    plot_data(X, corr.data[0,:,n], ddata, label[3],
-                            plotrange=[1,T],col=self.cycol())
-                    plot_function(fitfunc.fitfunc, X, mpar, label[4],
-                            add, fi, ploterror,col=self.cycol())
-                    plt.legend()
+                    _draw_fit_page(page, self._env())
                     if join is False:
                       self.save()
         label[0] = label_save
 
     def _genplot_comb(self, corr, label, fitresult, fitfunc, oldfit, add=None,
-            oldfitpar=None, ploterror=False, xshift=0., debug=0):
+            oldfitpar=None, ploterror=False, xshift=0., debug=0, join=False,
+            pages=None):
         """Plot the data of a Correlators object and a FitResult object
         together.
 
@@ -236,6 +425,11 @@ class LatticePlot(object):
         xshift : Optional scalar shift for xdata
         debug : int, optional
             The amount of info printed.
+        join : bool, optional
+            Plot all fits into one page.
+        pages : list, optional
+            If given, the pages are appended to it instead of being
+            plotted.
         """
         if len(label) < 4:
             raise RuntimeError("not enough labels")
@@ -278,36 +472,69 @@ class LatticePlot(object):
                 label[4] = "fit [%d, %d]\nold %s" % (fi[0], fi[1], str(ritem[:-1]))
 
                 # get old data
-                add_data = oldfit.get_data(item[:-1] + ritem[:-1]) 
-                # get only the wanted parameter if oldfitpar is given
-                if oldfitpar is not None:
-                    add_data = add_data[:,oldfitpar]
-                # if there is additional stuff needed for the fit
-                # function add it to the old data
-                if add is not None:
-                    # get the shape right, atleast_2d adds the dimension
-                    # in front, we need it in the end
-                    if add.ndim == 1:
-                        add.shape = (-1, 1)
-                    if add_data.ndim == 1:
-                        add_data.shape = (-1, 1)
-                    add_data = np.hstack((add_data, add))
-
+                add_data = self._comb_add(oldfit, item[:-1] + ritem[:-1],
+                        oldfitpar, add)
+
+                page = {"title": label[0], "axis": label[1:3], "X": X,
+                        "Y": corr.data[0,:,item[-2], n], "dY": ddata,
+                        "label": label[3], "plotrange": [1,T], "col": "b",
+                        "func": fitfunc.fitfunc, "par": _par,
+                        "fitlabel": label[4], "add": add_data, "fi": fi,
+                        "ploterror": ploterror, "fitcol": "red"}
+                if pages is not None:
+                    pages.append(page)
+                    continue
                 # plot
-                self._set_env_normal()
-                plot_data(X, corr.data[0,:,item[-2], n], ddata, label[3],
-                        plotrange=[1,T])
-                plot_function(fitfunc.fitfunc, X, _par, label[4], 
-                        add_data, fi, ploterror)
-                plt.legend()
-                self.save()
+                _draw_fit_page(page, self._env())
+                if join is False:
+                    self.save()
+        label[0] = label_save
+
+    def _comb_add(self, oldfit, index, oldfitpar=None, add=None):
+        """Get the additional arguments of a combined fit.
+
+        Parameters
+        ----------
+        oldfit : FitResult
+            The old fit.
+        index : tuple of int
+            The index of the old fit result.
+        oldfitpar : None, int or sequence of int, optional
+            Which parameter of the old fit to use.
+        add : ndarray, optional
+            Additional arguments to the fit function.
+
+        Returns
+        -------
+        ndarray
+            The arguments for the fit function.
+        """
+        add_data = oldfit.get_data(index)
+        # get only the wanted parameter if oldfitpar is given
+        if oldfitpar is not None:
+            add_data = add_data[:,oldfitpar]
+        # if there is additional stuff needed for the fit
+        # function add it to the old data
+        if add is not None:
+            # get the shape right, atleast_2d adds the dimension
+            # in front, we need it in the end
+            if add.ndim == 1:
+                add.shape = (-1, 1)
+            if add_data.ndim == 1:
+                add_data.shape = (-1, 1)
+            add_data = np.hstack((add_data, add))
+        return add_data
 
     def plot(self, corr, label, fitresult=None, fitfunc=None, oldfit=None,
             add=None, oldfitpar=None, ploterror=False, xshift=0., debug=0,
-            join=False):
+            join=False, processes=1):
         """Plot the data of a Correlators object and a FitResult object
         together.
 
+        With more than one process, the pages of the fit ranges are
+        rendered in parallel and merged into the plot file, see close.
+        This needs PyPDF2, without it the pages are rendered serially.
+
         Parameters
         ----------
         corr : Correlators
@@ -331,13 +558,146 @@ class LatticePlot(object):
             optional shift of xrange
         debug : int, optional
             The amount of info printed.
+        join : bool, optional
+            Plot all fits into one page, only possible with one process.
+        processes : int, optional
+            The number of processes rendering the pages.
         """
+        pages = None
+        if (processes > 1 and not join and fitresult is not None and
+                _can_merge()):
+            # functions that cannot be pickled are plotted serially
+            try:
+                pickle.dumps(fitfunc.fitfunc)
+                pages = []
+            except (pickle.PicklingError, TypeError, AttributeError):
+                pass
         if oldfit is None:
             self._genplot_single(corr, label, fitresult, fitfunc, add=add,
-                    ploterror=ploterror, xshift=xshift, debug=debug, join=join)
+                    ploterror=ploterror, xshift=xshift, debug=debug, join=join,
+                    pages=pages)
         else:
             self._genplot_comb(corr, label, fitresult, fitfunc, oldfit, add,
-                    oldfitpar, ploterror, xshift, debug,join=join)
+                    oldfitpar, ploterror, xshift, debug, join=join, pages=pages)
+        if pages is not None:
+            self._render_parallel(pages, processes)
+
+    def plot_summary(self, fitresult, label, par=0, corr=None, fitfunc=None,
+            nfits=3, oldfit=None, add=None, oldfitpar=None, xshift=0.):
+        """Plot a summary of all fit ranges.
+
+        For every correlator one page shows the fit parameter, the
+        p-value and the weight of every fit range as heat maps over the
+        first and last time slice of the fit. For combined fits the
+        combination of old fit ranges with the largest total weight is
+        shown. If the data and the fit function are given, the nfits fit
+        ranges with the largest weight are plotted in addition.
+
+        Parameters
+        ----------
+        fitresult : FitResult
+            The fit data.
+        label : list of strs
+            The title of the plot, the x- and y-axis titles of the fits,
+            and the data label.
+        par : int, optional
+            The parameter shown in the heat map.
+        corr : Correlators, optional
+            The correlation function data.
+        fitfunc : LatticeFit, optional
+            The fit function.
+        nfits : int, optional
+            The number of fits to plot.
+        oldfit : FitResult, optional
+            The old fit of a combined fit.
+        add : ndarray, optional
+            Additional arguments to the fit function.
+        oldfitpar : None, int or sequence of int, optional
+            Which parameter of the old fit to use, if there is more than one.
+        xshift : float, optional
+            Shift of the x values.
+        """
+        if fitresult.derived or fitresult.fit_ranges is None:
+            raise ValueError("summary needs a FitResult with fit ranges")
+        if len(label) < 4:
+            raise RuntimeError("not enough labels")
+        fitresult.calc_error()
+        for i, lab in enumerate(fitresult.label):
+            lab = tuple(int(x) for x in np.atleast_1d(lab))
+            n = lab[-1]
+            weight = fitresult.weight[par][i]
+            # select the old fit ranges with the largest weight
+            if weight.ndim > 1:
+                w = weight.reshape((-1, weight.shape[-1])).sum(axis=1)
+                sel = np.unravel_index(np.argmax(w), weight.shape[:-1])
+                sel = tuple(int(x) for x in sel)
+            else:
+                sel = ()
+            values = (fitresult.data[i][(0, par) + sel],
+                    fitresult.pval[i][(0,) + sel], weight[sel])
+            ranges = np.asarray(fitresult.fit_ranges[n])[:len(values[0])]
+            los = np.unique(ranges[:,0])
+            ups = np.unique(ranges[:,1])
+            li = np.searchsorted(los, ranges[:,0])
+            ui = np.searchsorted(ups, ranges[:,1])
+
+            fig, axes = plt.subplots(1, 3, figsize=(15, 4.5))
+            for ax, val, title in zip(axes, values, ("par %d" % par,
+                    "p-value", "weight")):
+                img = np.full((len(ups), len(los)), np.nan)
+                img[ui, li] = val
+                m = ax.imshow(np.ma.masked_invalid(img), origin="lower",
+                        aspect="auto", interpolation="nearest")
+                # label at most about 10 ticks per axis
+                xt = np.arange(0, len(los), max(1, len(los)//10))
+                yt = np.arange(0, len(ups), max(1, len(ups)//10))
+                ax.set_xticks(xt)
+                ax.set_xticklabels(los[xt])
+                ax.set_yticks(yt)
+                ax.set_yticklabels(ups[yt])
+                ax.set_xlabel("first time slice")
+                ax.set_ylabel("last time slice")
+                ax.set_title(title)
+                fig.colorbar(m, ax=ax)
+            if sel:
+                fig.suptitle("%s, pc %s, old ranges %s" % (label[0],
+                    str(lab), str(sel)))
+            else:
+                fig.suptitle("%s, pc %s" % (label[0], str(lab)))
+            self.plotfile.savefig(fig)
+            plt.close(fig)
+
+            if corr is None or fitfunc is None:
+                continue
+            # representative fits
+            X = np.linspace(0., float(corr.shape[1]), corr.shape[1],
+                    endpoint=False) + xshift
+            T = corr.shape[1]
+            if sel:
+                Y = corr.data[:,:,lab[-2],n]
+            else:
+                Y = corr.data[:,:,n]
+            _, ddata = compute_error(Y)
+            for r in np.argsort(values[2])[::-1][:nfits]:
+                fi = ranges[r]
+                if sel:
+                    _par = fitresult.data[i][(slice(None), slice(None)) +
+                            sel + (r,)]
+                    _add = self._comb_add(oldfit, lab[:-1] + sel, oldfitpar,
+                            add)
+                else:
+                    _par = fitresult.data[i][:,:,r]
+                    _add = add
+                page = {"title": "%s, pc %s" % (label[0], str(lab)),
+                        "axis": label[1:3], "X": X, "Y": Y[0], "dY": ddata,
+                        "label": label[3], "plotrange": [1,T], "col": "b",
+                        "func": fitfunc.fitfunc, "par": _par,
+                        "fitlabel": "fit [%d, %d]\nweight %.3g" % (fi[0],
+                            fi[1], values[2][r]),
+                        "add": _add, "fi": fi, "ploterror": False,
+                        "fitcol": "red"}
+                _draw_fit_page(page, self._env())
+                self.save()
 
     def histogram(self, fitresult, label, nb_bins=20, par=None):
         """Plot the histograms.
@@ -2,11 +2,17 @@
 Unit tests for the plot class.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
+import plot
 from plot import LatticePlot
+from fit import LatticeFit
 from functions import func_single_corr as f2
+import synthetic
 
 class Fit_Test(unittest.TestCase):
 
@@ -50,6 +56,73 @@ class Fit_Test(unittest.TestCase):
         plotter.plot_function(f2, x, args.T, "10arg, 1add", add)
         plotter.save()
 
+class Render_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        data = synthetic.single_correlator(50, 24, 0.3, noise=0.005)
+        cls.corr = synthetic.to_correlators(data)
+        cls.corr.sym_and_boot(20)
+        cls.add = np.ones((20,)) * 24
+        cls.fitter = LatticeFit(0, dt_i=1, dt_f=1, dt=4)
+        cls.fitres = cls.fitter.fit(None, cls.corr, [4, 12], add=cls.add)
+        cls.nfits = cls.fitres.fit_ranges_shape[0][0]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.label = ["test", "t", "C(t)", "data"]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def pages(self, fname):
+        from PyPDF2 import PdfFileReader
+        with open(fname, "rb") as f:
+            return PdfFileReader(f).getNumPages()
+
+    def test_parallel(self):
+        fname = os.path.join(self.path, "parallel.pdf")
+        plotter = LatticePlot(fname)
+        plotter.histogram(self.fitres, ["hist", "E", "E"], par=1)
+        plotter.plot(self.corr, self.label, self.fitres, self.fitter,
+                add=self.add, processes=2)
+        plotter.histogram(self.fitres, ["hist", "E", "E"], par=1)
+        plotter.close()
+        self.assertEqual(os.listdir(self.path), ["parallel.pdf"])
+        self.assertEqual(self.pages(fname), self.nfits + 2)
+
+    def test_without_merge(self):
+        can_merge, merge_pdfs = plot._can_merge, plot._merge_pdfs
+        def no_merge(parts, filename):
+            raise ImportError("no PyPDF2")
+        try:
+            # without PyPDF2 the pages are rendered serially
+            plot._can_merge = lambda: False
+            fname = os.path.join(self.path, "serial.pdf")
+            plotter = LatticePlot(fname)
+            plotter.plot(self.corr, self.label, self.fitres, self.fitter,
+                    add=self.add, processes=2)
+            plotter.close()
+            self.assertEqual(os.listdir(self.path), ["serial.pdf"])
+            self.assertEqual(self.pages(fname), self.nfits)
+            # parts that cannot be merged are an error
+            plot._can_merge = can_merge
+            plot._merge_pdfs = no_merge
+            plotter.new_file(os.path.join(self.path, "parts.pdf"))
+            plotter.plot(self.corr, self.label, self.fitres, self.fitter,
+                    add=self.add, processes=2)
+            self.assertRaises(RuntimeError, plotter.close)
+        finally:
+            plot._can_merge, plot._merge_pdfs = can_merge, merge_pdfs
+
+    def test_summary(self):
+        fname = os.path.join(self.path, "summary.pdf")
+        plotter = LatticePlot(fname)
+        plotter.plot_summary(self.fitres, self.label, par=1, corr=self.corr,
+                fitfunc=self.fitter, nfits=2, add=self.add)
+        npages = plotter.plotfile.get_pagecount()
+        plotter.close()
+        self.assertEqual(npages, 3)
+
 if __name__ == "__main__":
     unittest.main()
 
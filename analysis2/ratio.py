@@ -1,65 +1,100 @@
 """
 Functions for the ratio calculation.
+
+All ratios are computed as broadcast expressions on arrays with the
+samples on the first and the time on the second axis, any further axes
+are processed in the same pass. Energy differences dE are scalars or
+arrays with the samples on the first axis, further axes of dE are
+aligned with the axes after the time axis of the data. The results can
+be written into preallocated arrays given by the out argument.
 """
 
 import numpy as np
 from energies import WfromMass_lat
+from kernels import _out
+
+# momenta of the two particles for the states in moving frames, indexed by
+# the total momentum squared
+_MOMENTA = {
+    1: ([0, 1, 2, 1, 2, 4, 3], [1, 2, 3, 4, 5, 5, 6]),
+    2: ([0, 1, 1, 2, 2, 1, 3, 2], [2, 1, 3, 2, 4, 5, 5, 6]),
+}
+
+def _weight(dE, shift, ndim):
+    """The factor exp(dE*shift) broadcastable to data with ndim axes, shift
+    can be an array over the time slices."""
+    if dE is None:
+        return 1.
+    dE = np.asarray(dE, dtype=float)
+    if dE.ndim > 0:
+        if dE.ndim + 1 > ndim:
+            raise ValueError("dE has too many axes for the data")
+        dE = dE.reshape((dE.shape[0], 1) + dE.shape[1:] +
+            (1,) * (ndim - dE.ndim - 1))
+    return np.exp(dE * shift)
+
+def _time_check(d1, d2, shift):
+    if d2.shape[1] - shift < d1.shape[1]:
+        raise RuntimeError("The ratio with shift %d cannot be computed" % shift)
 
-def twopoint_ratio(d1, d2, d3):
-    """Calculates a simple ratio of three data sets.
+def twopoint_ratio(d1, d2, d3=None, shift=1, dE=None, useall=False, p2=0,
+        L=24, irep="A1", out=None):
+    """Calculates the ratio of two data sets.
 
-    Calculates d1(t)/d2(t).
-    Assumes that all data sets are numpy arrays with two axis, the first being
-    the bootstrap number and the second being the time.
-    
-    Args:
-        d1, d2 The three data sets.
+    Calculates d1(t)/d2(t) - 1. The remaining arguments are accepted for
+    compatibility with the other ratios and ignored.
+
+    Parameters
+    ----------
+    d1, d2 : ndarray
+        The data sets.
+    out : ndarray, optional
+        Array for the result.
 
-    Returns:
-        The ratio, its mean and its standard deviation.
+    Returns
+    -------
+    ndarray
+        The ratio.
     """
-    # create array from dimensions of the data
-    rshape = list(d1.shape)
-    ratio = np.zeros(rshape)
-    for _s in range(rshape[0]):
-        for _t in range(rshape[1]):
-            # calculate ratio
-            ratio[_s,_t] = d1[_s,_t]/d2[_s,_t]-1.
-    # TODO(CJ): test if the following give the same result
-    # ratio = d1/(d2*d3)
-    return ratio
-
-def simple_ratio(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24, irep="A1"):
+    out = _out(out, np.broadcast(d1, d2).shape)
+    np.divide(d1, d2, out=out)
+    out -= 1.
+    return out
+
+def simple_ratio(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24,
+        irep="A1", out=None):
     """Calculates a simple ratio of three data sets.
 
-    Calculates d1(t)/(d2(t)*d3(t)).
-    Assumes that all data sets are numpy arrays with two axis, the first being
-    the bootstrap number and the second being the time.
-    
-    Args:
-        d1, d2, d3: The three data sets.
+    Calculates d1(t)/(d2(t)*d3(t)). The remaining arguments are accepted
+    for compatibility with the other ratios and ignored.
+
+    Parameters
+    ----------
+    d1, d2, d3 : ndarray
+        The data sets.
+    out : ndarray, optional
+        Array for the result.
 
-    Returns:
-        The ratio, its mean and its standard deviation.
+    Returns
+    -------
+    ndarray
+        The ratio.
     """
-    # create array from dimensions of the data
-    rshape = list(d1.shape)
-    ratio = np.zeros(rshape)
-    for _s in range(rshape[0]):
-        for _t in range(rshape[1]):
-            # calculate ratio
-            ratio[_s,_t] = d1[_s,_t]/(d2[_s,_t]*d3[_s,_t])
-    # TODO(CJ): test if the following give the same result
-    # ratio = d1/(d2*d3)
-    return ratio
-
-def ratio_shift(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24, irrep="A1"):
-    """Calculates a simple ratio of three data sets.
+    out = _out(out, np.broadcast(d1, d2, d3).shape)
+    np.multiply(d2, d3, out=out)
+    np.divide(d1, out, out=out)
+    return out
+
+def ratio_shift(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24,
+        irrep="A1", out=None):
+    """Calculates the ratio with a shifted denominator.
+
+    Calculates d1(t)/(d2(t)*d3(t) - exp(dE*shift)*d2(t+shift)*d3(t+shift)),
+    which is the ratio of the weighted and shifted denominator
+    exp(-dE*t)[exp(dE*t)*d2(t)*d3(t) - exp(dE*(t+shift))*d2(t+shift)*d3(t+shift)].
+    The numerator is usually shifted already, the ratio is calculated for
+    the time extent of d1.
 
-    Calculates d1(t)/(d2(t)*d3(t) - d2(t+shift)*d3(t+shift)).
-    Assumes that all data sets are numpy arrays with two axis, the first being
-    the bootstrap number and the second being the time.
-    
     Parameters
     ----------
     d1 : ndarray
@@ -68,166 +103,150 @@ def ratio_shift(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24, irrep="A
         The denominator of the ratio, at least 3D.
     shift : int, optional
         The number of slices that d2 and d3 are shifted.
-    dE : {None, float}, optional
-        The exponent of the weight used for d1.
+    dE : {None, float, ndarray}, optional
+        The exponent of the weight, per sample if an array.
     useall : bool, optional
         Use all correlators of d2 and d3 or just the first.
-    usecomb : list of list of ints
-        The combinations of d2 and d3 entries to use for d1 entries.
+    p2 : int, optional
+        The total momentum squared, see get_states.
+    L : int, optional
+        The spatial extent of the lattice.
+    irrep : str, optional
+        The lattice irrep.
+    out : ndarray, optional
+        Array for the result.
 
     Returns
     -------
     ndarray:
         The calculated ratio.
-    """
-    # create array from dimensions of the data
-    rshape = list(d1.shape)
-    if (d2.shape[1] - shift) > rshape[1]:
-        raise RuntimeError("The ratio with shift %d cannot be computed" % shift)
 
-    tmp2, tmp3 = get_states(d2, d3, p2, irrep, useall)
-    ## fill temporary arrays for the denominator calculation
-    #tmp2 = np.zeros_like(d2)
-    #tmp3 = np.zeros_like(d3)
-    #tmp2[...,0] = d2[...,0]
-    #tmp3[...,0] = d3[...,0]
-    ## fill with the expected value for the higher momentum modes
-    ## TODO: differentiate different momenta and irreps
-    #if useall:
-    #    for i in range(1, d1.shape[2]):
-    #        tmp2[...,i] = WfromMass_lat(tmp2[...,0], i, L)
-    #        tmp3[...,i] = WfromMass_lat(tmp3[...,0], i, L)
-    ## only use ground state
-    #else:
-    #    for i in range(1, d1.shape[2]):
-    #        tmp2[...,i] = d2[...,0]
-    #        tmp3[...,i] = d3[...,0]
-    # if no weighting was used, don't use it here
+    Raises
+    ------
+    RuntimeError
+        If d2 and d3 have less than T+shift timeslices.
+    """
+    _time_check(d1, d2, shift)
+    _T = d1.shape[1]
+    tmp2, tmp3 = get_states(d2[:,:_T+shift], d3[:,:_T+shift], p2, irrep,
+        useall, L)
+    prod = tmp2 * tmp3
     if dE is None:
-        d = tmp2[:,:-shift]*tmp3[:,:-shift] - tmp2[:,shift:]*tmp3[:,shift:]
+        den = prod[:,:_T] - prod[:,shift:]
     else:
-        tmp = np.zeros_like(d1)
-        d = np.zeros_like(d1)
-        # weight the two point functions
-        for t in range(d2.shape[1]):
-            weight = np.exp(dE*t)
-            # the following is needed since the weight and data
-            # axis have the first axis in common
-            tmp[:,t] = ((tmp2[:,t]*tmp3[:,t]).T * weight).T
-        # calculate the shift and reweight
-        for t in range(d1.shape[1]):
-            weight = np.exp(-dE*t)
-            # the following is needed since the weight and data
-            # axis have the first axis in common
-            d[:,t] = ((tmp[:,t] - tmp[:,t+shift]).T * weight).T
-    # calculate ratio
-    ratio = d1 / d
-    return ratio
+        den = prod[:,shift:] * _weight(dE, shift, prod.ndim)
+        np.subtract(prod[:,:_T], den, out=den)
+    out = _out(out, np.broadcast(d1, den).shape)
+    np.divide(d1, den, out=out)
+    return out
 
 def simple_ratio_subtract(d1, d2, d3, shift=1, dE=None, useall=False, p2=0,
-        L=24, irep="A1"):
+        L=24, irep="A1", out=None):
     """Calculates a simple ratio of three data sets, combining two time slices.
 
     Calculates [d1(t)-d1(t+1)]/[(d2(t)*d3(t))-(d2(t+1)*d3(t+1))].
-    Assumes that all data sets are numpy arrays with two axis, the first being
-    the bootstrap number and the second being the time. The time extend is
-    reduced by one, as the ratio cannot be calculated on the last slice.
-    
-    Args:
-        d1, d2, d3: The three data sets.
-
-    Returns:
-        The ratio, its mean and its standard deviation.
+    The time extent is reduced by one, as the ratio cannot be calculated
+    on the last slice.
+
+    Parameters
+    ----------
+    d1, d2, d3 : ndarray
+        The data sets.
+    out : ndarray, optional
+        Array for the result.
+
+    Returns
+    -------
+    ndarray
+        The ratio.
     """
-    # create array from dimensions of the data
-    rshape = list(d1.shape)
-    rshape[1] -= 1
-    ratio = np.zeros(rshape)
-    for _s in range(rshape[0]):
-        for _t in range(rshape[1]):
-            # calculate ratio
-            ratio[_s,_t] = (d1[_s,_t] - d1[_s,_t+1]) / ((d2[_s,_t]*d3[_s,_t]) -
-                           (d2[_s,_t+1]*d3[_s,_t+1]))
-    return ratio
-
-def ratio(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24, irep="A1"):
+    return ratio(d1, d2, d3, out=out)
+
+def ratio(d1, d2, d3, shift=1, dE=None, useall=False, p2=0, L=24, irep="A1",
+        out=None):
     """Calculates a ratio of three data sets, combining two time slices and
        the energy difference between the energy levels.
 
-    Calculates [d1(t)-d1(t+1)]/[(d2(t)*d3(t))-(d2(t+1)*d3(t+1))].
-    Assumes that all data sets are numpy arrays with two axis, the first being
-    the bootstrap number and the second being the time. The time extend is
-    reduced by one, as the ratio cannot be calculated on the last slice.
-    
-    Args:
-        d1, d2, d3: The three data sets.
-        dE: Energy difference between the the data sets d2 and d3.
-
-    Returns:
-        The ratio, its mean and its standard deviation.
+    Calculates [d1(t)-w*d1(t+1)]/[(d2(t)*d3(t))-w*(d2(t+1)*d3(t+1))] with
+    w = exp(dE*(t+1)). The time extent is reduced by one, as the ratio
+    cannot be calculated on the last slice.
+
+    Parameters
+    ----------
+    d1, d2, d3 : ndarray
+        The data sets.
+    dE : {None, float, ndarray}, optional
+        Energy difference between the data sets d2 and d3, per sample if
+        an array.
+    out : ndarray, optional
+        Array for the result.
+
+    Returns
+    -------
+    ndarray
+        The ratio.
     """
-    # create array from dimensions of the data
-    ratio = np.zeros((d1.shape[0], d1.shape[1]-1))
-    for _s in range(d1.shape[0]):
-        for _t in range(d1.shape[1]-1):
-            # calculate numerator and denominator first
-            num=(d1[_s,_t] - d1[_s,_t+1] * np.exp(dE * (_t+1))) * np.exp(-dE*_t)
-            den=(d2[_s,_t] * d3[_s,_t] - d2[_s,_t+1] * d3[_s,_t+1] *
-                 np.exp(dE*(_t+1))) * np.exp(-dE*_t)
-            # calculate ratio
-            ratio[_s,_t] = num/den
-    return ratio
-
-def get_states(mass1, mass2, d2, irrep, useall):
+    _T = d1.shape[1] - 1
+    _time_check(d1[:,:-1], d2, 1)
+    # the weight grows with the time slice
+    t = np.arange(1, _T+1).reshape((_T,) + (1,) * (d1.ndim - 2))
+    w = _weight(dE, t, d1.ndim)
+    prod = d2[:,:_T+1] * d3[:,:_T+1]
+    den = prod[:,1:] * w
+    np.subtract(prod[:,:_T], den, out=den)
+    num = d1[:,1:] * w
+    out = _out(out, np.broadcast(num, den).shape)
+    np.subtract(d1[:,:-1], num, out=out)
+    np.divide(out, den, out=out)
+    return out
+
+def get_states(mass1, mass2, d2, irrep, useall, L=24):
     """Calculate the expected energy for states for a given
-    irrep and total momentum d2."""
-    res1 = np.zeros_like(mass1)
-    res2 = np.zeros_like(mass2)
-    # calculate ground states, always needed
-    if d2 == 0:
-        res1[...,0] = mass1[...,0]
-        res2[...,0] = mass2[...,0]
-    elif d2 == 1:
-        res1[...,0] = (WfromMass_lat(mass1[...,0], 1, L) + mass1[...,0])
-        res2[...,0] = (WfromMass_lat(mass2[...,0], 1, L) + mass2[...,0])
-    elif d2 == 2:
-        res1[...,0] = (WfromMass_lat(mass1[...,0], 2, L) + mass1[...,0])
-        res2[...,0] = (WfromMass_lat(mass2[...,0], 2, L) + mass2[...,0])
-    else:
-        raise ValueError("not implemented yet")
+    irrep and total momentum d2.
 
-    # get all states
-    if useall:
-        if d2 == 0:
-            for n in range(1, mass1.shape[-1]):
-                res1[...,n] = 2.*WfromMass_lat(mass1[...,0], n, L)
-            for n in range(1, mass2.shape[-1]):
-                res2[...,n] = 2.*WfromMass_lat(mass2[...,0], n, L)
-        elif d2 == 1:
-            k1 = [0, 1, 2, 1, 2, 4, 3]
-            k2 = [1, 2, 3, 4, 5, 5, 6]
-            for n in range(1, mass1.shape[-1]):
-                res1[...,n] = (WfromMass_lat(mass1[...,0], k1[n], L) + 
-                               WfromMass_lat(mass1[...,0], k2[n], L))
-            for n in range(1, mass2.shape[-1]):
-                res2[...,n] = (WfromMass_lat(mass2[...,0], k1[n], L) + 
-                               WfromMass_lat(mass2[...,0], k2[n], L))
-        elif d2 == 2:
-            k1 = [0, 1, 1, 2, 2, 1, 3, 2]
-            k2 = [2, 1, 3, 2, 4, 5, 5, 6]
-            for n in range(1, mass1.shape[-1]):
-                res1[...,n] = (WfromMass_lat(mass1[...,0], k1[n], L) + 
-                               WfromMass_lat(mass1[...,0], k2[n], L))
-            for n in range(1, mass2.shape[-1]):
-                res2[...,n] = (WfromMass_lat(mass2[...,0], k1[n], L) + 
-                               WfromMass_lat(mass2[...,0], k2[n], L))
-        
-    # use only ground state
-    else:
-        for n in range(1, mass1.shape[-1]):
-            res1[...,n] = res1[...,0]
-        for n in range(1, mass2.shape[-1]):
-            res2[...,n] = res2[...,0]
+    The ground state is calculated from the first entry of the last axis,
+    the other entries of the last axis are replaced by the excited states
+    if useall is set, otherwise by the ground state.
+
+    Parameters
+    ----------
+    mass1, mass2 : ndarray
+        The data of the two particles.
+    d2 : int
+        The total momentum squared.
+    irrep : str
+        The lattice irrep, not used yet.
+    useall : bool
+        Calculate the excited states.
+    L : int, optional
+        The spatial extent of the lattice.
+
+    Returns
+    -------
+    res1, res2 : ndarray
+        The states, read-only if useall is not set.
+
+    Raises
+    ------
+    ValueError
+        If d2 > 2.
+    """
+    if d2 not in (0, 1, 2):
+        raise ValueError("not implemented yet")
+    return _states(mass1, d2, useall, L), _states(mass2, d2, useall, L)
 
-if __name__ == "main":
-    pass
+def _states(mass, d2, useall, L):
+    m = mass[...,:1]
+    _n = mass.shape[-1]
+    if d2 == 0:
+        if not useall:
+            return np.broadcast_to(m, mass.shape)
+        res = 2. * WfromMass_lat(m, np.arange(_n), L)
+        res[...,0] = mass[...,0]
+        return res
+    k1, k2 = _MOMENTA[d2]
+    k1, k2 = np.asarray(k1[:_n]), np.asarray(k2[:_n])
+    if not useall:
+        k1, k2 = k1[:1], k2[:1]
+    res = WfromMass_lat(m, k1, L) + WfromMass_lat(m, k2, L)
+    return np.broadcast_to(res, mass.shape)
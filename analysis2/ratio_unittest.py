@@ -6,11 +6,81 @@ import unittest
 import numpy as np
 
 import ratio
+from energies import WfromMass_lat
 
 class Ratio_Test(unittest.TestCase):
-    def test_ratio(self):
-        pass
+    def setUp(self):
+        rng = np.random.RandomState(1227)
+        self.d1 = 1. + 0.1*rng.rand(10, 8, 3)
+        self.d2 = 1. + 0.1*rng.rand(10, 9, 3)
+        self.d3 = 1. + 0.1*rng.rand(10, 9, 3)
+        self.dE = 0.01 + 0.01*rng.rand(10)
+
+    def test_simple_ratio(self):
+        d2, d3 = self.d2[:,:8], self.d3[:,:8]
+        res = ratio.simple_ratio(self.d1, d2, d3)
+        self.assertTrue(np.allclose(res, self.d1/(d2*d3)))
+        out = np.empty_like(self.d1)
+        res = ratio.simple_ratio(self.d1, d2, d3, out=out)
+        self.assertIs(res, out)
+        self.assertRaises(ValueError, ratio.simple_ratio, self.d1, d2, d3,
+            out=np.empty((10, 8)))
+
+    def test_twopoint_ratio(self):
+        res = ratio.twopoint_ratio(self.d1, self.d2[:,:8], self.d3)
+        self.assertTrue(np.allclose(res, self.d1/self.d2[:,:8]-1.))
+
+    def test_ratio_shift(self):
+        res = ratio.ratio_shift(self.d1, self.d2, self.d3)
+        # only the ground state is used
+        a = (self.d2*self.d3)[...,:1]
+        ref = self.d1 / (a[:,:-1] - a[:,1:])
+        self.assertTrue(np.allclose(res, ref))
+
+    def test_ratio_shift_weighted(self):
+        res = ratio.ratio_shift(self.d1, self.d2, self.d3, dE=self.dE)
+        a = (self.d2*self.d3)[...,0]
+        ref = np.zeros_like(self.d1)
+        for s in range(10):
+            for t in range(8):
+                den = np.exp(-self.dE[s]*t) * (np.exp(self.dE[s]*t)*a[s,t] -
+                    np.exp(self.dE[s]*(t+1))*a[s,t+1])
+                ref[s,t] = self.d1[s,t] / den
+        self.assertTrue(np.allclose(res, ref))
+        self.assertRaises(RuntimeError, ratio.ratio_shift, self.d1, self.d2,
+            self.d3, shift=2)
+
+    def test_ratio_subtract(self):
+        d2, d3 = self.d2[:,:8], self.d3[:,:8]
+        res = ratio.simple_ratio_subtract(self.d1, d2, d3)
+        a = d2*d3
+        ref = (self.d1[:,:-1] - self.d1[:,1:]) / (a[:,:-1] - a[:,1:])
+        self.assertTrue(np.allclose(res, ref))
+        res = ratio.ratio(self.d1, d2, d3, dE=self.dE)
+        w = np.exp(self.dE[:,None,None] * np.arange(1., 8.)[:,None])
+        ref = (self.d1[:,:-1] - w*self.d1[:,1:]) / (a[:,:-1] - w*a[:,1:])
+        self.assertTrue(np.allclose(res, ref))
+        # the weight exp(dE*(t+1)) of the original loop
+        d1, d2, d3 = self.d1[...,0], d2[...,0], d3[...,0]
+        res = ratio.ratio(d1, d2, d3, dE=0.1)
+        for s in range(d1.shape[0]):
+            for t in range(d1.shape[1]-1):
+                w = np.exp(0.1*(t+1))
+                ref = (d1[s,t] - d1[s,t+1]*w) / (d2[s,t]*d3[s,t] -
+                    d2[s,t+1]*d3[s,t+1]*w)
+                self.assertAlmostEqual(res[s,t], ref, delta=1e-12*abs(ref))
+
+    def test_get_states(self):
+        m = 0.1 + 0.1*np.random.rand(10, 5, 4)
+        res, _ = ratio.get_states(m, m, 0, "A1", False)
+        self.assertTrue(np.all(res == m[...,:1]))
+        res, _ = ratio.get_states(m, m, 0, "A1", True)
+        self.assertTrue(np.allclose(res[...,0], m[...,0]))
+        self.assertTrue(np.allclose(res[...,2], 2.*WfromMass_lat(m[...,0], 2)))
+        res, _ = ratio.get_states(m, m, 1, "A1", True, L=32)
+        ref = WfromMass_lat(m[...,0], 2, 32) + WfromMass_lat(m[...,0], 3, 32)
+        self.assertTrue(np.allclose(res[...,2], ref))
+        self.assertRaises(ValueError, ratio.get_states, m, m, 3, "A1", True)
 
 if __name__ == "__main__":
     unittest.main()
-
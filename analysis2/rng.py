@@ -0,0 +1,236 @@
+"""
+Reproducible random number streams.
+
+The random numbers of the resampling are taken from streams identified
+by a key, e.g. the ensemble, the correlator and the purpose. Every
+stream is a counter-based generator: the n-th number of a stream is a
+hash of the key and n, computed with the SplitMix64 mixing function. No
+state is carried from one number to the next, so any range of a stream
+can be generated on its own, and the numbers do not depend on how the
+work is split between workers. Different keys give independent streams.
+"""
+
+import hashlib
+import numpy as np
+
+# the constants of SplitMix64
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MUL1 = np.uint64(0xBF58476D1CE4E5B9)
+_MUL2 = np.uint64(0x94D049BB133111EB)
+
+def _mix(z):
+    """The SplitMix64 finalizer, for uint64 arrays."""
+    z = (z ^ (z >> np.uint64(30))) * _MUL1
+    z = (z ^ (z >> np.uint64(27))) * _MUL2
+    return z ^ (z >> np.uint64(31))
+
+def stream_key(*names):
+    """The 64 bit key of a stream.
+
+    Parameters
+    ----------
+    names : anything
+        The parts of the name of the stream, converted to strings.
+
+    Returns
+    -------
+    int
+        The key.
+    """
+    h = hashlib.sha1("\0".join(str(n) for n in names))
+    return int(h.hexdigest()[:16], 16)
+
+def _size(size):
+    if isinstance(size, (tuple, list)):
+        return tuple(size), int(np.prod(size))
+    return (size,), int(size)
+
+class Stream(object):
+    """A counter-based stream of random numbers.
+
+    All methods take the position of the first number in the stream as
+    offset and use the numbers offset, offset+1, ... of the stream.
+    Calling them with the same key, offset and size gives the same
+    numbers.
+    """
+    def __init__(self, key):
+        """Create the stream.
+
+        Parameters
+        ----------
+        key : int
+            The key of the stream, see stream_key.
+        """
+        self.key = int(key) & 0xFFFFFFFFFFFFFFFF
+
+    def __repr__(self):
+        return "Stream(0x%016x)" % self.key
+
+    def __eq__(self, other):
+        return isinstance(other, Stream) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def child(self, *names):
+        """An independent stream derived from this one.
+
+        Parameters
+        ----------
+        names : anything
+            The name of the child stream.
+
+        Returns
+        -------
+        Stream
+            The derived stream.
+        """
+        return Stream(stream_key(self.key, *names))
+
+    def raw(self, size, offset=0):
+        """Random 64 bit integers.
+
+        Parameters
+        ----------
+        size : int or tuple of int
+            The shape of the result.
+        offset : int, optional
+            The position of the first number in the stream.
+
+        Returns
+        -------
+        ndarray
+            The numbers as uint64.
+        """
+        shape, n = _size(size)
+        counter = np.arange(n, dtype=np.uint64) + np.uint64(offset)
+        z = np.uint64(self.key) + (counter + np.uint64(1)) * _GOLDEN
+        return _mix(z).reshape(shape)
+
+    def uniform(self, size, offset=0, low=0., high=1.):
+        """Uniformly distributed random numbers in [low, high).
+
+        Parameters
+        ----------
+        size : int or tuple of int
+            The shape of the result.
+        offset : int, optional
+            The position of the first number in the stream.
+        low, high : float, optional
+            The interval.
+
+        Returns
+        -------
+        ndarray
+            The random numbers.
+        """
+        # the upper 53 bits give all doubles in [0, 1) with spacing 2^-53
+        u = (self.raw(size, offset) >> np.uint64(11)) * 2.**-53
+        return low + (high - low) * u
+
+    def integers(self, high, size, offset=0):
+        """Uniformly distributed random integers in [0, high).
+
+        Parameters
+        ----------
+        high : int
+            The upper bound.
+        size : int or tuple of int
+            The shape of the result.
+        offset : int, optional
+            The position of the first number in the stream.
+
+        Returns
+        -------
+        ndarray
+            The random integers.
+        """
+        return (self.uniform(size, offset) * high).astype(np.intp)
+
+    def normal(self, size, offset=0, loc=0., scale=1.):
+        """Normal distributed random numbers.
+
+        Every number uses two numbers of the stream, the i-th number uses
+        the numbers 2*(offset+i) and 2*(offset+i)+1.
+
+        Parameters
+        ----------
+        size : int or tuple of int
+            The shape of the result.
+        offset : int, optional
+            The position of the first number, counted in normal numbers.
+        loc, scale : float, optional
+            The mean and the standard deviation.
+
+        Returns
+        -------
+        ndarray
+            The random numbers.
+        """
+        shape, n = _size(size)
+        u = self.uniform((n, 2), 2 * offset)
+        # Box-Muller transform, 1-u is in (0, 1]
+        r = np.sqrt(-2. * np.log(1. - u[:,0]))
+        return loc + scale * (r * np.cos(2. * np.pi * u[:,1])).reshape(shape)
+
+class RNGService(object):
+    """Hands out the streams of an analysis.
+
+    The streams are derived from the seed of the service and the names
+    of the ensemble, the correlator and the purpose, so every stream is
+    reproducible and streams with different names are independent.
+    """
+    def __init__(self, seed=1227):
+        """Create the service.
+
+        Parameters
+        ----------
+        seed : int, optional
+            The seed of all streams.
+        """
+        self.seed = seed
+
+    def stream(self, ensemble="", correlator="", purpose=""):
+        """The stream of the given names.
+
+        Parameters
+        ----------
+        ensemble : str, optional
+            The name of the ensemble.
+        correlator : str, optional
+            The name of the correlator.
+        purpose : str, optional
+            What the numbers are used for, e.g. "bootstrap".
+
+        Returns
+        -------
+        Stream
+            The stream.
+        """
+        return Stream(stream_key(self.seed, ensemble, correlator, purpose))
+
+_service = RNGService()
+
+def set_seed(seed):
+    """Set the seed of the default service.
+
+    Parameters
+    ----------
+    seed : int
+        The seed of all streams.
+
+    Returns
+    -------
+    int
+        The previous seed.
+    """
+    old, _service.seed = _service.seed, seed
+    return old
+
+def stream(ensemble="", correlator="", purpose=""):
+    """The stream of the given names from the default service, see
+    RNGService.stream."""
+    return _service.stream(ensemble, correlator, purpose)
+
+if __name__ == "__main__":
+    pass
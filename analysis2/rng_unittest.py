@@ -0,0 +1,80 @@
+"""
+Unit tests for the random number streams.
+"""
+
+import unittest
+import numpy as np
+
+import rng
+from statistics import draw_weighted, draw_gauss_distributed
+
+class Stream_Test(unittest.TestCase):
+    def setUp(self):
+        self.stream = rng.stream("A40.24", "pi", "bootstrap")
+
+    def test_reproducible(self):
+        ref = self.stream.raw(100)
+        self.assertEqual(ref.dtype, np.uint64)
+        self.assertTrue(np.array_equal(rng.stream("A40.24", "pi",
+            "bootstrap").raw(100), ref))
+        self.assertEqual(rng.stream("A40.24", "pi", "bootstrap"), self.stream)
+
+    def test_independent(self):
+        streams = [rng.stream("A40.24", "pi", "bootstrap"),
+            rng.stream("A40.24", "k", "bootstrap"),
+            rng.stream("A40.24", "pi", "fse"), self.stream.child(1)]
+        u = np.array([s.uniform(10000) for s in streams])
+        self.assertEqual(len(set(s.key for s in streams)), 4)
+        corr = np.corrcoef(u)
+        self.assertTrue(np.all(np.abs(corr[np.triu_indices(4, 1)]) < 0.05))
+
+    def test_seed(self):
+        old = rng.set_seed(42)
+        try:
+            self.assertNotEqual(rng.stream("A40.24", "pi", "bootstrap"),
+                self.stream)
+        finally:
+            rng.set_seed(old)
+        self.assertEqual(rng.stream("A40.24", "pi", "bootstrap"), self.stream)
+
+    def test_offset(self):
+        ref = self.stream.uniform((10, 7))
+        for start in (0, 3, 9):
+            self.assertTrue(np.array_equal(self.stream.uniform(7, start*7),
+                ref[start]))
+        ref = self.stream.normal(20)
+        self.assertTrue(np.array_equal(self.stream.normal(5, 15), ref[15:]))
+
+    def test_distributions(self):
+        u = self.stream.uniform(100000, low=-1., high=3.)
+        self.assertTrue(np.all((u >= -1.) & (u < 3.)))
+        self.assertAlmostEqual(u.mean(), 1., delta=0.02)
+        i = self.stream.integers(7, 70000)
+        self.assertTrue(np.all(np.bincount(i, minlength=7) > 9000))
+        n = self.stream.normal((200, 500), loc=2., scale=0.5)
+        self.assertEqual(n.shape, (200, 500))
+        self.assertAlmostEqual(n.mean(), 2., delta=0.01)
+        self.assertAlmostEqual(n.std(), 0.5, delta=0.01)
+
+class Draw_Test(unittest.TestCase):
+    def test_draw_weighted(self):
+        vals = np.random.rand(30)
+        ref = draw_weighted(vals, 50)
+        self.assertTrue(np.array_equal(draw_weighted(vals, 50), ref))
+        res = draw_weighted(vals, 50, stream=rng.stream(purpose="weights"))
+        self.assertEqual(res.shape, (50,))
+        self.assertTrue(np.all(np.in1d(res, vals)))
+
+    def test_draw_gauss(self):
+        # the global generator is left untouched
+        np.random.seed(3)
+        ref = np.random.rand(3)
+        np.random.seed(3)
+        draw_gauss_distributed(1., 0.1, (20,))
+        self.assertTrue(np.array_equal(np.random.rand(3), ref))
+        s = rng.stream(purpose="fse")
+        res = draw_gauss_distributed(1., 0.1, (20,), s)
+        self.assertTrue(np.array_equal(res, s.normal(20, loc=1., scale=0.1)))
+
+if __name__ == "__main__":
+    unittest.main()
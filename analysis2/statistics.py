@@ -77,19 +77,9 @@ def compute_weight(data, pvals, rel=True):
         errors = np.nanstd(data, axis=0)
     # get the minimum of the errors
     min_err = np.amin(errors)
-    # prepare storage
-    weights = np.zeros((data.shape[1:]))
     # Warning playing with the exponent of the weight
     exp=2
-    if weights.ndim == 1:
-        for i in range(weights.shape[0]):
-            weights[i] = ((1. - 2.*np.abs(pvals[0,i]-0.5)) *
-                min_err/errors[i])**exp
-    else:
-        ranges = [[n for n in range(x)] for x in weights.shape]
-        for riter in itertools.product(*ranges):
-            weights[riter] = ((1. - 2.*np.abs(pvals[(0,)+riter]-0.5)) *
-                min_err/errors[riter])**exp
+    weights = ((1. - 2.*np.abs(pvals[0]-0.5)) * min_err/errors)**exp
     return weights
 
 def sys_error(data, pvals, par=0, rel=True):
@@ -217,27 +207,61 @@ def estimated_autocorrelation(x):
       result = r/(variance*(np.arange(n, 0, -1)))
       return  result
 
-def draw_weighted(vals, samples=200, seed=1227):
-    """Function to draw weighted random numbers after distribution of weights
-    for fit ranges
+def draw_weighted_indices(vals, samples=200, seed=1227, stream=None):
+    """Draw indices with probabilities proportional to the weights.
+
+    All random numbers are drawn at once. The indices are ordered by
+    increasing weight, vals[indices] is the result of draw_weighted.
 
     Parameters
     ----------
+    vals : ndarray
+        The weights, 1d.
+    samples : int, optional
+        The number of draws.
+    seed : int, optional
+        The seed of the random number generator, unused with a stream.
+    stream : rng.Stream, optional
+        The stream of the random numbers.
+
+    Returns
+    -------
+    indices : ndarray
+        The drawn indices into vals.
     """
     # get cumulated weights from sorted weights
-    vals_sort = np.sort(vals)
-    vals_cum = np.cumsum(vals_sort)
-    # Initialize with Bastians Seed
-    np.random.seed(seed)
-    # draw nbsample numbers from the interval [weigths_cum[0],weights_cum[-1]]
-    a,b = vals_cum[0], vals_cum[-1]
-    rnd_cum = np.sort(np.asarray([np.random.uniform(a, b) for i in range(0,
-      samples)]))
+    order = np.argsort(vals)
+    vals_cum = np.cumsum(vals[order])
+    # draw nbsample numbers from the interval [0, weights_cum[-1]), so
+    # every weight gets a share of its size
+    a,b = 0., vals_cum[-1]
+    if stream is None:
+        # Initialize with Bastians Seed
+        rnd = np.random.RandomState(seed).uniform(a, b, samples)
+    else:
+        rnd = stream.uniform(samples, low=a, high=b)
+    rnd_cum = np.sort(rnd)
     # get indices of values in rnd_cum which are nearest to the values in
     # vals_cum, i from v_{i-1} <= r < v_i
-    indices = np.searchsorted(vals_cum, rnd_cum, side='right')
-    vals_take = np.take(vals_sort, indices)
-    return vals_take
+    return order[np.searchsorted(vals_cum, rnd_cum, side='right')]
+
+def draw_weighted(vals, samples=200, seed=1227, stream=None):
+    """Function to draw weighted random numbers after distribution of weights
+    for fit ranges
+
+    Parameters
+    ----------
+    vals : ndarray
+        The weights.
+    samples : int, optional
+        The number of draws.
+    seed : int, optional
+        The seed of the random number generator, unused with a stream.
+    stream : rng.Stream, optional
+        The stream of the random numbers.
+    """
+    vals = np.asarray(vals)
+    return np.take(vals, draw_weighted_indices(vals, samples, seed, stream))
 
 def freq_count(arr, verb=False):
     """Get a frequency count for values in an array
@@ -250,20 +274,21 @@ def freq_count(arr, verb=False):
     frequencies : a 2d numpy array with the unique sorted values on the first
                   axis and the number of counts on the second axis
     """
-    # intermediate uniqe array
-    arr_unq = np.unique(arr)
-    frequencies = np.zeros((arr_unq.shape[0],2))
-    for i,v in enumerate(arr_unq):
-      frequencies[i] = np.asarray([arr_unq[i],(arr == v).sum()])
+    arr_unq, counts = np.unique(arr, return_counts=True)
+    frequencies = np.column_stack((arr_unq, counts)).astype(float)
     if verb == True:
       print(frequencies)
     return frequencies
 
-def draw_gauss_distributed(mean, std, shape):
-    """Draw normal distributed random numbers."""
-    np.random.seed(1227)
+def draw_gauss_distributed(mean, std, shape, stream=None):
+    """Draw normal distributed random numbers.
+
+    Without a stream the numbers are drawn with the seed 1227.
+    """
+    if stream is not None:
+        return stream.normal(shape, loc=mean, scale=std)
     # for random samples from N(\mu, \sigma^2) use
     # sigma * random(shape) + mu
-    return std * np.random.randn(*shape) + mean
+    return std * np.random.RandomState(1227).randn(*shape) + mean
 if __name__ == "main":
     pass
@@ -0,0 +1,35 @@
+"""
+Unit tests for the statistics routines.
+"""
+
+import unittest
+import numpy as np
+
+from statistics import draw_weighted, draw_weighted_indices, freq_count
+
+class DrawWeighted_Test(unittest.TestCase):
+    def setUp(self):
+        self.vals = np.random.RandomState(5).rand(40)
+
+    def test_indices(self):
+        ind = draw_weighted_indices(self.vals, 500)
+        self.assertEqual(ind.shape, (500,))
+        self.assertTrue(np.array_equal(self.vals[ind], draw_weighted(self.vals,
+            500)))
+        # ordered by weight
+        self.assertTrue(np.all(np.diff(self.vals[ind]) >= 0.))
+
+    def test_probabilities(self):
+        vals = np.array([0.1, 0.6, 0.3])
+        ind = draw_weighted_indices(vals, 20000)
+        freq = np.bincount(ind, minlength=3) / 20000.
+        ref = vals / np.sum(vals)
+        self.assertTrue(np.allclose(freq, ref, atol=0.02))
+
+    def test_freq_count(self):
+        arr = np.array([3., 1., 3., 2., 3., 1.])
+        ref = np.array([[1., 2.], [2., 1.], [3., 3.]])
+        self.assertTrue(np.array_equal(freq_count(arr), ref))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Synthetic lattice data for tests and benchmarks.
+
+The correlation functions are built from a known spectrum, so the
+results of the analysis can be checked against the input. The noise is
+gaussian with a relative size that can grow with time and an optional
+autocorrelation along the configurations.
+"""
+
+import numpy as np
+
+from correlator import Correlators
+
+def _noise(nconf, shape, tau, rng):
+    """Gaussian noise with unit variance, correlated along the first axis.
+
+    Parameters
+    ----------
+    nconf : int
+        The number of configurations.
+    shape : tuple of int
+        The shape of the noise on each configuration.
+    tau : float
+        The exponential autocorrelation time in units of configurations.
+        For tau <= 0 the configurations are independent.
+    rng : RandomState
+        The random number generator.
+
+    Returns
+    -------
+    ndarray
+        The noise with shape (nconf,) + shape.
+    """
+    eps = rng.standard_normal((nconf,) + tuple(shape))
+    if tau > 0.:
+        # AR(1) process, keeps the variance at 1
+        rho = np.exp(-1./tau)
+        fac = np.sqrt(1. - rho*rho)
+        for i in range(1, nconf):
+            eps[i] = rho * eps[i-1] + fac * eps[i]
+    return eps
+
+def _relative_error(T, noise, growth):
+    """The relative error on each time slice."""
+    t = np.arange(T, dtype=float)
+    # the noise grows towards the middle of the lattice
+    dist = np.minimum(t, T - t)
+    return noise * np.exp(growth * dist)
+
+def single_correlator(nconf, T, energies, amplitudes=None, noise=0.01,
+        growth=0., tau=0., seed=1227):
+    """Single particle correlation function.
+
+    The mean is given by sum_k 0.5*A_k^2*(exp(-E_k*t)+exp(-E_k*(T-t))),
+    the form fitted by fit function 0 of LatticeFit with T2=T.
+
+    Parameters
+    ----------
+    nconf : int
+        The number of configurations.
+    T : int
+        The time extent of the lattice.
+    energies : float or sequence of float
+        The energies of the states.
+    amplitudes : float or sequence of float, optional
+        The amplitudes of the states, defaults to 1 for every state.
+    noise : float, optional
+        The relative error at t=0.
+    growth : float, optional
+        The rate with which the relative error grows with time.
+    tau : float, optional
+        The autocorrelation time along the configurations.
+    seed : int, optional
+        The seed of the random number generator.
+
+    Returns
+    -------
+    ndarray
+        The data with shape (nconf, T, 1).
+    """
+    energies = np.atleast_1d(np.asarray(energies, dtype=float))
+    if amplitudes is None:
+        amplitudes = np.ones_like(energies)
+    amplitudes = np.atleast_1d(np.asarray(amplitudes, dtype=float))
+    rng = np.random.RandomState(seed)
+    t = np.arange(T, dtype=float)
+    mean = np.sum(0.5 * amplitudes[:,None]**2 * (np.exp(-energies[:,None]*t) +
+        np.exp(-energies[:,None]*(T-t))), axis=0)
+    err = _relative_error(T, noise, growth)
+    data = mean * (1. + err * _noise(nconf, (T,), tau, rng))
+    return data[:,:,None]
+
+def two_particle_correlator(nconf, T, energies, mass, amplitudes=None,
+        thermal=1., noise=0.01, growth=0., tau=0., seed=1228):
+    """Two particle correlation function.
+
+    The mean is given by sum_k A_k*cosh(E_k*(t-T/2)) + B*exp(-m*T), the
+    form fitted by fit function 3 of LatticeFit. The constant is the
+    thermal pollution of two particles propagating in opposite
+    directions.
+
+    Parameters
+    ----------
+    nconf : int
+        The number of configurations.
+    T : int
+        The time extent of the lattice.
+    energies : float or sequence of float
+        The energies of the two particle states.
+    mass : float
+        The single particle mass.
+    amplitudes : float or sequence of float, optional
+        The amplitudes of the states, defaults to exp(-E_k*T/2).
+    thermal : float, optional
+        The amplitude B of the thermal pollution.
+    noise, growth, tau, seed
+        See single_correlator.
+
+    Returns
+    -------
+    ndarray
+        The data with shape (nconf, T, 1).
+    """
+    energies = np.atleast_1d(np.asarray(energies, dtype=float))
+    if amplitudes is None:
+        amplitudes = np.exp(-energies*T/2.)
+    amplitudes = np.atleast_1d(np.asarray(amplitudes, dtype=float))
+    rng = np.random.RandomState(seed)
+    t = np.arange(T, dtype=float)
+    mean = np.sum(amplitudes[:,None] * np.cosh(energies[:,None]*(t-T/2.)),
+        axis=0) + thermal * np.exp(-mass*T)
+    err = _relative_error(T, noise, growth)
+    data = mean * (1. + err * _noise(nconf, (T,), tau, rng))
+    return data[:,:,None]
+
+def correlator_matrix(nconf, T, spectrum, overlaps=None, noise=0.01,
+        growth=0., tau=0., seed=1229):
+    """Symmetric correlation function matrix.
+
+    The mean is given by
+    C_ij(t) = sum_k v_ik*v_jk*(exp(-E_k*t)+exp(-E_k*(T-t))),
+    so the GEVP of the mean matrix gives back the spectrum.
+
+    Parameters
+    ----------
+    nconf : int
+        The number of configurations.
+    T : int
+        The time extent of the lattice.
+    spectrum : sequence of float
+        The energies of the states, the number of states gives the size
+        of the matrix.
+    overlaps : ndarray, optional
+        The overlaps v_ik of operator i with state k. Defaults to 1 on
+        the diagonal and 0.2 everywhere else.
+    noise, growth, tau, seed
+        See single_correlator.
+
+    Returns
+    -------
+    ndarray
+        The data with shape (nconf, T, n, n).
+    """
+    spectrum = np.asarray(spectrum, dtype=float)
+    n = spectrum.shape[0]
+    if overlaps is None:
+        overlaps = 0.2 * np.ones((n, n)) + 0.8 * np.identity(n)
+    rng = np.random.RandomState(seed)
+    t = np.arange(T, dtype=float)
+    # time dependence of each state, shape (T, n)
+    prop = np.exp(-t[:,None]*spectrum) + np.exp(-(T-t)[:,None]*spectrum)
+    mean = np.einsum("ik,tk,jk->tij", overlaps, prop, overlaps)
+    err = _relative_error(T, noise, growth)
+    eps = _noise(nconf, (T, n, n), tau, rng)
+    # keep every configuration symmetric
+    eps = (eps + np.swapaxes(eps, -1, -2)) / np.sqrt(2.)
+    return mean * (1. + err[:,None,None] * eps)
+
+def to_correlators(data):
+    """Wrap data into a Correlators object.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data, if the last two axes have the same extent it is
+        treated as a matrix.
+
+    Returns
+    -------
+    Correlators
+        The correlators.
+    """
+    corr = Correlators()
+    corr.data = data
+    corr.shape = data.shape
+    corr.matrix = (data.ndim == 4 and data.shape[-2] == data.shape[-1])
+    return corr
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,68 @@
+"""
+Unit tests for the synthetic data.
+"""
+
+import unittest
+import numpy as np
+
+import synthetic
+from gevp import calculate_gevp
+
+class Synthetic_Test(unittest.TestCase):
+    def setUp(self):
+        self.T = 32
+        self.nconf = 200
+        self.t = np.arange(self.T, dtype=float)
+
+    def test_single_mean(self):
+        data = synthetic.single_correlator(self.nconf, self.T, 0.2, noise=0.)
+        self.assertEqual(data.shape, (self.nconf, self.T, 1))
+        mean = 0.5 * (np.exp(-0.2*self.t) + np.exp(-0.2*(self.T-self.t)))
+        self.assertTrue(np.allclose(data[:,:,0], mean))
+
+    def test_single_noise(self):
+        data = synthetic.single_correlator(self.nconf, self.T, 0.2, noise=0.01)
+        mean = 0.5 * (np.exp(-0.2*self.t) + np.exp(-0.2*(self.T-self.t)))
+        rel = np.std(data[:,:,0], axis=0) / mean
+        self.assertTrue(np.allclose(rel, 0.01, rtol=0.2))
+
+    def test_seed(self):
+        d1 = synthetic.single_correlator(self.nconf, self.T, 0.2, seed=1)
+        d2 = synthetic.single_correlator(self.nconf, self.T, 0.2, seed=1)
+        d3 = synthetic.single_correlator(self.nconf, self.T, 0.2, seed=2)
+        self.assertTrue(np.array_equal(d1, d2))
+        self.assertFalse(np.array_equal(d1, d3))
+
+    def test_autocorrelation(self):
+        d1 = synthetic.single_correlator(self.nconf, self.T, 0.2, tau=0.)
+        d2 = synthetic.single_correlator(self.nconf, self.T, 0.2, tau=5.)
+        c1 = np.corrcoef(d1[:-1,0,0], d1[1:,0,0])[0,1]
+        c2 = np.corrcoef(d2[:-1,0,0], d2[1:,0,0])[0,1]
+        self.assertLess(abs(c1), 0.3)
+        self.assertGreater(c2, 0.6)
+
+    def test_two_particle_mean(self):
+        data = synthetic.two_particle_correlator(self.nconf, self.T, 0.3,
+            0.14, amplitudes=1., thermal=2., noise=0.)
+        mean = np.cosh(0.3*(self.t-self.T/2.)) + 2.*np.exp(-0.14*self.T)
+        self.assertTrue(np.allclose(data[:,:,0], mean))
+
+    def test_matrix_spectrum(self):
+        spectrum = [0.3, 0.6]
+        data = synthetic.correlator_matrix(10, self.T, spectrum, noise=0.)
+        self.assertEqual(data.shape, (10, self.T, 2, 2))
+        self.assertTrue(np.allclose(data, np.swapaxes(data, -1, -2)))
+        ev = calculate_gevp(data[:,:self.T//4], t0=1)
+        # the eigenvalues fall with exp(-E) far from T/2
+        meff = -np.log(ev[0,3] / ev[0,2])
+        self.assertTrue(np.allclose(np.sort(meff), spectrum, rtol=1e-2))
+
+    def test_to_correlators(self):
+        corr = synthetic.to_correlators(np.ones((4, self.T, 1)))
+        self.assertFalse(corr.matrix)
+        corr = synthetic.to_correlators(np.ones((4, self.T, 2, 2)))
+        self.assertTrue(corr.matrix)
+        self.assertEqual(corr.shape, (4, self.T, 2, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,388 @@
+"""
+A work queue in a shared directory.
+
+The queue distributes independent jobs, e.g. the fit ranges of a fit,
+over worker processes on any number of nodes that share a file system.
+No server is needed, all coordination is done with atomic file system
+operations:
+
+* jobs/<id>.job holds the pickled function and arguments, written to a
+  temporary file and renamed into place.
+* claims/<id>.<n> is created exclusively by the worker running attempt
+  n of the job. The modification time is the start of the lease, the
+  worker renews it while the job runs. If the lease of the latest
+  attempt expired, e.g. because the node died, another worker claims
+  attempt n+1.
+* results/<id>.res holds the pickled result or the error message,
+  written like the jobs.
+* shared/<name>.pkl holds data used by many jobs, e.g. the correlation
+  functions. Every process keeps the most recently used ones in memory,
+  so consecutive jobs of the same fit load them only once.
+
+The coordinator puts the jobs, works on the queue itself while waiting
+and collects the results, so a queue without additional workers is
+processed as well. Workers are started with
+
+    python workqueue.py [--max-jobs N] [--idle SECONDS] DIR
+
+with the same python environment and working directory as the
+coordinator, so the pickled functions can be imported. The jobs must be
+module level functions.
+"""
+
+from __future__ import with_statement
+
+import os
+import time
+import uuid
+import errno
+import socket
+import argparse
+import tempfile
+import threading
+import traceback
+import itertools
+import collections
+import cPickle as pickle
+
+_counter = itertools.count()
+
+class Shared(object):
+    """Reference to an object stored in the shared directory."""
+    def __init__(self, name):
+        self.name = name
+
+class WorkQueue(object):
+    """A work queue in a shared directory."""
+    def __init__(self, path, lease=600., max_shared=4):
+        """Open or create the queue.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the queue.
+        lease : float, optional
+            The time in seconds after which a job claimed by a worker
+            that did not renew its claim is given to another worker.
+        max_shared : int, optional
+            The number of shared objects kept in memory, the least
+            recently used ones are dropped first.
+        """
+        self.path = path
+        self.lease = float(lease)
+        self.max_shared = max_shared
+        self._shared = collections.OrderedDict()
+        for d in ("jobs", "claims", "results", "shared"):
+            try:
+                os.makedirs(os.path.join(path, d))
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def _file(self, kind, name):
+        return os.path.join(self.path, kind, name)
+
+    def _write(self, kind, name, obj):
+        """Write obj atomically, readers never see a partial file."""
+        fd, tmp = tempfile.mkstemp(prefix=".tmp", dir=os.path.join(self.path,
+            kind))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self._file(kind, name))
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _read(self, kind, name):
+        with open(self._file(kind, name), "rb") as f:
+            return pickle.load(f)
+
+    def share(self, obj):
+        """Store data used by many jobs.
+
+        Parameters
+        ----------
+        obj : object
+            The data, it has to be picklable.
+
+        Returns
+        -------
+        Shared
+            The reference to pass as argument to the jobs.
+        """
+        name = uuid.uuid4().hex
+        self._write("shared", name + ".pkl", obj)
+        self._keep(name, obj)
+        return Shared(name)
+
+    def _keep(self, name, obj):
+        """Keep a shared object as the most recently used one."""
+        self._shared.pop(name, None)
+        self._shared[name] = obj
+        while len(self._shared) > self.max_shared:
+            self._shared.popitem(last=False)
+
+    def _resolve(self, arg):
+        if not isinstance(arg, Shared):
+            return arg
+        obj = self._shared.get(arg.name)
+        if obj is None:
+            obj = self._read("shared", arg.name + ".pkl")
+        self._keep(arg.name, obj)
+        return obj
+
+    def put(self, func, *args):
+        """Put a job into the queue.
+
+        Parameters
+        ----------
+        func : callable
+            A module level function.
+        *args
+            The arguments, Shared references are replaced by the data.
+
+        Returns
+        -------
+        str
+            The id of the job.
+        """
+        # the ids sort in the order the jobs were put
+        jobid = "%017d-%08d-%s" % (int(time.time()*1e6), next(_counter),
+            uuid.uuid4().hex[:12])
+        self._write("jobs", jobid + ".job", (func, args))
+        return jobid
+
+    def _attempts(self):
+        """The latest attempt of every claimed job."""
+        attempts = {}
+        for name in os.listdir(os.path.join(self.path, "claims")):
+            jobid, _, n = name.rpartition(".")
+            try:
+                n = int(n)
+            except ValueError:
+                continue
+            attempts[jobid] = max(n, attempts.get(jobid, -1))
+        return attempts
+
+    def _expired(self, claim):
+        try:
+            return time.time() - os.path.getmtime(claim) > self.lease
+        except OSError:
+            return False
+
+    def pending(self):
+        """The ids of all jobs without result."""
+        done = set(n[:-4] for n in os.listdir(os.path.join(self.path,
+            "results")) if n.endswith(".res"))
+        jobs = [n[:-4] for n in os.listdir(os.path.join(self.path, "jobs"))
+            if n.endswith(".job")]
+        return sorted(j for j in jobs if j not in done)
+
+    def claim(self, jobids=None):
+        """Claim the next job that is not claimed or whose lease expired.
+
+        Parameters
+        ----------
+        jobids : sequence of str, optional
+            Only claim one of these jobs.
+
+        Returns
+        -------
+        tuple or None
+            The id and the name of the claim file of the job, or None if
+            there is no job to claim.
+        """
+        pending = self.pending()
+        if jobids is not None:
+            jobids = set(jobids)
+            pending = [j for j in pending if j in jobids]
+        attempts = self._attempts()
+        for jobid in pending:
+            n = attempts.get(jobid, -1)
+            if n >= 0 and not self._expired(self._file("claims",
+                    "%s.%d" % (jobid, n))):
+                continue
+            claim = self._file("claims", "%s.%d" % (jobid, n+1))
+            try:
+                fd = os.open(claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    # another worker was faster
+                    continue
+                raise
+            with os.fdopen(fd, "w") as f:
+                f.write("%s %d\n" % (socket.gethostname(), os.getpid()))
+            return jobid, claim
+        return None
+
+    def run(self, jobid, claim):
+        """Run a claimed job and store the result.
+
+        The claim is renewed in a background thread while the job runs.
+        Errors of the job are stored as result.
+        """
+        stop = threading.Event()
+        def renew():
+            while not stop.wait(self.lease / 3.):
+                try:
+                    os.utime(claim, None)
+                except OSError:
+                    pass
+        thread = threading.Thread(target=renew)
+        thread.daemon = True
+        thread.start()
+        try:
+            func, args = self._read("jobs", jobid + ".job")
+            res = ("ok", func(*[self._resolve(a) for a in args]))
+        except Exception:
+            res = ("error", traceback.format_exc())
+        finally:
+            stop.set()
+            thread.join()
+        self._write("results", jobid + ".res", res)
+
+    def work(self, max_jobs=None, idle=0., poll=1., jobids=None):
+        """Process jobs until the queue is empty.
+
+        Parameters
+        ----------
+        max_jobs : int, optional
+            Stop after this many jobs.
+        idle : float, optional
+            Wait this many seconds for new jobs before stopping.
+        poll : float, optional
+            The time between checks for new jobs.
+        jobids : sequence of str, optional
+            Only work on these jobs.
+
+        Returns
+        -------
+        int
+            The number of jobs run.
+        """
+        njobs = 0
+        last = time.time()
+        while max_jobs is None or njobs < max_jobs:
+            job = self.claim(jobids)
+            if job is None:
+                if time.time() - last >= idle:
+                    break
+                time.sleep(poll)
+                continue
+            self.run(*job)
+            njobs += 1
+            last = time.time()
+        return njobs
+
+    def wait(self, jobids, work=True, timeout=None, poll=1.):
+        """Wait for the results of jobs.
+
+        Parameters
+        ----------
+        jobids : sequence of str
+            The ids of the jobs.
+        work : bool, optional
+            Run jobs of the queue while waiting.
+        timeout : float, optional
+            The maximal time to wait in seconds.
+        poll : float, optional
+            The time between checks for results.
+
+        Returns
+        -------
+        list
+            The results in the order of jobids.
+
+        Raises
+        ------
+        RuntimeError
+            If a job failed or the timeout is reached.
+        """
+        start = time.time()
+        while True:
+            missing = [j for j in jobids if not os.path.exists(self._file(
+                "results", j + ".res"))]
+            if not missing:
+                break
+            if work:
+                job = self.claim(missing)
+                if job is not None:
+                    self.run(*job)
+                    continue
+            if timeout is not None and time.time() - start > timeout:
+                raise RuntimeError("%d jobs not finished" % len(missing))
+            time.sleep(poll)
+        results = []
+        for j in jobids:
+            status, res = self._read("results", j + ".res")
+            if status != "ok":
+                raise RuntimeError("job %s failed:\n%s" % (j, res))
+            results.append(res)
+        return results
+
+    def remove(self, jobids=(), shared=()):
+        """Remove jobs, their claims and results and shared data."""
+        jobids = set(jobids)
+        for name in os.listdir(os.path.join(self.path, "claims")):
+            if name.rpartition(".")[0] in jobids:
+                _remove(self._file("claims", name))
+        for j in jobids:
+            _remove(self._file("jobs", j + ".job"))
+            _remove(self._file("results", j + ".res"))
+        for s in shared:
+            _remove(self._file("shared", s.name + ".pkl"))
+            self._shared.pop(s.name, None)
+
+    def map(self, func, args, shared=None, timeout=None):
+        """Run func for every entry of args on the queue.
+
+        Parameters
+        ----------
+        func : callable
+            A module level function.
+        args : sequence of tuples
+            The arguments of the jobs.
+        shared : sequence of Shared, optional
+            Shared data used by the jobs, removed afterwards.
+        timeout : float, optional
+            The maximal time to wait in seconds.
+
+        Returns
+        -------
+        list
+            The results in the order of args.
+        """
+        jobids = [self.put(func, *a) for a in args]
+        try:
+            return self.wait(jobids, timeout=timeout)
+        finally:
+            self.remove(jobids, shared or ())
+
+def _remove(name):
+    try:
+        os.remove(name)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Work on a shared queue.")
+    parser.add_argument("path", help="the directory of the queue")
+    parser.add_argument("--max-jobs", type=int, default=None,
+        help="stop after this many jobs")
+    parser.add_argument("--idle", type=float, default=60.,
+        help="wait this many seconds for new jobs before stopping")
+    parser.add_argument("--lease", type=float, default=600.,
+        help="the lease time of a claim in seconds")
+    parser.add_argument("--max-shared", type=int, default=4,
+        help="the number of shared objects kept in memory")
+    args = parser.parse_args(argv)
+    queue = WorkQueue(args.path, lease=args.lease,
+        max_shared=args.max_shared)
+    njobs = queue.work(max_jobs=args.max_jobs, idle=args.idle)
+    print("%d jobs done" % njobs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Unit tests for the shared work queue.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+import numpy as np
+
+from workqueue import WorkQueue
+
+def square(x):
+    return x * x
+
+def scale(data, x):
+    return data * x
+
+def fail(x):
+    raise ValueError("failed %d" % x)
+
+class WorkQueue_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.queue = WorkQueue(self.path, lease=60.)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_claim(self):
+        j1 = self.queue.put(square, 2)
+        j2 = self.queue.put(square, 3)
+        self.assertEqual(self.queue.pending(), [j1, j2])
+        jobid, claim = self.queue.claim()
+        self.assertEqual(jobid, j1)
+        # a second worker gets the next job
+        other = WorkQueue(self.path, lease=60.)
+        self.assertEqual(other.claim()[0], j2)
+        self.assertIsNone(other.claim())
+        self.queue.run(jobid, claim)
+        self.assertEqual(self.queue.pending(), [j2])
+        self.assertEqual(self.queue.wait([j1], work=False), [4])
+
+    def test_expired_lease(self):
+        j1 = self.queue.put(square, 2)
+        jobid, claim = self.queue.claim()
+        other = WorkQueue(self.path, lease=60.)
+        self.assertIsNone(other.claim())
+        # the worker died and did not renew its claim
+        old = time.time() - 120.
+        os.utime(claim, (old, old))
+        jobid, claim = other.claim()
+        self.assertEqual(jobid, j1)
+        self.assertTrue(claim.endswith(".1"))
+        self.assertIsNone(self.queue.claim())
+        other.run(jobid, claim)
+        self.assertEqual(self.queue.wait([j1], work=False), [4])
+
+    def test_shared(self):
+        data = self.queue.share(np.arange(4.))
+        res = self.queue.map(scale, [(data, 1.), (data, 2.)], shared=[data])
+        self.assertTrue(np.array_equal(res[1], np.arange(4.) * 2.))
+        self.assertEqual(os.listdir(os.path.join(self.path, "shared")), [])
+        self.assertEqual(os.listdir(os.path.join(self.path, "jobs")), [])
+
+    def test_shared_memory(self):
+        queue = WorkQueue(self.path, max_shared=2)
+        shared = [queue.share(np.arange(n)) for n in range(3)]
+        self.assertEqual(list(queue._shared), [s.name for s in shared[1:]])
+        # the least recently used object is dropped, and read again
+        queue._resolve(shared[1])
+        self.assertTrue(np.array_equal(queue._resolve(shared[0]), []))
+        self.assertEqual(list(queue._shared), [shared[1].name, shared[0].name])
+        queue.remove(shared=shared)
+        self.assertEqual(len(queue._shared), 0)
+
+    def test_failure(self):
+        self.assertRaises(RuntimeError, self.queue.map, fail, [(1,)])
+
+    def test_timeout(self):
+        j1 = self.queue.put(square, 2)
+        self.assertRaises(RuntimeError, self.queue.wait, [j1], work=False,
+            timeout=0., poll=0.)
+
+    def test_workers(self):
+        jobs = [self.queue.put(square, i) for i in range(20)]
+        workers = [multiprocessing.Process(target=WorkQueue(self.path).work)
+            for i in range(2)]
+        for w in workers:
+            w.start()
+        res = self.queue.wait(jobs, poll=0.05)
+        for w in workers:
+            w.join()
+        self.assertEqual(res, [i * i for i in range(20)])
+
+class FitQueue_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_fit(self):
+        import synthetic
+        from fit import LatticeFit
+        corr = synthetic.to_correlators(synthetic.single_correlator(100, 32,
+            [0.2, 0.6], [1., 0.5], noise=0.005))
+        corr.sym_and_boot(20)
+        fitter = LatticeFit(0, dt_i=1, dt_f=1, dt=4)
+        add = np.ones((20,)) * 32
+        ref = fitter.fit([1., 0.2], corr, [8, 14], add=add)
+        queue = WorkQueue(self.path)
+        worker = multiprocessing.Process(target=WorkQueue(self.path).work,
+            kwargs=dict(idle=2., poll=0.05))
+        worker.start()
+        res = fitter.fit([1., 0.2], corr, [8, 14], add=add, queue=queue,
+            chunksize=3)
+        worker.join()
+        self.assertTrue(np.array_equal(ref.data[0], res.data[0]))
+        self.assertTrue(np.array_equal(ref.pval[0], res.pval[0]))
+        self.assertEqual(queue.pending(), [])
+
+if __name__ == "__main__":
+    unittest.main()
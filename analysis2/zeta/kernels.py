@@ -0,0 +1,302 @@
+"""
+Kernels for the sums of the zeta function.
+
+The kernels calculate the summands of the terms A and C of one momentum
+shell and the spherical harmonics. Two implementations exist, the numpy
+kernels process a whole shell with array operations, the loop kernels
+are written for a JIT compiler and are compiled with numba if the numba
+backend is chosen, see set_backend. Both give the same results up to
+rounding.
+"""
+
+import cmath
+import math
+import numpy as np
+import scipy.special
+
+BACKENDS = ("numpy", "numba")
+
+# the spherical harmonics with a closed form, the others are calculated
+# by scipy in the numpy kernels
+_CLOSED = set([(0, 0), (1, -1), (1, 0), (1, 1), (2, -2), (2, 0), (2, 2),
+    (4, -4), (4, -2), (4, 0), (4, 2), (4, 4)])
+
+# the maximal order of the Gauss-Legendre quadrature in term C
+_MAXORDER = 100
+
+def sph_harm_numpy(m=0, l=0, phi=0, theta=0):
+    """The spherical harmonics, vectorized over phi and theta."""
+    if l == 0 and m == 0:
+        return 0.28209479177387814
+    elif l == 1 and m == -1:
+        return 0.3454941494713355*np.sin(theta)*np.exp(-1.j*phi)
+    elif l == 1 and m == 0:
+        return 0.48860251190291992*np.cos(theta)
+    elif l == 1 and m == 1:
+        return -0.3454941494713355*np.sin(theta)*np.exp(1.j*phi)
+    elif l == 2 and m == -2:
+        return 0.38627420202318957*np.sin(theta)*np.sin(theta) * \
+            np.exp(-2.*1.j*phi)
+    elif l == 2 and m == 0:
+        return 0.31539156525252005*(3.*np.cos(theta)*np.cos(theta) - 1.)
+    elif l == 2 and m == 2:
+        return 0.38627420202318957*np.sin(theta)*np.sin(theta) * \
+            np.exp(2.*1.j*phi)
+    elif l == 4 and m == -4:
+        return 0.44253269244498263*np.sin(theta)**4*np.exp(-4.*1.j*phi)
+    elif l == 4 and m == -2:
+        return 0.33452327177864458*np.sin(theta)**2.*(7.*np.cos(theta)**2. -
+            1.)*np.exp(-2.*1.j*phi)
+    elif l == 4 and m == 0:
+        return 0.10578554691520430*(35.*np.cos(theta)**4 -
+            30.*np.cos(theta)**2 + 3.)
+    elif l == 4 and m == 2:
+        return 0.33452327177864458*np.sin(theta)**2.*(7.*np.cos(theta)**2. -
+            1.)*np.exp(2.*1.j*phi)
+    elif l == 4 and m == 4:
+        return 0.44253269244498263*np.sin(theta)**4*np.exp(4.*1.j*phi)
+    else:
+        return scipy.special.sph_harm(m, l, phi, theta)
+
+def _groups(values):
+    """Groups of values closer than 1e-8, as representatives and inverse
+    index."""
+    order = np.argsort(values, kind="mergesort")
+    new = np.ones(len(values), dtype=bool)
+    new[1:] = np.diff(values[order]) >= 1e-8
+    inverse = np.empty(len(values), dtype=int)
+    inverse[order] = np.cumsum(new) - 1
+    return values[order][new], inverse
+
+def summands_A_numpy(a_sph, q, l, m):
+    """The summands of term A of one shell, a_sph in spherical
+    coordinates."""
+    r, inverse = _groups(a_sph[:,0])
+    inter = np.exp(-(r**2. - q)) * r**l / (r**2 - q)
+    return np.sum(inter[inverse] * sph_harm_numpy(m, l, a_sph[:,2],
+        a_sph[:,1]))
+
+_roots = {}
+
+def _legendre(n):
+    """The Gauss-Legendre nodes and weights of order n."""
+    if n not in _roots:
+        x, w = scipy.special.roots_legendre(n)
+        _roots[n] = (np.real(x), w)
+    return _roots[n]
+
+def integrals_C(q, l, w2, tol, rtol=1.49e-8, maxiter=1000):
+    """The integrals of term C for all w2.
+
+    The integrals over t in [0, 1] of (pi/t)^(3/2+l)*exp(q*t-w2/t) are
+    calculated with Gauss-Legendre quadratures of increasing order until
+    two successive orders agree, as scipy.integrate.quadrature does, but
+    for all w2 at once.
+    """
+    w2 = np.asarray(w2, dtype=float)
+    res = np.zeros(w2.shape)
+    val = np.full(w2.shape, np.inf)
+    active = np.arange(w2.size)
+    for n in range(1, maxiter + 1):
+        x, w = _legendre(n)
+        t = 0.5 * (x + 1.)
+        f = (math.pi/t)**(3./2.+l) * np.exp(q*t - w2[active,None]/t)
+        newval = 0.5 * np.sum(w * f, axis=-1)
+        err = np.abs(newval - val[active])
+        val[active] = newval
+        done = (err < tol) | (err < rtol * np.abs(newval))
+        res[active[done]] = newval[done]
+        active = active[~done]
+        if active.size == 0:
+            break
+    else:
+        res[active] = val[active]
+    return res
+
+def summands_C_numpy(w_sph, w, q, gamma, l, m, d, m_split, precision):
+    """The summands of term C of one shell, w_sph are the boosted vectors
+    w in spherical coordinates."""
+    part1 = (-1.j)**l * gamma * (np.absolute(w_sph[:,0])**l) * \
+        np.exp((-1.j)*m_split*math.pi*np.dot(w, d)) * \
+        sph_harm_numpy(m, l, w_sph[:,2], w_sph[:,1])
+    r, inverse = _groups(w_sph[:,0])
+    part2 = integrals_C(q, l, (math.pi*r)**2, precision*0.1)
+    return np.dot(part1, part2[inverse])
+
+def make_loops(jit):
+    """The loop kernels, compiled with jit.
+
+    Parameters
+    ----------
+    jit : callable
+        The compiler, e.g. numba.njit. With the identity the kernels run
+        as plain python.
+
+    Returns
+    -------
+    dict
+        The kernels sph_harm, summands_A and summands_C.
+    """
+    @jit
+    def ylm(l, m, theta, phi):
+        st, ct = math.sin(theta), math.cos(theta)
+        if l == 0:
+            return 0.28209479177387814 + 0j
+        elif l == 1 and m == -1:
+            return 0.3454941494713355*st*cmath.exp(-1.j*phi)
+        elif l == 1 and m == 0:
+            return 0.48860251190291992*ct + 0j
+        elif l == 1 and m == 1:
+            return -0.3454941494713355*st*cmath.exp(1.j*phi)
+        elif l == 2 and m == 0:
+            return 0.31539156525252005*(3.*ct*ct - 1.) + 0j
+        elif l == 2:
+            return 0.38627420202318957*st*st*cmath.exp(m*1.j*phi)
+        elif l == 4 and m == 0:
+            return 0.10578554691520430*(35.*ct**4 - 30.*ct*ct + 3.) + 0j
+        elif l == 4 and (m == 2 or m == -2):
+            return 0.33452327177864458*st*st*(7.*ct*ct - 1.)*cmath.exp(
+                m*1.j*phi)
+        return 0.44253269244498263*st**4*cmath.exp(m*1.j*phi)
+
+    @jit
+    def sph_harm(m, l, phi, theta):
+        out = np.empty(phi.shape[0], dtype=np.complex128)
+        for i in range(phi.shape[0]):
+            out[i] = ylm(l, m, theta[i], phi[i])
+        return out
+
+    @jit
+    def summands_A(a_sph, q, l, m):
+        res = 0j
+        for i in range(a_sph.shape[0]):
+            r = a_sph[i,0]
+            r2 = r * r
+            res += (math.exp(-(r2 - q)) * r**l / (r2 - q) *
+                ylm(l, m, a_sph[i,1], a_sph[i,2]))
+        return res
+
+    @jit
+    def integral(q, l, w2, tol, rtol, xs, ws):
+        val = np.inf
+        newval = 0.
+        for n in range(1, xs.shape[0] + 1):
+            newval = 0.
+            for k in range(n):
+                t = 0.5 * (xs[n-1,k] + 1.)
+                newval += ws[n-1,k] * (math.pi/t)**(1.5+l) * math.exp(q*t -
+                    w2/t)
+            newval *= 0.5
+            err = abs(newval - val)
+            val = newval
+            if err < tol or err < rtol * abs(newval):
+                break
+        return newval
+
+    @jit
+    def summands_C(w_sph, w, q, gamma, l, m, d, m_split, precision, xs, ws):
+        res = 0j
+        # the integrals only depend on the norm, reuse them for equal norms
+        norms = np.empty(w_sph.shape[0])
+        values = np.empty(w_sph.shape[0])
+        nunique = 0
+        for i in range(w_sph.shape[0]):
+            r = w_sph[i,0]
+            part2 = 0.
+            found = False
+            for k in range(nunique):
+                if abs(r - norms[k]) < 1e-8:
+                    part2 = values[k]
+                    found = True
+                    break
+            if not found:
+                part2 = integral(q, l, (math.pi*r)**2, precision*0.1,
+                    1.49e-8, xs, ws)
+                norms[nunique] = r
+                values[nunique] = part2
+                nunique += 1
+            wd = w[i,0]*d[0] + w[i,1]*d[1] + w[i,2]*d[2]
+            part1 = ((-1.j)**l * gamma * abs(r)**l * cmath.exp(
+                (-1.j)*m_split*math.pi*wd) * ylm(l, m, w_sph[i,1], w_sph[i,2]))
+            res += part1 * part2
+        return res
+
+    return {"sph_harm": sph_harm, "summands_A": summands_A,
+        "summands_C": summands_C}
+
+def _legendre_table(maxorder):
+    """The Gauss-Legendre nodes and weights up to maxorder, padded."""
+    xs = np.zeros((maxorder, maxorder))
+    ws = np.zeros((maxorder, maxorder))
+    for n in range(1, maxorder + 1):
+        xs[n-1,:n], ws[n-1,:n] = _legendre(n)
+    return xs, ws
+
+class LoopKernels(object):
+    """The loop kernels with the interface of the numpy kernels."""
+    def __init__(self, jit):
+        self.loops = make_loops(jit)
+        self.xs, self.ws = _legendre_table(_MAXORDER)
+
+    def sph_harm(self, m=0, l=0, phi=0, theta=0):
+        if (l, m) not in _CLOSED or np.ndim(phi) != 1:
+            return sph_harm_numpy(m, l, phi, theta)
+        return self.loops["sph_harm"](m, l, np.asarray(phi, dtype=float),
+            np.asarray(theta, dtype=float))
+
+    def summands_A(self, a_sph, q, l, m):
+        if (l, m) not in _CLOSED:
+            return summands_A_numpy(a_sph, q, l, m)
+        return self.loops["summands_A"](np.asarray(a_sph, dtype=float),
+            float(q), l, m)
+
+    def summands_C(self, w_sph, w, q, gamma, l, m, d, m_split, precision):
+        if (l, m) not in _CLOSED:
+            return summands_C_numpy(w_sph, w, q, gamma, l, m, d, m_split,
+                precision)
+        return self.loops["summands_C"](np.asarray(w_sph, dtype=float),
+            np.asarray(w, dtype=float), float(q), float(gamma), l, m,
+            np.asarray(d, dtype=float), float(m_split), float(precision),
+            self.xs, self.ws)
+
+class NumpyKernels(object):
+    """The numpy kernels."""
+    sph_harm = staticmethod(sph_harm_numpy)
+    summands_A = staticmethod(summands_A_numpy)
+    summands_C = staticmethod(summands_C_numpy)
+
+_kernels = NumpyKernels()
+
+def set_backend(name):
+    """Choose the kernels used by the zeta function.
+
+    Parameters
+    ----------
+    name : str
+        The backend, "numpy" or "numba".
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    ImportError
+        If numba is chosen but not installed.
+    """
+    global _kernels
+    if name == "numpy":
+        _kernels = NumpyKernels()
+    elif name == "numba":
+        import numba
+        _kernels = LoopKernels(numba.njit)
+    else:
+        raise ValueError("unknown backend %s" % name)
+
+def sph_harm(m=0, l=0, phi=0, theta=0):
+    return _kernels.sph_harm(m, l, phi, theta)
+
+def summands_A(a_sph, q, l, m):
+    return _kernels.summands_A(a_sph, q, l, m)
+
+def summands_C(w_sph, w, q, gamma, l, m, d, m_split, precision):
+    return _kernels.summands_C(w_sph, w, q, gamma, l, m, d, m_split,
+        precision)
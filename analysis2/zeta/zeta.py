@@ -38,7 +38,6 @@
 #
 ################################################################################
 
-import os
 import math
 import cmath
 import numpy as np
@@ -46,29 +45,17 @@ import scipy.special
 import scipy.integrate
 
 from ._zeta_memoize import memoize
-#import create_momentum_array as cma
-from .create_momentum_array import main as cmamain
+from .momentum_shells import get_shells
+from . import kernels
 
 def zeta_n(function):
-    path = "./momenta.npy"
-    if not os.path.isfile(path):
-        #import .create_momentum_array as cma
-        cmamain()
-    try:
-        _mem = np.load(path)
-        #print("reading n in wrapper")
-    except (IOError, UnicodeDecodeError):
-        #import .create_momentum_array as cma
-        cmamain()
-        _mem = np.load(path)
-        #print("error and reading n in wrapper")
-
+    # the momentum shells are loaded from the cache or created on the first
+    # call, see momentum_shells
     def zeta_wrapper(*args, **kwargs):
         if 'n' in kwargs:
             kwargs.pop('n')
-        return function(*args, n=_mem, **kwargs)
+        return function(*args, n=get_shells(), **kwargs)
 
-    zeta_wrapper._zeta_n_mem = _mem
     zeta_wrapper._zeta_n_origfunc = function
     zeta_wrapper._zeta_n_func_name = function.func_name
     return zeta_wrapper
@@ -108,10 +95,8 @@ def Z(q2, gamma = 1.0, l = 0, m = 0, d = np.array([0., 0., 0.]), \
   if gamma < 1.0:
     print( 'Gamma must be larger or equal to 1.0')
     exit(0)
-  if n==None:
-      # reading the three momenta for summation from file
-      print("loading n zeta")
-      _n = np.load("./momenta.npy")
+  if n is None:
+      _n = get_shells()
   else:
       _n = n
   # the computation
@@ -149,77 +134,33 @@ def appendSpherical_np(xyz):
 # coordinates 
 ################################################################################
 def compute_r_in_spherical_coordinates(a, d, gamma, m_split):
-  out = np.zeros_like(a)
   if (np.linalg.norm(d) == 0.0):
     out = a/gamma
   # splitting every vector in a in parallel and orthogonal part w.r.t. d
   else:
-    for i, r in enumerate(a):
-      r_p = np.dot(r, d)/np.dot(d,d)*d 
-      r_o = r-r_p
-      out[i,:] = (r_p-0.5*m_split*d)/gamma + r_o
+    r_p = (np.dot(a, d)/np.dot(d,d))[:,None]*d
+    r_o = a-r_p
+    out = (r_p-0.5*m_split*d)/gamma + r_o
   return appendSpherical_np(out)
 
-# compute spherical harmonics
+# compute spherical harmonics, see kernels
 ################################################################################
 def sph_harm(m = 0, l = 0, phi = 0, theta = 0):
-  if l is 0 and m is 0:
-    return 0.28209479177387814
-  elif l is 1 and m is -1:
-    return 0.3454941494713355*np.sin(theta)*np.exp(-1.j*phi)
-  elif l is 1 and m is  0:
-    return 0.48860251190291992*np.cos(theta)
-  elif l is 1 and m is  1:
-    return -0.3454941494713355*np.sin(theta)*np.exp(1.j*phi)
-  elif l is 2 and m is -2:
-    return 0.38627420202318957*np.sin(theta)*np.sin(theta) * np.exp(-2.*1.j*phi)
-  elif l is 2 and m is  0:
-    return 0.31539156525252005*(3.*np.cos(theta)*np.cos(theta) - 1.)
-  elif l is 2 and m is  2:
-    return 0.38627420202318957*np.sin(theta)*np.sin(theta) * np.exp(2.*1.j*phi)
-  elif l is 4 and m is -4:
-    return 0.44253269244498263*np.sin(theta)**4*np.exp(-4.*1.j*phi)
-  elif l is 4 and m is -2:
-    return 0.33452327177864458*\
-        np.sin(theta)**2.*(7.*np.cos(theta)**2. - 1.)*np.exp(-2.*1.j*phi)
-  elif l is 4 and m is  0:
-    return 0.10578554691520430*(35.*np.cos(theta)**4 - 30.*np.cos(theta)**2 +3.)
-  elif l is 4 and m is  2:
-    return 0.33452327177864458*\
-        np.sin(theta)**2.*(7.*np.cos(theta)**2. - 1.)*np.exp(2.*1.j*phi)
-  elif l is 4 and m is  4:
-    return 0.44253269244498263*np.sin(theta)**4*np.exp(4.*1.j*phi)
-  else:
-    return scipy.special.sph_harm(m, l, phi, theta)
+  return kernels.sph_harm(m, l, phi, theta)
 
 # returns the part of the momentum array for a given momentum squared
 ################################################################################
 def return_momentum_array(p, n):
-  if len(n[p,0]) is 0:
+  if len(n[p,0]) == 0:
     p += 1
   out = n[p, 0]
   p += 1
   return out, p
 
-# Computes a part of the sum in term A
+# Computes a part of the sum in term A, see kernels
 ################################################################################
 def compute_summands_A(a_sph, q, l, m): 
-  inter = []
-  for count, r in enumerate(a_sph):
-    breaker = 0
-    # one way to avoid double computation
-    for i in xrange(0, count):
-      if abs(float(r[0]) - float(a_sph[i, 0])) < 1e-8:
-        inter.append(inter[i])
-        breaker = 1
-        break
-    if breaker == 0:
-      inter.append((np.exp(-(r[0]**2.-q)) * r[0]**l) / (r[0]**2-q))
-
-  result = 0.0 
-  for count, r in enumerate(a_sph):
-    result += inter[count]*sph_harm(m, l, r[2], r[1]) 
-  return result
+  return kernels.summands_A(a_sph, q, l, m)
 
 # Computation of term A
 ################################################################################
@@ -272,47 +213,19 @@ def B(q, gamma, l, precision, verbose):
 # Computes the term gamma*w and returns the result in spherical coordinates
 ################################################################################
 def compute_gamma_w_in_spherical_coordinates(a, d, gamma):
-  out = np.zeros(a.shape)
   if (np.linalg.norm(d) == 0.0):
-    for r, i in zip(a, xrange(0,a.shape[0])):
-      out[i,:] = r*gamma
+    out = a*gamma
   # splitting every vector in a in parallel and orthogonal part w.r.t. d
   else:
-    for r, i in zip(a, xrange(0,a.shape[0])):
-      r_p = np.dot(r, d)/np.dot(d,d)*d 
-      r_o = r-r_p
-      out[i,:] = r_p*gamma + r_o
-  return appendSpherical_np(out)
-
-# Just the integrand of term C
-################################################################################
-integrand = lambda t, q, l, w: ((math.pi/t)**(3./2.+l) ) * np.exp(q*t-w/t)
+    r_p = (np.dot(a, d)/np.dot(d,d))[:,None]*d
+    r_o = a-r_p
+    out = r_p*gamma + r_o
+  return appendSpherical_np(out.astype(float))
 
-# Computes a part of the sum in term C
+# Computes a part of the sum in term C, see kernels
 ################################################################################
 def compute_summands_C(w_sph, w, q, gamma, l, m, d, m_split, precision):
-  part1 = (-1.j)**l * gamma * (np.absolute(w_sph[:,0])**l) * \
-          np.exp((-1.j)*m_split*math.pi*np.dot(w, d)) * \
-          sph_harm(m, l, w_sph[:,2], w_sph[:,1])
-  # Factor two: The integral 
-  part2 = []
-  for count, ww in enumerate(w_sph):
-    breaker = 0
-    for i in xrange(0, count):
-      if abs(float(ww[0]) - float(w_sph[i, 0])) < 1e-8:
-        part2.append(part2[i])
-        breaker = 1
-        break
-    if breaker == 0:
-      # the precision in this integral might be crucial at some point but it is
-      # rather high right now with a standard of 1e-8. It should be enough
-      # for all comoputations. In doubt, please change it.
-      part2.append((scipy.integrate.quadrature(integrand, 0., 1., \
-                    args=(q, l, (math.pi*ww[0])**2), tol = precision*0.1, \
-                    maxiter=1000))[0])
-  part2 = np.asarray(part2, dtype=float)
-  # return the result
-  return np.dot(part1, part2)
+  return kernels.summands_C(w_sph, w, q, gamma, l, m, d, m_split, precision)
 
 # Computation of term C
 ################################################################################
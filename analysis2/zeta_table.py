@@ -0,0 +1,300 @@
+"""
+Interpolation tables for the Luescher zeta function.
+
+For a fixed total momentum d and quantum numbers l, m the zeta function
+is needed at many nearby points (q2, gamma), e.g. for all bootstrap
+samples and fit ranges of a phase shift. A ZetaTable replaces the series
+summation at these points by the evaluation of Chebyshev interpolations.
+
+Z has simple poles at the free two-particle levels. For the lattice
+vectors n they are at q2 = |n_perp|^2 + (n_par - m_split*d/2)^2 / gamma^2,
+which are straight lines in u = 1/gamma^2. The table is split into
+pieces between neighbouring poles, where the q2 axis of a piece is the
+relative position t between the two poles. Multiplied by the distance
+to both poles Z is smooth on a piece and is interpolated in t and u.
+Every piece is checked against the exact function on points between the
+interpolation nodes and bisected until the error is below the tolerance.
+Points closer to a pole than the margin, outside of the table or in a
+piece that did not converge are evaluated exactly.
+"""
+
+import numpy as np
+from numpy.polynomial import chebyshev as cheb
+
+import instrument
+import zeta_wrapper
+
+def pole_lines(q2max, umin, d=np.array([0., 0., 0.]), m_split=1.):
+    """The poles of the zeta function below q2max.
+
+    Parameters
+    ----------
+    q2max : float
+        The largest q2 needed.
+    umin : float
+        The smallest u = 1/gamma^2 needed.
+    d : ndarray, optional
+        The total momentum vector of the system.
+    m_split : float, optional
+        The mass difference between the particles.
+
+    Returns
+    -------
+    ndarray
+        The coefficients A, B of the poles q2 = A + B*u, shape (k, 2).
+    """
+    d = np.asarray(d, dtype=float)
+    d2 = np.dot(d, d)
+    q2max = max(q2max, 0.)
+    nmax = int(np.sqrt(q2max / umin) + np.sqrt(q2max) + np.sqrt(d2)) + 1
+    r = np.arange(-nmax, nmax + 1, dtype=float)
+    n = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+    n2 = np.sum(n * n, axis=1)
+    if d2 == 0.:
+        A, B = np.zeros_like(n2), n2
+    else:
+        nd = n.dot(d) / d2
+        A = n2 - nd * nd * d2
+        B = np.square(nd - 0.5 * m_split) * d2
+    sel = A + B * umin <= q2max
+    return np.unique(np.round(np.column_stack((A[sel], B[sel])), 10), axis=0)
+
+def _crossings(lines, q2, u):
+    """The u in the open interval u where two lines cross inside q2."""
+    A, B = lines[:,0], lines[:,1]
+    dA = A[None,:] - A[:,None]
+    dB = B[:,None] - B[None,:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uc = dA / dB
+        qc = A[:,None] + B[:,None] * uc
+        sel = (dB != 0.) & (uc > u[0]) & (uc < u[1]) & (qc >= q2[0]) & \
+            (qc <= q2[1])
+    return np.unique(uc[sel])
+
+def _nodes(n):
+    """The Chebyshev nodes of the first kind."""
+    return np.cos(np.pi * (2. * np.arange(n) + 1.) / (2. * n))
+
+def _extrema(n):
+    """The extrema of the Chebyshev polynomial of degree n, between the
+    nodes."""
+    return np.cos(np.pi * np.arange(n + 1) / float(n))
+
+class ZetaTable(object):
+    """Interpolation of the zeta function for fixed l, m, d and m_split."""
+    def __init__(self, q2, gamma=1., l=0, m=0, d=np.array([0., 0., 0.]),
+            m_split=1., prec=10e-6, tol=1e-5, margin=1e-3, order=16,
+            order_gamma=8, depth=6, exact=None):
+        """Build the table.
+
+        Parameters
+        ----------
+        q2 : tuple of floats
+            The range of q2.
+        gamma : float or tuple of floats, optional
+            The Lorentz boost factor or its range.
+        l, m : ints, optional
+            The orbital and magnetic quantum numbers.
+        d : ndarray, optional
+            The total momentum vector of the system.
+        m_split : float, optional
+            The mass difference between the particles.
+        prec : float, optional
+            The precision of the exact calculation the table replaces.
+        tol : float, optional
+            The maximal error of the interpolation, relative to the value
+            for values larger than one. The interpolation nodes and the
+            checks are calculated with a precision of tol/100, as the
+            exact calculation is not smooth below its precision.
+        margin : float, optional
+            Points closer to a pole are evaluated exactly.
+        order, order_gamma : ints, optional
+            The number of interpolation nodes in q2 and gamma.
+        depth : int, optional
+            The maximal number of bisections of a piece.
+        exact : callable, optional
+            The exact zeta function, called with arrays q2 and gamma and
+            l, m, d, m_split and prec, by default zeta_wrapper.Z_exact.
+        """
+        self.q2 = (float(q2[0]), float(q2[1]))
+        gamma = np.atleast_1d(np.asarray(gamma, dtype=float))
+        self.gamma = (float(gamma.min()), float(gamma.max()))
+        if self.gamma[0] < 1.:
+            raise ValueError("gamma must be larger or equal to 1")
+        self.l, self.m = l, m
+        self.d = np.asarray(d, dtype=float)
+        self.m_split = float(m_split)
+        self.prec = prec
+        self.tol = tol
+        self.margin = margin
+        self.order = order
+        self.order_gamma = order_gamma if self.gamma[1] > self.gamma[0] else 1
+        self.depth = depth
+        self.exact = zeta_wrapper.Z_exact if exact is None else exact
+        self.error = 0.
+        self.exact_pieces = 0
+
+        u = (1. / self.gamma[1]**2, 1. / self.gamma[0]**2)
+        poles = pole_lines(self.q2[1], u[0], self.d, self.m_split)
+        # the first two lines are the bounds of the table
+        self._lines = np.vstack(([[self.q2[0], 0.], [self.q2[1], 0.]], poles))
+        self._pole = np.arange(len(self._lines)) > 1
+        # the order of the lines only changes where they cross
+        self._ubreaks = np.concatenate(([u[0]], _crossings(self._lines,
+            self.q2, u), [u[1]]))
+        self._order = []
+        self._pieces = []
+        with instrument.span("zeta.table.build"):
+            for i in range(max(len(self._ubreaks) - 1, 1)):
+                ua, ub = self._ubreaks[i], self._ubreaks[min(i+1,
+                    len(self._ubreaks)-1)]
+                values = self._values(0.5 * (ua + ub))
+                inside = (values > self.q2[0]) & (values < self.q2[1])
+                inside[:2] = False
+                order = np.concatenate(([0], np.flatnonzero(inside)[np.argsort(
+                    values[inside])], [1]))
+                self._order.append(order)
+                self._pieces.append([self._fit(order[s], order[s+1], 0., 1.,
+                    ua, ub, self.depth) for s in range(len(order) - 1)])
+
+    def matches(self, l, m, d, m_split, prec):
+        """Whether the table replaces the zeta function with these
+        parameters."""
+        return (l == self.l and m == self.m and np.array_equal(np.asarray(d,
+            dtype=float), self.d) and float(m_split) == self.m_split and
+            prec >= self.prec)
+
+    def _values(self, u, lines=None):
+        """The values of the lines at u."""
+        lines = self._lines if lines is None else self._lines[lines]
+        return lines[...,0] + lines[...,1] * u
+
+    def _points(self, L, R, t, u):
+        """The q2 at the relative position t and the weight for the poles."""
+        pL, pR = self._values(u, L), self._values(u, R)
+        q2 = pL + t * (pR - pL)
+        weight = np.ones_like(q2)
+        if self._pole[L]:
+            weight *= q2 - pL
+        if self._pole[R]:
+            weight *= pR - q2
+        return q2, weight
+
+    def _exact(self, q2, u, prec=None):
+        return self.exact(q2, 1. / np.sqrt(u), self.l, self.m, self.d,
+            self.m_split, self.prec if prec is None else prec)
+
+    @staticmethod
+    def _scale(x, a, b):
+        if b == a:
+            return np.zeros_like(x)
+        return (2. * x - a - b) / (b - a)
+
+    def _fit(self, L, R, ta, tb, ua, ub, depth):
+        """Interpolate the piece between the lines L and R.
+
+        Returns
+        -------
+        list
+            The pieces (ta, tb, ua, ub, coefficients), the coefficients
+            are None if the piece did not converge.
+        """
+        nt, nu = self.order, self.order_gamma
+        xt, xu = _nodes(nt), _nodes(nu)
+        t, u = np.meshgrid(ta + 0.5 * (xt + 1.) * (tb - ta),
+            ua + 0.5 * (xu + 1.) * (ub - ua), indexing="ij")
+        q2, weight = self._points(L, R, t, u)
+        prec = min(self.prec, 0.01 * self.tol)
+        values = self._exact(q2, u, prec) * weight
+        coef = np.linalg.solve(cheb.chebvander(xt, nt - 1), values)
+        coef = np.linalg.solve(cheb.chebvander(xu, nu - 1), coef.T).T
+
+        # check between the nodes, up to the margin around the poles
+        xt = _extrema(nt)
+        xu = _extrema(nu) if nu > 1 else xu
+        t, u = np.meshgrid(ta + 0.5 * (xt + 1.) * (tb - ta),
+            ua + 0.5 * (xu + 1.) * (ub - ua), indexing="ij")
+        width = self._values(u, R) - self._values(u, L)
+        lo = self.margin / width if self._pole[L] else 0.
+        hi = 1. - self.margin / width if self._pole[R] else 1.
+        t = np.clip(t, lo, hi)
+        q2, weight = self._points(L, R, t, u)
+        ref = self._exact(q2, u, prec)
+        res = cheb.chebval2d(self._scale(t, ta, tb), self._scale(u, ua, ub),
+            coef) / weight
+        error = np.max(np.abs(res - ref) / np.maximum(1., np.abs(ref)))
+        if error <= self.tol:
+            self.error = max(self.error, error)
+            return [(ta, tb, ua, ub, coef)]
+        if depth == 0:
+            self.exact_pieces += 1
+            return [(ta, tb, ua, ub, None)]
+        if nu == 1 or depth % 2 == 0:
+            tm = 0.5 * (ta + tb)
+            return (self._fit(L, R, ta, tm, ua, ub, depth - 1) +
+                self._fit(L, R, tm, tb, ua, ub, depth - 1))
+        um = 0.5 * (ua + ub)
+        return (self._fit(L, R, ta, tb, ua, um, depth - 1) +
+            self._fit(L, R, ta, tb, um, ub, depth - 1))
+
+    def __call__(self, q2, gamma=None):
+        """Evaluate the zeta function.
+
+        Parameters
+        ----------
+        q2 : float or ndarray
+            The squared momentum transfer.
+        gamma : float or ndarray, optional
+            The Lorentz boost factor.
+
+        Returns
+        -------
+        complex or ndarray
+            The value of the zeta function.
+        """
+        q2 = np.asarray(q2, dtype=float)
+        gamma = np.ones_like(q2) if gamma is None else np.asarray(gamma,
+            dtype=float)
+        q2, gamma = np.broadcast_arrays(q2, gamma)
+        shape = q2.shape
+        q2, gamma = q2.ravel(), gamma.ravel()
+        res = np.zeros(q2.shape, dtype=complex)
+        done = np.zeros(q2.shape, dtype=bool)
+        u = 1. / np.square(gamma)
+        ub = self._ubreaks
+        inside = (q2 >= self.q2[0]) & (q2 <= self.q2[1]) & \
+            (u >= ub[0] * (1. - 1e-12)) & (u <= ub[-1] * (1. + 1e-12))
+        sub = np.clip(np.searchsorted(ub, u, side="right") - 1, 0,
+            len(self._order) - 1)
+        for r in np.unique(sub[inside]):
+            idx = np.flatnonzero(inside & (sub == r))
+            order = self._order[r]
+            values = self._values(u[idx,None], order)
+            seg = np.clip(np.sum(values <= q2[idx,None], axis=1) - 1, 0,
+                len(order) - 2)
+            for s in np.unique(seg):
+                i = idx[seg == s]
+                L, R = order[s], order[s+1]
+                pL, pR = self._values(u[i], L), self._values(u[i], R)
+                near = np.zeros(i.shape, dtype=bool)
+                if self._pole[L]:
+                    near |= q2[i] - pL < self.margin
+                if self._pole[R]:
+                    near |= pR - q2[i] < self.margin
+                t = (q2[i] - pL) / (pR - pL)
+                for ta, tb, ua, ubb, coef in self._pieces[r][s]:
+                    sel = (~near & ~done[i] & (t >= ta) & (t <= tb) &
+                        (u[i] >= ua * (1. - 1e-12)) & (u[i] <= ubb * (1. + 1e-12)))
+                    if coef is None or not np.any(sel):
+                        continue
+                    j = i[sel]
+                    _, weight = self._points(L, R, t[sel], u[j])
+                    res[j] = cheb.chebval2d(self._scale(t[sel], ta, tb),
+                        self._scale(u[j], ua, ubb), coef) / weight
+                    done[j] = True
+        instrument.count("zeta.table", np.count_nonzero(done))
+        if not np.all(done):
+            todo = ~done
+            res[todo] = self._exact(q2[todo], u[todo])
+        res = res.reshape(shape)
+        return res[()] if res.ndim == 0 else res
@@ -0,0 +1,83 @@
+"""
+Unit tests for the zeta function tables.
+"""
+
+import unittest
+import numpy as np
+
+import zeta_wrapper
+from zeta_wrapper import Z, Z_exact
+from zeta_table import ZetaTable, pole_lines
+from phaseshift_functions import get_solution, phaseshift_tables
+
+def _error(res, ref):
+    return np.max(np.abs(res - ref) / np.maximum(1., np.abs(ref)))
+
+class PoleLines_Test(unittest.TestCase):
+    def test_cmf(self):
+        lines = pole_lines(8., 1.)
+        self.assertTrue(np.all(lines[:,0] == 0.))
+        self.assertEqual(list(lines[:,1]), [0., 1., 2., 3., 4., 5., 6., 8.])
+
+    def test_mf1(self):
+        lines = pole_lines(1., 0.5, np.array([0., 0., 1.]))
+        # the lowest level is the one with both particles at rest
+        self.assertEqual(list(lines[0]), [0., 0.25])
+        self.assertTrue(np.all(lines[:,0] + 0.5 * lines[:,1] <= 1.))
+
+class ZetaTable_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = ZetaTable((-0.5, 2.5))
+
+    def tearDown(self):
+        zeta_wrapper.set_tables(None)
+
+    def test_cmf(self):
+        q2 = np.random.RandomState(1227).uniform(-0.5, 2.5, 100)
+        self.assertLess(self.table.error, self.table.tol)
+        self.assertEqual(self.table.exact_pieces, 0)
+        self.assertLess(_error(self.table(q2), Z_exact(q2, prec=1e-7)), 1e-5)
+
+    def test_pole(self):
+        q2 = np.array([1. - 1e-4, 1. + 5e-4, 2.6, -1.])
+        # close to the poles and outside the table Z is calculated exactly
+        self.assertTrue(np.array_equal(self.table(q2), Z_exact(q2)))
+
+    def test_scalar(self):
+        res = self.table(0.3)
+        self.assertEqual(np.ndim(res), 0)
+        self.assertAlmostEqual(res, Z_exact(0.3), delta=1e-5)
+
+    def test_moving_frame(self):
+        d = np.array([0., 0., 1.])
+        table = ZetaTable((0.05, 0.3), (1., 1.2), d=d, order=12,
+            order_gamma=6)
+        # a pole crosses the table
+        self.assertEqual(len(table._order[0]), 3)
+        rng = np.random.RandomState(1227)
+        q2, gamma = rng.uniform(0.05, 0.3, 50), rng.uniform(1., 1.2, 50)
+        self.assertLess(_error(table(q2, gamma), Z_exact(q2, gamma, d=d,
+            prec=1e-7)), 1e-5)
+
+    def test_set_tables(self):
+        q2 = np.linspace(0.1, 0.9, 5)
+        zeta_wrapper.set_tables([self.table])
+        self.assertTrue(np.array_equal(Z(q2), self.table(q2)))
+        # other quantum numbers are calculated exactly
+        self.assertTrue(np.array_equal(Z(q2, l=2), Z_exact(q2, l=2)))
+        zeta_wrapper.set_tables(None)
+        self.assertTrue(np.array_equal(Z(q2), Z_exact(q2)))
+
+    def test_get_solution(self):
+        rng = np.random.RandomState(1227)
+        q2 = rng.uniform(0.1, 0.4, (10, 3))
+        gamma = np.ones_like(q2)
+        tables = phaseshift_tables([q2], [gamma])
+        ref = get_solution(q2, gamma, 0)
+        res = get_solution(q2, gamma, 0, tables=tables)
+        self.assertTrue(np.allclose(res[1], ref[1], atol=1e-3))
+        self.assertEqual(zeta_wrapper._tables, [])
+
+if __name__ == "__main__":
+    unittest.main()
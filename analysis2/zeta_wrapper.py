@@ -4,8 +4,78 @@ wrapper for the zeta function.
 
 import numpy as np
 import memoize
-import zeta
+import instrument
 
+# optional cache shared between processes, see set_shared_cache
+_shared_cache = None
+
+def set_shared_cache(cache):
+    """Set a cache for the zeta function values shared between processes.
+
+    The cache is used by Z and omega. Any dict like object works, e.g. a
+    multiprocessing.Manager().dict() to share the values between the
+    processes of a pool.
+
+    Parameters
+    ----------
+    cache : dict like or None
+        The cache, None switches the cache off.
+    """
+    global _shared_cache
+    _shared_cache = cache
+
+# interpolation tables used instead of the exact calculation, see set_tables
+_tables = []
+
+def set_tables(tables):
+    """Set interpolation tables used by Z and omega.
+
+    Z is read from the first table matching l, m, d, m_split and prec,
+    see zeta_table.ZetaTable. Points outside of a table are calculated
+    exactly.
+
+    Parameters
+    ----------
+    tables : sequence of ZetaTable or None
+        The tables, None switches the tables off.
+
+    Returns
+    -------
+    list
+        The tables used before.
+    """
+    global _tables
+    old = _tables
+    _tables = [] if tables is None else list(tables)
+    return old
+
+def _table(l, m, d, m_split, prec):
+    for table in _tables:
+        if table.matches(l, m, d, m_split, prec):
+            return table
+    return None
+
+def _zeta():
+    """The zeta package, imported on first use to keep imports fast."""
+    import zeta
+    return zeta
+
+def _Z_single(q2, gamma, l, m, d, m_split, prec, verbose):
+    """Evaluate the zeta function for scalar input, using the shared cache."""
+    if _shared_cache is None:
+        return _zeta().Z(q2, gamma, l, m, d, m_split, prec, verbose)
+    key = (float(q2), float(gamma), l, m, tuple(np.asarray(d, dtype=float)),
+        float(m_split), prec)
+    try:
+        res = _shared_cache[key]
+        instrument.count("zeta.shared.hit")
+    except KeyError:
+        instrument.count("zeta.shared.miss")
+        res = _zeta().Z(q2, gamma, l, m, d, m_split, prec, verbose)
+        _shared_cache[key] = res
+    return res
+
+@instrument.timed("zeta")
 def Z(q2, gamma=None, l=0, m=0, d=np.array([0., 0., 0.]), m_split=1.,
         prec=10e-6, verbose=0):
     """Calculates the Luescher Zeta function.
@@ -27,9 +97,19 @@ def Z(q2, gamma=None, l=0, m=0, d=np.array([0., 0., 0.]), m_split=1.,
     verbose : int
         The amount of info printed.
     """
+    if _tables:
+        table = _table(l, m, d, m_split, prec)
+        if table is not None:
+            return table(q2, gamma)
+    return Z_exact(q2, gamma, l, m, d, m_split, prec, verbose)
+
+def Z_exact(q2, gamma=None, l=0, m=0, d=np.array([0., 0., 0.]), m_split=1.,
+        prec=10e-6, verbose=0):
+    """Calculates the Luescher Zeta function without interpolation tables,
+    see Z."""
     if isinstance(q2, (tuple, list, np.ndarray)):
         _q2 = np.asarray(q2)
-        if gamma == None:
+        if gamma is None:
             _gamma = np.ones_like(_q2)
         else:
             _gamma = np.asarray(gamma)
@@ -38,14 +118,16 @@ def Z(q2, gamma=None, l=0, m=0, d=np.array([0., 0., 0.]), m_split=1.,
         it = np.nditer([_q2, _gamma, res], op_flags = [["readonly"],
             ["readonly"], ["writeonly", "no_broadcast"]])
         for q, g, r in it:
-            r[...] = zeta.Z(q, g, l, m, d, m_split, prec, verbose)
+            r[...] = _Z_single(q, g, l, m, d, m_split, prec, verbose)
+        instrument.count("zeta.evaluations", res.size)
 
         return it.operands[2]
     else:
-        if gamma == None:
-            return zeta.Z(q2, 1., l, m, d, m_split, prec, verbose)
+        instrument.count("zeta.evaluations")
+        if gamma is None:
+            return _Z_single(q2, 1., l, m, d, m_split, prec, verbose)
         else:
-            return zeta.Z(q2, gamma, l, m, d, m_split, prec, verbose)
+            return _Z_single(q2, gamma, l, m, d, m_split, prec, verbose)
 
 def omega(q2, gamma=None, l=0, m=0, d=np.array([0., 0., 0.]), m_split=1.,
         prec=10e-6, exFac=False, verbose=0):
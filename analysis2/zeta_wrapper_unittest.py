@@ -2,6 +2,9 @@
 Unit tests for the zeta function wrappers.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
@@ -11,6 +14,7 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
 from zeta_wrapper import Z, omega
+from zeta import momentum_shells as ms
 
 class Zeta_Test(unittest.TestCase):
     def test_cmf(self):
@@ -99,6 +103,53 @@ class Zeta_Test(unittest.TestCase):
                     plt.clf()
             fplot.close()
 
+class Shells_Test(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.env = os.environ.get("ZETA_MOMENTA_DIR")
+        os.environ["ZETA_MOMENTA_DIR"] = self.path
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ["ZETA_MOMENTA_DIR"]
+        else:
+            os.environ["ZETA_MOMENTA_DIR"] = self.env
+        shutil.rmtree(self.path)
+
+    def test_generate(self):
+        vectors, offsets = ms.generate(30)
+        n = np.arange(-6, 7)
+        cube = np.asarray(np.meshgrid(n, n, n, indexing="ij")).reshape(3, -1).T
+        norms = np.sum(cube**2, axis=1)
+        for p in range(30):
+            ref = cube[norms == p]
+            self.assertTrue(np.array_equal(vectors[offsets[p]:offsets[p+1]],
+                ref))
+
+    def test_multiplicity(self):
+        reps, norms, mult = ms.reduced_shells(50)
+        vectors, offsets = ms.generate(50)
+        self.assertEqual(np.sum(mult), vectors.shape[0])
+        self.assertEqual(len(ms.expand(reps)), vectors.shape[0])
+        # shell 7 is empty, shell 3 are the 8 corners
+        self.assertEqual(offsets[8] - offsets[7], 0)
+        self.assertEqual(offsets[4] - offsets[3], 8)
+
+    def test_cache(self):
+        shells = ms.MomentumShells(40)
+        self.assertEqual(os.listdir(self.path), ["momenta_40.npz"])
+        # a smaller table is taken from the cached one
+        shells = ms.MomentumShells(20)
+        self.assertEqual(len(os.listdir(self.path)), 1)
+        self.assertEqual(shells.shell(9).shape, (30, 3))
+        self.assertEqual(shells[9, 1], 9)
+
+    def test_extend(self):
+        shells = ms.MomentumShells(10, cache=False)
+        self.assertEqual(shells.multiplicity(25), 30)
+        self.assertTrue(len(shells) > 25)
+        self.assertEqual(os.listdir(self.path), [])
+
 if __name__ == "__main__":
     unittest.main()
 